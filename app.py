@@ -33,6 +33,11 @@ def create_app():
     load_dotenv()
 
     global_manager = GlobalManager(app=app)
+    # Start the backend retention job, and write the costs still pending in the backend on shutdown,
+    # after the vector search plugins have saved their caches to it
+    app.add_event_handler("startup", global_manager.backend_internal_data_processing_dispatcher.start)
+    app.add_event_handler("shutdown", global_manager.genai_vectorsearch_dispatcher.close)
+    app.add_event_handler("shutdown", global_manager.backend_internal_data_processing_dispatcher.close)
 
     # Instrument the FastAPI application
     FastAPIInstrumentor.instrument_app(app)
@@ -0,0 +1,291 @@
+"""
+Vector search benchmark.
+
+Runs OpenaiFileSearchPlugin.search_reviews against indexes stored through the file system
+backend, with a deterministic local stub in place of the embeddings API. Reports the index
+load time, the p50/p99 search latency and the peak RSS of the process.
+
+Synthetic corpus:
+    python -m benchmarks.vector_search_benchmark --passages 100000 --dimensions 1536 --format binary
+Recorded corpus (a CSV or binary index, with optional recorded queries one per line):
+    python -m benchmarks.vector_search_benchmark --index path/to/docs.csv --queries-file queries.txt
+
+The corpus is generated in the parent process, loading and searching run in a fresh child
+process so its peak RSS only accounts for the retrieval path.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+from core.global_manager import GlobalManager
+from plugins.backend.internal_data_processing.file_system.file_system import (
+    FileSystemPlugin,
+)
+from plugins.genai_interactions.vector_search.openai_file_search.openai_file_search import (
+    OpenaiFileSearchPlugin,
+)
+from plugins.genai_interactions.vector_search.openai_file_search.utils.convert_index import (
+    binary_index_files,
+)
+from plugins.genai_interactions.vector_search.openai_file_search.utils.ivf_index import (
+    IvfIndex,
+    ivf_index_file,
+)
+from plugins.genai_interactions.vector_search.openai_file_search.utils.vector_index import (
+    VectorIndex,
+)
+
+VECTORS_CONTAINER = "vectors"
+INDEX_NAME = "benchmark.csv"
+
+
+class EmbeddingStub:
+    """
+    Stands in for client.embeddings: texts map to fixed pseudo-random unit vectors,
+    or to the vectors registered for them (queries sampled from the corpus).
+    """
+
+    def __init__(self, dimensions: int, vectors: Optional[Dict[str, np.ndarray]] = None):
+        self.dimensions = dimensions
+        self.vectors = vectors or {}
+        self.calls = 0
+
+    def embed(self, text: str) -> List[float]:
+        vector = self.vectors.get(text)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).normal(size=self.dimensions)
+        return (vector / (np.linalg.norm(vector) or 1.0)).astype(np.float32).tolist()
+
+    async def create(self, input, model=None):
+        self.calls += 1
+        texts = [input] if isinstance(input, str) else input
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=self.embed(text)) for i, text in enumerate(texts)])
+
+def make_global_manager(root_directory: str, search_config: dict) -> GlobalManager:
+    global_manager = MagicMock(spec=GlobalManager)
+    global_manager.logger = logging.getLogger("vector_search_benchmark")
+    global_manager.config_manager = MagicMock()
+    global_manager.plugin_manager = MagicMock()
+    global_manager.config_manager.config_model.PLUGINS.BACKEND.INTERNAL_DATA_PROCESSING = {
+        "FILE_SYSTEM": {
+            "PLUGIN_NAME": "file_system",
+            "DIRECTORY": root_directory,
+            "SESSIONS_CONTAINER": "sessions",
+            "MESSAGES_CONTAINER": "messages",
+            "FEEDBACKS_CONTAINER": "feedbacks",
+            "CONCATENATE_CONTAINER": "concatenate",
+            "PROMPTS_CONTAINER": "prompts",
+            "COSTS_CONTAINER": "costs",
+            "PROCESSING_CONTAINER": "processing",
+            "ABORT_CONTAINER": "abort",
+            "VECTORS_CONTAINER": VECTORS_CONTAINER,
+        }
+    }
+    global_manager.config_manager.config_model.PLUGINS.GENAI_INTERACTIONS.VECTOR_SEARCH = {"OPENAI_FILE_SEARCH": search_config}
+    return global_manager
+
+def make_plugin(root_directory: str, embedding_stub: EmbeddingStub, **settings) -> OpenaiFileSearchPlugin:
+    search_config = {
+        "PLUGIN_NAME": "openai_file_search",
+        "OPENAI_SEARCH_OPENAI_KEY": "benchmark",
+        "OPENAI_SEARCH_OPENAI_ENDPOINT": "http://localhost",
+        "OPENAI_SEARCH_OPENAI_API_VERSION": "benchmark",
+        "OPENAI_SEARCH_MODEL_HOST": "openai",
+        "OPENAI_SEARCH__MODEL_NAME": "benchmark-embedding",
+        "OPENAI_SEARCH_INPUT_TOKEN_PRICE": 0.0,
+        "OPENAI_SEARCH_OUTPUT_TOKEN_PRICE": 0.0,
+        "OPENAI_SEARCH_CONTEXT_EXTRACTION": settings.pop("context_extraction", False),
+        "OPENAI_SEARCH_CONTEXT_EXTRACTION_BEFORE_RATIO": 0.1,
+        "OPENAI_SEARCH_CONTEXT_EXTRACTION_AFTER_RATIO": 0.1,
+        "OPENAI_SEARCH_TEXT_WEIGHT": 0.7,
+        "OPENAI_SEARCH_TITLE_WEIGHT": 0.3,
+        "OPENAI_SEARCH_USE_TITLE_IN_SEARCH": False,
+        "OPENAI_SEARCH_RESULT_COUNT": 5,
+    }
+    search_config.update({f"OPENAI_SEARCH_{key.upper()}": value for key, value in settings.items()})
+    global_manager = make_global_manager(root_directory, search_config)
+
+    backend = FileSystemPlugin(global_manager)
+    backend.initialize()
+    os.makedirs(os.path.join(root_directory, VECTORS_CONTAINER), exist_ok=True)
+    global_manager.backend_internal_data_processing_dispatcher = backend
+
+    plugin = OpenaiFileSearchPlugin(global_manager)
+    plugin.initialize()
+    plugin.client = SimpleNamespace(embeddings=embedding_stub)
+    return plugin
+
+def synthetic_corpus(passages: int, dimensions: int, documents: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Clustered unit vectors, so nearest neighbours are meaningful as in real corpora.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, documents), dimensions)).astype(np.float32)
+    owners = rng.integers(0, len(centers), size=passages)
+    embeddings = centers[owners] + rng.normal(scale=0.5, size=(passages, dimensions)).astype(np.float32)
+    words = np.array(["error", "login", "deploy", "billing", "ticket", "cluster", "export", "report", "timeout", "quota"])
+    texts = [" ".join(rng.choice(words, size=12)) + f" REF-{row}" for row in range(passages)]
+    return pd.DataFrame({
+        'document_id': [f"doc{owner}.txt" for owner in owners],
+        'passage_id': np.arange(passages),
+        'passage_index': np.zeros(passages, dtype=np.int64),
+        'text': texts,
+        'title': [f"doc{owner}" for owner in owners],
+        'file_path': [f"benchmark/doc{owner}.txt" for owner in owners],
+        'embedding': list(embeddings),
+    })
+
+def write_index(root_directory: str, index: VectorIndex, index_format: str, ann_lists: int = 0) -> None:
+    vectors_directory = os.path.join(root_directory, VECTORS_CONTAINER)
+    os.makedirs(vectors_directory, exist_ok=True)
+    if index_format == "binary":
+        embeddings, title_embeddings, metadata = index.to_binary()
+        embeddings_file, title_embeddings_file, metadata_file = binary_index_files(INDEX_NAME)
+        with open(os.path.join(vectors_directory, metadata_file), 'w') as file:
+            file.write(metadata)
+        if title_embeddings is not None:
+            with open(os.path.join(vectors_directory, title_embeddings_file), 'wb') as file:
+                file.write(title_embeddings)
+        with open(os.path.join(vectors_directory, embeddings_file), 'wb') as file:
+            file.write(embeddings)
+    else:
+        _, _, metadata = index.to_binary()
+        df = pd.read_csv(io.StringIO(metadata))
+        df['embedding'] = [json.dumps(row.tolist()) for row in index.embeddings]
+        df.to_csv(os.path.join(vectors_directory, INDEX_NAME), index=False)
+    if ann_lists:
+        with open(os.path.join(vectors_directory, ivf_index_file(INDEX_NAME)), 'wb') as file:
+            file.write(IvfIndex.build(index.embeddings, ann_lists).to_bytes())
+
+def load_recorded_index(index_path: str) -> VectorIndex:
+    if index_path.endswith(".csv"):
+        return VectorIndex.from_dataframe(pd.read_csv(index_path))
+    # Binary indexes are given by their embeddings file, the sidecar files are read next to it
+    base_path = index_path[:-len(".embeddings.npy")] if index_path.endswith(".embeddings.npy") else os.path.splitext(index_path)[0]
+    directory, base_name = os.path.split(base_path)
+    embeddings_file, title_embeddings_file, metadata_file = [os.path.join(directory, name) for name in binary_index_files(f"{base_name}.csv")]
+    with open(embeddings_file, 'rb') as file:
+        embeddings = file.read()
+    title_embeddings = None
+    if os.path.exists(title_embeddings_file):
+        with open(title_embeddings_file, 'rb') as file:
+            title_embeddings = file.read()
+    with open(metadata_file) as file:
+        metadata = file.read()
+    return VectorIndex.from_binary(embeddings, metadata, title_embeddings)
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+async def measure(plugin: OpenaiFileSearchPlugin, queries: List[str], result_count: int, search_mode: str,
+                  prefilter: bool, warmup: int = 5) -> Dict[str, float]:
+    baseline_rss = peak_rss_mb()
+    start = time.perf_counter()
+    index = await plugin.load_index(INDEX_NAME)
+    load_time = time.perf_counter() - start
+
+    for query in queries[:warmup]:
+        await plugin.search_reviews(index, query, INDEX_NAME, result_count, search_mode=search_mode, prefilter=prefilter)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        await plugin.search_reviews(index, query, INDEX_NAME, result_count, search_mode=search_mode, prefilter=prefilter)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "passages": len(index),
+        "load_s": load_time,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def measure_in_process(root_directory: str, dimensions: int, vectors: Dict[str, np.ndarray], queries: List[str],
+                       result_count: int, search_mode: str, prefilter: bool, settings: dict) -> Dict[str, float]:
+    plugin = make_plugin(root_directory, EmbeddingStub(dimensions, vectors), **settings)
+    return asyncio.run(measure(plugin, queries, result_count, search_mode, prefilter))
+
+def run_benchmark(passages: int = 10000, dimensions: int = 256, documents: int = 100, query_count: int = 200,
+                  result_count: int = 5, index_format: str = "binary", precision: str = "float32",
+                  search_mode: str = "vector", prefilter: bool = False, ann_lists: int = 0, ann_probes: int = 8,
+                  index_path: Optional[str] = None, queries_file: Optional[str] = None,
+                  root_directory: Optional[str] = None) -> Dict[str, float]:
+    cleanup = root_directory is None
+    root_directory = root_directory or tempfile.mkdtemp(prefix="vector_search_benchmark_")
+    try:
+        if index_path:
+            index = load_recorded_index(index_path)
+        else:
+            index = VectorIndex.from_dataframe(synthetic_corpus(passages, dimensions, documents))
+        write_index(root_directory, index, index_format, ann_lists=ann_lists)
+
+        # Queries are either recorded texts or perturbed corpus rows registered in the stub
+        rng = np.random.default_rng(1)
+        if queries_file:
+            with open(queries_file) as file:
+                queries = [line.strip() for line in file if line.strip()]
+            vectors = {}
+        else:
+            rows = rng.choice(len(index), size=min(query_count, len(index)), replace=False)
+            queries = [f"query {row}" for row in rows]
+            vectors = {query: index.embeddings[row] + rng.normal(scale=0.05, size=index.embeddings.shape[1]) for query, row in zip(queries, rows)}
+        dimensions = index.embeddings.shape[1]
+        del index
+
+        settings = {"embedding_precision": precision, "ann_probes": ann_probes if ann_lists else 0}
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            report = executor.submit(measure_in_process, root_directory, dimensions, vectors, queries,
+                                     result_count, search_mode, prefilter, settings).result()
+        report.update({"format": index_format, "precision": precision, "search_mode": search_mode, "queries": len(queries)})
+        return report
+    finally:
+        if cleanup:
+            shutil.rmtree(root_directory, ignore_errors=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the vector search retrieval path.")
+    parser.add_argument("--passages", type=int, default=10000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--result-count", type=int, default=5)
+    parser.add_argument("--format", choices=["csv", "binary"], default="binary")
+    parser.add_argument("--precision", choices=["float32", "float16", "int8"], default="float32")
+    parser.add_argument("--search-mode", choices=["vector", "lexical", "hybrid"], default="vector")
+    parser.add_argument("--prefilter", action="store_true")
+    parser.add_argument("--ann-lists", type=int, default=0, help="Build an IVF index with this many lists")
+    parser.add_argument("--ann-probes", type=int, default=8)
+    parser.add_argument("--index", help="Recorded CSV index to benchmark instead of a synthetic corpus")
+    parser.add_argument("--queries-file", help="Recorded queries, one per line")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        passages=args.passages, dimensions=args.dimensions, documents=args.documents, query_count=args.queries,
+        result_count=args.result_count, index_format=args.format, precision=args.precision,
+        search_mode=args.search_mode, prefilter=args.prefilter, ann_lists=args.ann_lists,
+        ann_probes=args.ann_probes, index_path=args.index, queries_file=args.queries_file,
+    )
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
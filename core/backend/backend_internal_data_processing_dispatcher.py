@@ -1,6 +1,27 @@
+import inspect
+import os
+import tempfile
 from typing import List, Optional
 
+from core.backend.cost_ledger import CostLedger
+from core.backend.flag_store import (
+    ABORT_FLAGS,
+    PROCESSING_FLAGS,
+    BackendFlagStore,
+    FlagStoreBase,
+)
+from core.backend.image_store import ImageStore
 from core.backend.internal_data_processing_base import InternalDataProcessingBase
+from core.backend.read_cache import CachePolicy, ReadCache
+from core.backend.retention_service import RetentionService
+from core.backend.shared_state import (
+    InMemorySharedState,
+    SharedStateBase,
+    SqliteSharedState,
+)
+
+# Namespace of the buffers holding the messages a bot was not mentioned in
+UNMENTIONED_MESSAGES = "unmentioned_messages"
 
 
 class BackendInternalDataProcessingDispatcher(InternalDataProcessingBase):
@@ -11,6 +32,15 @@ class BackendInternalDataProcessingDispatcher(InternalDataProcessingBase):
         self.plugins : List[InternalDataProcessingBase] = []
         self.default_plugin_name = None
         self.default_plugin: Optional[InternalDataProcessingBase] = None
+        self.read_cache = ReadCache()
+        self.flag_store : FlagStoreBase = InMemorySharedState()
+        self.abort_flag_store : FlagStoreBase = BackendFlagStore(self)
+        self.shared_state : SharedStateBase = self.flag_store
+        self.flag_ttls = {}
+        self.unmentioned_messages_ttl = None
+        self.image_store = ImageStore()
+        self.cost_ledger = CostLedger(self)
+        self.retention_service = RetentionService(self)
 
     def initialize(self, plugins: List[InternalDataProcessingBase] = None):
         if not plugins:
@@ -20,6 +50,98 @@ class BackendInternalDataProcessingDispatcher(InternalDataProcessingBase):
         self.plugins = plugins
         self.default_plugin = plugins[0]
         self.default_plugin_name = self.default_plugin.plugin_name
+        self.read_cache = ReadCache(self.get_cache_policies())
+        bot_config = self.global_manager.bot_config
+        self.flag_store = self.create_flag_store(getattr(bot_config, 'FLAG_STORE', None))
+        abort_flag_store = getattr(bot_config, 'ABORT_FLAG_STORE', None)
+        if not isinstance(abort_flag_store, str):
+            abort_flag_store = "backend"
+        # Abort flags must outlive the process, they share the processing flag store only when configured alike
+        if abort_flag_store == getattr(bot_config, 'FLAG_STORE', None):
+            self.abort_flag_store = self.flag_store
+        else:
+            self.abort_flag_store = self.create_flag_store(abort_flag_store)
+        # Locks and buffers stay in the process when flags are in the backend
+        self.shared_state = self.flag_store if isinstance(self.flag_store, SharedStateBase) else InMemorySharedState()
+        self.flag_ttls = {
+            PROCESSING_FLAGS: getattr(self.global_manager.bot_config, 'PROCESSING_FLAG_TTL', None),
+            ABORT_FLAGS: getattr(self.global_manager.bot_config, 'ABORT_FLAG_TTL', None),
+        }
+        unmentioned_messages_ttl = getattr(bot_config, 'UNMENTIONED_MESSAGES_TTL', None)
+        self.unmentioned_messages_ttl = unmentioned_messages_ttl if isinstance(unmentioned_messages_ttl, (int, float)) else None
+        flush_interval = getattr(self.global_manager.bot_config, 'COST_FLUSH_INTERVAL', None)
+        if isinstance(flush_interval, (int, float)):
+            self.cost_ledger = CostLedger(self, flush_interval)
+        self.retention_service = self.create_retention_service()
+
+    def get_cache_policies(self):
+        # Caching is opt-in: entries are only invalidated by the writes of this process,
+        # other instances sharing the backend are served stale content until the TTL expires
+        configured = getattr(self.global_manager.bot_config, 'INTERNAL_DATA_PROCESSING_CACHE', None)
+        if not isinstance(configured, dict):
+            return {}
+
+        policies = {}
+        for container_property, policy in configured.items():
+            # Policies name containers by their dispatcher property, e.g. PROMPTS or FEEDBACKS
+            container = getattr(self.default_plugin, container_property.lower(), None)
+            if container is None:
+                self.logger.error(f"BackendInternalDataProcessingDispatcher: Unknown container '{container_property}' in cache configuration")
+                continue
+            policies[container] = policy if isinstance(policy, CachePolicy) else CachePolicy(**policy)
+        return policies
+
+    def create_retention_service(self) -> RetentionService:
+        bot_config = self.global_manager.bot_config
+        retention = getattr(bot_config, 'RETENTION', None)
+        if not isinstance(retention, dict):
+            return RetentionService(self)
+        settings = {}
+        for name, setting in (('interval', 'RETENTION_INTERVAL'), ('batch_size', 'RETENTION_BATCH_SIZE'), ('batch_pause', 'RETENTION_BATCH_PAUSE')):
+            value = getattr(bot_config, setting, None)
+            if isinstance(value, (int, float)):
+                settings[name] = value
+        return RetentionService(self, retention, **settings)
+
+    def create_flag_store(self, flag_store) -> FlagStoreBase:
+        if flag_store == "backend":
+            # Flags are written to the backend so that every worker sharing it sees them
+            self.logger.info("Using the backend flag store")
+            return BackendFlagStore(self)
+        if flag_store == "sqlite":
+            # Flags, locks and buffers are shared by the workers of the node
+            database_path = getattr(self.global_manager.bot_config, 'SHARED_STATE_PATH', None)
+            if not isinstance(database_path, str):
+                database_path = os.path.join(tempfile.gettempdir(), "shared_state.db")
+            self.logger.info(f"Using the SQLite shared state {database_path}")
+            return SqliteSharedState(database_path)
+        return InMemorySharedState()
+
+    def get_flag_store(self, namespace) -> FlagStoreBase:
+        return self.abort_flag_store if namespace == ABORT_FLAGS else self.flag_store
+
+    async def set_flag(self, namespace, key, value = "1"):
+        ttl = self.flag_ttls.get(namespace)
+        await self.get_flag_store(namespace).set_flag(namespace, key, value, ttl=ttl if isinstance(ttl, (int, float)) else None)
+
+    async def get_flag(self, namespace, key):
+        return await self.get_flag_store(namespace).get_flag(namespace, key)
+
+    async def clear_flag(self, namespace, key):
+        await self.get_flag_store(namespace).clear_flag(namespace, key)
+
+    async def claim_flag(self, namespace, key, value = "1") -> bool:
+        """
+        Set a flag unless it is already set, and return whether this call set it.
+        """
+        ttl = self.flag_ttls.get(namespace)
+        return await self.get_flag_store(namespace).add_flag(namespace, key, value, ttl=ttl if isinstance(ttl, (int, float)) else None)
+
+    def lock(self, name, ttl = 30):
+        return self.shared_state.lock(name, ttl=ttl)
+
+    def invalidate_cache(self, plugin: InternalDataProcessingBase, data_container, data_file):
+        self.read_cache.invalidate(data_container, (plugin.plugin_name, data_file))
 
     def get_plugin(self, plugin_name = None):
         if plugin_name is None:
@@ -95,42 +217,195 @@ class BackendInternalDataProcessingDispatcher(InternalDataProcessingBase):
         plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
         return plugin.vectors
 
+    @property
+    def images(self, plugin_name = None):
+        plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
+        return plugin.images
+
     def append_data(self, container_name: str, data_identifier: str, data: str = None):
         plugin: InternalDataProcessingBase = self.get_plugin(container_name)
         plugin.append_data(container_name, data_identifier, data)
 
     async def read_data_content(self, data_container, data_file, plugin_name = None):
         plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
-        return await plugin.read_data_content(data_container= data_container, data_file= data_file)
+        cache_key = (plugin.plugin_name, data_file)
+        found, content = self.read_cache.get(data_container, cache_key)
+        if found:
+            return content
+
+        generation = self.read_cache.generation(data_container)
+        content = await plugin.read_data_content(data_container= data_container, data_file= data_file)
+        self.read_cache.put(data_container, cache_key, content, generation)
+        return content
+
+    async def read_data_buffer(self, data_container, data_file, plugin_name = None):
+        plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
+        return await plugin.read_data_buffer(data_container= data_container, data_file= data_file)
 
     async def write_data_content(self, data_container, data_file, data, plugin_name = None):
         plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
         await plugin.write_data_content(data_container= data_container, data_file= data_file, data= data)
+        self.invalidate_cache(plugin, data_container, data_file)
+
+    async def read_many(self, data_files, return_exceptions: bool = False, plugin_name = None):
+        plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
+        data_files = list(data_files)
+        contents = [None] * len(data_files)
+        missing = []
+        generations = {}
+        for index, (data_container, data_file) in enumerate(data_files):
+            found, content = self.read_cache.get(data_container, (plugin.plugin_name, data_file))
+            if found:
+                contents[index] = content
+            else:
+                missing.append(index)
+                generations.setdefault(data_container, self.read_cache.generation(data_container))
+        if not missing:
+            return contents
+
+        # Files not in the read cache are read in one round
+        read = await plugin.read_many([data_files[index] for index in missing], return_exceptions=return_exceptions)
+        for index, content in zip(missing, read):
+            contents[index] = content
+            if not isinstance(content, BaseException):
+                data_container, data_file = data_files[index]
+                self.read_cache.put(data_container, (plugin.plugin_name, data_file), content, generations[data_container])
+        return contents
+
+    async def write_many(self, data_files, plugin_name = None):
+        plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
+        data_files = list(data_files)
+        await plugin.write_many(data_files)
+        for data_container, data_file, _ in data_files:
+            self.invalidate_cache(plugin, data_container, data_file)
 
     async def store_unmentioned_messages(self, channel_id, thread_id, message, plugin_name = None):
         plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
-        await plugin.store_unmentioned_messages(channel_id= channel_id, thread_id= thread_id, message= message)
+        if self.shared_state.cross_process:
+            # Appending to a shared buffer is atomic, the workers never rewrite each other's messages
+            await self.shared_state.append_buffer(UNMENTIONED_MESSAGES, f"{plugin.plugin_name}/{channel_id}_{thread_id}", message, ttl=self.unmentioned_messages_ttl)
+            return
+        # Stored messages are read and rewritten, concurrent stores must not interleave
+        async with self.lock(f"{plugin.plugin_name}/unmentioned_messages_{channel_id}_{thread_id}"):
+            await plugin.store_unmentioned_messages(channel_id= channel_id, thread_id= thread_id, message= message)
+        self.invalidate_cache(plugin, plugin.messages, f"unmentioned_messages_{channel_id}_{thread_id}.json")
 
     async def retrieve_unmentioned_messages(self, channel_id, thread_id, plugin_name = None):
         plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
-        return await plugin.retrieve_unmentioned_messages(channel_id= channel_id, thread_id= thread_id)
+        if self.shared_state.cross_process:
+            return await self.shared_state.drain_buffer(UNMENTIONED_MESSAGES, f"{plugin.plugin_name}/{channel_id}_{thread_id}")
+        async with self.lock(f"{plugin.plugin_name}/unmentioned_messages_{channel_id}_{thread_id}"):
+            messages = await plugin.retrieve_unmentioned_messages(channel_id= channel_id, thread_id= thread_id)
+        self.invalidate_cache(plugin, plugin.messages, f"unmentioned_messages_{channel_id}_{thread_id}.json")
+        return messages
 
     async def update_pricing(self, container_name, datafile_name, pricing_data, plugin_name = None):
         plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
-        return await plugin.update_pricing(container_name= container_name, datafile_name= datafile_name, pricing_data= pricing_data)
+        async with self.lock(f"{plugin.plugin_name}/{container_name}/{datafile_name}"):
+            data = await plugin.update_pricing(container_name= container_name, datafile_name= datafile_name, pricing_data= pricing_data)
+        self.invalidate_cache(plugin, container_name, datafile_name)
+        return data
+
+    async def increment_pricing(self, container_name, datafile_name, pricing_data, plugin_name = None):
+        """
+        Add the cost of a completion to a thread and return the thread total.
+        The backend is updated by the cost ledger, unless COST_FLUSH_INTERVAL is 0.
+        The ledger total only includes the completions of other workers made
+        before this worker loaded the thread, the write-through total is exact.
+        """
+        if self.cost_ledger.flush_interval <= 0:
+            return await self.update_pricing(container_name, datafile_name, pricing_data, plugin_name)
+        plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
+        return await self.cost_ledger.increment(plugin, container_name, datafile_name, pricing_data)
+
+    async def flush_costs(self):
+        await self.cost_ledger.flush()
+
+    def get_costs_by_channel(self):
+        # Costs of the completions of this worker since it started
+        return dict(self.cost_ledger.channel_totals)
+
+    def get_costs_by_day(self):
+        # Costs of the completions of this worker since it started
+        return dict(self.cost_ledger.daily_totals)
+
+    async def start(self):
+        # Started once the event loop runs
+        self.retention_service.start()
+        for plugin in self.plugins:
+            start = getattr(plugin, 'start', None)
+            if inspect.iscoroutinefunction(start):
+                try:
+                    await start()
+                except Exception as e:
+                    self.logger.error(f"BackendInternalDataProcessingDispatcher: Failed to start plugin '{plugin.plugin_name}': {e}")
+
+    async def close(self):
+        # Pending costs are written before the plugins release their resources
+        await self.retention_service.close()
+        await self.cost_ledger.close()
+        stores = []
+        for store in (self.shared_state, self.flag_store, self.abort_flag_store):
+            if isinstance(store, SharedStateBase) and all(store is not other for other in stores):
+                stores.append(store)
+        for store in stores:
+            try:
+                await store.close()
+            except Exception as e:
+                self.logger.error(f"BackendInternalDataProcessingDispatcher: Failed to close the shared state: {e}")
+        for plugin in self.plugins:
+            close = getattr(plugin, 'close', None)
+            if inspect.iscoroutinefunction(close):
+                try:
+                    await close()
+                except Exception as e:
+                    self.logger.error(f"BackendInternalDataProcessingDispatcher: Failed to close plugin '{plugin.plugin_name}': {e}")
 
     async def update_prompt_system_message(self, channel_id, thread_id, message, plugin_name = None):
         plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
         await plugin.update_prompt_system_message(channel_id= channel_id, thread_id= thread_id, message= message)
+        self.invalidate_cache(plugin, plugin.sessions, f"{channel_id}-{thread_id}.txt")
 
     async def update_session(self, data_container, data_file, role, content, plugin_name = None):
         plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
         await plugin.update_session(data_container= data_container, data_file= data_file, role= role, content= content)
+        self.invalidate_cache(plugin, data_container, data_file)
+
+    async def append_session_messages(self, data_container, data_file, messages, plugin_name = None):
+        plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
+        # Images are stored once in the images container and referenced from the session
+        messages = await self.image_store.externalize(plugin, messages)
+        await plugin.append_session_messages(data_container= data_container, data_file= data_file, messages= messages)
+        self.invalidate_cache(plugin, data_container, data_file)
+
+    async def read_session_messages(self, data_container, data_file, plugin_name = None):
+        plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
+        return await plugin.read_session_messages(data_container= data_container, data_file= data_file)
+
+    async def rehydrate_session_images(self, messages, plugin_name = None):
+        plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
+        return await self.image_store.rehydrate(plugin, messages)
 
     async def remove_data_content(self, data_container, data_file, plugin_name = None):
         plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
         await plugin.remove_data_content(data_container= data_container, data_file= data_file)
+        self.invalidate_cache(plugin, data_container, data_file)
+
+    async def get_data_version(self, data_container, data_file, plugin_name = None):
+        plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
+        return await plugin.get_data_version(data_container= data_container, data_file= data_file)
 
     async def list_container_files(self, container_name, plugin_name = None):
         plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
         return await plugin.list_container_files(container_name= container_name)
+
+    async def list_stale_files(self, data_container, older_than, plugin_name = None):
+        plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
+        return await plugin.list_stale_files(data_container= data_container, older_than= older_than)
+
+    async def remove_many(self, data_container, data_files, plugin_name = None):
+        plugin : InternalDataProcessingBase = self.get_plugin(plugin_name)
+        removed = await plugin.remove_many(data_container= data_container, data_files= data_files)
+        for data_file in data_files:
+            self.invalidate_cache(plugin, data_container, data_file)
+        return removed
@@ -0,0 +1,151 @@
+import gzip
+import io
+import zlib
+from typing import Dict, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Containers whose data files may be stored compressed, by dispatcher property name
+COMPRESSIBLE_CONTAINERS = ("SESSIONS", "CONCATENATE", "FEEDBACKS")
+
+class MissingCodecPackageError(ValueError):
+    """
+    Raised when a compression format is configured or read without its optional package.
+    """
+    def __init__(self, codec_name: str, package: str):
+        super().__init__(f"{codec_name} compression requires the {package} package, install it with: pip install {package}")
+        self.package = package
+
+class Codec:
+    """
+    Compression format recognized on read by the magic bytes starting its output.
+    """
+    name = None
+    magic = b""
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress_member(self, data: bytes):
+        """
+        Decompress the first member of data, returning it with the bytes that follow it.
+        """
+        raise NotImplementedError
+
+class GzipCodec(Codec):
+    name = "gzip"
+    magic = b"\x1f\x8b"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def decompress(self, data: bytes) -> bytes:
+        # Appends add one gzip member each, gzip reads concatenated members as a single stream
+        return gzip.decompress(data)
+
+    def decompress_member(self, data: bytes):
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        return decompressor.decompress(data), decompressor.unused_data
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    magic = b"\x28\xb5\x2f\xfd"
+
+    def __init__(self, level: int = 3):
+        if zstandard is None:
+            raise MissingCodecPackageError(self.name, "zstandard")
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True)
+        return reader.read()
+
+    def decompress_member(self, data: bytes):
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        return decompressor.decompress(data), decompressor.unused_data
+
+CODECS = {codec.name: codec for codec in (GzipCodec, ZstdCodec)}
+MAGIC_LENGTH = max(len(codec.magic) for codec in CODECS.values())
+
+def create_codec(name: Optional[str]) -> Optional[Codec]:
+    if not name or name.lower() == "none":
+        return None
+    codec = CODECS.get(name.lower())
+    if codec is None:
+        raise ValueError(f"Unknown compression '{name}', expected one of {', '.join(CODECS)} or none")
+    return codec()
+
+def detect_codec(header: bytes) -> Optional[Codec]:
+    for codec in CODECS.values():
+        if header.startswith(codec.magic):
+            return codec()
+    return None
+
+def container_codecs(plugin, compression: Dict[str, str], logger) -> Dict[str, Codec]:
+    """
+    Resolve the COMPRESSION setting of a backend, keyed by container property name,
+    into codecs keyed by container name.
+    """
+    codecs = {}
+    for container_property, name in (compression or {}).items():
+        if container_property.upper() not in COMPRESSIBLE_CONTAINERS:
+            logger.error(f"Compression is not supported for the '{container_property}' container, expected one of {', '.join(COMPRESSIBLE_CONTAINERS)}")
+            continue
+        try:
+            codec = create_codec(name)
+        except ValueError as e:
+            logger.error(f"Invalid compression for the '{container_property}' container: {e}")
+            continue
+        if codec is not None:
+            codecs[getattr(plugin, container_property.lower())] = codec
+    return codecs
+
+def encode_content(data: str, codec: Optional[Codec]):
+    """
+    Return the data to store: compressed bytes, or the text itself without a codec.
+    """
+    return codec.compress(data.encode('utf-8')) if codec is not None else data
+
+def decode_content(data: bytes) -> str:
+    """
+    Decode a data file written whole, compressed or not.
+    """
+    codec = detect_codec(data[:MAGIC_LENGTH])
+    if codec is not None:
+        data = codec.decompress(data)
+    return data.decode('utf-8')
+
+def decode_segments(data: bytes) -> str:
+    """
+    Decode an append-only session, whose appends may each be compressed or plain.
+
+    Sessions are ASCII JSON Lines, so a magic header can only start a compressed
+    member and a session keeps working when compression is turned on or off.
+    Corrupted compressed data raises a ValueError, like invalid JSON does.
+    """
+    parts = []
+    while data:
+        codec = detect_codec(data[:MAGIC_LENGTH])
+        if codec is not None:
+            try:
+                member, data = codec.decompress_member(data)
+            except Exception as e:
+                raise ValueError(f"Invalid {codec.name} data: {e}") from e
+            parts.append(member)
+            continue
+        end = min((index for index in (data.find(other.magic) for other in CODECS.values()) if index > 0), default=len(data))
+        parts.append(data[:end])
+        data = data[end:]
+    return b"".join(parts).decode('utf-8')
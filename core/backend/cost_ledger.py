@@ -0,0 +1,167 @@
+import asyncio
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from core.backend.pricing_data import PricingData
+
+PRICING_FIELDS = ("total_tokens", "prompt_tokens", "completion_tokens", "total_cost", "input_cost", "output_cost")
+
+def add_pricing(target: PricingData, pricing_data: PricingData) -> PricingData:
+    for field in PRICING_FIELDS:
+        setattr(target, field, getattr(target, field) + getattr(pricing_data, field))
+    return target
+
+def copy_pricing(pricing_data: PricingData) -> PricingData:
+    return add_pricing(PricingData(), pricing_data)
+
+def is_zero_pricing(pricing_data: PricingData) -> bool:
+    return not any(getattr(pricing_data, field) for field in PRICING_FIELDS)
+
+class LedgerEntry:
+    def __init__(self, total: PricingData):
+        # Cumulated cost of the thread, as stored plus the pending increments
+        self.total = total
+        # Increments not written to the backend yet
+        self.pending = PricingData()
+
+class CostLedger:
+    """
+    Write-behind accumulator of the cost of each thread.
+
+    Increments are added in memory and returned immediately with the thread
+    total. Pending increments are written to the backend every flush interval
+    and on close, one update per thread however many completions it had.
+    The ledger belongs to one process: the total of a thread is the stored
+    total when it was loaded plus the increments of this process, and the
+    totals per channel and per day only count the usage of this process.
+    The backend, which every update adds to, holds the exact totals.
+    """
+
+    def __init__(self, dispatcher, flush_interval: float = 30, max_entries: int = 4096, clock: Callable[[], float] = time.time):
+        self.dispatcher = dispatcher
+        self.logger = dispatcher.logger
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries: "OrderedDict[Tuple[str, str, str], LedgerEntry]" = OrderedDict()
+        self.load_locks: Dict[Hashable, asyncio.Lock] = {}
+        self.channel_totals: Dict[str, PricingData] = defaultdict(PricingData)
+        self.daily_totals: Dict[str, PricingData] = defaultdict(PricingData)
+        self.flushing = set()
+        self.flush_task: Optional[asyncio.Task] = None
+        self.flush_lock = asyncio.Lock()
+
+    def has_pending(self) -> bool:
+        return any(not is_zero_pricing(entry.pending) for entry in self.entries.values())
+
+    async def increment(self, plugin, container_name, datafile_name, pricing_data: PricingData) -> PricingData:
+        """
+        Add the cost of a completion to its thread and return the thread total.
+        """
+        entry = await self.load_entry(plugin, container_name, datafile_name)
+        add_pricing(entry.total, pricing_data)
+        add_pricing(entry.pending, pricing_data)
+
+        # Cost files are named <channel id>-<thread id>.txt
+        channel_id = datafile_name.split('-', 1)[0]
+        day = datetime.fromtimestamp(self.clock(), tz=timezone.utc).date().isoformat()
+        add_pricing(self.channel_totals[channel_id], pricing_data)
+        add_pricing(self.daily_totals[day], pricing_data)
+
+        self.schedule_flush()
+        return copy_pricing(entry.total)
+
+    async def load_entry(self, plugin, container_name, datafile_name) -> LedgerEntry:
+        key = (plugin.plugin_name, container_name, datafile_name)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+
+        lock = self.load_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                # A zero increment returns the stored total in the same way on every backend
+                async with self.dispatcher.lock(f"{plugin.plugin_name}/{container_name}/{datafile_name}"):
+                    stored = await plugin.update_pricing(container_name=container_name, datafile_name=datafile_name, pricing_data=PricingData())
+                entry = LedgerEntry(copy_pricing(stored) if stored is not None else PricingData())
+                self.evict()
+                self.entries[key] = entry
+        self.load_locks.pop(key, None)
+        return entry
+
+    def evict(self):
+        # Only threads without pending or flushing increments can be forgotten, they are reloaded when used again
+        for key in list(self.entries):
+            if len(self.entries) < self.max_entries:
+                break
+            if key not in self.flushing and is_zero_pricing(self.entries[key].pending):
+                del self.entries[key]
+
+    def schedule_flush(self):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush_periodically())
+
+    async def flush_periodically(self):
+        while self.has_pending():
+            await asyncio.sleep(self.flush_interval)
+            # Cancelling the loop must not interrupt a flush half way
+            await asyncio.shield(self.flush())
+
+    async def flush(self):
+        """
+        Write the pending increments, one update per thread, all threads at once.
+        Increments that could not be written are kept for the next flush.
+        """
+        async with self.flush_lock:
+            batch = []
+            for key, entry in self.entries.items():
+                if not is_zero_pricing(entry.pending):
+                    batch.append((key, entry, entry.pending))
+                    entry.pending = PricingData()
+                    self.flushing.add(key)
+            if not batch:
+                return
+
+            try:
+                results = await asyncio.gather(
+                    *(self.write_increment(key, pending) for key, _, pending in batch),
+                    return_exceptions=True,
+                )
+            finally:
+                self.flushing.clear()
+            failed = 0
+            for (key, entry, pending), result in zip(batch, results):
+                if isinstance(result, Exception) or result is None:
+                    failed += 1
+                    add_pricing(entry.pending, pending)
+            if failed:
+                self.logger.error(f"CostLedger: {failed} of {len(batch)} cost updates failed, they will be retried")
+            else:
+                self.logger.debug(f"CostLedger: {len(batch)} cost updates written")
+            self.evict()
+
+    async def write_increment(self, key, pending: PricingData):
+        plugin_name, container_name, datafile_name = key
+        plugin = self.dispatcher.get_plugin(plugin_name)
+        # Backends add the increment to the stored total, other workers may update the same thread
+        async with self.dispatcher.lock(f"{plugin_name}/{container_name}/{datafile_name}"):
+            result = await plugin.update_pricing(container_name=container_name, datafile_name=datafile_name, pricing_data=pending)
+        self.dispatcher.invalidate_cache(plugin, container_name, datafile_name)
+        return result
+
+    async def close(self):
+        """
+        Stop the periodic flush and write what is pending.
+        """
+        if self.flush_task is not None and not self.flush_task.done():
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+        self.flush_task = None
+        await self.flush()
@@ -0,0 +1,127 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+# Flag namespaces, named after the backend containers that used to hold them
+PROCESSING_FLAGS = "processing"
+ABORT_FLAGS = "abort"
+
+class FlagStoreBase(ABC):
+    """
+    Short-lived markers such as "this message is being processed" or
+    "automatic replies are stopped in this thread", expiring after a TTL.
+    """
+
+    @abstractmethod
+    async def set_flag(self, namespace: str, key: str, value: str = "1", ttl: Optional[float] = None) -> None:
+        """
+        Set a flag, replacing any previous value. A ttl of None keeps it until cleared.
+        """
+        pass
+
+    @abstractmethod
+    async def get_flag(self, namespace: str, key: str) -> Optional[str]:
+        """
+        Return the flag value, or None when the flag is not set or has expired.
+        """
+        pass
+
+    @abstractmethod
+    async def clear_flag(self, namespace: str, key: str) -> None:
+        """
+        Remove a flag.
+        """
+        pass
+
+    async def add_flag(self, namespace: str, key: str, value: str = "1", ttl: Optional[float] = None) -> bool:
+        """
+        Set a flag only if it is not set yet, and return whether it was set.
+        This default checks then sets, which is only safe without concurrent
+        writers. Stores able to do both at once override it.
+        """
+        if await self.get_flag(namespace, key) is not None:
+            return False
+        await self.set_flag(namespace, key, value, ttl)
+        return True
+
+class InMemoryFlagStore(FlagStoreBase):
+    """
+    Flags kept in a dictionary of the current process.
+
+    Lookups are O(1). Expired flags are dropped when read, and swept at most
+    once per sweep interval so that flags never read again do not accumulate.
+    """
+
+    def __init__(self, sweep_interval: float = 60, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.sweep_interval = sweep_interval
+        self.flags: Dict[Tuple[str, Hashable], Tuple[str, Optional[float]]] = {}
+        self.next_sweep = clock() + sweep_interval
+
+    def __len__(self):
+        return len(self.flags)
+
+    async def set_flag(self, namespace, key, value="1", ttl=None):
+        now = self.clock()
+        self.flags[(namespace, key)] = (value, now + ttl if ttl is not None else None)
+        if now >= self.next_sweep:
+            self.sweep(now)
+
+    async def get_flag(self, namespace, key):
+        flag = self.flags.get((namespace, key))
+        if flag is None:
+            return None
+        value, expires_at = flag
+        if expires_at is not None and expires_at <= self.clock():
+            del self.flags[(namespace, key)]
+            return None
+        return value
+
+    async def clear_flag(self, namespace, key):
+        self.flags.pop((namespace, key), None)
+
+    def sweep(self, now: Optional[float] = None):
+        now = self.clock() if now is None else now
+        expired = [flag_key for flag_key, (_, expires_at) in self.flags.items() if expires_at is not None and expires_at <= now]
+        for flag_key in expired:
+            del self.flags[flag_key]
+        self.next_sweep = now + self.sweep_interval
+
+class BackendFlagStore(FlagStoreBase):
+    """
+    Flags stored as data files of the backend, shared by every worker using it.
+
+    Each namespace maps to the backend container of the same name. The expiry
+    date is stored with the value and checked on read, so expired flags are
+    ignored even if their file has not been removed yet.
+    """
+
+    def __init__(self, backend, clock: Callable[[], float] = time.time):
+        self.backend = backend
+        self.clock = clock
+
+    def container(self, namespace):
+        return getattr(self.backend, namespace)
+
+    async def set_flag(self, namespace, key, value="1", ttl=None):
+        content = json.dumps({"value": value, "expires_at": self.clock() + ttl if ttl is not None else None})
+        await self.backend.write_data_content(self.container(namespace), key, content)
+
+    async def get_flag(self, namespace, key):
+        content = await self.backend.read_data_content(self.container(namespace), key)
+        if content is None:
+            return None
+        try:
+            flag = json.loads(content)
+            value, expires_at = flag["value"], flag["expires_at"]
+        except (ValueError, TypeError, KeyError):
+            # Flags written before expiry was stored hold a bare value and never expire
+            return content
+        if expires_at is not None and expires_at <= self.clock():
+            await self.backend.remove_data_content(self.container(namespace), key)
+            return None
+        return value
+
+    async def clear_flag(self, namespace, key):
+        await self.backend.remove_data_content(self.container(namespace), key)
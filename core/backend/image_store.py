@@ -0,0 +1,109 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from core.backend.internal_data_processing_base import InternalDataProcessingBase
+
+# Stands for an image in stored sessions, followed by the sha256 digest of its data URL
+IMAGE_REF_PREFIX = "image-ref:sha256:"
+DATA_URL_PREFIX = "data:"
+MISSING_IMAGE_TEXT = "[image no longer available]"
+
+class ImageStore:
+    """
+    Content-addressed storage of the images sent in conversations.
+
+    Sessions reference images by digest instead of embedding their base64 data
+    URL, and each distinct image is written once to the images container.
+    References are resolved back to data URLs only for turns sent to a vision
+    model.
+    """
+
+    def __init__(self, max_known: int = 4096):
+        # Digests already written, so that an image repeated in a thread is not uploaded again
+        self.known: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self.max_known = max_known
+
+    @staticmethod
+    def digest(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def image_url(part: Any) -> str:
+        if isinstance(part, dict) and part.get("type") == "image_url" and isinstance(part.get("image_url"), dict):
+            return part["image_url"].get("url") or ""
+        return ""
+
+    @staticmethod
+    def with_url(part: Dict, url: str) -> Dict:
+        return {**part, "image_url": {**part["image_url"], "url": url}}
+
+    async def externalize(self, plugin: InternalDataProcessingBase, messages: List[Dict]) -> List[Dict]:
+        """
+        Return the messages with inline images replaced by references, storing the images.
+        """
+        stored = []
+        for message in messages:
+            content = message.get("content") if isinstance(message, dict) else None
+            if not isinstance(content, list) or not any(self.image_url(part).startswith(DATA_URL_PREFIX) for part in content):
+                stored.append(message)
+                continue
+
+            new_content = []
+            for part in content:
+                url = self.image_url(part)
+                if url.startswith(DATA_URL_PREFIX):
+                    digest = self.digest(url)
+                    await self.store(plugin, digest, url)
+                    part = self.with_url(part, f"{IMAGE_REF_PREFIX}{digest}")
+                new_content.append(part)
+            stored.append({**message, "content": new_content})
+        return stored
+
+    async def store(self, plugin: InternalDataProcessingBase, digest: str, url: str):
+        known_key = (plugin.plugin_name, digest)
+        if known_key in self.known:
+            self.known.move_to_end(known_key)
+            return
+        # Content addressing makes the write idempotent, an existing image is simply rewritten
+        await plugin.write_data_content(plugin.images, digest, url)
+        self.known[known_key] = None
+        if len(self.known) > self.max_known:
+            self.known.popitem(last=False)
+
+    async def rehydrate(self, plugin: InternalDataProcessingBase, messages: List[Dict]) -> List[Dict]:
+        """
+        Return the messages with image references replaced by their data URLs.
+
+        Each distinct image is read once. Images that can no longer be read are
+        replaced by a short text so that the rest of the conversation is still sent.
+        """
+        digests = {
+            self.image_url(part)[len(IMAGE_REF_PREFIX):]
+            for message in messages if isinstance(message, dict) and isinstance(message.get("content"), list)
+            for part in message["content"] if self.image_url(part).startswith(IMAGE_REF_PREFIX)
+        }
+        if not digests:
+            return messages
+
+        digests = list(digests)
+        urls = await asyncio.gather(*(plugin.read_data_content(plugin.images, digest) for digest in digests))
+        resolved = dict(zip(digests, urls))
+
+        rehydrated = []
+        for message in messages:
+            content = message.get("content") if isinstance(message, dict) else None
+            if not isinstance(content, list):
+                rehydrated.append(message)
+                continue
+
+            new_content = []
+            for part in content:
+                url = self.image_url(part)
+                if url.startswith(IMAGE_REF_PREFIX):
+                    data_url = resolved.get(url[len(IMAGE_REF_PREFIX):])
+                    part = self.with_url(part, data_url) if data_url else {"type": "text", "text": MISSING_IMAGE_TEXT}
+                new_content.append(part)
+            rehydrated.append({**message, "content": new_content})
+        return rehydrated
@@ -1,3 +1,4 @@
+import asyncio
 from abc import abstractmethod
 
 from core.backend.internal_data_plugin_base import InternalDataPluginBase
@@ -88,6 +89,14 @@ class InternalDataProcessingBase(InternalDataPluginBase):
         """
         raise NotImplementedError
 
+    @property
+    @abstractmethod
+    def images(self):
+        """
+        Property for images data, stored once per content hash.
+        """
+        raise NotImplementedError
+
 
     @abstractmethod
     def append_data(self, container_name: str, data_identifier: str, data: str) -> None:
@@ -110,6 +119,17 @@ class InternalDataProcessingBase(InternalDataPluginBase):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    async def read_data_buffer(self, data_container, data_file):
+        """
+        Asynchronously read binary data from a specified data container and file.
+        Backends that can memory-map the data return a read-only buffer without copying it.
+
+        :param data_container: The data container to read from
+        :param data_file: The data file to read
+        """
+        raise NotImplementedError
+
     @abstractmethod
     async def write_data_content(self, data_container, data_file, data):
         """
@@ -121,6 +141,31 @@ class InternalDataProcessingBase(InternalDataPluginBase):
         """
         raise NotImplementedError
 
+    async def read_many(self, data_files, return_exceptions: bool = False):
+        """
+        Asynchronously read the content of several files, possibly from different
+        containers, in a single round. Backends able to batch reads override this,
+        the others read the files concurrently.
+
+        :param data_files: (data container, data file) pairs
+        :param return_exceptions: Return the exception raised reading a file in its
+            place instead of raising it, as asyncio.gather does
+        :return: The contents in the order of data_files, None for missing files
+        """
+        return list(await asyncio.gather(
+            *(self.read_data_content(data_container, data_file) for data_container, data_file in data_files),
+            return_exceptions=return_exceptions,
+        ))
+
+    async def write_many(self, data_files):
+        """
+        Asynchronously write several files, possibly to different containers, in a
+        single round.
+
+        :param data_files: (data container, data file, data) triples
+        """
+        await asyncio.gather(*(self.write_data_content(data_container, data_file, data) for data_container, data_file, data in data_files))
+
     @abstractmethod
     async def store_unmentioned_messages(self, channel_id, thread_id, message):
         """
@@ -181,6 +226,27 @@ class InternalDataProcessingBase(InternalDataPluginBase):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    async def append_session_messages(self, data_container, data_file, messages):
+        """
+        Asynchronously append messages to a session without rewriting its previous messages.
+
+        :param data_container: The data container
+        :param data_file: The session file
+        :param messages: The new messages, in order
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def read_session_messages(self, data_container, data_file):
+        """
+        Asynchronously read all the messages of a session, an empty list if it does not exist.
+
+        :param data_container: The data container
+        :param data_file: The session file
+        """
+        raise NotImplementedError
+
     @abstractmethod
     async def remove_data_content(self, data_container, data_file):
         """
@@ -191,6 +257,17 @@ class InternalDataProcessingBase(InternalDataPluginBase):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    async def get_data_version(self, data_container, data_file):
+        """
+        Asynchronously get an opaque version token for a specified data container and file.
+        The token changes whenever the content changes and is None if the data does not exist.
+
+        :param data_container: The data container to inspect
+        :param data_file: The data file to inspect
+        """
+        raise NotImplementedError
+
     @abstractmethod
     async def list_container_files(self, container_name):
         """
@@ -199,3 +276,25 @@ class InternalDataProcessingBase(InternalDataPluginBase):
         :param container_name: The name of the container
         """
         raise NotImplementedError
+
+    @abstractmethod
+    async def list_stale_files(self, data_container, older_than: float):
+        """
+        Asynchronously list the files of a container last modified before a date,
+        as (file name, size in bytes) pairs. File names keep their extension.
+
+        :param data_container: The data container to inspect
+        :param older_than: A POSIX timestamp
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def remove_many(self, data_container, data_files):
+        """
+        Asynchronously remove several files of a container, in as few requests as the
+        backend allows, and return the number of files removed.
+
+        :param data_container: The data container to remove from
+        :param data_files: The data files to remove
+        """
+        raise NotImplementedError
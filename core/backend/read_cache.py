@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from pydantic import BaseModel
+
+
+class CachePolicy(BaseModel):
+    # Seconds an entry stays valid, 0 disables caching for the container
+    TTL: float = 300
+    MAX_BYTES: int = 1024 * 1024
+    MAX_ENTRIES: int = 256
+
+class ContainerCache:
+    """
+    LRU entries of a single container, bounded by entry count and total size.
+    """
+
+    def __init__(self, policy: CachePolicy):
+        self.policy = policy
+        self.entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self.size = 0
+        # Bumped by every invalidation so that reads started before a write are not cached
+        self.generation = 0
+
+    def get(self, key: Hashable, now: float) -> Tuple[bool, Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at, _ = entry
+        if expires_at <= now:
+            self.pop(key)
+            return False, None
+        self.entries.move_to_end(key)
+        return True, value
+
+    def put(self, key: Hashable, value: Any, now: float):
+        size = len(value) if isinstance(value, (str, bytes)) else 0
+        self.pop(key)
+        if size > self.policy.MAX_BYTES:
+            return
+        self.entries[key] = (value, now + self.policy.TTL, size)
+        self.size += size
+        while len(self.entries) > self.policy.MAX_ENTRIES or self.size > self.policy.MAX_BYTES:
+            self.pop(next(iter(self.entries)))
+
+    def pop(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+        self.generation += 1
+
+class ReadCache:
+    """
+    Read-through cache of data contents, with one policy per container.
+
+    Reads of containers without a policy are never cached. Missing files are
+    cached as None, so absent flags do not cost a storage round-trip either.
+    """
+
+    def __init__(self, policies: Optional[Dict[Hashable, CachePolicy]] = None, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.containers: Dict[Hashable, ContainerCache] = {
+            container: ContainerCache(policy) for container, policy in (policies or {}).items() if policy.TTL > 0
+        }
+        self.hits = 0
+        self.misses = 0
+
+    def is_cached(self, container: Hashable) -> bool:
+        return container in self.containers
+
+    def generation(self, container: Hashable) -> Optional[int]:
+        container_cache = self.containers.get(container)
+        return container_cache.generation if container_cache is not None else None
+
+    def get(self, container: Hashable, key: Hashable) -> Tuple[bool, Any]:
+        container_cache = self.containers.get(container)
+        if container_cache is None:
+            return False, None
+        found, value = container_cache.get(key, self.clock())
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found, value
+
+    def put(self, container: Hashable, key: Hashable, value: Any, generation: Optional[int] = None):
+        container_cache = self.containers.get(container)
+        if container_cache is None or (generation is not None and generation != container_cache.generation):
+            return
+        container_cache.put(key, value, self.clock())
+
+    def invalidate(self, container: Hashable, key: Optional[Hashable] = None):
+        container_cache = self.containers.get(container)
+        if container_cache is None:
+            return
+        if key is None:
+            container_cache.clear()
+        else:
+            container_cache.pop(key)
+            container_cache.generation += 1
+
+    def clear(self):
+        for container_cache in self.containers.values():
+            container_cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": sum(len(cache.entries) for cache in self.containers.values()),
+            "bytes": sum(cache.size for cache in self.containers.values()),
+        }
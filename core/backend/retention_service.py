@@ -0,0 +1,121 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class ContainerReport:
+    def __init__(self, plugin_name: str, container: str):
+        self.plugin_name = plugin_name
+        self.container = container
+        self.stale_files = 0
+        self.removed_files = 0
+        self.reclaimed_bytes = 0
+
+    def __repr__(self):
+        return (f"{self.plugin_name}/{self.container}: {self.removed_files} of {self.stale_files} stale files removed, "
+                f"{self.reclaimed_bytes} bytes reclaimed")
+
+class RetentionService:
+    """
+    Periodic removal of the backend files older than the retention of their container.
+
+    Retentions are given in seconds by container property (SESSIONS, PROCESSING,
+    ABORT, COSTS...) and apply to every backend plugin. Stale files are removed
+    in batches of batch_size with a pause between batches, so that a large
+    backlog does not compete with the bot for the backend. Each run logs and
+    keeps a report of what it reclaimed.
+    """
+
+    def __init__(self, dispatcher, retention: Optional[Dict[str, float]] = None, interval: float = 3600,
+                 batch_size: int = 256, batch_pause: float = 1.0, clock: Callable[[], float] = time.time):
+        self.dispatcher = dispatcher
+        self.logger = dispatcher.logger
+        self.retention = retention or {}
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.batch_pause = batch_pause
+        self.clock = clock
+        self.last_report: List[ContainerReport] = []
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.retention) and self.interval > 0
+
+    def start(self):
+        if self.enabled and (self.task is None or self.task.done()):
+            self.task = asyncio.create_task(self.run_periodically())
+
+    async def run_periodically(self):
+        while True:
+            try:
+                # Cancelling the loop must not interrupt a batch half way
+                await asyncio.shield(self.run_once())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"RetentionService: run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def resolve_containers(self, plugin):
+        containers = []
+        for container_property, ttl in self.retention.items():
+            container = getattr(plugin, container_property.lower(), None)
+            if not isinstance(container, str):
+                self.logger.error(f"RetentionService: Unknown container '{container_property}' in retention configuration")
+                continue
+            if ttl is None or ttl <= 0:
+                continue
+            containers.append((container, ttl))
+        return containers
+
+    async def run_once(self) -> List[ContainerReport]:
+        """
+        Remove the stale files of every configured container and return the report.
+        """
+        reports = []
+        now = self.clock()
+        for plugin in self.dispatcher.plugins:
+            for container, ttl in self.resolve_containers(plugin):
+                reports.append(await self.clean_container(plugin, container, now - ttl))
+        self.last_report = reports
+        reclaimed_files = sum(report.removed_files for report in reports)
+        reclaimed_bytes = sum(report.reclaimed_bytes for report in reports)
+        self.logger.info(f"RetentionService: {reclaimed_files} files and {reclaimed_bytes} bytes reclaimed")
+        return reports
+
+    async def clean_container(self, plugin, container, older_than) -> ContainerReport:
+        report = ContainerReport(plugin.plugin_name, container)
+        try:
+            stale_files = await self.dispatcher.list_stale_files(container, older_than, plugin_name=plugin.plugin_name)
+        except Exception as e:
+            self.logger.error(f"RetentionService: Failed to list stale files in {container}: {e}")
+            return report
+        report.stale_files = len(stale_files)
+
+        for start in range(0, len(stale_files), self.batch_size):
+            if start:
+                await asyncio.sleep(self.batch_pause)
+            batch = stale_files[start:start + self.batch_size]
+            try:
+                removed = await self.dispatcher.remove_many(container, [name for name, _ in batch], plugin_name=plugin.plugin_name)
+            except Exception as e:
+                self.logger.error(f"RetentionService: Failed to remove stale files from {container}: {e}")
+                continue
+            report.removed_files += removed
+            # Backends count the removed files without naming them, a partial batch is prorated
+            batch_bytes = sum(size for _, size in batch)
+            report.reclaimed_bytes += batch_bytes if removed >= len(batch) else batch_bytes * removed // len(batch)
+
+        if report.stale_files:
+            self.logger.info(f"RetentionService: {report}")
+        return report
+
+    async def close(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
@@ -0,0 +1,31 @@
+import json
+from typing import Iterable, List
+
+# Sessions are stored as JSON Lines, one message per line, so a turn only appends its
+# new messages. Sessions written as a single JSON array by earlier versions are still read.
+
+
+def serialize_session_messages(messages: Iterable[dict]) -> str:
+    return "".join(json.dumps(message) + "\n" for message in messages)
+
+def is_legacy_session(content: str) -> bool:
+    return content.lstrip().startswith("[")
+
+def parse_session_lines(lines: Iterable[str]) -> List[dict]:
+    messages = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            messages.append(json.loads(line))
+        except json.JSONDecodeError:
+            # A record torn by an interrupted append is skipped
+            continue
+    return messages
+
+def parse_session_messages(content: str) -> List[dict]:
+    if not content or not content.strip():
+        return []
+    if is_legacy_session(content):
+        return json.loads(content)
+    return parse_session_lines(content.splitlines())
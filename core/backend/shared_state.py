@@ -0,0 +1,239 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from abc import abstractmethod
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.backend.flag_store import FlagStoreBase, InMemoryFlagStore
+
+# Namespace of the flags holding locks
+LOCKS = "locks"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS flags (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS buffers (
+    id INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    item TEXT NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS buffers_by_key ON buffers (namespace, key, id);
+"""
+
+class SharedStateBase(FlagStoreBase):
+    """
+    State that the workers serving the bot must agree on: flags, locks and
+    short-lived buffers. Every value may expire after a TTL.
+    """
+
+    # Whether other processes see the state, otherwise it belongs to the current one
+    cross_process = False
+
+    @abstractmethod
+    async def release_flag(self, namespace: str, key: str, value: str) -> bool:
+        """
+        Remove a flag only if it still holds value, and return whether it was removed.
+        """
+        pass
+
+    @abstractmethod
+    async def append_buffer(self, namespace: str, key: str, item: Any, ttl: Optional[float] = None) -> None:
+        """
+        Append a JSON serializable item to a buffer.
+        """
+        pass
+
+    @abstractmethod
+    async def drain_buffer(self, namespace: str, key: str) -> List[Any]:
+        """
+        Return the unexpired items of a buffer in the order they were appended, and empty it.
+        """
+        pass
+
+    @asynccontextmanager
+    async def lock(self, name: str, ttl: float = 30, poll_interval: float = 0.05):
+        """
+        Hold a lock shared by every user of the store. The lock expires after
+        ttl seconds so that a worker dying while holding it does not block the others.
+        """
+        token = uuid.uuid4().hex
+        while not await self.add_flag(LOCKS, name, token, ttl):
+            await asyncio.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            await self.release_flag(LOCKS, name, token)
+
+    async def close(self):
+        pass
+
+class InMemorySharedState(InMemoryFlagStore, SharedStateBase):
+    """
+    Shared state of the current process only, for a single worker.
+    """
+
+    def __init__(self, sweep_interval: float = 60, clock: Callable[[], float] = time.monotonic):
+        super().__init__(sweep_interval, clock)
+        self.buffers: Dict[Tuple[str, str], List[Tuple[Any, Optional[float]]]] = defaultdict(list)
+
+    async def release_flag(self, namespace, key, value):
+        if await self.get_flag(namespace, key) != value:
+            return False
+        await self.clear_flag(namespace, key)
+        return True
+
+    async def append_buffer(self, namespace, key, item, ttl=None):
+        self.buffers[(namespace, key)].append((item, self.clock() + ttl if ttl is not None else None))
+
+    async def drain_buffer(self, namespace, key):
+        now = self.clock()
+        items = self.buffers.pop((namespace, key), [])
+        return [item for item, expires_at in items if expires_at is None or expires_at > now]
+
+class SqliteSharedState(SharedStateBase):
+    """
+    Shared state in a SQLite database on local disk, shared by the workers of a node.
+
+    Every operation is one short transaction started with BEGIN IMMEDIATE, so
+    that checks and updates from different processes never interleave. The
+    database is opened on first use, in the worker process that uses it.
+    Expired rows are ignored when read and swept at most once per sweep interval.
+    """
+
+    cross_process = True
+
+    def __init__(self, database_path: str, busy_timeout: float = 5.0, sweep_interval: float = 60,
+                 clock: Callable[[], float] = time.time):
+        self.database_path = database_path
+        self.busy_timeout = busy_timeout
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.connection: Optional[sqlite3.Connection] = None
+        # sqlite3 connections belong to the thread that opened them, all statements run on this one
+        self.executor: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state")
+        self.next_sweep = clock() + sweep_interval
+
+    def connect(self):
+        directory = os.path.dirname(self.database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Transactions are started explicitly
+        connection = sqlite3.connect(self.database_path, timeout=self.busy_timeout, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        self.connection = connection
+
+    async def run(self, func, *args):
+        if self.executor is None:
+            raise RuntimeError("The shared state database is closed")
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.transaction, func, *args)
+
+    def transaction(self, func, *args):
+        if self.connection is None:
+            self.connect()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(self.connection, self.clock(), *args)
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def expiry(now, ttl):
+        return now + ttl if ttl is not None else None
+
+    async def set_flag(self, namespace, key, value="1", ttl=None):
+        await self.run(self._set_flag, namespace, key, value, ttl)
+
+    def _set_flag(self, connection, now, namespace, key, value, ttl):
+        connection.execute(
+            "INSERT OR REPLACE INTO flags (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, value, self.expiry(now, ttl)),
+        )
+        if now >= self.next_sweep:
+            self._sweep(connection, now)
+
+    async def get_flag(self, namespace, key):
+        return await self.run(self._get_flag, namespace, key)
+
+    def _get_flag(self, connection, now, namespace, key):
+        row = connection.execute(
+            "SELECT value FROM flags WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, now),
+        ).fetchone()
+        return row[0] if row else None
+
+    async def clear_flag(self, namespace, key):
+        await self.run(self._clear_flag, namespace, key)
+
+    def _clear_flag(self, connection, now, namespace, key):
+        connection.execute("DELETE FROM flags WHERE namespace = ? AND key = ?", (namespace, key))
+
+    async def add_flag(self, namespace, key, value="1", ttl=None):
+        return await self.run(self._add_flag, namespace, key, value, ttl)
+
+    def _add_flag(self, connection, now, namespace, key, value, ttl):
+        if self._get_flag(connection, now, namespace, key) is not None:
+            return False
+        self._set_flag(connection, now, namespace, key, value, ttl)
+        return True
+
+    async def release_flag(self, namespace, key, value):
+        return await self.run(self._release_flag, namespace, key, value)
+
+    def _release_flag(self, connection, now, namespace, key, value):
+        cursor = connection.execute("DELETE FROM flags WHERE namespace = ? AND key = ? AND value = ?", (namespace, key, value))
+        return cursor.rowcount > 0
+
+    async def append_buffer(self, namespace, key, item, ttl=None):
+        await self.run(self._append_buffer, namespace, key, json.dumps(item), ttl)
+
+    def _append_buffer(self, connection, now, namespace, key, item, ttl):
+        connection.execute(
+            "INSERT INTO buffers (namespace, key, item, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, item, self.expiry(now, ttl)),
+        )
+
+    async def drain_buffer(self, namespace, key):
+        items = await self.run(self._drain_buffer, namespace, key)
+        return [json.loads(item) for item in items]
+
+    def _drain_buffer(self, connection, now, namespace, key):
+        rows = connection.execute(
+            "SELECT item FROM buffers WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?) ORDER BY id",
+            (namespace, key, now),
+        ).fetchall()
+        connection.execute("DELETE FROM buffers WHERE namespace = ? AND key = ?", (namespace, key))
+        return [row[0] for row in rows]
+
+    def _sweep(self, connection, now):
+        for table in ("flags", "buffers"):
+            connection.execute(f"DELETE FROM {table} WHERE expires_at <= ?", (now,))
+        self.next_sweep = now + self.sweep_interval
+
+    async def close(self):
+        if self.executor is not None:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._close)
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def _close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
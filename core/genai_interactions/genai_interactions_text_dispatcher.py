@@ -1,6 +1,7 @@
 from typing import List, Optional
 
 from core.action_interactions.action_input import ActionInput
+from core.backend.flag_store import ABORT_FLAGS
 from core.genai_interactions.genai_interactions_text_plugin_base import (
     GenAIInteractionsTextPluginBase,
 )
@@ -78,8 +79,7 @@ class GenaiInteractionsTextDispatcher(GenAIInteractionsTextPluginBase):
         ts = event.thread_id
         channel_id = event.channel_id
         session_name = f"{channel_id.replace(':','_')}-{ts}.txt"
-        abort_container = self.global_manager.backend_internal_data_processing_dispatcher.abort
-        aborted = await self.global_manager.backend_internal_data_processing_dispatcher.read_data_content(abort_container, session_name)
+        aborted = await self.global_manager.backend_internal_data_processing_dispatcher.get_flag(ABORT_FLAGS, session_name)
         if aborted:
             self.logger.info(f"Aborted session found for {session_name}")
             await self.global_manager.user_interactions_dispatcher.send_message(message=f"Session aborted, discarded autogenerated content (Trigger: {event.text})", event=event, message_type=MessageType.COMMENT, is_internal=True)
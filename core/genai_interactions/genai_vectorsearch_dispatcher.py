@@ -1,3 +1,4 @@
+import inspect
 from typing import List, Optional
 
 from core.action_interactions.action_input import ActionInput
@@ -89,3 +90,13 @@ class GenaiVectorsearch(GenAIInteractionsPluginBase):
     async def handle_action(self, action_input: ActionInput, plugin_name=None):
         plugin: GenAIInteractionsPluginBase = self.get_plugin(plugin_name)
         return await plugin.handle_action(action_input)
+
+    async def close(self):
+        # Plugins write what they keep in memory, like cached embeddings, before shutting down
+        for plugin in self.plugins:
+            close = getattr(plugin, 'close', None)
+            if inspect.iscoroutinefunction(close):
+                try:
+                    await close()
+                except Exception as e:
+                    self.logger.error(f"GenaiVectorsearch: Failed to close plugin '{plugin.plugin_name}': {e}")
@@ -1,4 +1,5 @@
 # Gunicorn configuration file
+import os
 
 max_requests = 1000
 max_requests_jitter = 50
@@ -8,4 +9,6 @@ log_file = "-"
 bind = "0.0.0.0:3100"
 
 worker_class = "uvicorn.workers.UvicornWorker"
-workers = 1
+# More than one worker requires FLAG_STORE "sqlite", so that the workers share processing flags
+# and locks, and a backend other than TIERED_STORAGE, whose local tier belongs to one process
+workers = int(os.environ.get("GUNICORN_WORKERS", "1"))
@@ -35,12 +35,11 @@ class GenerateText(ActionBase):
             sessions = self.backend_internal_data_processing_dispatcher.sessions
 
             if conversation == True:
-                conversation_data = await self.backend_internal_data_processing_dispatcher.read_data_content(sessions, blob_name) or "[]"
-                if conversation_data is None:
+                conversation_json = await self.backend_internal_data_processing_dispatcher.read_session_messages(sessions, blob_name)
+                if not conversation_json:
                     self.logger.warning(f"The conversation {blob_name} returned is empty.")
 
                 # Clean up conversation from system instruction
-                conversation_json = json.loads(conversation_data)
                 # Filter out elements with 'role: system'
                 filtered_json = [item for item in conversation_json if item.get('role') != 'system']
 
@@ -23,6 +23,17 @@ class GetPreviousFeedback(ActionBase):
         self.genai_interactions_text_dispatcher = self.global_manager.genai_interactions_text_dispatcher
         self.backend_internal_data_processing_dispatcher = self.global_manager.backend_internal_data_processing_dispatcher
 
+    async def read_feedbacks(self, feedbacks_container, general_blob_name, blob_name):
+        # The general and specific feedbacks are read in one round, a failure is returned in place of its content
+        general_content, existing_content = await self.backend_internal_data_processing_dispatcher.read_many(
+            [(feedbacks_container, general_blob_name), (feedbacks_container, blob_name)],
+            return_exceptions=True,
+        )
+        if isinstance(general_content, Exception):
+            self.logger.error(f"Error reading general feedback: {str(general_content)}")
+            general_content = ""
+        return general_content, existing_content
+
     async def execute(self, action_input: ActionInput, event: IncomingNotificationDataBase):
         NO_FEEDBACK_FOUND_MESSAGE = "No previous feedback found"
         event_copy = copy.deepcopy(event)
@@ -38,14 +49,11 @@ class GetPreviousFeedback(ActionBase):
         feedbackprompt = ""
         existing_content = ""  # Initialize existing_content
 
-        try:
-            general_content = await self.backend_internal_data_processing_dispatcher.read_data_content(data_container=self.feedbacks_container, data_file=general_blob_name)
-        except Exception as e:
-            self.logger.error(f"Error reading general feedback: {str(e)}")
-            general_content = ""
+        general_content, existing_content = await self.read_feedbacks(self.feedbacks_container, general_blob_name, blob_name)
 
         try:
-            existing_content = await self.backend_internal_data_processing_dispatcher.read_data_content(data_container=self.feedbacks_container, data_file=blob_name)
+            if isinstance(existing_content, Exception):
+                raise existing_content
             if general_content:
                 existing_content = general_content + "\n" + existing_content
         except Exception as e:
@@ -70,14 +78,11 @@ class GetPreviousFeedback(ActionBase):
         feedbackprompt = ""
         blob_name = f"{category}_{sub_category}.txt"
         general_blob_name = f"{category}_Global.txt"
-        try:
-            general_content = await self.backend_internal_data_processing_dispatcher.read_data_content(data_container=self.backend_internal_data_processing_dispatcher.feedbacks, data_file=general_blob_name)
-        except Exception as e:
-            self.logger.error(f"Error reading general feedback: {str(e)}")
-            general_content = ""
+        general_content, existing_content = await self.read_feedbacks(self.backend_internal_data_processing_dispatcher.feedbacks, general_blob_name, blob_name)
 
         try:
-            existing_content = await self.backend_internal_data_processing_dispatcher.read_data_content(data_container=self.backend_internal_data_processing_dispatcher.feedbacks, data_file=blob_name)
+            if isinstance(existing_content, Exception):
+                raise existing_content
             if general_content:
                 existing_content = general_content + "\n" + existing_content
         except Exception as e:
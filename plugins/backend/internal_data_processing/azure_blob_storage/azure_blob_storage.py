@@ -1,19 +1,47 @@
+import asyncio
 import inspect
 import json
 import os
 import traceback
-
-from azure.core.exceptions import AzureError
-from azure.identity import DefaultAzureCredential
-from azure.storage.blob import BlobServiceClient
+import uuid
+from typing import Dict, Optional
+
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    AzureError,
+    HttpResponseError,
+    ResourceExistsError,
+    ResourceNotFoundError,
+    ResourceNotModifiedError,
+)
+from azure.identity.aio import DefaultAzureCredential
+from azure.storage.blob.aio import BlobServiceClient
 from pydantic import BaseModel
 
+from core.backend.compression import (
+    container_codecs,
+    decode_content,
+    decode_segments,
+)
 from core.backend.internal_data_processing_base import InternalDataProcessingBase
 from core.backend.pricing_data import PricingData
+from core.backend.session_log import (
+    parse_session_messages,
+    serialize_session_messages,
+)
 from core.global_manager import GlobalManager
 from utils.plugin_manager.plugin_manager import PluginManager
 
+from .utils.blob_cache import BlobCache
+from .utils.pooled_transport import create_pooled_transport
+
 AZURE_BLOB_STORAGE = "AZURE_BLOB_STORAGE"
+# Largest block accepted by a single append block call
+APPEND_BLOCK_MAX_SIZE = 4 * 1024 * 1024
+# Most sub-requests accepted by a single blob batch request
+BLOB_BATCH_MAX_SIZE = 256
+# Seconds between checks of a pending copy of a staged session
+COPY_POLL_INTERVAL = 0.1
 
 class AzureBlobStorageConfig(BaseModel):
     PLUGIN_NAME: str
@@ -27,16 +55,35 @@ class AzureBlobStorageConfig(BaseModel):
     PROCESSING_CONTAINER: str
     ABORT_CONTAINER: str
     VECTORS_CONTAINER: str
+    IMAGES_CONTAINER: str = "images"
+    CONNECTION_POOL_SIZE: int = 100
+    # Compression of SESSIONS, CONCATENATE or FEEDBACKS blobs: gzip, zstd or none
+    COMPRESSION: Dict[str, str] = {}
+    # Blobs whose ETag and content are kept to make repeated reads conditional, 0 disables it
+    BLOB_CACHE_MAX_ENTRIES: int = 1024
+    BLOB_CACHE_MAX_BLOB_SIZE: int = 1024 * 1024
+    BLOB_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
 
 class AzureBlobStoragePlugin(InternalDataProcessingBase):
-    def __init__(self, global_manager: GlobalManager):
+    def __init__(self, global_manager: GlobalManager, config_dict: Optional[Dict] = None):
         self.logger =global_manager.logger
         super().__init__(global_manager)
         self.plugin_manager : PluginManager = global_manager.plugin_manager
         self.plugin_configs = global_manager.config_manager.config_model.PLUGINS
-        config_dict = global_manager.config_manager.config_model.PLUGINS.BACKEND.INTERNAL_DATA_PROCESSING[AZURE_BLOB_STORAGE]
+        # Plugins composing this one, like tiered storage, pass their own configuration
+        if config_dict is None:
+            config_dict = global_manager.config_manager.config_model.PLUGINS.BACKEND.INTERNAL_DATA_PROCESSING[AZURE_BLOB_STORAGE]
         self.azure_blob_storage_config = AzureBlobStorageConfig(**config_dict)
         self.plugin_name = None
+        self.codecs = {}
+        self.credential = None
+        self.transport = None
+        self._blob_service_client = None
+        self.blob_cache = BlobCache(
+            max_entries=self.azure_blob_storage_config.BLOB_CACHE_MAX_ENTRIES,
+            max_blob_size=self.azure_blob_storage_config.BLOB_CACHE_MAX_BLOB_SIZE,
+            max_bytes=self.azure_blob_storage_config.BLOB_CACHE_MAX_BYTES,
+        )
 
     def initialize(self):
         self.logger.debug("Initializing Azure Blob Storage connection")
@@ -50,15 +97,39 @@ class AzureBlobStoragePlugin(InternalDataProcessingBase):
         self.processing_container = self.azure_blob_storage_config.PROCESSING_CONTAINER
         self.abort_container = self.azure_blob_storage_config.ABORT_CONTAINER
         self.vectors_container = self.azure_blob_storage_config.VECTORS_CONTAINER
+        self.images_container = self.azure_blob_storage_config.IMAGES_CONTAINER
         self.plugin_name = self.azure_blob_storage_config.PLUGIN_NAME
+        self.codecs = container_codecs(self, self.azure_blob_storage_config.COMPRESSION, self.logger)
 
         try:
-            credential = DefaultAzureCredential()
-            self.blob_service_client = BlobServiceClient(account_url=self.azure_blob_storage_config.CONNECTION_STRING, credential=credential)
-            self.logger.debug("BlobServiceClient successfully created")
+            self.credential = DefaultAzureCredential()
+        except AzureError as e:
+            self.initialization_failed = True
+            self.logger.exception(f"Failed to create the Azure credential: {str(e)}")
+
+    @property
+    def blob_service_client(self) -> BlobServiceClient:
+        # Created on first use, inside the event loop its pooled session binds to
+        if self._blob_service_client is None:
+            self._blob_service_client = self.create_blob_service_client()
+        return self._blob_service_client
+
+    @blob_service_client.setter
+    def blob_service_client(self, value):
+        self._blob_service_client = value
+
+    def create_blob_service_client(self) -> BlobServiceClient:
+        # A single pooled transport is shared by every blob and container client of the service client
+        transport = create_pooled_transport(pool_size=self.azure_blob_storage_config.CONNECTION_POOL_SIZE)
+        try:
+            blob_service_client = BlobServiceClient(account_url=self.azure_blob_storage_config.CONNECTION_STRING, credential=self.credential, transport=transport)
         except AzureError as e:
             self.initialization_failed = True
             self.logger.exception(f"Failed to create BlobServiceClient: {str(e)}")
+            raise
+        self.transport = transport
+        self.logger.debug("BlobServiceClient successfully created")
+        return blob_service_client
 
     @property
     def plugin_name(self):
@@ -113,6 +184,11 @@ class AzureBlobStoragePlugin(InternalDataProcessingBase):
         # Implement the vectors property
         return self.vectors_container
 
+    @property
+    def images(self):
+        # Implement the images property
+        return self.images_container
+
     def validate_request(self, request):
         raise NotImplementedError(f"{self.__class__.__name__}.{inspect.currentframe().f_code.co_name} is not implemented")
 
@@ -125,129 +201,211 @@ class AzureBlobStoragePlugin(InternalDataProcessingBase):
 
     async def update_session(self, data_container, data_file, role, content):
         self.logger.debug(f"Updating session for file {data_file} in container {data_container}")
+        await self.append_session_messages(data_container, data_file, [{"role": role, "content": content}])
+        self.logger.debug(f"Appended new role/content: {role}/{content}")
 
+    async def append_session_messages(self, data_container, data_file, messages):
         try:
-            current_content = await self.read_data_content(data_container, data_file)
-
-            if current_content is None:
-                current_content = '[]'  # Default to an empty list as a JSON string
+            await self._append_session_messages(data_container, data_file, messages)
+        except Exception as e:
+            self.logger.error(f"An error occurred while appending to the session: {str(e)}")
+            self.logger.error(traceback.format_exc())
 
+    async def _append_session_messages(self, data_container, data_file, messages):
+        # Raises on failure, for callers that retry like the tiered storage uploads
+        data_file = data_file.lower()
+        blob_client = self.blob_service_client.get_blob_client(container=data_container, blob=data_file)
+        data = self.encode(data_container, serialize_session_messages(messages))
+        self.blob_cache.invalidate(data_container, data_file)
+        try:
+            await self.append_blocks(blob_client, data)
+        except ResourceNotFoundError:
             try:
-                data = json.loads(current_content) if current_content else []
-                self.logger.debug("JSON content successfully parsed")
-            except json.JSONDecodeError:
-                self.logger.error("Failed to decode JSON, aborting update")
-                return
-
-            data.append({"role": role, "content": content})
-            self.logger.debug(f"Appended new role/content: {role}/{content}")
+                # Only created when still missing, a concurrent first append must not be truncated
+                await blob_client.create_append_blob(match_condition=MatchConditions.IfMissing)
+            except ResourceExistsError:
+                pass
+            await self.append_blocks(blob_client, data)
+        except HttpResponseError as e:
+            if e.error_code != "InvalidBlobType":
+                raise
+            # Sessions stored as a single JSON array in a block blob are converted once
+            download_stream = await blob_client.download_blob()
+            previous_messages = parse_session_messages(decode_segments(await download_stream.readall()))
+            await self.write_session_blob(blob_client, data_container, previous_messages + list(messages))
+            self.logger.info(f"Session {data_file} converted to the append-only format")
+        self.logger.debug(f"Appended {len(messages)} messages to session {data_file}")
+
+    async def read_session_messages(self, data_container, data_file):
+        content = await self.read_data_buffer(data_container, data_file)
+        try:
+            # Appends may be plain or compressed, depending on the configuration when they were written
+            return parse_session_messages(decode_segments(content) if content else None)
+        except ValueError:
+            # Invalid JSON, text or compressed data
+            self.logger.error(f"Failed to decode session {data_file}")
+            return []
 
-            new_content = json.dumps(data)
-            self.logger.debug("Data converted back to JSON")
+    async def write_session_blob(self, blob_client, data_container, messages):
+        # The session is staged in its own append blob and copied over the previous one,
+        # readers never see it empty or partially written
+        staging_client = self.blob_service_client.get_blob_client(
+            container=data_container, blob=f"{blob_client.blob_name}.{uuid.uuid4().hex}.staging"
+        )
+        await staging_client.create_append_blob()
+        try:
+            await self.append_blocks(staging_client, self.encode(data_container, serialize_session_messages(messages)))
+            copy = await blob_client.start_copy_from_url(staging_client.url)
+            copy_status = copy.get('copy_status')
+            while copy_status == 'pending':
+                await asyncio.sleep(COPY_POLL_INTERVAL)
+                copy_status = (await blob_client.get_blob_properties()).copy.status
+            if copy_status in ('aborted', 'failed'):
+                raise HttpResponseError(f"Copy of the staged session {blob_client.blob_name} ended with status {copy_status}")
+        finally:
+            await staging_client.delete_blob()
+
+    def encode(self, data_container, data: str) -> bytes:
+        data = data.encode('utf-8')
+        codec = self.codecs.get(data_container)
+        return codec.compress(data) if codec is not None else data
+
+    async def download(self, blob_client, data_container, data_file):
+        """
+        Download a blob in a single request, returning None when it does not exist.
+        A blob in the cache is only downloaded again when its ETag has changed.
+        """
+        cached = self.blob_cache.get(data_container, data_file)
+        try:
+            if cached is not None:
+                download_stream = await blob_client.download_blob(etag=cached[0], match_condition=MatchConditions.IfModified)
+            else:
+                download_stream = await blob_client.download_blob()
+            blob_data = await download_stream.readall()
+        except ResourceNotModifiedError:
+            return cached[1]
+        except ResourceNotFoundError:
+            self.blob_cache.invalidate(data_container, data_file)
+            return None
+        self.blob_cache.put(data_container, data_file, download_stream.properties.etag, blob_data)
+        return blob_data
 
-            await self.write_data_content(data_container, data_file, new_content)
-            self.logger.debug("Session update completed")
-        except Exception as e:
-            self.logger.error(f"An error occurred while updating the session: {str(e)}")
-            self.logger.error(traceback.format_exc())
+    @staticmethod
+    async def append_blocks(blob_client, data):
+        for start in range(0, len(data), APPEND_BLOCK_MAX_SIZE):
+            await blob_client.append_block(data[start:start + APPEND_BLOCK_MAX_SIZE])
 
     async def read_data_content(self, data_container, data_file : str):
         try:
             data_file = data_file.lower()
             self.logger.info(f"Reading data content from {data_file} in {data_container}")
             blob_client = self.blob_service_client.get_blob_client(data_container, data_file)
-            if blob_client.exists():
-                try:
-                    download_stream = blob_client.download_blob()
-                    blob_data = download_stream.readall()
-                    self.logger.debug("Blob data successfully read")
-                    return blob_data.decode('utf-8')
-                except Exception as e:
-                    self.logger.error(f"Failed to read blob: {str(e)}")
-                    self.logger.error(traceback.format_exc())
-                    return None
-            else:
+            blob_data = await self.download(blob_client, data_container, data_file)
+            if blob_data is None:
                 self.logger.warning(f"Blob not found: {data_file}")
                 return None
+            self.logger.debug("Blob data successfully read")
+            # Compressed blobs are recognized by their header, whatever the current configuration
+            return decode_content(blob_data)
         except Exception as e:
             self.logger.error(f"An error occurred while reading the data content: {str(e)}")
             self.logger.error(traceback.format_exc())
             return None
 
-    async def remove_data_content(self, data_container, data_file: str):
+    async def read_data_buffer(self, data_container, data_file: str):
         try:
             data_file = data_file.lower()
-            self.logger.info(f"Removing data content from {data_file} in {data_container}")
+            self.logger.info(f"Reading data buffer from {data_file} in {data_container}")
             blob_client = self.blob_service_client.get_blob_client(data_container, data_file)
-            if blob_client.exists():
-                try:
-                    blob_client.delete_blob()
-                    self.logger.debug("Blob successfully deleted")
-                except Exception as e:
-                    self.logger.error(f"Failed to delete blob: {str(e)}")
-                    self.logger.error(traceback.format_exc())
-                    return None
-            else:
-                self.logger.debug(f"Blob not found: {data_file}")
+            blob_data = await self.download(blob_client, data_container, data_file)
+            if blob_data is None:
+                self.logger.warning(f"Blob not found: {data_file}")
                 return None
+            self.logger.debug("Blob data successfully read")
+            return blob_data
+        except Exception as e:
+            self.logger.error(f"An error occurred while reading the data buffer: {str(e)}")
+            self.logger.error(traceback.format_exc())
+            return None
+
+    async def remove_data_content(self, data_container, data_file: str):
+        try:
+            await self._remove_data_content(data_container, data_file)
         except Exception as e:
             self.logger.error(f"An error occurred while removing the data content: {str(e)}")
             self.logger.error(traceback.format_exc())
             return None
 
-    async def write_data_content(self, data_container, data_file: str, data):
+    async def _remove_data_content(self, data_container, data_file: str):
+        # Raises on failure, a missing blob is already removed
+        data_file = data_file.lower()
+        self.logger.info(f"Removing data content from {data_file} in {data_container}")
+        blob_client = self.blob_service_client.get_blob_client(data_container, data_file)
+        self.blob_cache.invalidate(data_container, data_file)
+        try:
+            await blob_client.delete_blob()
+            self.logger.debug("Blob successfully deleted")
+        except ResourceNotFoundError:
+            self.logger.debug(f"Blob not found: {data_file}")
+
+    async def get_data_version(self, data_container, data_file: str):
         try:
             data_file = data_file.lower()
-            self.logger.debug(f"Writing data content to {data_file} in {data_container}")
-            blob_client = self.blob_service_client.get_blob_client(container=data_container, blob=data_file)
-            try:
-                data = data.encode('utf-8')
-                blob_client.upload_blob(data, overwrite=True)
-                self.logger.debug("Data successfully written to blob")
-            except Exception as e:
-                self.logger.error(f"Failed to write data to blob: {str(e)}")
-                self.logger.error(traceback.format_exc())
-                return None
+            blob_client = self.blob_service_client.get_blob_client(data_container, data_file)
+            properties = await blob_client.get_blob_properties()
+            return properties.etag
+        except ResourceNotFoundError:
+            self.logger.debug(f"Blob not found: {data_file}")
+            return None
         except Exception as e:
-            self.logger.error(f"An error occurred while writing the data content: {str(e)}")
+            self.logger.error(f"An error occurred while reading the blob properties: {str(e)}")
             self.logger.error(traceback.format_exc())
             return None
 
+    async def write_data_content(self, data_container, data_file: str, data):
+        try:
+            await self._write_data_content(data_container, data_file, data)
+        except Exception as e:
+            self.logger.error(f"Failed to write data to blob: {str(e)}")
+            self.logger.error(traceback.format_exc())
+            return None
+
+    async def _write_data_content(self, data_container, data_file: str, data):
+        # Raises on failure, for callers that retry like the tiered storage uploads
+        data_file = data_file.lower()
+        self.logger.debug(f"Writing data content to {data_file} in {data_container}")
+        blob_client = self.blob_service_client.get_blob_client(container=data_container, blob=data_file)
+        data = self.encode(data_container, data)
+        self.blob_cache.invalidate(data_container, data_file)
+        result = await blob_client.upload_blob(data, overwrite=True)
+        # What was written is what the next read would download
+        self.blob_cache.put(data_container, data_file, result.get('etag') if isinstance(result, dict) else None, data)
+        self.logger.debug("Data successfully written to blob")
+
     async def store_unmentioned_messages(self, channel_id, thread_id, message):
         try:
             self.logger.debug(f"Storing unmentioned messages for channel {channel_id}, thread {thread_id}")
             blob_name = f"unmentioned_messages_{channel_id}_{thread_id}.json"
             blob_name = blob_name.lower()
             blob_client = self.blob_service_client.get_blob_client(container=self.messages_container, blob=blob_name)
-            if blob_client.exists():
-                try:
-                    existing_blob = blob_client.download_blob().readall()
-                    messages = json.loads(existing_blob) if existing_blob else []
-                    self.logger.debug("Existing messages successfully retrieved")
-                except Exception as e:
-                    self.logger.error(f"Failed to retrieve existing messages: {str(e)}")
-                    self.logger.error(traceback.format_exc())
-                    return
-            else:
-                self.logger.debug("No existing messages found, initializing empty list")
-                messages = []
+            try:
+                existing_blob = await self.download(blob_client, self.messages_container, blob_name)
+                messages = json.loads(existing_blob) if existing_blob else []
+                self.logger.debug("Existing messages successfully retrieved")
+            except Exception as e:
+                self.logger.error(f"Failed to retrieve existing messages: {str(e)}")
+                self.logger.error(traceback.format_exc())
+                return
 
             messages.append(message)
             self.logger.debug(f"Appending new message: {message}")
-            if blob_client.exists():
-                try:
-                    blob_client.upload_blob(json.dumps(messages), overwrite=True)
-                    self.logger.info("Unmentioned messages stored successfully")
-                except Exception as e:
-                    self.logger.error(f"Failed to store unmentioned messages: {str(e)}")
-                    self.logger.error(traceback.format_exc())
-            else:
-                try:
-                    await self.write_data_content(data_container=self.messages_container, data_file=blob_name, data=json.dumps(messages))
-                    self.logger.info("Unmentioned messages stored successfully")
-                except Exception as e:
-                    self.logger.error(f"Failed to store unmentioned messages: {str(e)}")
-                    self.logger.error(traceback.format_exc())
+            try:
+                self.blob_cache.invalidate(self.messages_container, blob_name)
+                await blob_client.upload_blob(json.dumps(messages), overwrite=True)
+                self.logger.info("Unmentioned messages stored successfully")
+            except Exception as e:
+                self.logger.error(f"Failed to store unmentioned messages: {str(e)}")
+                self.logger.error(traceback.format_exc())
         except Exception as e:
             self.logger.error(f"An error occurred while storing unmentioned messages: {str(e)}")
             self.logger.error(traceback.format_exc())
@@ -260,19 +418,19 @@ class AzureBlobStoragePlugin(InternalDataProcessingBase):
             container_name = self.messages_container
             blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=blob_name)
 
-            if blob_client.exists():
-                try:
-                    blob_content = blob_client.download_blob().readall()
-                    blob_client.delete_blob()  # Clear the blob after retrieving the content
-                    messages = json.loads(blob_content)
-                    self.logger.debug("Messages successfully retrieved and blob cleared")
-                    return messages
-                except Exception as e:
-                    self.logger.error(f"Failed to retrieve or clear messages: {str(e)}")
-                    self.logger.error(traceback.format_exc())
+            try:
+                blob_content = await self.download(blob_client, container_name, blob_name)
+                if blob_content is None:
+                    self.logger.debug("Failed to retrieve or clear messages, might be empty or first call")
                     return []
-            else:
-                self.logger.debug("Failed to retrieve or clear messages, might be empty or first call")
+                self.blob_cache.invalidate(container_name, blob_name)
+                await blob_client.delete_blob()  # Clear the blob after retrieving the content
+                messages = json.loads(blob_content)
+                self.logger.debug("Messages successfully retrieved and blob cleared")
+                return messages
+            except Exception as e:
+                self.logger.error(f"Failed to retrieve or clear messages: {str(e)}")
+                self.logger.error(traceback.format_exc())
                 return []
         except Exception as e:
             self.logger.error(f"An error occurred while retrieving unmentioned messages: {str(e)}")
@@ -326,7 +484,7 @@ class AzureBlobStoragePlugin(InternalDataProcessingBase):
         try:
             blob_list = self.blob_service_client.get_container_client(container_name).list_blobs()
             file_names = []
-            for blob in blob_list:
+            async for blob in blob_list:
                 base_name = os.path.basename(blob.name)
                 file_name_without_extension = os.path.splitext(base_name)[0]
                 file_names.append(file_name_without_extension)
@@ -335,21 +493,51 @@ class AzureBlobStoragePlugin(InternalDataProcessingBase):
             self.logger.error(f"An error occurred while listing blobs: {e}")
             return []
 
+    async def list_stale_files(self, data_container, older_than):
+        try:
+            stale_files = []
+            async for blob in self.blob_service_client.get_container_client(data_container).list_blobs():
+                if blob.last_modified.timestamp() < older_than:
+                    stale_files.append((blob.name, blob.size))
+            return stale_files
+        except AzureError as e:
+            self.logger.error(f"An error occurred while listing stale blobs: {e}")
+            return []
+
+    async def remove_many(self, data_container, data_files):
+        data_files = [data_file.lower() for data_file in data_files]
+        container_client = self.blob_service_client.get_container_client(data_container)
+        removed = 0
+        for start in range(0, len(data_files), BLOB_BATCH_MAX_SIZE):
+            batch = data_files[start:start + BLOB_BATCH_MAX_SIZE]
+            for data_file in batch:
+                self.blob_cache.invalidate(data_container, data_file)
+            try:
+                # One batch request deletes up to 256 blobs, blobs already gone answer 404
+                responses = await container_client.delete_blobs(*batch, raise_on_any_failure=False)
+                async for response in responses:
+                    if response.status_code == 202:
+                        removed += 1
+            except AzureError as e:
+                self.logger.error(f"An error occurred while deleting a batch of blobs: {e}")
+                self.logger.error(traceback.format_exc())
+        return removed
+
     async def update_prompt_system_message(self, channel_id, thread_id, message):
         try:
             self.logger.debug(f"Updating prompt system message for channel {channel_id}, thread {thread_id}")
             blob_name = f"{channel_id}-{thread_id}.txt"
             blob_name = blob_name.lower()
-            session = await self.read_data_content(self.sessions, blob_name)
+            session = await self.read_data_buffer(self.sessions, blob_name)
 
             if session is None:
                 self.logger.error(f"Session data not found for blob {blob_name}")
                 return
 
             try:
-                session_json = json.loads(session)
+                session_json = parse_session_messages(decode_segments(session))
                 self.logger.debug("Session string parsed into JSON")
-            except json.JSONDecodeError:
+            except ValueError:
                 self.logger.error("Failed to decode session JSON")
                 return
 
@@ -365,9 +553,10 @@ class AzureBlobStoragePlugin(InternalDataProcessingBase):
                 self.logger.warning("System role not found in session JSON")
                 return
 
-            updated_session = json.dumps(session_json)
             try:
-                await self.write_data_content(self.sessions_container, blob_name, updated_session)
+                blob_client = self.blob_service_client.get_blob_client(container=self.sessions_container, blob=blob_name)
+                self.blob_cache.invalidate(self.sessions_container, blob_name)
+                await self.write_session_blob(blob_client, self.sessions_container, session_json)
                 self.logger.info("Prompt system message update completed successfully")
             except Exception as e:
                 self.logger.error(f"Failed to update prompt system message: {str(e)}")
@@ -378,3 +567,13 @@ class AzureBlobStoragePlugin(InternalDataProcessingBase):
             self.logger.error(traceback.format_exc())
             return
 
+    async def close(self):
+        # Release the pooled connections held by the service client, its session and its credential
+        if self._blob_service_client is not None:
+            await self._blob_service_client.close()
+            self._blob_service_client = None
+        if self.transport is not None:
+            await self.transport.session.close()
+            self.transport = None
+        if self.credential is not None:
+            await self.credential.close()
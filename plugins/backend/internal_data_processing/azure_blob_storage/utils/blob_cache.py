@@ -0,0 +1,43 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class BlobCache:
+    """
+    ETag and content of the blobs read or written last, so that reading them
+    again is a conditional request answered without a body when unchanged.
+
+    Least recently used blobs are dropped beyond max_entries or once their contents
+    exceed max_bytes, and blobs larger than max_blob_size are not kept.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_blob_size: int = 1024 * 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_blob_size = max_blob_size
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[str, bytes]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, container: str, blob: str) -> Optional[Tuple[str, bytes]]:
+        entry = self.entries.get((container, blob))
+        if entry is not None:
+            self.entries.move_to_end((container, blob))
+        return entry
+
+    def put(self, container: str, blob: str, etag: Optional[str], data: bytes):
+        self.invalidate(container, blob)
+        if not etag or not isinstance(data, bytes) or len(data) > min(self.max_blob_size, self.max_bytes) or self.max_entries <= 0:
+            return
+        self.entries[(container, blob)] = (etag, data)
+        self.size += len(data)
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def invalidate(self, container: str, blob: str):
+        entry = self.entries.pop((container, blob), None)
+        if entry is not None:
+            self.size -= len(entry[1])
@@ -0,0 +1,19 @@
+import aiohttp
+from azure.core.pipeline.transport import AioHttpTransport
+
+
+def create_pooled_transport(pool_size: int = 100) -> AioHttpTransport:
+    """
+    Create an aiohttp transport whose session keeps a bounded pool of keep-alive connections.
+
+    The session binds to the running event loop, so call this from the loop that sends
+    the requests. The transport does not own the session: closing a client leaves it
+    open, close it with transport.session.close() once the clients are closed.
+    """
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=pool_size, limit_per_host=pool_size),
+        trust_env=True,
+        cookie_jar=aiohttp.DummyCookieJar(),
+        auto_decompress=False,
+    )
+    return AioHttpTransport(session=session, session_owner=False)
@@ -1,15 +1,32 @@
+import asyncio
 import inspect
 import json
+import mmap
 import os
 import traceback
+import weakref
 
 from pydantic import BaseModel
 
+from core.backend.compression import (
+    container_codecs,
+    decode_content,
+    decode_segments,
+    detect_codec,
+    encode_content,
+)
 from core.backend.internal_data_processing_base import InternalDataProcessingBase
 from core.backend.pricing_data import PricingData
+from core.backend.session_log import (
+    is_legacy_session,
+    parse_session_messages,
+    serialize_session_messages,
+)
 from core.global_manager import GlobalManager
 from utils.plugin_manager.plugin_manager import PluginManager
-from typing import NoReturn
+from typing import Dict, NoReturn, Optional
+
+from .utils.io_executor import IoExecutor, atomic_write
 
 class FileSystemConfig(BaseModel):
     PLUGIN_NAME: str
@@ -23,14 +40,20 @@ class FileSystemConfig(BaseModel):
     PROCESSING_CONTAINER: str
     ABORT_CONTAINER: str
     VECTORS_CONTAINER: str
+    IMAGES_CONTAINER: str = "images"
+    IO_POOL_SIZE: int = 8
+    # Compression of SESSIONS, CONCATENATE or FEEDBACKS data files: gzip, zstd or none
+    COMPRESSION: Dict[str, str] = {}
 
 class FileSystemPlugin(InternalDataProcessingBase):
-    def __init__(self, global_manager: GlobalManager):
+    def __init__(self, global_manager: GlobalManager, config_dict: Optional[Dict] = None):
         super().__init__(global_manager)
         self.logger = global_manager.logger
         self.global_manager = global_manager
         self.plugin_manager : PluginManager = global_manager.plugin_manager
-        config_dict = global_manager.config_manager.config_model.PLUGINS.BACKEND.INTERNAL_DATA_PROCESSING["FILE_SYSTEM"]
+        # Plugins composing this one, like tiered storage, pass their own configuration
+        if config_dict is None:
+            config_dict = global_manager.config_manager.config_model.PLUGINS.BACKEND.INTERNAL_DATA_PROCESSING["FILE_SYSTEM"]
         self.file_system_config = FileSystemConfig(**config_dict)
 
         # Set the variables to None
@@ -45,6 +68,11 @@ class FileSystemPlugin(InternalDataProcessingBase):
         self.processing_container = None
         self.abort_container = None
         self.vectors_container = None
+        self.images_container = None
+        self.io_executor = None
+        self.codecs = {}
+        # Read-modify-write operations on the same file are serialized across I/O threads
+        self.file_locks = weakref.WeakValueDictionary()
 
     @property
     def plugin_name(self):
@@ -99,6 +127,11 @@ class FileSystemPlugin(InternalDataProcessingBase):
         # Implement the vectors property
         return self.vectors_container
 
+    @property
+    def images(self):
+        # Implement the images property
+        return self.images_container
+
     def initialize(self):
         try:
             self.logger.debug("Initializing file system")
@@ -112,7 +145,10 @@ class FileSystemPlugin(InternalDataProcessingBase):
             self.processing_container = self.file_system_config.PROCESSING_CONTAINER
             self.abort_container = self.file_system_config.ABORT_CONTAINER
             self.vectors_container = self.file_system_config.VECTORS_CONTAINER
+            self.images_container = self.file_system_config.IMAGES_CONTAINER
             self.plugin_name = self.file_system_config.PLUGIN_NAME
+            self.io_executor = IoExecutor(pool_size=self.file_system_config.IO_POOL_SIZE)
+            self.codecs = container_codecs(self, self.file_system_config.COMPRESSION, self.logger)
             self.init_shares()
         except KeyError as e:
             self.logger.exception(f"Missing configuration key: {str(e)}")
@@ -124,7 +160,7 @@ class FileSystemPlugin(InternalDataProcessingBase):
         raise NotImplementedError(f"{self.__class__.__name__}.{inspect.currentframe().f_code.co_name} is not implemented")
 
     def init_shares(self):
-        containers = [self.sessions_container, self.messages_container, self.feedbacks_container, self.concatenate_container, self.prompts_container, self.costs_container]
+        containers = [self.sessions_container, self.messages_container, self.feedbacks_container, self.concatenate_container, self.prompts_container, self.costs_container, self.images_container]
         for container in containers:
             directory_path = os.path.join(self.root_directory, container)
             os.makedirs(directory_path, exist_ok=True)
@@ -143,14 +179,28 @@ class FileSystemPlugin(InternalDataProcessingBase):
             # Log an error message if an IOError occurs (e.g., if the file could not be opened)
             self.logger.error(f"Failed to append data to the file: {e}")
 
+    def file_lock(self, file_path):
+        lock = self.file_locks.get(file_path)
+        if lock is None:
+            lock = asyncio.Lock()
+            self.file_locks[file_path] = lock
+        return lock
+
+    async def run_io(self, func, *args):
+        # Blocking file operations run on the bounded I/O pool, never on the event loop
+        return await self.io_executor.run(func, *args)
+
     async def read_data_content(self, data_container, data_file):
+        return await self.run_io(self._read_data_content, data_container, data_file)
 
+    def _read_data_content(self, data_container, data_file):
         self.logger.debug(f"Reading data content from {data_file} in {data_container}")
         file_path = os.path.join(self.root_directory, data_container, data_file)
         if os.path.exists(file_path):
             try:
-                with open(file_path, 'r') as file:
-                    data = file.read()
+                with open(file_path, 'rb') as file:
+                    # Compressed files are recognized by their header, whatever the current configuration
+                    data = decode_content(file.read())
                 self.logger.debug("Data successfully read")
                 return data
             except Exception as e:
@@ -161,18 +211,49 @@ class FileSystemPlugin(InternalDataProcessingBase):
             self.logger.debug(f"File not found: {data_file}")
             return None
 
+    async def read_data_buffer(self, data_container, data_file):
+        return await self.run_io(self._read_data_buffer, data_container, data_file)
+
+    def _read_data_buffer(self, data_container, data_file):
+        self.logger.debug(f"Reading data buffer from {data_file} in {data_container}")
+        file_path = os.path.join(self.root_directory, data_container, data_file)
+        if not os.path.exists(file_path):
+            self.logger.debug(f"File not found: {data_file}")
+            return None
+
+        try:
+            with open(file_path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    return b""
+                # The mapping stays valid after the file is closed and shares the page cache between processes
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.logger.debug("Data successfully mapped")
+            return buffer
+        except Exception as e:
+            self.logger.error(f"Failed to map file: {str(e)}")
+            return None
+
     async def write_data_content(self, data_container, data_file, data):
+        file_path = os.path.join(self.root_directory, data_container, data_file)
+        async with self.file_lock(file_path):
+            await self.run_io(self._write_data_content, data_container, data_file, data)
+
+    def _write_data_content(self, data_container, data_file, data):
         self.logger.debug(f"Writing data content to {data_file} in {data_container}")
         file_path = os.path.join(self.root_directory, data_container, data_file)
         try:
-            with open(file_path, 'w') as file:
-                file.write(data)
+            atomic_write(file_path, encode_content(data, self.codecs.get(data_container)))
             self.logger.debug("Data successfully written to file")
         except Exception:
             error_traceback = traceback.format_exc()
             self.logger.exception(f"Failed to write to file: {str(error_traceback)}")
 
     async def store_unmentioned_messages(self, channel_id, thread_id, message):
+        file_path = os.path.join(self.root_directory,self.messages_container, f"unmentioned_messages_{channel_id}_{thread_id}.json")
+        async with self.file_lock(file_path):
+            await self.run_io(self._store_unmentioned_messages, channel_id, thread_id, message)
+
+    def _store_unmentioned_messages(self, channel_id, thread_id, message):
         self.logger.debug(f"Storing unmentioned messages for channel {channel_id}, thread {thread_id}")
         file_path = os.path.join(self.root_directory,self.messages_container, f"unmentioned_messages_{channel_id}_{thread_id}.json")
         if os.path.exists(file_path):
@@ -190,13 +271,17 @@ class FileSystemPlugin(InternalDataProcessingBase):
         messages.append(message)
 
         try:
-            with open(file_path, 'w') as file:
-                json.dump(messages, file)
+            atomic_write(file_path, json.dumps(messages))
             self.logger.debug("Message successfully stored")
         except Exception as e:
             self.logger.error(f"Failed to write to file: {str(e)}")
 
     async def retrieve_unmentioned_messages(self, channel_id, thread_id):
+        file_path = os.path.join(self.root_directory,self.messages_container, f"unmentioned_messages_{channel_id}_{thread_id}.json")
+        async with self.file_lock(file_path):
+            return await self.run_io(self._retrieve_unmentioned_messages, channel_id, thread_id)
+
+    def _retrieve_unmentioned_messages(self, channel_id, thread_id):
         self.logger.debug(f"Retrieving unmentioned messages for channel {channel_id}, thread {thread_id}")
         file_path = os.path.join(self.root_directory,self.messages_container, f"unmentioned_messages_{channel_id}_{thread_id}.json")
 
@@ -216,6 +301,11 @@ class FileSystemPlugin(InternalDataProcessingBase):
             return []
 
     async def remove_data_content(self, data_container, data_file):
+        file_path = os.path.join(self.root_directory, data_container, data_file)
+        async with self.file_lock(file_path):
+            return await self.run_io(self._remove_data_content, data_container, data_file)
+
+    def _remove_data_content(self, data_container, data_file):
         self.logger.debug(f"Removing data content from {data_file} in {data_container}")
         file_path = os.path.join(self.root_directory, data_container, data_file)
         if os.path.exists(file_path):
@@ -229,7 +319,27 @@ class FileSystemPlugin(InternalDataProcessingBase):
             self.logger.debug(f"File not found: {data_file}")
             return None
 
+    async def get_data_version(self, data_container, data_file):
+        return await self.run_io(self._get_data_version, data_container, data_file)
+
+    def _get_data_version(self, data_container, data_file):
+        file_path = os.path.join(self.root_directory, data_container, data_file)
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            self.logger.debug(f"File not found: {data_file}")
+            return None
+        except Exception as e:
+            self.logger.error(f"Failed to stat file: {str(e)}")
+            return None
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
     async def update_pricing(self, container_name, datafile_name, pricing_data):
+        file_path = os.path.join(self.root_directory, container_name, datafile_name)
+        async with self.file_lock(file_path):
+            return await self.run_io(self._update_pricing, container_name, datafile_name, pricing_data)
+
+    def _update_pricing(self, container_name, datafile_name, pricing_data):
         self.logger.debug(f"Updating pricing in file {datafile_name} in container {container_name}")
         file_path = os.path.join(self.root_directory, container_name, datafile_name)
         if os.path.exists(file_path):
@@ -254,8 +364,7 @@ class FileSystemPlugin(InternalDataProcessingBase):
         self.logger.debug(f"Updated pricing data: {data.__dict__}")
 
         try:
-            with open(file_path, 'w') as file:
-                json.dump(data.__dict__, file)
+            atomic_write(file_path, json.dumps(data.__dict__))
             self.logger.debug("Pricing update completed")
         except Exception as e:
             self.logger.error(f"Failed to write to file: {str(e)}")
@@ -263,12 +372,17 @@ class FileSystemPlugin(InternalDataProcessingBase):
         return data
 
     async def update_prompt_system_message(self, channel_id, thread_id, message):
+        file_path = os.path.join(self.root_directory, self.sessions, f"{channel_id}-{thread_id}.txt")
+        async with self.file_lock(file_path):
+            await self.run_io(self._update_prompt_system_message, channel_id, thread_id, message)
+
+    def _update_prompt_system_message(self, channel_id, thread_id, message):
         self.logger.debug(f"Updating prompt system message for channel {channel_id}, thread {thread_id}")
         file_path = os.path.join(self.root_directory, self.sessions, f"{channel_id}-{thread_id}.txt")
         if os.path.exists(file_path):
             try:
-                with open(file_path, 'r') as file:
-                    session = json.load(file)
+                with open(file_path, 'rb') as file:
+                    session = parse_session_messages(decode_segments(file.read()))
                 self.logger.debug("Session string parsed into JSON")
             except Exception as e:
                 self.logger.error(f"Failed to read file: {str(e)}")
@@ -290,17 +404,20 @@ class FileSystemPlugin(InternalDataProcessingBase):
             return
 
         try:
-            with open(file_path, 'w') as file:
-                json.dump(session, file)
+            atomic_write(file_path, encode_content(serialize_session_messages(session), self.codecs.get(self.sessions)))
             self.logger.info("Prompt system message update completed successfully")
         except Exception as e:
             self.logger.error(f"Failed to write to file: {str(e)}")
 
     async def list_container_files(self, container_name):
+        return await self.run_io(self._list_container_files, container_name)
+
+    def _list_container_files(self, container_name):
         try:
             file_names = []
-            for file in os.listdir(container_name):
-                if os.path.isfile(os.path.join(container_name, file)):
+            container_path = os.path.join(self.root_directory, container_name)
+            for file in os.listdir(container_path):
+                if os.path.isfile(os.path.join(container_path, file)):
                     file_name_without_extension = os.path.splitext(file)[0]
                     file_names.append(file_name_without_extension)
             return file_names
@@ -308,26 +425,92 @@ class FileSystemPlugin(InternalDataProcessingBase):
             self.logger.error(f"An error occurred while listing files: {e}")
             return []
 
+    async def list_stale_files(self, data_container, older_than):
+        return await self.run_io(self._list_stale_files, data_container, older_than)
+
+    def _list_stale_files(self, data_container, older_than):
+        try:
+            stale_files = []
+            with os.scandir(os.path.join(self.root_directory, data_container)) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        if stat.st_mtime < older_than:
+                            stale_files.append((entry.name, stat.st_size))
+            return stale_files
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            self.logger.error(f"An error occurred while listing stale files: {e}")
+            return []
+
+    async def remove_many(self, data_container, data_files):
+        return await self.run_io(self._remove_many, data_container, list(data_files))
+
+    def _remove_many(self, data_container, data_files):
+        removed = 0
+        for data_file in data_files:
+            try:
+                os.remove(os.path.join(self.root_directory, data_container, data_file))
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                self.logger.error(f"Failed to delete file {data_file}: {str(e)}")
+        return removed
+
     async def update_session(self, data_container, data_file, role, content):
         self.logger.debug(f"Updating session for file {data_file} in container {data_container}")
+        await self.append_session_messages(data_container, data_file, [{"role": role, "content": content}])
+        self.logger.debug(f"Appended new role/content: {role}/{content}")
+
+    async def append_session_messages(self, data_container, data_file, messages):
         file_path = os.path.join(self.root_directory, data_container, data_file)
-        if os.path.exists(file_path):
-            try:
+        async with self.file_lock(file_path):
+            await self.run_io(self._append_session_messages, data_container, data_file, messages)
+
+    def _append_session_messages(self, data_container, data_file, messages):
+        file_path = os.path.join(self.root_directory, data_container, data_file)
+        codec = self.codecs.get(data_container)
+        try:
+            if self.is_legacy_session_file(file_path):
+                # Sessions stored as a single JSON array are converted once, then appended to
                 with open(file_path, 'r') as file:
-                    data = json.load(file)
-                self.logger.debug("JSON content successfully parsed")
-            except Exception as e:
-                self.logger.error(f"Failed to read file: {str(e)}")
+                    previous_messages = json.load(file)
+                atomic_write(file_path, encode_content(serialize_session_messages(previous_messages + list(messages)), codec))
+                self.logger.info(f"Session {data_file} converted to the append-only format")
                 return
-        else:
-            data = []  # Default to an empty list
+            if codec is not None:
+                # Each append is a compressed member of its own, read back as one stream
+                with open(file_path, 'ab') as file:
+                    file.write(encode_content(serialize_session_messages(messages), codec))
+            else:
+                with open(file_path, 'a') as file:
+                    file.write(serialize_session_messages(messages))
+            self.logger.debug(f"Appended {len(messages)} messages to session {data_file}")
+        except Exception as e:
+            self.logger.error(f"Failed to append to session: {str(e)}")
 
-        data.append({"role": role, "content": content})
-        self.logger.debug(f"Appended new role/content: {role}/{content}")
+    async def read_session_messages(self, data_container, data_file):
+        return await self.run_io(self._read_session_messages, data_container, data_file)
 
+    def _read_session_messages(self, data_container, data_file):
+        file_path = os.path.join(self.root_directory, data_container, data_file)
         try:
-            with open(file_path, 'w') as file:
-                json.dump(data, file)
-            self.logger.debug("Session update completed")
+            with open(file_path, 'rb') as file:
+                # Appends may be plain or compressed, depending on the configuration when they were written
+                return parse_session_messages(decode_segments(file.read()))
+        except FileNotFoundError:
+            return []
         except Exception as e:
-            self.logger.error(f"Failed to write to file: {str(e)}")
+            self.logger.error(f"Failed to read session: {str(e)}")
+            return []
+
+    @staticmethod
+    def is_legacy_session_file(file_path):
+        try:
+            with open(file_path, 'rb') as file:
+                header = file.read(64)
+            return detect_codec(header) is None and is_legacy_session(header.decode('utf-8', errors='ignore'))
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Union
+
+from opentelemetry import metrics
+from opentelemetry.metrics import Observation
+
+DEFAULT_FILE_MODE = 0o644
+
+class IoExecutor:
+    """
+    Bounded thread pool running blocking file operations off the event loop.
+
+    Tracks how many operations are queued or running so that a slow volume
+    shows up as a growing queue rather than as a stalled event loop.
+    """
+
+    def __init__(self, pool_size: int = 8, name: str = "file_system_io"):
+        self.pool_size = pool_size
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix=name)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.active = 0
+        self.max_pending = 0
+        self.completed = 0
+
+        meter = metrics.get_meter(__name__)
+        meter.create_observable_gauge(f"{name}.queue_depth", callbacks=[self.observe_queue_depth], description="File operations waiting for an I/O thread")
+        meter.create_observable_gauge(f"{name}.active", callbacks=[self.observe_active], description="File operations running on an I/O thread")
+
+    @property
+    def queue_depth(self) -> int:
+        return self.pending - self.active
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "pool_size": self.pool_size,
+                "queue_depth": self.queue_depth,
+                "active": self.active,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+            }
+
+    def observe_queue_depth(self, options=None):
+        yield Observation(self.queue_depth)
+
+    def observe_active(self, options=None):
+        yield Observation(self.active)
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        with self.lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self.track, func, *args)
+        finally:
+            with self.lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def track(self, func: Callable[..., Any], *args) -> Any:
+        with self.lock:
+            self.active += 1
+        try:
+            return func(*args)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+def atomic_write(file_path: str, data: Union[str, bytes]):
+    """
+    Write a text or binary file through a temporary file renamed over the target, so
+    readers see either the previous or the new content, never a partial one.
+    """
+    directory, file_name = os.path.split(file_path)
+    fd, temp_path = tempfile.mkstemp(dir=directory or None, prefix=f".{file_name}.", suffix=".tmp")
+    try:
+        # mkstemp creates owner-only files, keep the permissions a plain open() would have given
+        try:
+            mode = os.stat(file_path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = DEFAULT_FILE_MODE
+        os.chmod(temp_path, mode)
+        with os.fdopen(fd, 'wb' if isinstance(data, bytes) else 'w') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
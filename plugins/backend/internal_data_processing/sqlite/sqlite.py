@@ -0,0 +1,616 @@
+import asyncio
+import inspect
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+from core.backend.internal_data_processing_base import InternalDataProcessingBase
+from core.backend.pricing_data import PricingData
+from core.backend.session_log import parse_session_messages, serialize_session_messages
+from core.global_manager import GlobalManager
+from utils.plugin_manager.plugin_manager import PluginManager
+
+SQLITE = "SQLITE"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS data_files (
+    container TEXT NOT NULL,
+    name TEXT NOT NULL,
+    content BLOB,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (container, name)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS session_messages (
+    container TEXT NOT NULL,
+    session TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT,
+    message TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (container, session, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS costs (
+    container TEXT NOT NULL,
+    name TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    total_cost REAL NOT NULL DEFAULT 0,
+    input_cost REAL NOT NULL DEFAULT 0,
+    output_cost REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (container, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS costs_by_channel ON costs (container, channel_id);
+
+CREATE TABLE IF NOT EXISTS flags (
+    container TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    expires_at REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (container, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS flags_by_expiry ON flags (expires_at) WHERE expires_at IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS unmentioned_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel_id TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS unmentioned_messages_by_thread ON unmentioned_messages (channel_id, thread_id);
+"""
+
+# Unmentioned messages of a thread, named like the files of the other backends
+UNMENTIONED_MESSAGES_FILE = "'unmentioned_messages_' || channel_id || '_' || thread_id || '.json'"
+
+class SqliteConfig(BaseModel):
+    PLUGIN_NAME: str
+    DATABASE_PATH: str
+    SESSIONS_CONTAINER: str
+    MESSAGES_CONTAINER: str
+    FEEDBACKS_CONTAINER: str
+    CONCATENATE_CONTAINER: str
+    PROMPTS_CONTAINER: str
+    COSTS_CONTAINER: str
+    PROCESSING_CONTAINER: str
+    ABORT_CONTAINER: str
+    VECTORS_CONTAINER: str
+    IMAGES_CONTAINER: str = "images"
+    # Seconds a statement waits for a lock held by another process before failing
+    BUSY_TIMEOUT: float = 5.0
+
+class SqlitePlugin(InternalDataProcessingBase):
+    """
+    Internal data stored in a local SQLite database in WAL mode.
+
+    Sessions, costs, flags and unmentioned messages have tables of their own,
+    indexed for the queries made on them. The other containers share a table of
+    data files keyed by container and name. Every statement runs on a single
+    database thread, each operation in one transaction.
+    """
+
+    def __init__(self, global_manager: GlobalManager):
+        super().__init__(global_manager)
+        self.logger = global_manager.logger
+        self.global_manager = global_manager
+        self.plugin_manager : PluginManager = global_manager.plugin_manager
+        config_dict = global_manager.config_manager.config_model.PLUGINS.BACKEND.INTERNAL_DATA_PROCESSING[SQLITE]
+        self.sqlite_config = SqliteConfig(**config_dict)
+
+        self.plugin_name = None
+        self.database_path = None
+        self.sessions_container = None
+        self.messages_container = None
+        self.feedbacks_container = None
+        self.concatenate_container = None
+        self.prompts_container = None
+        self.costs_container = None
+        self.processing_container = None
+        self.abort_container = None
+        self.vectors_container = None
+        self.images_container = None
+        self.executor = None
+        self.connection = None
+
+    @property
+    def plugin_name(self):
+        return "sqlite"
+
+    @plugin_name.setter
+    def plugin_name(self, value):
+        self._plugin_name = value
+
+    @property
+    def sessions(self):
+        # Implement the sessions property
+        return self.sessions_container
+
+    @property
+    def messages(self):
+        # Implement the messages property
+        return self.messages_container
+
+    @property
+    def feedbacks(self):
+        # Implement the feedbacks property
+        return self.feedbacks_container
+
+    @property
+    def concatenate(self):
+        # Implement the concatenate property
+        return self.concatenate_container
+
+    @property
+    def prompts(self):
+        # Implement the prompts property
+        return self.prompts_container
+
+    @property
+    def costs(self):
+        # Implement the costs property
+        return self.costs_container
+
+    @property
+    def processing(self):
+        # Implement the processing property
+        return self.processing_container
+
+    @property
+    def abort(self):
+        # Implement the abort property
+        return self.abort_container
+
+    @property
+    def vectors(self):
+        # Implement the vectors property
+        return self.vectors_container
+
+    @property
+    def images(self):
+        # Implement the images property
+        return self.images_container
+
+    def initialize(self):
+        self.logger.debug("Initializing SQLite database")
+        self.database_path = self.sqlite_config.DATABASE_PATH
+        self.sessions_container = self.sqlite_config.SESSIONS_CONTAINER
+        self.messages_container = self.sqlite_config.MESSAGES_CONTAINER
+        self.feedbacks_container = self.sqlite_config.FEEDBACKS_CONTAINER
+        self.concatenate_container = self.sqlite_config.CONCATENATE_CONTAINER
+        self.prompts_container = self.sqlite_config.PROMPTS_CONTAINER
+        self.costs_container = self.sqlite_config.COSTS_CONTAINER
+        self.processing_container = self.sqlite_config.PROCESSING_CONTAINER
+        self.abort_container = self.sqlite_config.ABORT_CONTAINER
+        self.vectors_container = self.sqlite_config.VECTORS_CONTAINER
+        self.images_container = self.sqlite_config.IMAGES_CONTAINER
+        self.plugin_name = self.sqlite_config.PLUGIN_NAME
+
+        # sqlite3 connections belong to the thread that opened them, all statements run on this one
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        try:
+            self.executor.submit(self.connect).result()
+        except Exception as e:
+            self.initialization_failed = True
+            self.logger.exception(f"Failed to open SQLite database {self.database_path}: {str(e)}")
+
+    def connect(self):
+        directory = os.path.dirname(self.database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Transactions are started explicitly, see transaction()
+        connection = sqlite3.connect(self.database_path, timeout=self.sqlite_config.BUSY_TIMEOUT, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Safe in WAL mode, a commit no longer waits for a sync of the database file
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        self.connection = connection
+
+    async def run(self, func, *args):
+        if self.executor is None:
+            raise RuntimeError("The SQLite database is closed")
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.transaction, func, *args)
+
+    def transaction(self, func, *args):
+        # Taking the write lock first keeps reads and the writes depending on them atomic across processes
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(self.connection, *args)
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+        return result
+
+    async def close(self):
+        if self.executor is not None:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._close)
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def _close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def validate_request(self, request):
+        raise NotImplementedError(f"{self.__class__.__name__}.{inspect.currentframe().f_code.co_name} is not implemented")
+
+    def handle_request(self, request):
+        raise NotImplementedError(f"{self.__class__.__name__}.{inspect.currentframe().f_code.co_name} is not implemented")
+
+    def is_flags_container(self, data_container):
+        return data_container in (self.processing_container, self.abort_container)
+
+    @staticmethod
+    def channel_of(datafile_name):
+        # Cost files are named <channel id>-<thread id>.txt
+        return datafile_name.split('-', 1)[0]
+
+    @staticmethod
+    def flag_expiry(value):
+        # Flags written by the backend flag store carry their expiry date
+        try:
+            expires_at = json.loads(value).get("expires_at")
+        except (ValueError, TypeError, AttributeError):
+            return None
+        return expires_at if isinstance(expires_at, (int, float)) else None
+
+    @staticmethod
+    def pricing_to_dict(row) -> Dict:
+        keys = ("total_tokens", "prompt_tokens", "completion_tokens", "total_cost", "input_cost", "output_cost")
+        return dict(zip(keys, row))
+
+    def append_data(self, container_name: str, data_identifier: str, data: str):
+        try:
+            if self.executor is None:
+                raise RuntimeError("The SQLite database is closed")
+            self.executor.submit(self.transaction, self._append_data, container_name, data_identifier, data).result()
+            self.logger.info("Data appended to the file.")
+        except Exception as e:
+            self.logger.error(f"Failed to append data to the file: {e}")
+
+    def _append_data(self, connection, container_name, data_identifier, data):
+        connection.execute(
+            "INSERT INTO data_files (container, name, content, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (container, name) DO UPDATE SET content = CAST(content AS TEXT) || excluded.content, "
+            "version = version + 1, updated_at = excluded.updated_at",
+            (container_name, data_identifier, data, time.time()),
+        )
+
+    async def read_data_content(self, data_container, data_file):
+        try:
+            return await self.run(self._read_data_content, data_container, data_file)
+        except Exception as e:
+            self.logger.error(f"Failed to read data content {data_file} from {data_container}: {str(e)}")
+            return None
+
+    def _read_data_content(self, connection, data_container, data_file):
+        if data_container == self.sessions_container:
+            messages = self._read_session_messages(connection, data_container, data_file)
+            if messages:
+                return serialize_session_messages(messages)
+        elif data_container == self.costs_container:
+            row = connection.execute(
+                "SELECT total_tokens, prompt_tokens, completion_tokens, total_cost, input_cost, output_cost FROM costs WHERE container = ? AND name = ?",
+                (data_container, data_file),
+            ).fetchone()
+            return json.dumps(self.pricing_to_dict(row)) if row else None
+        elif self.is_flags_container(data_container):
+            row = connection.execute("SELECT value FROM flags WHERE container = ? AND name = ?", (data_container, data_file)).fetchone()
+            return row[0] if row else None
+
+        row = connection.execute("SELECT content FROM data_files WHERE container = ? AND name = ?", (data_container, data_file)).fetchone()
+        if row is None:
+            self.logger.debug(f"File not found: {data_file}")
+            return None
+        content = row[0]
+        return content.decode('utf-8') if isinstance(content, bytes) else content
+
+    async def read_many(self, data_files, return_exceptions: bool = False):
+        # One executor job and one transaction for every file
+        data_files = list(data_files)
+        try:
+            return await self.run(self._read_many, data_files)
+        except Exception as e:
+            self.logger.error(f"Failed to read {len(data_files)} files: {str(e)}")
+            return [None] * len(data_files)
+
+    def _read_many(self, connection, data_files):
+        return [self._read_data_content(connection, data_container, data_file) for data_container, data_file in data_files]
+
+    async def read_data_buffer(self, data_container, data_file):
+        try:
+            content = await self.run(self._read_data_buffer, data_container, data_file)
+        except Exception as e:
+            self.logger.error(f"Failed to read data buffer {data_file} from {data_container}: {str(e)}")
+            return None
+        if content is None:
+            self.logger.debug(f"File not found: {data_file}")
+        return content
+
+    def _read_data_buffer(self, connection, data_container, data_file):
+        row = connection.execute("SELECT content FROM data_files WHERE container = ? AND name = ?", (data_container, data_file)).fetchone()
+        if row is None:
+            return None
+        content = row[0]
+        return content.encode('utf-8') if isinstance(content, str) else content
+
+    async def write_data_content(self, data_container, data_file, data):
+        try:
+            await self.run(self._write_data_content, data_container, data_file, data)
+            self.logger.debug("Data successfully written")
+        except Exception as e:
+            self.logger.error(f"Failed to write data content {data_file} to {data_container}: {str(e)}")
+
+    def _write_data_content(self, connection, data_container, data_file, data):
+        now = time.time()
+        if self.is_flags_container(data_container):
+            connection.execute(
+                "INSERT INTO flags (container, name, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (container, name) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at, updated_at = excluded.updated_at",
+                (data_container, data_file, data, self.flag_expiry(data), now),
+            )
+            return
+        connection.execute(
+            "INSERT INTO data_files (container, name, content, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (container, name) DO UPDATE SET content = excluded.content, version = version + 1, updated_at = excluded.updated_at",
+            (data_container, data_file, data, now),
+        )
+
+    async def write_many(self, data_files):
+        data_files = list(data_files)
+        try:
+            await self.run(self._write_many, data_files)
+            self.logger.debug(f"{len(data_files)} files successfully written")
+        except Exception as e:
+            self.logger.error(f"Failed to write {len(data_files)} files: {str(e)}")
+
+    def _write_many(self, connection, data_files):
+        for data_container, data_file, data in data_files:
+            self._write_data_content(connection, data_container, data_file, data)
+
+    async def remove_data_content(self, data_container, data_file):
+        try:
+            await self.run(self._remove_data_content, data_container, data_file)
+        except Exception as e:
+            self.logger.error(f"Failed to delete {data_file} from {data_container}: {str(e)}")
+            return None
+
+    def _remove_data_content(self, connection, data_container, data_file):
+        self.logger.debug(f"Removing data content from {data_file} in {data_container}")
+        if data_container == self.sessions_container:
+            connection.execute("DELETE FROM session_messages WHERE container = ? AND session = ?", (data_container, data_file))
+        elif data_container == self.costs_container:
+            connection.execute("DELETE FROM costs WHERE container = ? AND name = ?", (data_container, data_file))
+        elif self.is_flags_container(data_container):
+            connection.execute("DELETE FROM flags WHERE container = ? AND name = ?", (data_container, data_file))
+        elif data_container == self.messages_container:
+            connection.execute(f"DELETE FROM unmentioned_messages WHERE {UNMENTIONED_MESSAGES_FILE} = ?", (data_file,))
+        connection.execute("DELETE FROM data_files WHERE container = ? AND name = ?", (data_container, data_file))
+
+    async def list_stale_files(self, data_container, older_than):
+        try:
+            return await self.run(self._list_stale_files, data_container, older_than)
+        except Exception as e:
+            self.logger.error(f"An error occurred while listing stale files: {e}")
+            return []
+
+    def _list_stale_files(self, connection, data_container, older_than):
+        queries = [("SELECT name, LENGTH(content) FROM data_files WHERE container = ? AND updated_at < ?", (data_container, older_than))]
+        if data_container == self.sessions_container:
+            queries.append((
+                "SELECT session, SUM(LENGTH(message)) FROM session_messages WHERE container = ? GROUP BY session HAVING MAX(updated_at) < ?",
+                (data_container, older_than),
+            ))
+        elif data_container == self.costs_container:
+            queries.append(("SELECT name, 0 FROM costs WHERE container = ? AND updated_at < ?", (data_container, older_than)))
+        elif self.is_flags_container(data_container):
+            queries.append(("SELECT name, LENGTH(value) FROM flags WHERE container = ? AND updated_at < ?", (data_container, older_than)))
+        elif data_container == self.messages_container:
+            queries.append((
+                f"SELECT {UNMENTIONED_MESSAGES_FILE}, SUM(LENGTH(message)) FROM unmentioned_messages GROUP BY channel_id, thread_id HAVING MAX(created_at) < ?",
+                (older_than,),
+            ))
+        return [(row[0], row[1] or 0) for query, parameters in queries for row in connection.execute(query, parameters)]
+
+    async def remove_many(self, data_container, data_files):
+        try:
+            return await self.run(self._remove_many, data_container, list(data_files))
+        except Exception as e:
+            self.logger.error(f"Failed to delete files from {data_container}: {str(e)}")
+            return 0
+
+    def _remove_many(self, connection, data_container, data_files):
+        removed = 0
+        for data_file in data_files:
+            changes = connection.total_changes
+            self._remove_data_content(connection, data_container, data_file)
+            removed += connection.total_changes > changes
+        return removed
+
+    async def get_data_version(self, data_container, data_file):
+        try:
+            return await self.run(self._get_data_version, data_container, data_file)
+        except Exception as e:
+            self.logger.error(f"Failed to read the version of {data_file} in {data_container}: {str(e)}")
+            return None
+
+    def _get_data_version(self, connection, data_container, data_file):
+        row = connection.execute("SELECT version, updated_at FROM data_files WHERE container = ? AND name = ?", (data_container, data_file)).fetchone()
+        if row is None and data_container == self.sessions_container:
+            # The last change and the last sequence number identify the content of a session
+            row = connection.execute("SELECT MAX(seq), MAX(updated_at) FROM session_messages WHERE container = ? AND session = ?", (data_container, data_file)).fetchone()
+            row = row if row[0] is not None else None
+        if row is None:
+            self.logger.debug(f"File not found: {data_file}")
+            return None
+        return f"{row[1]!r}-{row[0]}"
+
+    async def list_container_files(self, container_name):
+        try:
+            return await self.run(self._list_container_files, container_name)
+        except Exception as e:
+            self.logger.error(f"An error occurred while listing files: {e}")
+            return []
+
+    def _list_container_files(self, connection, container_name):
+        names = [row[0] for row in connection.execute("SELECT name FROM data_files WHERE container = ? ORDER BY name", (container_name,))]
+        if container_name == self.sessions_container:
+            names += [row[0] for row in connection.execute("SELECT DISTINCT session FROM session_messages WHERE container = ? ORDER BY session", (container_name,))]
+        elif container_name == self.costs_container:
+            names += [row[0] for row in connection.execute("SELECT name FROM costs WHERE container = ? ORDER BY name", (container_name,))]
+        elif self.is_flags_container(container_name):
+            names += [row[0] for row in connection.execute("SELECT name FROM flags WHERE container = ? ORDER BY name", (container_name,))]
+        # Names are returned without extension, like the file based backends
+        return [os.path.splitext(name)[0] for name in names]
+
+    async def store_unmentioned_messages(self, channel_id, thread_id, message):
+        try:
+            await self.run(self._store_unmentioned_messages, channel_id, thread_id, message)
+            self.logger.debug("Message successfully stored")
+        except Exception as e:
+            self.logger.error(f"Failed to store unmentioned message: {str(e)}")
+
+    def _store_unmentioned_messages(self, connection, channel_id, thread_id, message):
+        connection.execute(
+            "INSERT INTO unmentioned_messages (channel_id, thread_id, message, created_at) VALUES (?, ?, ?, ?)",
+            (channel_id, thread_id, json.dumps(message), time.time()),
+        )
+
+    async def retrieve_unmentioned_messages(self, channel_id, thread_id):
+        try:
+            return await self.run(self._retrieve_unmentioned_messages, channel_id, thread_id)
+        except Exception as e:
+            self.logger.error(f"Failed to retrieve or delete messages: {str(e)}")
+            return []
+
+    def _retrieve_unmentioned_messages(self, connection, channel_id, thread_id):
+        rows = connection.execute(
+            "SELECT message FROM unmentioned_messages WHERE channel_id = ? AND thread_id = ? ORDER BY id",
+            (channel_id, thread_id),
+        ).fetchall()
+        # Messages are consumed by the read, in the same immediate transaction
+        connection.execute("DELETE FROM unmentioned_messages WHERE channel_id = ? AND thread_id = ?", (channel_id, thread_id))
+        return [json.loads(row[0]) for row in rows]
+
+    async def update_pricing(self, container_name, datafile_name, pricing_data):
+        try:
+            return await self.run(self._update_pricing, container_name, datafile_name, pricing_data)
+        except Exception as e:
+            self.logger.error(f"Failed to update pricing {datafile_name} in {container_name}: {str(e)}")
+            return PricingData()
+
+    def _update_pricing(self, connection, container_name, datafile_name, pricing_data):
+        connection.execute(
+            "INSERT INTO costs (container, name, channel_id, total_tokens, prompt_tokens, completion_tokens, total_cost, input_cost, output_cost, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (container, name) DO UPDATE SET "
+            "total_tokens = total_tokens + excluded.total_tokens, prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+            "completion_tokens = completion_tokens + excluded.completion_tokens, total_cost = total_cost + excluded.total_cost, "
+            "input_cost = input_cost + excluded.input_cost, output_cost = output_cost + excluded.output_cost, updated_at = excluded.updated_at",
+            (
+                container_name, datafile_name, self.channel_of(datafile_name),
+                pricing_data.total_tokens, pricing_data.prompt_tokens, pricing_data.completion_tokens,
+                pricing_data.total_cost, pricing_data.input_cost, pricing_data.output_cost, time.time(),
+            ),
+        )
+        row = connection.execute(
+            "SELECT total_tokens, prompt_tokens, completion_tokens, total_cost, input_cost, output_cost FROM costs WHERE container = ? AND name = ?",
+            (container_name, datafile_name),
+        ).fetchone()
+        self.logger.debug("Pricing update completed")
+        return PricingData(**self.pricing_to_dict(row))
+
+    async def get_costs_by_channel(self, container_name = None) -> Dict[str, PricingData]:
+        """
+        Cumulated costs of every channel, read from the index of the costs table.
+        """
+        try:
+            return await self.run(self._get_costs_by_channel, container_name or self.costs_container)
+        except Exception as e:
+            self.logger.error(f"Failed to read costs by channel: {str(e)}")
+            return {}
+
+    def _get_costs_by_channel(self, connection, container_name):
+        rows = connection.execute(
+            "SELECT channel_id, SUM(total_tokens), SUM(prompt_tokens), SUM(completion_tokens), SUM(total_cost), SUM(input_cost), SUM(output_cost) "
+            "FROM costs WHERE container = ? GROUP BY channel_id ORDER BY channel_id",
+            (container_name,),
+        )
+        return {row[0]: PricingData(**self.pricing_to_dict(row[1:])) for row in rows}
+
+    async def update_prompt_system_message(self, channel_id, thread_id, message):
+        try:
+            await self.run(self._update_prompt_system_message, channel_id, thread_id, message)
+        except Exception as e:
+            self.logger.error(f"Failed to update prompt system message: {str(e)}")
+
+    def _update_prompt_system_message(self, connection, channel_id, thread_id, message):
+        self.logger.debug(f"Updating prompt system message for channel {channel_id}, thread {thread_id}")
+        session = f"{channel_id}-{thread_id}.txt"
+        row = connection.execute(
+            "SELECT seq, message FROM session_messages WHERE container = ? AND session = ? AND role = 'system' ORDER BY seq LIMIT 1",
+            (self.sessions_container, session),
+        ).fetchone()
+        if row is None:
+            self.logger.warning("System role not found in session")
+            return
+        system_message = json.loads(row[1])
+        system_message['content'] = message
+        connection.execute(
+            "UPDATE session_messages SET message = ?, updated_at = ? WHERE container = ? AND session = ? AND seq = ?",
+            (json.dumps(system_message), time.time(), self.sessions_container, session, row[0]),
+        )
+        self.logger.info("Prompt system message update completed successfully")
+
+    async def update_session(self, data_container, data_file, role, content):
+        self.logger.debug(f"Updating session for file {data_file} in container {data_container}")
+        await self.append_session_messages(data_container, data_file, [{"role": role, "content": content}])
+        self.logger.debug(f"Appended new role/content: {role}/{content}")
+
+    async def append_session_messages(self, data_container, data_file, messages):
+        try:
+            await self.run(self._append_session_messages, data_container, data_file, list(messages))
+            self.logger.debug(f"Appended {len(messages)} messages to session {data_file}")
+        except Exception as e:
+            self.logger.error(f"Failed to append to session: {str(e)}")
+
+    def _append_session_messages(self, connection, data_container, data_file, messages):
+        if not messages:
+            return
+        now = time.time()
+        # The sequence number is assigned by the insert itself
+        connection.executemany(
+            "INSERT INTO session_messages (container, session, seq, role, message, updated_at) "
+            "SELECT ?, ?, COALESCE(MAX(seq), -1) + 1, ?, ?, ? FROM session_messages WHERE container = ? AND session = ?",
+            [
+                (data_container, data_file, message.get('role'), json.dumps(message), now, data_container, data_file)
+                for message in messages
+            ],
+        )
+
+    async def read_session_messages(self, data_container, data_file):
+        try:
+            return await self.run(self._read_session_messages, data_container, data_file)
+        except Exception as e:
+            self.logger.error(f"Failed to read session: {str(e)}")
+            return []
+
+    def _read_session_messages(self, connection, data_container, data_file) -> List[dict]:
+        rows = connection.execute(
+            "SELECT message FROM session_messages WHERE container = ? AND session = ? ORDER BY seq",
+            (data_container, data_file),
+        ).fetchall()
+        return parse_session_messages("".join(row[0] + "\n" for row in rows)) if rows else []
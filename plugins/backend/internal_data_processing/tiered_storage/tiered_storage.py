@@ -0,0 +1,493 @@
+import asyncio
+import inspect
+import os
+import traceback
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from core.backend.compression import decode_content, decode_segments
+from core.backend.internal_data_processing_base import InternalDataProcessingBase
+from core.backend.session_log import parse_session_messages
+from core.global_manager import GlobalManager
+from plugins.backend.internal_data_processing.azure_blob_storage.azure_blob_storage import (
+    AzureBlobStoragePlugin,
+)
+from plugins.backend.internal_data_processing.file_system.file_system import (
+    FileSystemPlugin,
+)
+from utils.plugin_manager.plugin_manager import PluginManager
+
+TIERED_STORAGE = "TIERED_STORAGE"
+# Containers only changed through reads, writes, appends and removals, which the local tier can mirror
+CACHEABLE_CONTAINERS = ("SESSIONS", "PROMPTS", "FEEDBACKS", "CONCATENATE", "IMAGES", "VECTORS")
+CONTAINER_SETTINGS = (
+    "SESSIONS_CONTAINER", "MESSAGES_CONTAINER", "FEEDBACKS_CONTAINER", "CONCATENATE_CONTAINER", "PROMPTS_CONTAINER",
+    "COSTS_CONTAINER", "PROCESSING_CONTAINER", "ABORT_CONTAINER", "VECTORS_CONTAINER", "IMAGES_CONTAINER",
+)
+
+class TieredStorageConfig(BaseModel):
+    PLUGIN_NAME: str
+    SESSIONS_CONTAINER: str
+    MESSAGES_CONTAINER: str
+    FEEDBACKS_CONTAINER: str
+    CONCATENATE_CONTAINER: str
+    PROMPTS_CONTAINER: str
+    COSTS_CONTAINER: str
+    PROCESSING_CONTAINER: str
+    ABORT_CONTAINER: str
+    VECTORS_CONTAINER: str
+    IMAGES_CONTAINER: str = "images"
+    # Directory of the local tier and the size above which its least recently used files are evicted
+    LOCAL_DIRECTORY: str
+    LOCAL_MAX_SIZE: int = 1024 * 1024 * 1024
+    # Containers served from the local tier, the others are read and written in blob storage only
+    CACHED_CONTAINERS: List[str] = ["SESSIONS", "PROMPTS", "FEEDBACKS", "IMAGES"]
+    # Containers copied to the local tier at startup
+    WARM_UP_CONTAINERS: List[str] = ["PROMPTS", "FEEDBACKS"]
+    UPLOAD_CONCURRENCY: int = 8
+    UPLOAD_RETRY_DELAY: float = 5
+    # Azure Blob Storage settings of the remote tier: CONNECTION_STRING, CONNECTION_POOL_SIZE, COMPRESSION...
+    REMOTE: Dict[str, Any]
+
+class PendingUpload:
+    """
+    Changes of a data file not yet applied to blob storage, merged so that
+    a file written several times is uploaded once.
+    """
+
+    def __init__(self, kind: str, data=None, messages=None, reset: bool = False):
+        # "write" uploads data, "append" appends messages to a session, "remove" deletes the blob
+        self.kind = kind
+        self.data = data
+        self.messages = messages or []
+        # The blob is deleted before the messages are appended
+        self.reset = reset
+
+    def merge(self, later: "PendingUpload") -> "PendingUpload":
+        if later.kind != "append":
+            return later
+        if self.kind == "append":
+            return PendingUpload("append", messages=self.messages + later.messages, reset=self.reset or later.reset)
+        if self.kind == "remove":
+            return PendingUpload("append", messages=later.messages, reset=True)
+        # A session written whole, its latest content is in the local tier
+        return PendingUpload("write", data=None)
+
+class TieredStoragePlugin(InternalDataProcessingBase):
+    """
+    Local disk in front of Azure Blob Storage, which stays the source of truth.
+
+    Files of the cached containers are read from disk once copied there, and
+    written to disk first then uploaded in the background. A file with pending
+    uploads is flushed before blob storage is read for it. One process should
+    own a local directory: changes made to the blobs by other processes are
+    only seen by this one once the file is evicted. Files left by a previous
+    run count towards the size bound and are copied again before being used.
+    """
+
+    def __init__(self, global_manager: GlobalManager):
+        super().__init__(global_manager)
+        self.logger = global_manager.logger
+        self.global_manager = global_manager
+        self.plugin_manager : PluginManager = global_manager.plugin_manager
+        config_dict = global_manager.config_manager.config_model.PLUGINS.BACKEND.INTERNAL_DATA_PROCESSING[TIERED_STORAGE]
+        self.tiered_storage_config = TieredStorageConfig(**config_dict)
+
+        containers = {setting: getattr(self.tiered_storage_config, setting) for setting in CONTAINER_SETTINGS}
+        plugin_name = self.tiered_storage_config.PLUGIN_NAME
+        self.local = FileSystemPlugin(global_manager, {
+            **containers, "PLUGIN_NAME": plugin_name, "DIRECTORY": self.tiered_storage_config.LOCAL_DIRECTORY,
+        })
+        self.remote = AzureBlobStoragePlugin(global_manager, {
+            **self.tiered_storage_config.REMOTE, **containers, "PLUGIN_NAME": plugin_name,
+        })
+
+        self.plugin_name = None
+        self.cached_containers = set()
+        # Files present in the local tier with their size, least recently used first
+        self.local_files: "OrderedDict[tuple, int]" = OrderedDict()
+        self.local_size = 0
+        # Files found in the local tier at startup, blob storage may have changed since they were copied
+        self.unverified = set()
+        self.pending: Dict[tuple, PendingUpload] = {}
+        self.scheduled = set()
+        self.uploading = set()
+        self.upload_tasks = set()
+        self.upload_locks = weakref.WeakValueDictionary()
+        self.upload_semaphore = None
+        self.warm_up_task = None
+
+    @property
+    def plugin_name(self):
+        return "tiered_storage"
+
+    @plugin_name.setter
+    def plugin_name(self, value):
+        self._plugin_name = value
+
+    @property
+    def sessions(self):
+        return self.remote.sessions
+
+    @property
+    def messages(self):
+        return self.remote.messages
+
+    @property
+    def feedbacks(self):
+        return self.remote.feedbacks
+
+    @property
+    def concatenate(self):
+        return self.remote.concatenate
+
+    @property
+    def prompts(self):
+        return self.remote.prompts
+
+    @property
+    def costs(self):
+        return self.remote.costs
+
+    @property
+    def processing(self):
+        return self.remote.processing
+
+    @property
+    def abort(self):
+        return self.remote.abort
+
+    @property
+    def vectors(self):
+        return self.remote.vectors
+
+    @property
+    def images(self):
+        return self.remote.images
+
+    def initialize(self):
+        self.logger.debug("Initializing tiered storage")
+        self.plugin_name = self.tiered_storage_config.PLUGIN_NAME
+        self.local.initialize()
+        self.remote.initialize()
+        if getattr(self.remote, "initialization_failed", False):
+            self.initialization_failed = True
+
+        for container_property in self.tiered_storage_config.CACHED_CONTAINERS:
+            if container_property.upper() not in CACHEABLE_CONTAINERS:
+                self.logger.error(f"The '{container_property}' container cannot be cached locally, expected one of {', '.join(CACHEABLE_CONTAINERS)}")
+                continue
+            container = getattr(self, container_property.lower())
+            os.makedirs(os.path.join(self.local.root_directory, container), exist_ok=True)
+            self.cached_containers.add(container)
+        self.scan_local_tier()
+
+    def scan_local_tier(self):
+        """
+        Track the files of the cached containers already on disk, least recently written first.
+        """
+        found = []
+        for container in self.cached_containers:
+            container_directory = os.path.join(self.local.root_directory, container)
+            for directory, _, file_names in os.walk(container_directory):
+                for file_name in file_names:
+                    # Temporary files of interrupted writes are not data files
+                    if file_name.startswith(".") and file_name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(directory, file_name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    found.append((stat.st_mtime, container, os.path.relpath(path, container_directory), stat.st_size))
+        for _, container, data_file, size in sorted(found):
+            self.local_files[(container, data_file)] = size
+            self.local_size += size
+            self.unverified.add((container, data_file))
+        if found:
+            self.logger.info(f"Tiered storage: {len(found)} files ({self.local_size} bytes) found in the local tier")
+
+    async def start(self):
+        # Called by the dispatcher once the event loop runs
+        await self.evict()
+        if self.warm_up_task is None:
+            self.warm_up_task = asyncio.create_task(self.warm_up())
+
+    def validate_request(self, request):
+        raise NotImplementedError(f"{self.__class__.__name__}.{inspect.currentframe().f_code.co_name} is not implemented")
+
+    def handle_request(self, request):
+        raise NotImplementedError(f"{self.__class__.__name__}.{inspect.currentframe().f_code.co_name} is not implemented")
+
+    def is_cached(self, data_container):
+        return data_container in self.cached_containers
+
+    async def warm_up(self):
+        """
+        Copy the blobs of the warm up containers to the local tier.
+        """
+        for container_property in self.tiered_storage_config.WARM_UP_CONTAINERS:
+            container = getattr(self, container_property.lower(), None)
+            if container not in self.cached_containers:
+                continue
+            try:
+                container_client = self.remote.blob_service_client.get_container_client(container)
+                names = [blob.name async for blob in container_client.list_blobs()]
+                await asyncio.gather(*(self.fetch(container, name) for name in names if not self.is_local(container, name)))
+                self.logger.info(f"Tiered storage: {len(names)} files of {container} copied to the local tier")
+            except Exception as e:
+                self.logger.error(f"Tiered storage: failed to warm up the {container} container: {str(e)}")
+
+    def local_path(self, data_container, data_file):
+        return os.path.join(self.local.root_directory, data_container, data_file)
+
+    def track(self, data_container, data_file):
+        key = (data_container, data_file)
+        try:
+            size = os.path.getsize(self.local_path(data_container, data_file))
+        except OSError:
+            self.forget(data_container, data_file)
+            return
+        self.local_size += size - self.local_files.get(key, 0)
+        self.local_files[key] = size
+        self.local_files.move_to_end(key)
+        self.unverified.discard(key)
+
+    def forget(self, data_container, data_file):
+        self.local_size -= self.local_files.pop((data_container, data_file), 0)
+        self.unverified.discard((data_container, data_file))
+
+    def is_local(self, data_container, data_file) -> bool:
+        key = (data_container, data_file)
+        return key in self.local_files and key not in self.unverified
+
+    def touch(self, data_container, data_file) -> bool:
+        if not self.is_local(data_container, data_file):
+            return False
+        self.local_files.move_to_end((data_container, data_file))
+        return True
+
+    async def evict(self):
+        # Files waiting for their upload stay, the local tier holds their only copy
+        for key in list(self.local_files):
+            if self.local_size <= self.tiered_storage_config.LOCAL_MAX_SIZE:
+                break
+            if key in self.pending or key in self.scheduled or key in self.uploading:
+                continue
+            self.forget(*key)
+            await self.local.remove_data_content(*key)
+
+    async def fetch(self, data_container, data_file) -> Optional[bytes]:
+        """
+        Copy a blob to the local tier as stored, compressed or not, and return it.
+        """
+        await self.upload((data_container, data_file))
+        data = await self.remote.read_data_buffer(data_container, data_file)
+        if data is None:
+            return None
+        data = bytes(data)
+        await self.local.write_data_content(data_container, data_file, data)
+        self.track(data_container, data_file)
+        await self.evict()
+        return data
+
+    async def read_local_buffer(self, data_container, data_file):
+        if self.touch(data_container, data_file):
+            data = await self.local.read_data_buffer(data_container, data_file)
+            if data is not None:
+                return data
+            self.forget(data_container, data_file)
+        return await self.fetch(data_container, data_file)
+
+    def enqueue(self, data_container, data_file, operation: PendingUpload):
+        key = (data_container, data_file)
+        previous = self.pending.get(key)
+        self.pending[key] = previous.merge(operation) if previous is not None else operation
+        if key not in self.scheduled:
+            self.scheduled.add(key)
+            self.start_upload(key)
+
+    def start_upload(self, key, delay: float = 0):
+        task = asyncio.create_task(self.scheduled_upload(key, delay))
+        self.upload_tasks.add(task)
+        task.add_done_callback(self.upload_tasks.discard)
+
+    async def scheduled_upload(self, key, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        if self.upload_semaphore is None:
+            self.upload_semaphore = asyncio.Semaphore(self.tiered_storage_config.UPLOAD_CONCURRENCY)
+        async with self.upload_semaphore:
+            # Changes made from now on need another upload
+            self.scheduled.discard(key)
+            await self.upload(key)
+
+    def upload_lock(self, key):
+        lock = self.upload_locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self.upload_locks[key] = lock
+        return lock
+
+    async def upload(self, key):
+        """
+        Apply the pending changes of a data file to blob storage, after those already in progress.
+        """
+        async with self.upload_lock(key):
+            operation = self.pending.pop(key, None)
+            if operation is None:
+                return
+            data_container, data_file = key
+            self.uploading.add(key)
+            try:
+                # The raising variants of the remote methods, a failed upload must be kept and retried
+                if operation.kind == "remove":
+                    await self.remote._remove_data_content(data_container, data_file)
+                elif operation.kind == "append":
+                    if operation.reset:
+                        await self.remote._remove_data_content(data_container, data_file)
+                    await self.remote._append_session_messages(data_container, data_file, operation.messages)
+                else:
+                    data = operation.data
+                    if data is None:
+                        data = await self.local.read_data_content(data_container, data_file)
+                        if data is None:
+                            raise FileNotFoundError(f"Local copy of {data_file} not found in {data_container}")
+                    await self.remote._write_data_content(data_container, data_file, data)
+                self.logger.debug(f"Tiered storage: {operation.kind} of {data_file} uploaded to {data_container}")
+            except Exception as e:
+                self.logger.error(f"Tiered storage: failed to upload {data_file} to {data_container}, retrying: {str(e)}")
+                self.logger.error(traceback.format_exc())
+                later = self.pending.get(key)
+                self.pending[key] = operation.merge(later) if later is not None else operation
+                if key not in self.scheduled:
+                    self.scheduled.add(key)
+                    self.start_upload(key, self.tiered_storage_config.UPLOAD_RETRY_DELAY)
+            finally:
+                self.uploading.discard(key)
+
+    async def flush(self):
+        """
+        Wait until every pending change is uploaded.
+        """
+        while self.pending or self.upload_tasks:
+            if self.upload_tasks:
+                await asyncio.gather(*list(self.upload_tasks), return_exceptions=True)
+            else:
+                await asyncio.gather(*(self.upload(key) for key in list(self.pending)))
+
+    async def flush_container(self, data_container):
+        await asyncio.gather(*(self.upload(key) for key in list(self.pending) if key[0] == data_container))
+
+    def append_data(self, container_name: str, data_identifier: str, data: str) -> None:
+        # Implementation for appending data to Azure Blob Storage
+        raise NotImplementedError(f"{self.__class__.__name__}.{inspect.currentframe().f_code.co_name} is not implemented")
+
+    async def read_data_content(self, data_container, data_file):
+        if not self.is_cached(data_container):
+            return await self.remote.read_data_content(data_container, data_file)
+        data = await self.read_local_buffer(data_container, data_file)
+        if data is None:
+            return None
+        try:
+            # Compressed blobs are copied as they are
+            return decode_content(bytes(data))
+        except Exception as e:
+            self.logger.error(f"Failed to read data content {data_file} from {data_container}: {str(e)}")
+            return None
+
+    async def read_data_buffer(self, data_container, data_file):
+        if not self.is_cached(data_container):
+            return await self.remote.read_data_buffer(data_container, data_file)
+        return await self.read_local_buffer(data_container, data_file)
+
+    async def write_data_content(self, data_container, data_file, data):
+        if not self.is_cached(data_container):
+            return await self.remote.write_data_content(data_container, data_file, data)
+        await self.local.write_data_content(data_container, data_file, data)
+        self.track(data_container, data_file)
+        self.enqueue(data_container, data_file, PendingUpload("write", data=data))
+        await self.evict()
+
+    async def remove_data_content(self, data_container, data_file):
+        if not self.is_cached(data_container):
+            return await self.remote.remove_data_content(data_container, data_file)
+        self.forget(data_container, data_file)
+        await self.local.remove_data_content(data_container, data_file)
+        self.enqueue(data_container, data_file, PendingUpload("remove"))
+
+    async def update_session(self, data_container, data_file, role, content):
+        self.logger.debug(f"Updating session for file {data_file} in container {data_container}")
+        await self.append_session_messages(data_container, data_file, [{"role": role, "content": content}])
+        self.logger.debug(f"Appended new role/content: {role}/{content}")
+
+    async def append_session_messages(self, data_container, data_file, messages):
+        if not self.is_cached(data_container):
+            return await self.remote.append_session_messages(data_container, data_file, messages)
+        # A session not in the local tier is copied there by its next read, with this append once uploaded
+        if self.touch(data_container, data_file):
+            await self.local.append_session_messages(data_container, data_file, messages)
+            self.track(data_container, data_file)
+        self.enqueue(data_container, data_file, PendingUpload("append", messages=list(messages)))
+        await self.evict()
+
+    async def read_session_messages(self, data_container, data_file):
+        if not self.is_cached(data_container):
+            return await self.remote.read_session_messages(data_container, data_file)
+        content = await self.read_local_buffer(data_container, data_file)
+        try:
+            # Local appends are plain, blobs copied from the remote tier may be compressed
+            return parse_session_messages(decode_segments(bytes(content)) if content else None)
+        except ValueError:
+            self.logger.error(f"Failed to decode session {data_file}")
+            return []
+
+    async def update_prompt_system_message(self, channel_id, thread_id, message):
+        # Rewritten in blob storage, then copied again by the next read
+        data_file = f"{channel_id}-{thread_id}.txt"
+        if self.is_cached(self.sessions):
+            await self.upload((self.sessions, data_file))
+            self.forget(self.sessions, data_file)
+            await self.local.remove_data_content(self.sessions, data_file)
+        await self.remote.update_prompt_system_message(channel_id, thread_id, message)
+
+    async def get_data_version(self, data_container, data_file):
+        await self.upload((data_container, data_file))
+        return await self.remote.get_data_version(data_container, data_file)
+
+    async def list_container_files(self, container_name):
+        await self.flush_container(container_name)
+        return await self.remote.list_container_files(container_name)
+
+    async def list_stale_files(self, data_container, older_than):
+        # Modification times are those of blob storage, the local tier only mirrors it
+        await self.flush_container(data_container)
+        return await self.remote.list_stale_files(data_container, older_than)
+
+    async def remove_many(self, data_container, data_files):
+        await self.flush_container(data_container)
+        if self.is_cached(data_container):
+            for data_file in data_files:
+                if (data_container, data_file) in self.local_files:
+                    self.forget(data_container, data_file)
+                    await self.local.remove_data_content(data_container, data_file)
+        return await self.remote.remove_many(data_container, data_files)
+
+    async def store_unmentioned_messages(self, channel_id, thread_id, message):
+        await self.remote.store_unmentioned_messages(channel_id, thread_id, message)
+
+    async def retrieve_unmentioned_messages(self, channel_id, thread_id):
+        return await self.remote.retrieve_unmentioned_messages(channel_id, thread_id)
+
+    async def update_pricing(self, container_name, datafile_name, pricing_data):
+        return await self.remote.update_pricing(container_name, datafile_name, pricing_data)
+
+    async def close(self):
+        # Pending uploads are written before the connections to blob storage are closed
+        if self.warm_up_task is not None and not self.warm_up_task.done():
+            self.warm_up_task.cancel()
+        await self.flush()
+        await self.remote.close()
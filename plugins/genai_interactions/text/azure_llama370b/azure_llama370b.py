@@ -1,6 +1,5 @@
 import asyncio
 import inspect
-import json
 import traceback
 from typing import Any
 
@@ -157,10 +156,7 @@ class AzureLlama370bPlugin(GenAIInteractionsTextPluginBase):
 
             # Update the session with the completion
             sessions = self.backend_internal_data_processing_dispatcher.sessions
-            messages = json.loads(await self.backend_internal_data_processing_dispatcher.read_data_content(sessions, blob_name) or "[]")
-            messages.append({"role": "assistant", "content": completion})
-            completion_json = json.dumps(messages)
-            await self.backend_internal_data_processing_dispatcher.write_data_content(sessions, blob_name, completion_json)
+            await self.backend_internal_data_processing_dispatcher.append_session_messages(sessions, blob_name, [{"role": "assistant", "content": completion}])
             return completion
 
         except Exception as e:
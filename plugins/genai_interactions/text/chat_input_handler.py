@@ -20,6 +20,8 @@ from core.user_interactions.incoming_notification_data_base import (
 from utils.config_manager.config_model import BotConfig
 from utils.plugin_manager.plugin_manager import PluginManager
 
+from .history_manager import HistoryManager
+
 
 class ChatInputHandler():
     def __init__(self, global_manager: GlobalManager, chat_plugin: GenAIInteractionsTextPluginBase):
@@ -32,6 +34,7 @@ class ChatInputHandler():
         self.user_interaction_dispatcher = self.global_manager.user_interactions_dispatcher
         self.genai_interactions_text_dispatcher = self.global_manager.genai_interactions_text_dispatcher
         self.backend_internal_data_processing_dispatcher = self.global_manager.backend_internal_data_processing_dispatcher
+        self.history_manager = HistoryManager(global_manager, chat_plugin)
 
     def initialize(self):
         self.genai_client = {}
@@ -51,8 +54,11 @@ class ChatInputHandler():
     async def handle_message_event(self, event_data: IncomingNotificationDataBase):
         try:
             feedbacks_container = self.backend_internal_data_processing_dispatcher.feedbacks
-            general_behavior_content = await self.backend_internal_data_processing_dispatcher.read_data_content(feedbacks_container, self.bot_config.FEEDBACK_GENERAL_BEHAVIOR)
-            await self.global_manager.prompt_manager.initialize()
+            # The general behavior feedback is read while the prompts are
+            general_behavior_content, _ = await asyncio.gather(
+                self.backend_internal_data_processing_dispatcher.read_data_content(feedbacks_container, self.bot_config.FEEDBACK_GENERAL_BEHAVIOR),
+                self.global_manager.prompt_manager.initialize(),
+            )
             init_prompt = f"{self.global_manager.prompt_manager.core_prompt}\n{self.global_manager.prompt_manager.main_prompt}"
             constructed_message = f"Timestamp: {str(event_data.converted_timestamp)}, [username]: {str(event_data.user_name)}, [user id]: {str(event_data.user_id)}, [user email]: {event_data.user_email}, [Directly mentioning you]: {str(event_data.is_mention)}, [message]: {str(event_data.text)}"
 
@@ -97,7 +103,9 @@ class ChatInputHandler():
             # Construct the blob name and retrieve the content
             blob_name = f"{event_data.channel_id}-{event_data.thread_id}.txt"
             sessions = self.backend_internal_data_processing_dispatcher.sessions
-            messages = json.loads(await self.backend_internal_data_processing_dispatcher.read_data_content(sessions, blob_name) or "[]")
+            messages = await self.backend_internal_data_processing_dispatcher.read_session_messages(sessions, blob_name)
+            # Messages past this point are new and will be appended to the session
+            session_length = len(messages)
 
             # Add new message to the JSON
             constructed_message = {
@@ -136,18 +144,18 @@ class ChatInputHandler():
             if not event_data.images and not event_data.files_content:
                 messages.append(constructed_message)
 
-            return await self.generate_response(event_data, messages)
+            return await self.generate_response(event_data, messages, session_length=session_length)
         except Exception as e:
             self.logger.error(f"Error while handling thread message event: {e}")
             raise
 
-    async def generate_response(self, event_data: IncomingNotificationDataBase, messages):
+    async def generate_response(self, event_data: IncomingNotificationDataBase, messages, session_length = 0):
         try:
             original_msg_ts = event_data.thread_id if event_data.thread_id else event_data.timestamp
             if event_data.is_mention or event_data.event_label == "message":
                 self.logger.info("GENAI CALL: Calling Generative AI completion for user input..")
                 await self.global_manager.user_interactions_behavior_dispatcher.begin_genai_completion(event_data, channel_id=event_data.channel_id, timestamp= event_data.timestamp)
-                completion = await self.call_completion(event_data.channel_id,original_msg_ts, messages, event_data)
+                completion = await self.call_completion(event_data.channel_id,original_msg_ts, messages, event_data, session_length=session_length)
                 await self.global_manager.user_interactions_behavior_dispatcher.end_genai_completion(event=event_data, channel_id=event_data.channel_id, timestamp= event_data.timestamp)
             return completion
         except Exception as e:
@@ -165,12 +173,19 @@ class ChatInputHandler():
             filtered_messages.append(message)
         return filtered_messages
 
-    async def call_completion(self, channel_id, thread_id, messages, event_data: IncomingNotificationDataBase):
+    async def call_completion(self, channel_id, thread_id, messages, event_data: IncomingNotificationDataBase, session_length = 0):
         # Define blob_name for session storage
         blob_name = f"{channel_id}-{thread_id}.txt"
 
+        # Long threads are sent as a summary followed by their most recent messages
+        completion_messages = await self.history_manager.fit(blob_name, messages, session_length, event_data)
+
+        # Sessions reference their images, only turns sent to a vision model need the image data back
+        if event_data.images:
+            completion_messages = await self.backend_internal_data_processing_dispatcher.rehydrate_session_images(completion_messages)
+
         try:
-            completion, genai_cost_base = await self.chat_plugin.generate_completion(messages, event_data)
+            completion, genai_cost_base = await self.chat_plugin.generate_completion(completion_messages, event_data)
         except asyncio.exceptions.CancelledError:
             await self.user_interaction_dispatcher.send_message(event=event_data, message="Task was cancelled", message_type=MessageType.COMMENT, is_internal=True)
             self.logger.error("Task was cancelled")
@@ -205,12 +220,11 @@ class ChatInputHandler():
             await self.user_interaction_dispatcher.send_message(event=event_data, message=f"An error occurred while converting the completion: {e}", message_type=MessageType.COMMENT, is_internal=True)
             return None
 
-        # Save the entire conversation to the session blob
+        # Append the new messages of this turn to the session blob
         messages.append({"role": "assistant", "content": completion})
-        completion_json = json.dumps(messages)
         sessions = self.backend_internal_data_processing_dispatcher.sessions
         self.logger.debug(f"conversation stored in {sessions} : {blob_name} ")
-        await self.backend_internal_data_processing_dispatcher.write_data_content(sessions, blob_name, completion_json)
+        await self.backend_internal_data_processing_dispatcher.append_session_messages(sessions, blob_name, messages[session_length:])
         return response_json
 
     async def handle_completion_errors(self, event_data, e):
@@ -328,10 +342,10 @@ class ChatInputHandler():
             output_cost = (completion_tk / 1000) * output_token_price
             total_cost = input_cost + output_cost
 
-            # Update the cost in blob and get the cumulative cost details
+            # Add the cost to the thread and get the cumulative cost details
             pricing_data = PricingData(total_tokens=total_tk, prompt_tokens=prompt_tk, completion_tokens=completion_tk, total_cost=total_cost, input_cost=input_cost, output_cost=output_cost)
 
-            updated_pricing_data = await self.backend_internal_data_processing_dispatcher.update_pricing(container_name=costs_blob_container_name, datafile_name=blob_name, pricing_data=pricing_data)
+            updated_pricing_data = await self.backend_internal_data_processing_dispatcher.increment_pricing(container_name=costs_blob_container_name, datafile_name=blob_name, pricing_data=pricing_data)
 
             cost_update_msg = (
                 f"🔹 Last: {total_tk} tk {total_cost:.2f}$ "
@@ -0,0 +1,188 @@
+import asyncio
+import copy
+import json
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+from core.backend.pricing_data import PricingData
+from core.genai_interactions.genai_interactions_text_plugin_base import (
+    GenAIInteractionsTextPluginBase,
+)
+from core.global_manager import GlobalManager
+from core.user_interactions.incoming_notification_data_base import (
+    IncomingNotificationDataBase,
+)
+
+# Local estimate of GPT-style tokenizers: about 4 characters of text per token,
+# a few tokens of chat formatting per message and a fixed cost per high detail image
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+IMAGE_TOKENS = 765
+
+SUMMARY_PROMPT = (
+    "You maintain the running summary of a conversation between users and an assistant. "
+    "Merge the previous summary with the new messages into a single concise summary in plain text. "
+    "Keep names, decisions, open questions, figures and anything the assistant committed to, drop greetings and repetitions."
+)
+
+def message_text(message: Dict) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") if part.get("type") == "text" else "[image]" for part in content if isinstance(part, dict))
+    return str(content) if content is not None else ""
+
+def count_tokens(message: Dict) -> int:
+    content = message.get("content")
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    if isinstance(content, list):
+        for part in content:
+            if isinstance(part, dict) and part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+            elif isinstance(part, dict):
+                tokens += math.ceil(len(part.get("text", "")) / CHARS_PER_TOKEN)
+    elif content is not None:
+        tokens += math.ceil(len(str(content)) / CHARS_PER_TOKEN)
+    return tokens
+
+class HistoryManager:
+    """
+    Fits the stored conversation of a thread into the token budget of the model.
+
+    The system prompt, the messages of the current turn and the most recent stored
+    messages are sent as they are. Older messages are replaced by a rolling summary,
+    kept next to the session and extended in the background once they leave the
+    recent window, so that summarization never delays a reply.
+    """
+
+    def __init__(self, global_manager: GlobalManager, chat_plugin: GenAIInteractionsTextPluginBase):
+        self.global_manager : GlobalManager = global_manager
+        self.logger = self.global_manager.logger
+        self.chat_plugin : GenAIInteractionsTextPluginBase = chat_plugin
+        self.backend_internal_data_processing_dispatcher = self.global_manager.backend_internal_data_processing_dispatcher
+        # Summaries being generated, by session, so that a thread is summarized once at a time
+        self.summary_tasks: Dict[str, asyncio.Task] = {}
+
+    def token_budget(self) -> int:
+        bot_config = self.global_manager.bot_config
+        budgets = getattr(bot_config, 'HISTORY_TOKEN_BUDGETS', None)
+        budget = budgets.get(self.chat_plugin.plugin_name) if isinstance(budgets, dict) else None
+        if budget is None:
+            budget = getattr(bot_config, 'HISTORY_TOKEN_BUDGET', 0)
+        return budget if isinstance(budget, int) else 0
+
+    def recent_messages(self) -> int:
+        recent_messages = getattr(self.global_manager.bot_config, 'HISTORY_RECENT_MESSAGES', 10)
+        return recent_messages if isinstance(recent_messages, int) else 10
+
+    @staticmethod
+    def summary_file(blob_name: str) -> str:
+        return f"{os.path.splitext(blob_name)[0]}.summary.json"
+
+    async def read_summary(self, blob_name: str) -> Tuple[int, Optional[str]]:
+        sessions = self.backend_internal_data_processing_dispatcher.sessions
+        content = await self.backend_internal_data_processing_dispatcher.read_data_content(sessions, self.summary_file(blob_name))
+        if not content:
+            return 0, None
+        try:
+            summary = json.loads(content)
+            return int(summary["covered"]), summary["summary"]
+        except (ValueError, TypeError, KeyError) as e:
+            self.logger.error(f"Invalid history summary for {blob_name}: {e}")
+            return 0, None
+
+    async def fit(self, blob_name: str, messages: List[Dict], session_length: int, event_data: IncomingNotificationDataBase) -> List[Dict]:
+        """
+        Return the messages to send for this turn, within the token budget of the model.
+
+        messages[:session_length] come from the stored session and may be summarized,
+        the following ones belong to the current turn and are always sent.
+        """
+        budget = self.token_budget()
+        counts = [count_tokens(message) for message in messages]
+        if budget <= 0 or sum(counts) <= budget:
+            return messages
+
+        start = 1 if messages and messages[0].get("role") == "system" else 0
+        session_length = max(start, min(session_length, len(messages)))
+        covered, summary = await self.read_summary(blob_name)
+        if not start <= covered <= session_length:
+            # The summary does not match this session, it is rebuilt from the beginning
+            covered, summary = start, None
+        covered = max(covered, start)
+
+        summary_message = None
+        if summary:
+            summary_text = f"Summary of the earlier part of this conversation: {summary}"
+            if start:
+                summary_message = {**messages[0], "content": f"{message_text(messages[0])}\n\n{summary_text}"}
+            else:
+                summary_message = {"role": "user", "content": summary_text}
+
+        used = sum(counts[:start]) + sum(counts[session_length:])
+        if summary_message is not None:
+            used += count_tokens(summary_message) - sum(counts[:start])
+
+        # Keep the most recent stored messages that fit, newest first
+        keep_from = session_length
+        while keep_from > covered and used + counts[keep_from - 1] <= budget:
+            keep_from -= 1
+            used += counts[keep_from]
+
+        recent_start = max(start, session_length - self.recent_messages())
+        summarize_to = max(recent_start, keep_from)
+        if summarize_to > covered:
+            self.schedule_summary(blob_name, messages, covered, summarize_to, summary, event_data, budget)
+
+        if keep_from > covered:
+            self.logger.debug(f"History of {blob_name}: {keep_from - covered} messages left out until they are summarized")
+
+        head = [summary_message] if summary_message is not None else messages[:start]
+        return head + messages[keep_from:]
+
+    def schedule_summary(self, blob_name: str, messages: List[Dict], covered: int, summarize_to: int, summary: Optional[str], event_data: IncomingNotificationDataBase, budget: int):
+        task = self.summary_tasks.get(blob_name)
+        if task is not None and not task.done():
+            return
+
+        # A long backlog is summarized over several turns, each pass staying within half the budget
+        chunk = []
+        chunk_tokens = 0
+        for message in messages[covered:summarize_to]:
+            tokens = count_tokens(message)
+            if chunk and chunk_tokens + tokens > budget // 2:
+                break
+            chunk.append(message)
+            chunk_tokens += tokens
+
+        task = asyncio.create_task(self.summarize(blob_name, chunk, covered + len(chunk), summary, event_data))
+        self.summary_tasks[blob_name] = task
+        task.add_done_callback(lambda done: self.summary_tasks.pop(blob_name, None) if self.summary_tasks.get(blob_name) is done else None)
+
+    async def summarize(self, blob_name: str, chunk: List[Dict], covered: int, summary: Optional[str], event_data: IncomingNotificationDataBase):
+        try:
+            transcript = "\n".join(f"{message.get('role')}: {message_text(message)}" for message in chunk)
+            summary_messages = [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Previous summary: {summary or 'None'}\n\nNew messages:\n{transcript}"},
+            ]
+            # Summaries are text only, they must not switch the plugin to its vision model
+            summary_event = copy.copy(event_data)
+            summary_event.images = []
+            completion, genai_cost_base = await self.chat_plugin.generate_completion(summary_messages, summary_event)
+            if not completion:
+                return
+
+            sessions = self.backend_internal_data_processing_dispatcher.sessions
+            await self.backend_internal_data_processing_dispatcher.write_data_content(sessions, self.summary_file(blob_name), json.dumps({"covered": covered, "summary": completion}))
+            self.logger.info(f"History of {blob_name} summarized up to message {covered}")
+            await self.update_costs(genai_cost_base, blob_name)
+        except Exception as e:
+            self.logger.error(f"Failed to summarize the history of {blob_name}: {e}")
+
+    async def update_costs(self, cost_params, blob_name: str):
+        input_cost = (float(cost_params.prompt_tk) / 1000) * float(cost_params.input_token_price)
+        output_cost = (float(cost_params.completion_tk) / 1000) * float(cost_params.output_token_price)
+        pricing_data = PricingData(total_tokens=cost_params.total_tk, prompt_tokens=cost_params.prompt_tk, completion_tokens=cost_params.completion_tk, total_cost=input_cost + output_cost, input_cost=input_cost, output_cost=output_cost)
+        costs = self.backend_internal_data_processing_dispatcher.costs
+        await self.backend_internal_data_processing_dispatcher.increment_pricing(container_name=costs, datafile_name=blob_name, pricing_data=pricing_data)
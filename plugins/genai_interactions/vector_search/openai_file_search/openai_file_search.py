@@ -1,8 +1,9 @@
+import asyncio
 import inspect
+import time
 import traceback
-from ast import literal_eval
 from io import StringIO
-from typing import List
+from typing import Dict, List, Optional
 
 import numpy as np
 import pandas as pd
@@ -19,6 +20,19 @@ from core.user_interactions.incoming_notification_data_base import (
     IncomingNotificationDataBase,
 )
 
+from .utils.convert_index import binary_index_files
+from .utils.document_cache import DocumentCache
+from .utils.embedding_cache import EmbeddingCache
+from .utils.index_builder import IndexBuilder
+from .utils.ivf_index import IvfIndex, ivf_index_file
+from .utils.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from .utils.vector_index import VectorIndex
+
+EMBEDDING_CACHE_FILE = "embedding_cache.json"
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+# Minimum depth of the rankings fused in hybrid mode
+FUSION_DEPTH = 50
+
 
 class OpenaiFileSearchConfig(BaseModel):
     PLUGIN_NAME: str
@@ -36,6 +50,27 @@ class OpenaiFileSearchConfig(BaseModel):
     OPENAI_SEARCH_TITLE_WEIGHT: float
     OPENAI_SEARCH_USE_TITLE_IN_SEARCH: bool
     OPENAI_SEARCH_RESULT_COUNT: int
+    OPENAI_SEARCH_EMBEDDING_CACHE_SIZE: int = 1024
+    OPENAI_SEARCH_EMBEDDING_CACHE_TTL: int = 86400
+    OPENAI_SEARCH_EMBEDDING_CACHE_PERSIST: bool = False
+    OPENAI_SEARCH_EMBEDDING_CACHE_PERSIST_INTERVAL: int = 300
+    OPENAI_SEARCH_ANN_PROBES: int = 8
+    # Seconds a loaded index is used before the versions of its files are checked again
+    OPENAI_SEARCH_INDEX_VERSION_TTL: float = 30
+    OPENAI_SEARCH_DOCUMENT_CACHE_SIZE: int = 64
+    OPENAI_SEARCH_MODE: str = "vector"
+    OPENAI_SEARCH_LEXICAL_PREFILTER: bool = False
+    OPENAI_SEARCH_LEXICAL_CANDIDATES: int = 1000
+    OPENAI_SEARCH_RRF_K: int = 60
+    OPENAI_SEARCH_EMBEDDING_PRECISION: str = "float32"
+    OPENAI_SEARCH_RERANK_CANDIDATES: int = 50
+    # Re-ranking a quantized CSV index keeps its float32 matrices in memory, it is opt-in
+    OPENAI_SEARCH_CSV_RERANK_CANDIDATES: int = 0
+    OPENAI_SEARCH_INDEXING_CHUNK_SIZE: int = 1000
+    OPENAI_SEARCH_INDEXING_CHUNK_OVERLAP: int = 200
+    OPENAI_SEARCH_INDEXING_BATCH_SIZE: int = 64
+    OPENAI_SEARCH_INDEXING_CONCURRENCY: int = 4
+    OPENAI_SEARCH_INDEXING_MAX_RETRIES: int = 5
 
 class OpenaiFileSearchPlugin(GenAIInteractionsPluginBase):
     def __init__(self, global_manager: GlobalManager):
@@ -45,6 +80,11 @@ class OpenaiFileSearchPlugin(GenAIInteractionsPluginBase):
         openai_search_config_dict = global_manager.config_manager.config_model.PLUGINS.GENAI_INTERACTIONS.VECTOR_SEARCH["OPENAI_FILE_SEARCH"]
         self.openai_search_config = OpenaiFileSearchConfig(**openai_search_config_dict)
         self.plugin_name = None
+        # Indexes are loaded once per index name and reloaded when the vectors file changes
+        self.indexes: Dict[str, VectorIndex] = {}
+        self.index_locks: Dict[str, asyncio.Lock] = {}
+        # Monotonic time until which the loaded version of each index is assumed current
+        self.index_checked_until: Dict[str, float] = {}
 
     def initialize(self):
         self.openai_key = self.openai_search_config.OPENAI_SEARCH_OPENAI_KEY
@@ -61,6 +101,22 @@ class OpenaiFileSearchPlugin(GenAIInteractionsPluginBase):
         self.title_weight = self.openai_search_config.OPENAI_SEARCH_TITLE_WEIGHT
         self.use_title_in_search = self.openai_search_config.OPENAI_SEARCH_USE_TITLE_IN_SEARCH
         self.result_count = self.openai_search_config.OPENAI_SEARCH_RESULT_COUNT
+        self.ann_probes = self.openai_search_config.OPENAI_SEARCH_ANN_PROBES
+        self.index_version_ttl = self.openai_search_config.OPENAI_SEARCH_INDEX_VERSION_TTL
+        self.embedding_cache = EmbeddingCache(max_size=self.openai_search_config.OPENAI_SEARCH_EMBEDDING_CACHE_SIZE, ttl=self.openai_search_config.OPENAI_SEARCH_EMBEDDING_CACHE_TTL)
+        self.embedding_cache_persist = self.openai_search_config.OPENAI_SEARCH_EMBEDDING_CACHE_PERSIST
+        self.embedding_cache_persist_interval = self.openai_search_config.OPENAI_SEARCH_EMBEDDING_CACHE_PERSIST_INTERVAL
+        self.embedding_cache_loaded = False
+        self.embedding_cache_flush_task: Optional[asyncio.Task] = None
+        self.embedding_cache_lock = asyncio.Lock()
+        self.document_cache = DocumentCache(max_size=self.openai_search_config.OPENAI_SEARCH_DOCUMENT_CACHE_SIZE)
+        self.search_mode = self.openai_search_config.OPENAI_SEARCH_MODE
+        self.lexical_prefilter = self.openai_search_config.OPENAI_SEARCH_LEXICAL_PREFILTER
+        self.lexical_candidates = self.openai_search_config.OPENAI_SEARCH_LEXICAL_CANDIDATES
+        self.rrf_k = self.openai_search_config.OPENAI_SEARCH_RRF_K
+        self.embedding_precision = self.openai_search_config.OPENAI_SEARCH_EMBEDDING_PRECISION
+        self.rerank_candidates = self.openai_search_config.OPENAI_SEARCH_RERANK_CANDIDATES
+        self.csv_rerank_candidates = self.openai_search_config.OPENAI_SEARCH_CSV_RERANK_CANDIDATES
         self.backend_internal_data_processing_dispatcher : InternalDataProcessingBase = self.global_manager.backend_internal_data_processing_dispatcher
 
         if self.model_host.lower() == "azure":
@@ -90,82 +146,317 @@ class OpenaiFileSearchPlugin(GenAIInteractionsPluginBase):
         result = await self.handle_action(action_input, event)
         return result  # Assurez-vous de renvoyer une valeur
 
-    async def handle_action(self, action_input:ActionInput, event: IncomingNotificationDataBase):
+    async def handle_action(self, action_input:ActionInput, event: IncomingNotificationDataBase = None):
         parameters = {k.lower(): v for k, v in action_input.parameters.items()}
         query = parameters.get('query', '')
-        self.index_name = parameters.get('index_name', '')
-        self.result_count = parameters.get('result_count', self.result_count)
-        result = await self.call_search(query=query, index_name=self.index_name, result_count=self.result_count)
+        index_names = self.parse_index_names(parameters.get('index_name', ''))
+        # The plugin instance is shared by concurrent requests, per request values stay local
+        index_name = index_names[0] if len(index_names) == 1 else parameters.get('index_name', '')
+        result_count = parameters.get('result_count', self.result_count)
+        search_mode = parameters.get('search_mode', self.search_mode)
+        prefilter = parameters.get('prefilter', self.lexical_prefilter)
+        if isinstance(prefilter, str):
+            prefilter = prefilter.strip().lower() in ("true", "1", "yes")
+        if len(index_names) > 1:
+            return await self.call_multi_search(query=query, index_names=index_names, result_count=result_count, search_mode=search_mode, prefilter=prefilter)
+        result = await self.call_search(query=query, index_name=index_name, result_count=result_count, search_mode=search_mode, prefilter=prefilter)
         return result
 
+    @staticmethod
+    def parse_index_names(index_name) -> List[str]:
+        # Several indexes can be given as a list or as a comma separated string
+        values = index_name if isinstance(index_name, (list, tuple)) else str(index_name).split(',')
+        names = [str(value).strip() for value in values]
+        return list(dict.fromkeys(name for name in names if name))
+
     def trigger_genai(self, user_message = None, event: IncomingNotificationDataBase = None):
         raise NotImplementedError(f"{self.__class__.__name__}.{inspect.currentframe().f_code.co_name} is not implemented")
 
-    async def call_search(self, query, index_name, result_count = 3, use_title_in_search = False, get_all_document = False):
-        vector_container = self.backend_internal_data_processing_dispatcher.vectors
+    async def call_search(self, query, index_name, result_count = 3, use_title_in_search = False, get_all_document = False, search_mode = None, prefilter = None):
         try:
-            file_content = await self.backend_internal_data_processing_dispatcher.read_data_content(data_container=vector_container, data_file=index_name)
-            df = pd.read_csv(StringIO(file_content))
+            index = await self.load_index(index_name)
         except Exception:
-            self.logger.error(f"Failed to load CSV file: {traceback.format_exc()}")
+            self.logger.error(f"Failed to load vector index: {traceback.format_exc()}")
             raise
 
-        if df.empty:
-            return []  # Retourne une liste vide si le DataFrame est vide
+        if len(index) == 0:
+            return []  # Retourne une liste vide si l'index est vide
 
-        passage_indices = df['passage_index'].tolist()
-        results = await self.search_reviews(df, query, passage_indices[0])
+        search_mode = search_mode or self.search_mode
+        prefilter = self.lexical_prefilter if prefilter is None else prefilter
+        results = await self.search_reviews(index, query, index_name, int(result_count), search_mode=search_mode, prefilter=prefilter)
         return results
 
+    async def call_multi_search(self, query, index_names, result_count = 3, search_mode = None, prefilter = None):
+        if (search_mode or self.search_mode) != "lexical":
+            # Computed once up front, the concurrent searches then share it through the embedding cache
+            try:
+                await self.get_embedding(query, model=self.model_name)
+            except Exception as e:
+                self.logger.error(f"Unexpected error getting query embedding: {e}")
+                return []
+
+        searches = await asyncio.gather(*[
+            self.call_search(query=query, index_name=index_name, result_count=result_count, search_mode=search_mode, prefilter=prefilter)
+            for index_name in index_names
+        ], return_exceptions=True)
+
+        # Scores of different indexes are not comparable, their rankings are fused instead
+        results = []
+        rankings = []
+        for index_name, search in zip(index_names, searches):
+            if isinstance(search, Exception):
+                self.logger.error(f"Vector search failed for index {index_name}: {search}")
+                continue
+            rankings.append([(len(results) + position, result[2]) for position, result in enumerate(search)])
+            results.extend(search)
+        fused = reciprocal_rank_fusion(rankings, int(result_count), k=self.rrf_k)
+        # As in hybrid mode, the similarity of a result is its fused score
+        return [results[key][:2] + (score,) + results[key][3:] for key, score in fused]
+
+    async def load_index(self, index_name) -> VectorIndex:
+        # Versions are checked at most once per TTL, each check is up to three backend requests
+        index = self.indexes.get(index_name)
+        if index is not None and time.monotonic() < self.index_checked_until.get(index_name, 0):
+            return index
+
+        vector_container = self.backend_internal_data_processing_dispatcher.vectors
+        lock = self.index_locks.setdefault(index_name, asyncio.Lock())
+        async with lock:
+            # The binary format is preferred over the CSV when both exist for an index
+            embeddings_file, title_embeddings_file, metadata_file = binary_index_files(index_name)
+            binary_version = await self.backend_internal_data_processing_dispatcher.get_data_version(data_container=vector_container, data_file=embeddings_file)
+            if binary_version is not None:
+                version = f"binary:{binary_version}"
+            else:
+                version = await self.backend_internal_data_processing_dispatcher.get_data_version(data_container=vector_container, data_file=index_name)
+
+            # An approximate index built offline is picked up when present
+            ann_file = ivf_index_file(index_name)
+            ann_version = await self.backend_internal_data_processing_dispatcher.get_data_version(data_container=vector_container, data_file=ann_file) if self.ann_probes > 0 else None
+            if version is not None and ann_version is not None:
+                version = f"{version}+ivf:{ann_version}"
+
+            index = self.indexes.get(index_name)
+            if index is not None and version is not None and index.version == version:
+                self.index_checked_until[index_name] = time.monotonic() + self.index_version_ttl
+                return index
+
+            self.logger.info(f"Loading vector index {index_name} from {vector_container}")
+            loop = asyncio.get_running_loop()
+            if binary_version is not None:
+                embeddings_buffer = await self.backend_internal_data_processing_dispatcher.read_data_buffer(data_container=vector_container, data_file=embeddings_file)
+                title_embeddings_buffer = await self.backend_internal_data_processing_dispatcher.read_data_buffer(data_container=vector_container, data_file=title_embeddings_file)
+                metadata_content = await self.backend_internal_data_processing_dispatcher.read_data_content(data_container=vector_container, data_file=metadata_file)
+                if embeddings_buffer is None:
+                    raise FileNotFoundError(f"Vector index {embeddings_file} not found in {vector_container}")
+                if metadata_content is None:
+                    raise FileNotFoundError(f"Vector index metadata {metadata_file} not found in {vector_container}")
+                index = await loop.run_in_executor(None, lambda: VectorIndex.from_binary(embeddings_buffer, metadata_content, title_embeddings_buffer, version=version))
+            else:
+                file_content = await self.backend_internal_data_processing_dispatcher.read_data_content(data_container=vector_container, data_file=index_name)
+                if file_content is None:
+                    raise FileNotFoundError(f"Vector index {index_name} not found in {vector_container}")
+                # Parsing the index is CPU bound, keep it off the event loop
+                index = await loop.run_in_executor(None, self.build_index, file_content, version)
+
+            if self.embedding_precision != "float32":
+                # The float32 matrices are kept to re-rank the candidates when they are memory-mapped from a
+                # binary index, a CSV index only keeps them in memory with OPENAI_SEARCH_CSV_RERANK_CANDIDATES
+                keep_exact = self.rerank_depth(index) > 0
+                await loop.run_in_executor(None, lambda: index.quantize(self.embedding_precision, keep_exact=keep_exact))
+                if keep_exact and binary_version is None:
+                    self.logger.warning(f"Vector index {index_name} keeps its float32 embeddings in memory to re-rank candidates, build a binary index to memory-map them")
+                self.logger.info(f"Vector index {index_name} stored in {index.precision}")
+
+            if ann_version is not None:
+                ann_buffer = await self.backend_internal_data_processing_dispatcher.read_data_buffer(data_container=vector_container, data_file=ann_file)
+                if ann_buffer is not None:
+                    ann_index = await loop.run_in_executor(None, IvfIndex.from_bytes, ann_buffer)
+                    # An approximate index built from another version of the embeddings would return wrong rows
+                    if ann_index.covers(len(index)):
+                        index.ann_index = ann_index
+                        self.logger.info(f"Approximate index {ann_file} loaded with {ann_index.n_lists} lists")
+                    else:
+                        self.logger.warning(f"Approximate index {ann_file} does not match the {len(index)} passages of {index_name}, using exact search")
+
+            self.indexes[index_name] = index
+            self.index_checked_until[index_name] = time.monotonic() + self.index_version_ttl
+            # Source documents may have changed along with the index
+            self.document_cache.invalidate(index_name)
+            self.logger.info(f"Vector index {index_name} loaded with {len(index)} passages")
+            return index
+
+    async def get_lexical_index(self, index: VectorIndex, index_name) -> LexicalIndex:
+        if index.lexical_index is None:
+            async with self.index_locks.setdefault(index_name, asyncio.Lock()):
+                if index.lexical_index is None:
+                    loop = asyncio.get_running_loop()
+                    texts = [f"{text} {title}" for text, title in zip(index.texts, index.titles)]
+                    index.lexical_index = await loop.run_in_executor(None, LexicalIndex.build, texts)
+                    self.logger.info(f"Lexical index built for {index_name}")
+        return index.lexical_index
+
+    def rerank_depth(self, index: VectorIndex) -> int:
+        # Binary indexes memory-map their float32 matrices, CSV indexes would hold them in memory
+        if (index.version or "").startswith("binary:"):
+            return self.rerank_candidates
+        return self.csv_rerank_candidates
+
+    def build_index(self, file_content, version = None) -> VectorIndex:
+        df = pd.read_csv(StringIO(file_content))
+        return VectorIndex.from_dataframe(df, version=version)
+
     async def get_embedding(self,text: str, model, **kwargs) -> List[float]:
         # replace newlines, which can negatively affect performance.
         text = text.replace("\n", " ")
+        use_cache = not kwargs
+        if use_cache:
+            await self.load_embedding_cache()
+            embedding = self.embedding_cache.get(model, text)
+            self.logger.debug(f"Embedding cache stats: {self.embedding_cache.stats}")
+            if embedding is not None:
+                return embedding
+
         response = await self.client.embeddings.create(input=[text], model=model, **kwargs)
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        if use_cache:
+            self.embedding_cache.put(model, text, embedding)
+            self.schedule_embedding_cache_flush()
+        return embedding
+
+    async def get_embeddings(self, texts: List[str], model = None) -> List[List[float]]:
+        texts = [text.replace("\n", " ") for text in texts]
+        response = await self.client.embeddings.create(input=texts, model=model or self.model_name)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def index_documents(self, index_name, documents_container = None, document_extension = ".txt"):
+        # Documents of an index live in a container named after it, see extract_context
+        documents_container = documents_container or index_name
+        builder = IndexBuilder(
+            backend=self.backend_internal_data_processing_dispatcher,
+            embed_batch=self.get_embeddings,
+            logger=self.logger,
+            chunk_size=self.openai_search_config.OPENAI_SEARCH_INDEXING_CHUNK_SIZE,
+            chunk_overlap=self.openai_search_config.OPENAI_SEARCH_INDEXING_CHUNK_OVERLAP,
+            batch_size=self.openai_search_config.OPENAI_SEARCH_INDEXING_BATCH_SIZE,
+            concurrency=self.openai_search_config.OPENAI_SEARCH_INDEXING_CONCURRENCY,
+            max_retries=self.openai_search_config.OPENAI_SEARCH_INDEXING_MAX_RETRIES,
+        )
+        stats = await builder.build(index_name, documents_container, document_extension=document_extension)
+        # The rebuilt index is picked up by the next search
+        self.index_checked_until.pop(index_name, None)
+        self.logger.info(f"Vector index {index_name} built from {documents_container}: {stats}")
+        return stats
+
+    async def load_embedding_cache(self):
+        if self.embedding_cache_loaded or not self.embedding_cache_persist:
+            return
+        self.embedding_cache_loaded = True
+        try:
+            vector_container = self.backend_internal_data_processing_dispatcher.vectors
+            content = await self.backend_internal_data_processing_dispatcher.read_data_content(data_container=vector_container, data_file=EMBEDDING_CACHE_FILE)
+            if content:
+                self.embedding_cache.load_json(content)
+                self.logger.info(f"Loaded {len(self.embedding_cache)} cached query embeddings")
+        except Exception as e:
+            self.logger.error(f"Failed to load the embedding cache: {e}")
+
+    def schedule_embedding_cache_flush(self):
+        if not self.embedding_cache_persist:
+            return
+        if self.embedding_cache_flush_task is None or self.embedding_cache_flush_task.done():
+            self.embedding_cache_flush_task = asyncio.create_task(self.flush_embedding_cache_periodically())
+
+    async def flush_embedding_cache_periodically(self):
+        # The cache is rewritten as a whole, at most once per interval while it has new embeddings
+        while self.embedding_cache.dirty:
+            await asyncio.sleep(self.embedding_cache_persist_interval)
+            # Cancelling the loop must not interrupt a save half way
+            await asyncio.shield(self.save_embedding_cache())
+
+    async def save_embedding_cache(self):
+        async with self.embedding_cache_lock:
+            if not self.embedding_cache_persist or not self.embedding_cache.dirty:
+                return
+            # Embeddings added while writing mark the cache dirty again
+            self.embedding_cache.dirty = False
+            try:
+                vector_container = self.backend_internal_data_processing_dispatcher.vectors
+                await self.backend_internal_data_processing_dispatcher.write_data_content(data_container=vector_container, data_file=EMBEDDING_CACHE_FILE, data=self.embedding_cache.to_json())
+            except Exception as e:
+                self.embedding_cache.dirty = True
+                self.logger.error(f"Failed to save the embedding cache: {e}")
+
+    async def close(self):
+        """
+        Stop the periodic flush and save the embedding cache if it has new embeddings.
+        """
+        if self.embedding_cache_flush_task is not None and not self.embedding_cache_flush_task.done():
+            self.embedding_cache_flush_task.cancel()
+            try:
+                await self.embedding_cache_flush_task
+            except asyncio.CancelledError:
+                pass
+        self.embedding_cache_flush_task = None
+        await self.save_embedding_cache()
 
     def cosine_similarity(self, a, b):
         return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
     # Function to search reviews in the database based on a query
-    async def search_reviews(self, df, query, passage_index):
-        try:
-            query_embedding = await self.get_embedding(query, model=self.model_name)
-        except Exception as e:
-            self.logger.error(f"Unexpected error getting query embedding: {e}")
-            return []
+    async def search_reviews(self, index: VectorIndex, query, index_name, result_count, search_mode = "vector", prefilter = False):
+        search_mode = str(search_mode).lower()
+        if search_mode not in SEARCH_MODES:
+            self.logger.warning(f"Unknown search mode {search_mode}, falling back to vector search")
+            search_mode = "vector"
+
+        # Similarity is the cosine similarity, the BM25 score or the fused RRF score depending on the mode
+        lexical_hits = []
+        candidates = None
+        if search_mode != "vector" or prefilter:
+            lexical_index = await self.get_lexical_index(index, index_name)
+            if search_mode == "lexical":
+                lexical_hits = lexical_index.search(query, result_count)
+            elif search_mode == "hybrid":
+                lexical_hits = lexical_index.search(query, max(result_count, FUSION_DEPTH))
+            if prefilter and search_mode != "lexical":
+                candidates = lexical_index.candidates(query, self.lexical_candidates)
+                # Without any lexical match the whole index is scanned
+                if len(candidates) == 0:
+                    candidates = None
+
+        query_embedding = None
+        if search_mode != "lexical":
+            try:
+                query_embedding = await self.get_embedding(query, model=self.model_name)
+            except Exception as e:
+                self.logger.error(f"Unexpected error getting query embedding: {e}")
+                return []
 
         try:
-            # Calculate similarity with text embeddings
-            df['similarity_text'] = df['embedding'].apply(lambda x: self.cosine_similarity(np.array(literal_eval(x)), query_embedding))
-
-            if self.use_title_in_search:
-                # Calculate similarity with title embeddings
-                df['similarity_title'] = df['title_embedding'].apply(lambda x: self.cosine_similarity(np.array(literal_eval(x)), query_embedding))
-                # Combine similarities
-                df['similarity'] = self.text_weight * df['similarity_text'] + self.title_weight * df['similarity_title']
+            if search_mode == "lexical":
+                hits = lexical_hits
             else:
-                df['similarity'] = df['similarity_text']
-
-            # Sort results by similarity
-            res = df.sort_values('similarity', ascending=False).head(self.result_count)
-
-            results = []
-            for _, row in res.iterrows():
-                document_id = row['document_id']
-                passage_id = row['passage_id']
-                similarity = row['similarity']
-                text = row['text']
-                title = row['title']
-                file_path = row['file_path']
-                # passage_index is already retrieved from the DataFrame
-
-                if self.context_extraction:
-                    context = await self.extract_context(self.index_name, document_id, passage_index, len(text))
-                    text = context  # Use the extracted context as the text
-
-                results.append((document_id, passage_id, similarity, text, title, file_path))
-
-            return results
+                depth = result_count if search_mode == "vector" else max(result_count, FUSION_DEPTH)
+                hits = index.search(query_embedding, depth, text_weight=self.text_weight, title_weight=self.title_weight, use_title=self.use_title_in_search, n_probe=self.ann_probes, rows=candidates, rerank=self.rerank_depth(index))
+                if search_mode == "hybrid":
+                    hits = reciprocal_rank_fusion([hits, lexical_hits], result_count, k=self.rrf_k)
+
+            passages = [index.get_passage(row) for row, _ in hits]
+            texts = [passage['text'] for passage in passages]
+
+            if self.context_extraction:
+                # Contexts are fetched concurrently, hits from the same document share one download
+                texts = await asyncio.gather(*[
+                    self.extract_context(index_name, passage['document_id'], passage['passage_index'], len(text))
+                    for passage, text in zip(passages, texts)
+                ])
+
+            return [
+                (passage['document_id'], passage['passage_id'], similarity, text, passage['title'], passage['file_path'])
+                for passage, (_, similarity), text in zip(passages, hits, texts)
+            ]
         except Exception as e:
             self.logger.error(f"Error during search: {e}")
             return []
@@ -173,7 +464,10 @@ class OpenaiFileSearchPlugin(GenAIInteractionsPluginBase):
     # Function to extract context around a passage using passage index
     async def extract_context(self, index_name, document_id, passage_index, passage_length):
         try:
-            full_content = await self.backend_internal_data_processing_dispatcher.read_data_content(data_container=index_name, data_file=document_id)
+            full_content = await self.document_cache.fetch(
+                (index_name, document_id),
+                lambda: self.backend_internal_data_processing_dispatcher.read_data_content(data_container=index_name, data_file=document_id),
+            )
 
             context_length_before = int(passage_length * self.before_ratio)
             context_length_after = int(passage_length * self.after_ratio)
@@ -0,0 +1,65 @@
+"""
+Convert CSV vector indexes to the binary memory-mappable format.
+
+Usage:
+    python -m plugins.genai_interactions.vector_search.openai_file_search.utils.convert_index <index.csv> [<output_directory>]
+
+For an index named ``docs.csv`` this writes ``docs.embeddings.npy``, ``docs.metadata.csv``
+and, when the CSV has title embeddings, ``docs.title_embeddings.npy`` next to it (or in the
+output directory). Upload these files to the vectors container; the plugin prefers them over
+the CSV for the same index name.
+"""
+import argparse
+import os
+from typing import List
+
+import pandas as pd
+
+from .vector_index import (
+    EMBEDDINGS_SUFFIX,
+    METADATA_SUFFIX,
+    TITLE_EMBEDDINGS_SUFFIX,
+    VectorIndex,
+)
+
+
+def binary_index_files(index_name: str) -> List[str]:
+    base_name = os.path.splitext(index_name)[0]
+    return [f"{base_name}{EMBEDDINGS_SUFFIX}", f"{base_name}{TITLE_EMBEDDINGS_SUFFIX}", f"{base_name}{METADATA_SUFFIX}"]
+
+def convert_csv_index(csv_path: str, output_directory: str = None) -> List[str]:
+    """
+    Convert a CSV index file and return the paths of the files written.
+    """
+    output_directory = output_directory or os.path.dirname(csv_path)
+    os.makedirs(output_directory or ".", exist_ok=True)
+    index = VectorIndex.from_dataframe(pd.read_csv(csv_path))
+    embeddings, title_embeddings, metadata = index.to_binary()
+    embeddings_file, title_embeddings_file, metadata_file = [
+        os.path.join(output_directory, file_name) for file_name in binary_index_files(os.path.basename(csv_path))
+    ]
+
+    written = []
+    # The metadata is written first so a reader never sees embeddings without their passages
+    with open(metadata_file, 'w', encoding='utf-8', newline='') as file:
+        file.write(metadata)
+    written.append(metadata_file)
+    if title_embeddings is not None:
+        with open(title_embeddings_file, 'wb') as file:
+            file.write(title_embeddings)
+        written.append(title_embeddings_file)
+    with open(embeddings_file, 'wb') as file:
+        file.write(embeddings)
+    written.append(embeddings_file)
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a CSV vector index to the binary index format.")
+    parser.add_argument("csv_path", help="Path of the CSV index to convert")
+    parser.add_argument("output_directory", nargs="?", default=None, help="Directory to write the binary index to")
+    args = parser.parse_args(argv)
+    for path in convert_csv_index(args.csv_path, args.output_directory):
+        print(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+
+class DocumentCache:
+    """
+    Bounded LRU cache of source documents used for context extraction.
+
+    Concurrent fetches of the same document share a single backend read.
+    """
+
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self.entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.pending: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    async def fetch(self, key: Hashable, loader: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        future = self.pending.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The fetch owning the read was cancelled, read the document again
+                return await self.fetch(key, loader)
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            content = await loader()
+            future.set_result(content)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when no other caller was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self.pending[key]
+            if not future.done():
+                # Cancelled while reading, waiters must not wait forever
+                future.cancel()
+
+        # Missing documents are not cached so they are picked up once uploaded
+        if content is not None and self.max_size > 0:
+            self.entries[key] = content
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return content
+
+    def invalidate(self, index_name: str) -> None:
+        for key in [key for key in self.entries if key[0] == index_name]:
+            del self.entries[key]
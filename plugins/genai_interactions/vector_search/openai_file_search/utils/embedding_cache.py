@@ -0,0 +1,86 @@
+import base64
+import json
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings with a time to live.
+
+    Entries are keyed by (model, normalized text). The cache can be serialized to JSON
+    so it can be persisted in the backend and survive restarts.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 86400, clock=time.time):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def make_key(model: str, text: str) -> Tuple[str, str]:
+        # Collapse whitespace so trivially different spellings of a query share an entry
+        return model, " ".join(text.split())
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = self.make_key(model, text)
+        entry = self.entries.get(key)
+        if entry is not None:
+            created_at, embedding = entry
+            if self.ttl <= 0 or self.clock() - created_at < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, model: str, text: str, embedding: List[float]) -> None:
+        if self.max_size <= 0:
+            return
+        key = self.make_key(model, text)
+        self.entries[key] = (self.clock(), embedding)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        self.dirty = True
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def to_json(self) -> str:
+        entries = []
+        for (model, text), (created_at, embedding) in self.entries.items():
+            encoded = base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode('ascii')
+            entries.append([model, text, created_at, encoded])
+        return json.dumps({"entries": entries})
+
+    def load_json(self, content: str) -> None:
+        """
+        Load persisted entries, skipping the ones that already expired.
+        """
+        now = self.clock()
+        for model, text, created_at, encoded in json.loads(content).get("entries", []):
+            if self.ttl > 0 and now - created_at >= self.ttl:
+                continue
+            embedding = np.frombuffer(base64.b64decode(encoded), dtype=np.float32).tolist()
+            self.entries[(model, text)] = (created_at, embedding)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
@@ -0,0 +1,240 @@
+"""
+Batch indexing pipeline producing the CSV vector indexes consumed by OpenaiFileSearchPlugin.
+
+Documents are read from a container of the internal data processing backend, split into
+overlapping passages and embedded in batches. Each group of embedded documents is checkpointed
+to the vectors container as a part file, together with a manifest of document content hashes,
+so an interrupted run resumes where it stopped and a rerun only re-embeds changed documents.
+The parts are compacted into the CSV once every document is indexed.
+Binary and approximate indexes derived from a previous version of the CSV are removed when
+it changes, convert and build them again from the new CSV.
+
+Usage:
+    python -m plugins.genai_interactions.vector_search.openai_file_search.utils.index_builder <index_name> [--documents-container <container>]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+from io import StringIO
+from typing import Awaitable, Callable, Dict, List
+
+import pandas as pd
+
+from .convert_index import binary_index_files
+from .ivf_index import ivf_index_file
+
+INDEX_COLUMNS = ['document_id', 'passage_id', 'passage_index', 'text', 'title', 'file_path', 'embedding', 'title_embedding']
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def manifest_file(index_name: str) -> str:
+    return f"{os.path.splitext(index_name)[0]}{MANIFEST_SUFFIX}"
+
+def part_file(index_name: str, number: int) -> str:
+    return f"{os.path.splitext(index_name)[0]}.part{number}.csv"
+
+def parse_manifest(content) -> tuple:
+    """
+    Return the documents ({document_id: {"hash", "passages"}}) and part files of a manifest.
+    Manifests of previous versions map document ids to their hash.
+    """
+    manifest = json.loads(content) if content else {}
+    if isinstance(manifest.get("documents"), dict):
+        return manifest["documents"], manifest.get("parts", [])
+    return {document_id: {"hash": content_hash} for document_id, content_hash in manifest.items()}, []
+
+def chunk_text(text: str, chunk_size: int, chunk_overlap: int) -> List[tuple]:
+    """
+    Split text into (offset, passage) chunks of at most chunk_size characters.
+    Chunks end on whitespace when possible and overlap by about chunk_overlap characters.
+    """
+    chunks = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            boundary = text.rfind(" ", start + chunk_size // 2, end)
+            if boundary != -1:
+                end = boundary
+        passage = text[start:end]
+        if passage.strip():
+            chunks.append((start, passage))
+        if end >= length:
+            break
+        start = max(end - chunk_overlap, start + 1)
+    return chunks
+
+
+class IndexBuilder:
+    def __init__(self, backend, embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]], logger,
+                 chunk_size: int = 1000, chunk_overlap: int = 200, batch_size: int = 64, concurrency: int = 4,
+                 max_retries: int = 5, retry_delay: float = 1.0, checkpoint_every: int = 50):
+        self.backend = backend
+        self.embed_batch = embed_batch
+        self.logger = logger
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.checkpoint_every = checkpoint_every
+
+    async def build(self, index_name: str, documents_container: str, document_extension: str = ".txt") -> Dict[str, int]:
+        vectors_container = self.backend.vectors
+        manifest_name = manifest_file(index_name)
+        manifest_content = await self.backend.read_data_content(data_container=vectors_container, data_file=manifest_name)
+        previous_documents, parts = parse_manifest(manifest_content)
+        rows_by_document = await self.load_existing_rows(vectors_container, index_name)
+        # Parts of an interrupted run hold the most recent rows of their documents
+        for part_name in parts:
+            rows_by_document.update(await self.load_existing_rows(vectors_container, part_name))
+
+        # The backend lists files with their extension, documents are matched on it explicitly
+        document_files = await self.backend.list_stale_files(documents_container, older_than=float("inf"))
+        document_ids = sorted(name for name, _ in document_files if name.endswith(document_extension))
+        stats = {"documents": len(document_ids), "unchanged": 0, "embedded": 0, "removed": 0, "passages": 0}
+
+        contents = await asyncio.gather(*[self.read_document(documents_container, document_id) for document_id in document_ids])
+        documents = {}
+        changed = []
+        for document_id, content in zip(document_ids, contents):
+            if content is None:
+                self.logger.warning(f"Skipping unreadable document {document_id}")
+                continue
+            content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            previous = previous_documents.get(document_id, {})
+            # A document known to produce no passages has no rows, its hash is enough
+            if previous.get("hash") == content_hash and (document_id in rows_by_document or previous.get("passages") == 0):
+                documents[document_id] = previous
+                stats["unchanged"] += 1
+            else:
+                changed.append((document_id, content, content_hash))
+
+        removed = (set(rows_by_document) | set(previous_documents)) - set(document_ids)
+        for document_id in removed:
+            rows_by_document.pop(document_id, None)
+        stats["removed"] = len(removed)
+
+        if changed or removed:
+            await self.remove_derived_files(vectors_container, index_name)
+
+        # Changed documents are embedded in groups, each group is checkpointed to its own part file
+        for start in range(0, len(changed), self.checkpoint_every):
+            group = changed[start:start + self.checkpoint_every]
+            group_rows = await asyncio.gather(*[
+                self.index_document(documents_container, document_id, content) for document_id, content, _ in group
+            ])
+            for (document_id, _, content_hash), rows in zip(group, group_rows):
+                rows_by_document[document_id] = rows
+                documents[document_id] = {"hash": content_hash, "passages": len(rows)}
+            part_name = part_file(index_name, len(parts))
+            await self.write_rows(vectors_container, part_name, [row for rows in group_rows for row in rows])
+            parts.append(part_name)
+            # The manifest is written last so it never references rows missing from the index
+            await self.write_manifest(vectors_container, manifest_name, documents, parts)
+            stats["embedded"] += len(group)
+            self.logger.info(f"Indexed {stats['embedded']}/{len(changed)} changed documents for {index_name}")
+
+        if changed or removed or parts or documents != previous_documents:
+            await self.compact(vectors_container, index_name, manifest_name, rows_by_document, documents, parts)
+
+        stats["passages"] = sum(len(rows) for rows in rows_by_document.values())
+        return stats
+
+    async def read_document(self, documents_container, document_id):
+        async with self.semaphore:
+            return await self.backend.read_data_content(data_container=documents_container, data_file=document_id)
+
+    async def remove_derived_files(self, vectors_container, index_name):
+        # The plugin prefers these files over the CSV, they would keep serving the previous version.
+        # The embeddings file goes first, without it the plugin falls back to the CSV
+        for derived_file in binary_index_files(index_name) + [ivf_index_file(index_name)]:
+            if await self.backend.get_data_version(data_container=vectors_container, data_file=derived_file) is not None:
+                await self.backend.remove_data_content(data_container=vectors_container, data_file=derived_file)
+                self.logger.info(f"Removed {derived_file}, derived from a previous version of {index_name}")
+
+    async def load_existing_rows(self, vectors_container, index_name) -> Dict[str, List[dict]]:
+        content = await self.backend.read_data_content(data_container=vectors_container, data_file=index_name)
+        if not content:
+            return {}
+        # Embeddings of unchanged documents are kept as their serialized strings
+        df = pd.read_csv(StringIO(content), dtype={'embedding': str, 'title_embedding': str})
+        return {document_id: group.to_dict('records') for document_id, group in df.groupby('document_id', sort=False)}
+
+    async def index_document(self, documents_container, document_id, content) -> List[dict]:
+        title = os.path.splitext(document_id)[0]
+        chunks = chunk_text(content, self.chunk_size, self.chunk_overlap)
+        texts = [passage for _, passage in chunks]
+        embeddings = await self.embed_texts([title] + texts)
+        title_embedding = json.dumps(embeddings[0])
+        return [
+            {
+                'document_id': document_id,
+                'passage_id': passage_id,
+                'passage_index': offset,
+                'text': passage,
+                'title': title,
+                'file_path': f"{documents_container}/{document_id}",
+                'embedding': json.dumps(embedding),
+                'title_embedding': title_embedding,
+            }
+            for passage_id, ((offset, passage), embedding) in enumerate(zip(chunks, embeddings[1:]))
+        ]
+
+    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*[self.embed_with_retry(batch) for batch in batches])
+        return [embedding for batch in results for embedding in batch]
+
+    async def embed_with_retry(self, batch: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.semaphore:
+                    return await self.embed_batch(batch)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_delay * (2 ** attempt)
+                self.logger.warning(f"Embedding batch failed ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def compact(self, vectors_container, index_name, manifest_name, rows_by_document, documents, parts):
+        rows = [row for document_id in sorted(rows_by_document) for row in rows_by_document[document_id]]
+        await self.write_rows(vectors_container, index_name, rows)
+        await self.write_manifest(vectors_container, manifest_name, documents, [])
+        # The rows of the parts are in the index now
+        for part_name in parts:
+            await self.backend.remove_data_content(data_container=vectors_container, data_file=part_name)
+
+    async def write_rows(self, vectors_container, data_file, rows):
+        content = pd.DataFrame(rows, columns=INDEX_COLUMNS).to_csv(index=False)
+        await self.backend.write_data_content(data_container=vectors_container, data_file=data_file, data=content)
+
+    async def write_manifest(self, vectors_container, manifest_name, documents, parts):
+        manifest = {"documents": documents, "parts": parts}
+        await self.backend.write_data_content(data_container=vectors_container, data_file=manifest_name, data=json.dumps(manifest))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or refresh a vector index from a documents container.")
+    parser.add_argument("index_name", help="Name of the index file in the vectors container")
+    parser.add_argument("--documents-container", default=None, help="Container holding the documents, defaults to the index name")
+    parser.add_argument("--document-extension", default=".txt")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from fastapi import FastAPI
+
+    from core.global_manager import GlobalManager
+
+    load_dotenv()
+    global_manager = GlobalManager(app=FastAPI())
+    plugin = global_manager.genai_vectorsearch_dispatcher.get_plugin("openai_file_search")
+    stats = asyncio.run(plugin.index_documents(args.index_name, documents_container=args.documents_container, document_extension=args.document_extension))
+    print(json.dumps(stats))
+
+if __name__ == "__main__":
+    main()
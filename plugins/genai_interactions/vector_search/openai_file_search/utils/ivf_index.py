@@ -0,0 +1,189 @@
+"""
+Inverted file (IVF) approximate nearest neighbour index for large vector indexes.
+
+Passages are clustered with spherical k-means; a query only scans the passages of the
+``n_probe`` clusters whose centroids are closest to it. More probes means better recall
+and more latency.
+
+Build the index offline next to the embeddings and measure recall against the exact scan:
+    python -m plugins.genai_interactions.vector_search.openai_file_search.utils.ivf_index docs.embeddings.npy --lists 1024 --benchmark
+"""
+import argparse
+import io
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+IVF_SUFFIX = ".ivf.npz"
+# Rows assigned per matrix product while clustering, bounds the temporary score matrix
+ASSIGN_CHUNK_SIZE = 65536
+
+
+class IvfIndex:
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        # Row ids grouped by cluster: cluster i owns order[offsets[i]:offsets[i + 1]]
+        self.order = np.asarray(order, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, n_lists: int, iterations: int = 20, sample_size: Optional[int] = None,
+              seed: int = 0) -> "IvfIndex":
+        """
+        Cluster normalized embeddings into ``n_lists`` inverted lists.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        row_count = embeddings.shape[0]
+        n_lists = max(1, min(n_lists, row_count))
+        rng = np.random.default_rng(seed)
+
+        # Centroids are trained on a sample, every row is assigned afterwards
+        sample_size = sample_size or min(row_count, n_lists * 256)
+        sample = embeddings[rng.choice(row_count, size=min(sample_size, row_count), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = cls.assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=n_lists)
+            empty = counts == 0
+            # Empty clusters are reseeded on random sample points
+            sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+            centroids = cls.normalize(sums)
+
+        assignments = cls.assign(embeddings, centroids)
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=n_lists))))
+        return cls(centroids, order, offsets)
+
+    @staticmethod
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32)
+
+    @staticmethod
+    def assign(embeddings: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        assignments = np.empty(embeddings.shape[0], dtype=np.int64)
+        for start in range(0, embeddings.shape[0], ASSIGN_CHUNK_SIZE):
+            chunk = embeddings[start:start + ASSIGN_CHUNK_SIZE]
+            assignments[start:start + chunk.shape[0]] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignments
+
+    def candidates(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        """
+        Return the row ids stored in the ``n_probe`` clusters closest to the query.
+        """
+        n_probe = max(1, min(n_probe, self.n_lists))
+        centroid_scores = self.centroids @ np.asarray(query, dtype=np.float32)
+        if n_probe < self.n_lists:
+            probes = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        else:
+            probes = np.arange(self.n_lists)
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in probes])
+
+    def covers(self, row_count: int) -> bool:
+        """
+        Whether the index was built for ``row_count`` rows, every row in exactly one list.
+        """
+        return self.order.size == row_count and (row_count == 0 or int(self.order.max()) < row_count)
+
+    def to_bytes(self) -> bytes:
+        stream = io.BytesIO()
+        np.savez(stream, centroids=self.centroids, order=self.order, offsets=self.offsets)
+        return stream.getvalue()
+
+    @classmethod
+    def from_bytes(cls, buffer) -> "IvfIndex":
+        with np.load(io.BytesIO(bytes(buffer))) as data:
+            return cls(data['centroids'], data['order'], data['offsets'])
+
+def evaluate_recall(embeddings: np.ndarray, ivf_index: IvfIndex, queries: np.ndarray, result_count: int,
+                    probes: List[int]) -> List[Dict]:
+    """
+    Compare the IVF search with the exact scan for each probe count.
+    Reports the mean recall@result_count and the mean query latency in milliseconds.
+    """
+    exact_results = []
+    exact_start = time.perf_counter()
+    for query in queries:
+        scores = embeddings @ query
+        exact_results.append(set(np.argpartition(-scores, result_count - 1)[:result_count].tolist()))
+    exact_latency = (time.perf_counter() - exact_start) * 1000 / len(queries)
+
+    report = [{"n_probe": 0, "recall": 1.0, "latency_ms": exact_latency, "scanned": 1.0}]
+    for n_probe in probes:
+        recall = 0.0
+        scanned = 0
+        start = time.perf_counter()
+        for query, expected in zip(queries, exact_results):
+            rows = ivf_index.candidates(query, n_probe)
+            scores = embeddings[rows] @ query
+            k = min(result_count, rows.shape[0])
+            found = rows[np.argpartition(-scores, k - 1)[:k]]
+            recall += len(expected.intersection(found.tolist())) / result_count
+            scanned += rows.shape[0]
+        latency = (time.perf_counter() - start) * 1000 / len(queries)
+        report.append({
+            "n_probe": n_probe,
+            "recall": recall / len(queries),
+            "latency_ms": latency,
+            "scanned": scanned / (len(queries) * embeddings.shape[0]),
+        })
+    return report
+
+def sample_queries(embeddings: np.ndarray, query_count: int, noise: float = 0.05, seed: int = 0) -> np.ndarray:
+    # Perturbed corpus rows stand in for real queries, they land near but not on indexed passages
+    rng = np.random.default_rng(seed)
+    rows = embeddings[rng.choice(embeddings.shape[0], size=min(query_count, embeddings.shape[0]), replace=False)]
+    queries = rows + rng.normal(scale=noise, size=rows.shape).astype(np.float32)
+    return IvfIndex.normalize(queries)
+
+def load_embeddings(path: str) -> np.ndarray:
+    if path.endswith(".csv"):
+        import pandas as pd
+
+        from .vector_index import VectorIndex
+        return VectorIndex.from_dataframe(pd.read_csv(path)).embeddings
+    return IvfIndex.normalize(np.load(path, mmap_mode='r'))
+
+def ivf_index_file(index_name: str) -> str:
+    base_name = os.path.splitext(index_name)[0]
+    if base_name.endswith(".embeddings"):
+        base_name = base_name[:-len(".embeddings")]
+    return f"{base_name}{IVF_SUFFIX}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an IVF index for a vector index.")
+    parser.add_argument("embeddings_path", help="CSV index or binary .embeddings.npy file")
+    parser.add_argument("--lists", type=int, default=None, help="Number of clusters, defaults to sqrt(passages)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--benchmark", action="store_true", help="Report recall and latency against the exact scan")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--result-count", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    embeddings = load_embeddings(args.embeddings_path)
+    n_lists = args.lists or max(1, int(np.sqrt(embeddings.shape[0])))
+    start = time.perf_counter()
+    ivf_index = IvfIndex.build(embeddings, n_lists, iterations=args.iterations)
+    output_path = ivf_index_file(args.embeddings_path)
+    with open(output_path, 'wb') as file:
+        file.write(ivf_index.to_bytes())
+    print(f"{output_path}: {ivf_index.n_lists} lists built in {time.perf_counter() - start:.1f}s")
+
+    if args.benchmark:
+        queries = sample_queries(embeddings, args.queries)
+        print(f"{'n_probe':>8} {'recall':>8} {'latency_ms':>11} {'scanned':>8}")
+        for row in evaluate_recall(embeddings, ivf_index, queries, args.result_count, args.probes):
+            print(f"{row['n_probe'] or 'exact':>8} {row['recall']:>8.3f} {row['latency_ms']:>11.3f} {row['scanned']:>8.3f}")
+
+if __name__ == "__main__":
+    main()
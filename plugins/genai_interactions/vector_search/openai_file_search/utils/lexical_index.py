@@ -0,0 +1,96 @@
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Identifiers such as ERR-1234, ticket_42 or v1.2.3 are kept as single tokens
+TOKEN_PATTERN = re.compile(r"\w+(?:[-_.:/]\w+)*")
+
+
+def tokenize(text) -> List[str]:
+    if not isinstance(text, str):
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the passages of a vector index.
+
+    Postings are stored per term as parallel (rows, term frequencies) arrays, rows
+    matching the rows of the vector index the lexical index was built from.
+    """
+
+    def __init__(self, postings: Dict[str, Tuple[np.ndarray, np.ndarray]], document_lengths: np.ndarray,
+                 k1: float = 1.2, b: float = 0.75):
+        self.postings = postings
+        self.document_lengths = document_lengths
+        self.k1 = k1
+        self.b = b
+        self.average_length = float(document_lengths.mean()) if len(document_lengths) else 0.0
+
+    def __len__(self):
+        return len(self.document_lengths)
+
+    @classmethod
+    def build(cls, texts: Iterable, k1: float = 1.2, b: float = 0.75) -> "LexicalIndex":
+        postings = defaultdict(lambda: ([], []))
+        document_lengths = []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            document_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                rows, frequencies = postings[term]
+                rows.append(row)
+                frequencies.append(frequency)
+        return cls(
+            {term: (np.asarray(rows, dtype=np.int32), np.asarray(frequencies, dtype=np.float32)) for term, (rows, frequencies) in postings.items()},
+            np.asarray(document_lengths, dtype=np.float32),
+            k1=k1,
+            b=b,
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self), dtype=np.float32)
+        if len(self) == 0:
+            return scores
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows, frequencies = posting
+            idf = np.log(1.0 + (len(self) - len(rows) + 0.5) / (len(rows) + 0.5))
+            length_norm = self.k1 * (1.0 - self.b + self.b * self.document_lengths[rows] / (self.average_length or 1.0))
+            scores[rows] += idf * frequencies * (self.k1 + 1.0) / (frequencies + length_norm)
+        return scores
+
+    def search(self, query: str, result_count: int) -> List[Tuple[int, float]]:
+        """
+        Return the (row, score) pairs of the best matching passages, best first.
+        Passages sharing no term with the query are never returned.
+        """
+        scores = self.scores(query)
+        matches = np.flatnonzero(scores)
+        if result_count <= 0 or len(matches) == 0:
+            return []
+        k = min(result_count, len(matches))
+        top = matches[np.argpartition(-scores[matches], k - 1)[:k]] if k < len(matches) else matches
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def candidates(self, query: str, limit: int) -> np.ndarray:
+        """
+        Rows of the best lexical matches, in row order, used to prefilter a vector scan.
+        """
+        return np.sort(np.asarray([row for row, _ in self.search(query, limit)], dtype=np.int64))
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[int, float]]], result_count: int, k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse several rankings of (row, score) pairs, scoring each row by sum(1 / (k + rank)).
+    """
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, (row, _) in enumerate(ranking, start=1):
+            fused[row] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:result_count]
@@ -0,0 +1,144 @@
+"""
+Reduced-precision storage for the embedding matrices of vector indexes.
+
+``float16`` halves the memory of the float32 matrix and ``int8`` (symmetric scalar
+quantization with one scale per row) divides it by four. Scans convert fixed-size
+chunks back to float32 so the matrix products keep using BLAS.
+
+Measure the recall loss against the exact float32 scan:
+    python -m plugins.genai_interactions.vector_search.openai_file_search.utils.quantization docs.embeddings.npy --rerank 0 50
+"""
+import argparse
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .ivf_index import load_embeddings, sample_queries
+
+PRECISIONS = ("float32", "float16", "int8")
+# Rows converted back to float32 per matrix product, bounds the temporary buffer
+SCAN_CHUNK_SIZE = 16384
+
+
+class QuantizedMatrix:
+    """
+    Row-major embedding matrix stored as float16, or as int8 with per-row scales.
+
+    Supports the subset of the ndarray interface used by VectorIndex: ``shape``,
+    ``matrix @ query`` and ``matrix[rows]``, which returns float32 rows.
+    """
+
+    def __init__(self, data: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.data = data
+        self.scales = scales
+
+    @classmethod
+    def quantize(cls, matrix, precision: str) -> "QuantizedMatrix":
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if precision == "float16":
+            return cls(matrix.astype(np.float16))
+        if precision == "int8":
+            scales = (np.abs(matrix).max(axis=1, initial=0.0) / 127.0).astype(np.float32)
+            divisors = np.where(scales == 0, 1.0, scales).astype(np.float32)
+            data = np.rint(matrix / divisors[:, None]).astype(np.int8)
+            return cls(data, scales)
+        raise ValueError(f"Unsupported embedding precision {precision}, expected one of {PRECISIONS}")
+
+    @property
+    def precision(self) -> str:
+        return "int8" if self.scales is not None else "float16"
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def ndim(self) -> int:
+        return self.data.ndim
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, rows) -> np.ndarray:
+        values = self.data[rows].astype(np.float32)
+        if self.scales is not None:
+            values *= self.scales[rows][..., None]
+        return values
+
+    def __matmul__(self, query) -> np.ndarray:
+        query = np.asarray(query, dtype=np.float32)
+        scores = np.empty(self.data.shape[0], dtype=np.float32)
+        for start in range(0, self.data.shape[0], SCAN_CHUNK_SIZE):
+            chunk = self.data[start:start + SCAN_CHUNK_SIZE]
+            scores[start:start + chunk.shape[0]] = chunk.astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def __array__(self, dtype=None, copy=None):
+        values = self[:]
+        return values if dtype is None else values.astype(dtype)
+
+def evaluate_precision(embeddings: np.ndarray, queries: np.ndarray, result_count: int,
+                       precisions: List[str], reranks: List[int]) -> List[Dict]:
+    """
+    Compare quantized scans, optionally re-ranked with the float32 matrix, with the exact scan.
+    Reports the mean recall@result_count, the mean query latency and the matrix size.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    exact_results = []
+    start = time.perf_counter()
+    for query in queries:
+        scores = embeddings @ query
+        exact_results.append(set(np.argpartition(-scores, result_count - 1)[:result_count].tolist()))
+    exact_latency = (time.perf_counter() - start) * 1000 / len(queries)
+
+    report = [{"precision": "float32", "rerank": 0, "recall": 1.0, "latency_ms": exact_latency, "megabytes": embeddings.nbytes / 2**20}]
+    for precision in precisions:
+        if precision == "float32":
+            continue
+        matrix = QuantizedMatrix.quantize(embeddings, precision)
+        for rerank in reranks:
+            recall = 0.0
+            start = time.perf_counter()
+            for query, expected in zip(queries, exact_results):
+                scores = matrix @ query
+                depth = max(rerank, result_count)
+                found = np.argpartition(-scores, depth - 1)[:depth]
+                if rerank:
+                    exact_scores = embeddings[found] @ query
+                    found = found[np.argpartition(-exact_scores, result_count - 1)[:result_count]]
+                else:
+                    found = found[:result_count]
+                recall += len(expected.intersection(found.tolist())) / result_count
+            report.append({
+                "precision": precision,
+                "rerank": rerank,
+                "recall": recall / len(queries),
+                "latency_ms": (time.perf_counter() - start) * 1000 / len(queries),
+                "megabytes": matrix.nbytes / 2**20,
+            })
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark reduced-precision embedding storage against the exact float32 scan.")
+    parser.add_argument("embeddings_path", help="CSV index or binary .embeddings.npy file")
+    parser.add_argument("--precisions", nargs="+", default=["float16", "int8"], choices=PRECISIONS)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 50], help="Candidates re-ranked in float32, 0 disables re-ranking")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--result-count", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    embeddings = load_embeddings(args.embeddings_path)
+    queries = sample_queries(embeddings, args.queries)
+    print(f"{'precision':>9} {'rerank':>7} {'recall':>8} {'latency_ms':>11} {'megabytes':>10}")
+    for row in evaluate_precision(embeddings, queries, args.result_count, args.precisions, args.rerank):
+        print(f"{row['precision']:>9} {row['rerank']:>7} {row['recall']:>8.3f} {row['latency_ms']:>11.3f} {row['megabytes']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
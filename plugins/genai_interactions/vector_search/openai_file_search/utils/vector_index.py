@@ -0,0 +1,250 @@
+import io
+import json
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .quantization import QuantizedMatrix
+
+# Binary index layout: a float32 .npy matrix per embedding kind plus a metadata sidecar
+EMBEDDINGS_SUFFIX = ".embeddings.npy"
+TITLE_EMBEDDINGS_SUFFIX = ".title_embeddings.npy"
+METADATA_SUFFIX = ".metadata.csv"
+METADATA_COLUMNS = ['document_id', 'passage_id', 'passage_index', 'text', 'title', 'file_path']
+# Largest possible .npy header (version 2.0+ headers are prefixed by a 4 byte length)
+NPY_MAX_HEADER_SIZE = 12 + 65535
+
+
+class VectorIndex:
+    """
+    In-memory vector index built once from an index file.
+
+    Embeddings are stored as a pre-normalized float32 matrix so a query is scored
+    with a single matrix-vector product. Passage metadata is held in arrays parallel
+    to the matrix rows.
+    """
+
+    def __init__(self, embeddings, title_embeddings=None, document_ids=None, passage_ids=None,
+                 passage_indices=None, texts=None, titles=None, file_paths=None, version=None,
+                 normalized=False):
+        # Already normalized float32 matrices (e.g. memory-mapped binary indexes) are used without copying
+        prepare = self.as_matrix if normalized else self.normalize
+        self.embeddings = prepare(embeddings)
+        self.title_embeddings = prepare(title_embeddings) if title_embeddings is not None else None
+        row_count = self.embeddings.shape[0]
+        self.document_ids = self._column(document_ids, row_count)
+        self.passage_ids = self._column(passage_ids, row_count)
+        self.passage_indices = self._column(passage_indices, row_count)
+        self.texts = self._column(texts, row_count)
+        self.titles = self._column(titles, row_count)
+        self.file_paths = self._column(file_paths, row_count)
+        self.version = version
+        # Optional approximate index (IvfIndex) used to restrict the scan to candidate rows
+        self.ann_index = None
+        # Optional LexicalIndex over the passage texts, built on demand
+        self.lexical_index = None
+        # float32 matrices kept aside to re-rank candidates once the scanned matrices are quantized
+        self.exact_embeddings = None
+        self.exact_title_embeddings = None
+
+    def __len__(self):
+        return self.embeddings.shape[0]
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, version=None) -> "VectorIndex":
+        embeddings = cls.parse_embeddings(df['embedding'])
+        title_embeddings = cls.parse_embeddings(df['title_embedding']) if 'title_embedding' in df.columns else None
+        return cls(
+            embeddings=embeddings,
+            title_embeddings=title_embeddings,
+            document_ids=df.get('document_id'),
+            passage_ids=df.get('passage_id'),
+            passage_indices=df.get('passage_index'),
+            texts=df.get('text'),
+            titles=df.get('title'),
+            file_paths=df.get('file_path'),
+            version=version,
+        )
+
+    @classmethod
+    def from_binary(cls, embeddings_buffer, metadata_content: str, title_embeddings_buffer=None,
+                    version=None) -> "VectorIndex":
+        """
+        Build an index from the binary format without copying the embedding buffers.
+        The metadata must describe every row of the embeddings.
+        """
+        if metadata_content is None:
+            raise ValueError("The metadata of a binary vector index is required")
+        embeddings = cls.load_npy_buffer(embeddings_buffer)
+        title_embeddings = cls.load_npy_buffer(title_embeddings_buffer) if title_embeddings_buffer else None
+        metadata = pd.read_csv(io.StringIO(metadata_content)) if metadata_content else pd.DataFrame()
+        if len(metadata) != embeddings.shape[0]:
+            raise ValueError(f"Binary vector index metadata has {len(metadata)} rows for {embeddings.shape[0]} embeddings")
+        return cls(
+            embeddings=embeddings,
+            title_embeddings=title_embeddings,
+            document_ids=metadata.get('document_id'),
+            passage_ids=metadata.get('passage_id'),
+            passage_indices=metadata.get('passage_index'),
+            texts=metadata.get('text'),
+            titles=metadata.get('title'),
+            file_paths=metadata.get('file_path'),
+            version=version,
+            normalized=True,
+        )
+
+    def to_binary(self) -> Tuple[bytes, Optional[bytes], str]:
+        """
+        Serialize the index to (embeddings, title embeddings, metadata) in the binary format.
+        """
+        metadata = pd.DataFrame({
+            'document_id': self.document_ids,
+            'passage_id': self.passage_ids,
+            'passage_index': self.passage_indices,
+            'text': self.texts,
+            'title': self.titles,
+            'file_path': self.file_paths,
+        }, columns=METADATA_COLUMNS)
+        embeddings = self.exact_embeddings if self.exact_embeddings is not None else self.embeddings
+        title_embeddings = self.exact_title_embeddings if self.exact_title_embeddings is not None else self.title_embeddings
+        title_embeddings = self.dump_npy_buffer(title_embeddings) if title_embeddings is not None else None
+        return self.dump_npy_buffer(embeddings), title_embeddings, metadata.to_csv(index=False)
+
+    @staticmethod
+    def load_npy_buffer(buffer) -> np.ndarray:
+        header = io.BytesIO(bytes(memoryview(buffer)[:NPY_MAX_HEADER_SIZE]))
+        major, _ = np.lib.format.read_magic(header)
+        if major == 1:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+        if fortran_order:
+            raise ValueError("Fortran ordered vector indexes are not supported")
+        count = int(np.prod(shape))
+        return np.frombuffer(buffer, dtype=dtype, count=count, offset=header.tell()).reshape(shape)
+
+    @staticmethod
+    def dump_npy_buffer(matrix: np.ndarray) -> bytes:
+        stream = io.BytesIO()
+        np.save(stream, np.ascontiguousarray(matrix, dtype=np.float32))
+        return stream.getvalue()
+
+    @staticmethod
+    def parse_embeddings(column) -> np.ndarray:
+        # Embeddings are stored as stringified lists, json is much faster than literal_eval here
+        rows = [json.loads(value) if isinstance(value, str) else value for value in column]
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.asarray(rows, dtype=np.float32)
+
+    @staticmethod
+    def as_matrix(matrix) -> np.ndarray:
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+        return matrix
+
+    @classmethod
+    def normalize(cls, matrix) -> np.ndarray:
+        matrix = cls.as_matrix(matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @staticmethod
+    def _column(values, row_count) -> List:
+        if values is None:
+            return [None] * row_count
+        return list(values)
+
+    @property
+    def precision(self) -> str:
+        return self.embeddings.precision if isinstance(self.embeddings, QuantizedMatrix) else "float32"
+
+    def quantize(self, precision: str, keep_exact: bool = False) -> None:
+        """
+        Store the scanned matrices in reduced precision ("float16" or "int8").
+        With keep_exact the float32 matrices are kept to re-rank candidates, which is
+        cheap for memory-mapped binary indexes whose pages are shared and evictable.
+        """
+        if precision == "float32" or precision == self.precision:
+            return
+        if keep_exact:
+            self.exact_embeddings = self.embeddings
+            self.exact_title_embeddings = self.title_embeddings
+        self.embeddings = QuantizedMatrix.quantize(self.embeddings, precision)
+        if self.title_embeddings is not None:
+            self.title_embeddings = QuantizedMatrix.quantize(self.title_embeddings, precision)
+
+    def scores(self, query_embedding, text_weight=1.0, title_weight=0.0, use_title=False, rows=None,
+               exact=False) -> np.ndarray:
+        query = self.normalize_query(query_embedding)
+        matrix = self.exact_embeddings if exact else self.embeddings
+        title_matrix = self.exact_title_embeddings if exact else self.title_embeddings
+        embeddings = matrix if rows is None else matrix[rows]
+        scores = embeddings @ query
+        if use_title and title_matrix is not None:
+            title_embeddings = title_matrix if rows is None else title_matrix[rows]
+            scores = text_weight * scores + title_weight * (title_embeddings @ query)
+        return scores
+
+    @staticmethod
+    def normalize_query(query_embedding) -> np.ndarray:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm:
+            query = query / query_norm
+        return query
+
+    def search(self, query_embedding, result_count, text_weight=1.0, title_weight=0.0,
+               use_title=False, n_probe=0, rows=None, rerank=0) -> List[Tuple[int, float]]:
+        """
+        Return the (row, similarity) pairs of the top results, best first.
+        When candidate rows are given only those are scanned, otherwise with an
+        approximate index and n_probe > 0 only the probed clusters are scanned.
+        With quantized matrices and rerank > 0 the best rerank rows are re-scored in float32.
+        """
+        if len(self) == 0 or result_count <= 0:
+            return []
+
+        weights = dict(text_weight=text_weight, title_weight=title_weight, use_title=use_title)
+        rerank = rerank if self.exact_embeddings is not None else 0
+        depth = max(result_count, rerank)
+
+        if rows is None and self.ann_index is not None and n_probe > 0:
+            rows = self.ann_index.candidates(self.normalize_query(query_embedding), n_probe)
+        if rows is not None:
+            scores = self.scores(query_embedding, rows=rows, **weights)
+            hits = [(int(rows[position]), score) for position, score in self.top_k(scores, depth)]
+        else:
+            scores = self.scores(query_embedding, **weights)
+            hits = self.top_k(scores, depth)
+
+        if rerank:
+            candidates = np.asarray([row for row, _ in hits], dtype=np.int64)
+            exact_scores = self.scores(query_embedding, rows=candidates, exact=True, **weights)
+            hits = [(int(candidates[position]), score) for position, score in self.top_k(exact_scores, result_count)]
+        return hits[:result_count]
+
+    @staticmethod
+    def top_k(scores: np.ndarray, result_count: int) -> List[Tuple[int, float]]:
+        k = min(result_count, scores.shape[0])
+        if k <= 0:
+            return []
+        if k < scores.shape[0]:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def get_passage(self, row: int) -> dict:
+        return {
+            'document_id': self.document_ids[row],
+            'passage_id': self.passage_ids[row],
+            'passage_index': self.passage_indices[row],
+            'text': self.texts[row],
+            'title': self.titles[row],
+            'file_path': self.file_paths[row],
+        }
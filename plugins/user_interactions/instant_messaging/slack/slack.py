@@ -13,6 +13,7 @@ from fastapi import Request
 from pydantic import BaseModel
 from starlette.responses import Response
 
+from core.backend.flag_store import PROCESSING_FLAGS
 from core.global_manager import GlobalManager
 from core.user_interactions.incoming_notification_data_base import (
     IncomingNotificationDataBase,
@@ -200,10 +201,12 @@ class SlackPlugin(UserInteractionsPluginBase):
             self.logger.error(f"An error occurred while processing user input: {e}")
             raise
 
+    @staticmethod
+    def is_processed_event(event_type, event_subtype):
+        return (event_type == 'message' and event_subtype is None) or event_subtype == "file_share"
+
     async def process_event_by_type(self, event_data, event_type, event_subtype):
-        if event_type == 'message' and event_subtype is None:
-            await self.process_interaction(event_data)
-        elif event_subtype == "file_share":
+        if self.is_processed_event(event_type, event_subtype):
             await self.process_interaction(event_data)
         elif event_subtype is not None:
             self.logger.info(f"ignoring channel event subtype: {event_subtype}")
@@ -236,6 +239,11 @@ class SlackPlugin(UserInteractionsPluginBase):
         if not self._validate_event_data(event_type, ts, channel_id, user_id, event):
             return False
 
+        # Slack sends an app_mention and a message event for the same mention, only the one processed claims the message
+        if not self.is_processed_event(event_type, event.get('subtype')):
+            self.logger.debug(f"Discarding request: event '{event_type}' with subtype '{event.get('subtype')}' is not processed")
+            return False
+
         if not await self._validate_processing_status(channel_id, ts):
             return False
 
@@ -299,10 +307,10 @@ class SlackPlugin(UserInteractionsPluginBase):
             return False
 
         session_name = f"{channel_id}-{ts}.txt"
-        processing_container = self.backend_internal_data_processing_dispatcher.processing
-        result = await self.backend_internal_data_processing_dispatcher.read_data_content(processing_container, session_name)
+        # Claimed at once so that a retry delivered to another worker is discarded
+        claimed = await self.backend_internal_data_processing_dispatcher.claim_flag(PROCESSING_FLAGS, session_name, "processing")
 
-        if result is not None:
+        if not claimed:
             self.logger.warning(f"Discarding request: This request is already being processed for {session_name}")
             return False
 
@@ -22,6 +22,7 @@ from fastapi import Request
 from pydantic import BaseModel
 from starlette.responses import Response
 
+from core.backend.flag_store import PROCESSING_FLAGS
 from core.global_manager import GlobalManager
 from core.user_interactions.incoming_notification_data_base import (
     IncomingNotificationDataBase,
@@ -259,10 +260,10 @@ class TeamsPlugin(UserInteractionsPluginBase):
             message_id = event_data.get('conversation', {}).get('id', '').replace(':', '_')
             session_name = f"{user_id}-{message_id}.txt"
 
-        processing_container = self.backend_internal_data_processing_dispatcher.processing
-        result = await self.backend_internal_data_processing_dispatcher.read_data_content(processing_container, session_name)
+        # Claimed at once so that a retry delivered to another worker is discarded
+        claimed = await self.backend_internal_data_processing_dispatcher.claim_flag(PROCESSING_FLAGS, session_name, "processing")
 
-        if result is not None:
+        if not claimed:
             self.logger.warning(f"Discarding request: This request is already being processed for {session_name}")
             return True
         return False
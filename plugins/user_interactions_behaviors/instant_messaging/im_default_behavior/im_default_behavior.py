@@ -2,6 +2,7 @@ import json
 import time
 import traceback
 
+from core.backend.flag_store import ABORT_FLAGS, PROCESSING_FLAGS
 from core.genai_interactions.genai_response import GenAIResponse
 from core.user_interactions.incoming_notification_data_base import (
     IncomingNotificationDataBase,
@@ -74,10 +75,7 @@ class ImDefaultBehaviorPlugin(UserInteractionsBehaviorBase):
             channel_id = event.channel_id
             session_name = f"{channel_id.replace(':','_')}-{ts}.txt"
 
-            processing_container = self.backend_internal_data_processing_dispatcher.processing
-            abort_container = self.backend_internal_data_processing_dispatcher.abort
-
-            await self.backend_internal_data_processing_dispatcher.write_data_content(processing_container, session_name, data="processing")
+            await self.backend_internal_data_processing_dispatcher.set_flag(PROCESSING_FLAGS, session_name, "processing")
             self.logger.info(f"Processing session data for {session_name} created successfully.")
 
             # If the event is a thread message
@@ -89,7 +87,7 @@ class ImDefaultBehaviorPlugin(UserInteractionsBehaviorBase):
                     self.logger.info(f"Break keyword detected in thread message, stopping processing with flag {abort_name}.")
                     await self.instantmessaging_plugin.send_message(event=event, message=f"Break keyword detected, stopping further autogenerated processing in this thread. use {start_keyword} to resume", message_type=MessageType.COMMENT, is_internal=True, show_ref=False)
                     await self.instantmessaging_plugin.send_message(event=event, message=f"Break keyword detected, stopping further autogenerated processin in this thread. use {start_keyword} to resume", message_type=MessageType.COMMENT, is_internal=False, show_ref=False)
-                    await self.backend_internal_data_processing_dispatcher.write_data_content(abort_container, abort_name, data="abort")
+                    await self.backend_internal_data_processing_dispatcher.set_flag(ABORT_FLAGS, abort_name, "abort")
                     return
                 elif event.text == start_keyword:
                     thread_id = event.thread_id
@@ -97,7 +95,7 @@ class ImDefaultBehaviorPlugin(UserInteractionsBehaviorBase):
                     self.logger.info(f"Start keyword detected in thread message, resuming processing with flag {abort_name}.")
                     await self.instantmessaging_plugin.send_message(event=event, message="Start keyword detected, resuming further autogenerated processing in this thread.", message_type=MessageType.COMMENT, is_internal=True, show_ref=False)
                     await self.instantmessaging_plugin.send_message(event=event, message="Start keyword detected, resuming further autogenerated processing in this thread.", message_type=MessageType.COMMENT, is_internal=False, show_ref=False)
-                    await self.backend_internal_data_processing_dispatcher.remove_data_content(abort_container, abort_name)
+                    await self.backend_internal_data_processing_dispatcher.clear_flag(ABORT_FLAGS, abort_name)
                     return
                 else:
                     # If the bot is configured to require a mention in thread messages and the event is a mention,
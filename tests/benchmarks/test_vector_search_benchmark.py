@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from benchmarks.vector_search_benchmark import (
+    INDEX_NAME,
+    EmbeddingStub,
+    load_recorded_index,
+    make_plugin,
+    measure,
+    synthetic_corpus,
+    write_index,
+)
+from plugins.genai_interactions.vector_search.openai_file_search.utils.vector_index import (
+    VectorIndex,
+)
+
+
+def test_synthetic_corpus_shape():
+    df = synthetic_corpus(passages=50, dimensions=8, documents=5)
+    assert len(df) == 50
+    assert np.asarray(df['embedding'].tolist()).shape == (50, 8)
+    assert df['document_id'].nunique() <= 5
+
+@pytest.mark.asyncio
+async def test_embedding_stub_is_deterministic():
+    stub = EmbeddingStub(8, {"known": np.ones(8)})
+    first = await stub.create(input=["some text", "known"])
+    second = await stub.create(input="some text")
+    assert first.data[0].embedding == second.data[0].embedding
+    assert np.allclose(first.data[1].embedding, np.ones(8) / np.sqrt(8))
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("index_format", ["csv", "binary"])
+async def test_measure_reports_latency_and_memory(tmp_path, index_format):
+    index = VectorIndex.from_dataframe(synthetic_corpus(passages=200, dimensions=16, documents=10))
+    write_index(str(tmp_path), index, index_format, ann_lists=4)
+    plugin = make_plugin(str(tmp_path), EmbeddingStub(16), ann_probes=2)
+
+    report = await measure(plugin, [f"query {i}" for i in range(20)], result_count=3, search_mode="hybrid", prefilter=False)
+
+    assert report["passages"] == 200
+    assert 0 < report["p50_ms"] <= report["p99_ms"]
+    assert report["peak_rss_mb"] >= report["baseline_rss_mb"] > 0
+    assert plugin.indexes[INDEX_NAME].ann_index is not None
+
+def test_load_recorded_binary_index(tmp_path):
+    index = VectorIndex.from_dataframe(synthetic_corpus(passages=10, dimensions=4, documents=2))
+    write_index(str(tmp_path), index, "binary")
+    recorded = load_recorded_index(str(tmp_path / "vectors" / "benchmark.embeddings.npy"))
+    assert np.allclose(recorded.embeddings, index.embeddings)
+    assert recorded.texts == index.texts
@@ -1,13 +1,22 @@
 # tests/core/backend/test_backend_internal_data_processing_dispatcher.py
 
-from unittest.mock import MagicMock
+import json
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
 from core.backend.backend_internal_data_processing_dispatcher import (
     BackendInternalDataProcessingDispatcher,
 )
+from core.backend.flag_store import (
+    ABORT_FLAGS,
+    PROCESSING_FLAGS,
+    BackendFlagStore,
+    InMemoryFlagStore,
+)
 from core.backend.internal_data_processing_base import InternalDataProcessingBase
+from core.backend.pricing_data import PricingData
+from core.backend.shared_state import InMemorySharedState, SqliteSharedState
 
 
 @pytest.fixture
@@ -75,7 +84,7 @@ async def test_append_data(dispatcher, mock_plugin):
     dispatcher.initialize([mock_plugin])
     dispatcher.append_data('container_name', 'data_id', 'data')
     mock_plugin.append_data.assert_called_with('container_name', 'data_id', 'data')
-    
+
 @pytest.mark.asyncio
 async def test_read_data_content(dispatcher, mock_plugin):
     dispatcher.initialize([mock_plugin])
@@ -124,8 +133,295 @@ async def test_remove_data_content(dispatcher, mock_plugin):
     await dispatcher.remove_data_content('container', 'file')
     mock_plugin.remove_data_content.assert_called_with(data_container='container', data_file='file')
 
+@pytest.mark.asyncio
+async def test_list_stale_files_and_remove_many(dispatcher, mock_plugin):
+    dispatcher.initialize([mock_plugin])
+    mock_plugin.list_stale_files.return_value = [('file', 10)]
+    mock_plugin.remove_many.return_value = 1
+    dispatcher.invalidate_cache = MagicMock()
+    assert await dispatcher.list_stale_files('container', 1000) == [('file', 10)]
+    mock_plugin.list_stale_files.assert_called_with(data_container='container', older_than=1000)
+    assert await dispatcher.remove_many('container', ['file']) == 1
+    mock_plugin.remove_many.assert_called_with(data_container='container', data_files=['file'])
+    dispatcher.invalidate_cache.assert_called_once_with(mock_plugin, 'container', 'file')
+
+def test_initialize_retention_service(dispatcher, mock_plugin):
+    dispatcher.initialize([mock_plugin])
+    assert not dispatcher.retention_service.enabled
+    dispatcher.global_manager.bot_config.RETENTION = {'PROCESSING': 86400}
+    dispatcher.global_manager.bot_config.RETENTION_INTERVAL = 600
+    dispatcher.global_manager.bot_config.RETENTION_BATCH_SIZE = 100
+    dispatcher.initialize([mock_plugin])
+    assert dispatcher.retention_service.enabled
+    assert dispatcher.retention_service.interval == 600
+    assert dispatcher.retention_service.batch_size == 100
+
+@pytest.mark.asyncio
+async def test_read_many_reads_missing_files_in_one_round(dispatcher, mock_plugin):
+    dispatcher.global_manager.bot_config.INTERNAL_DATA_PROCESSING_CACHE = {'PROMPTS': {'TTL': 60}}
+    mock_plugin.prompts = 'prompts'
+    dispatcher.initialize([mock_plugin])
+    mock_plugin.read_many.return_value = ['core', None]
+
+    assert await dispatcher.read_many([('prompts', 'core.txt'), ('feedbacks', 'general.txt')]) == ['core', None]
+    mock_plugin.read_many.assert_awaited_once_with([('prompts', 'core.txt'), ('feedbacks', 'general.txt')], return_exceptions=False)
+
+    # The cached prompt is not read again
+    mock_plugin.read_many.return_value = [None]
+    assert await dispatcher.read_many([('prompts', 'core.txt'), ('feedbacks', 'general.txt')]) == ['core', None]
+    mock_plugin.read_many.assert_awaited_with([('feedbacks', 'general.txt')], return_exceptions=False)
+
+@pytest.mark.asyncio
+async def test_write_many_invalidates_cache(dispatcher, mock_plugin):
+    dispatcher.initialize([mock_plugin])
+    dispatcher.invalidate_cache = MagicMock()
+    await dispatcher.write_many([('prompts', 'core.txt', 'core'), ('prompts', 'main.txt', 'main')])
+    mock_plugin.write_many.assert_awaited_once_with([('prompts', 'core.txt', 'core'), ('prompts', 'main.txt', 'main')])
+    assert dispatcher.invalidate_cache.call_count == 2
+
 @pytest.mark.asyncio
 async def test_list_container_files(dispatcher, mock_plugin):
     dispatcher.initialize([mock_plugin])
     await dispatcher.list_container_files('container')
     mock_plugin.list_container_files.assert_called_with(container_name='container')
+
+@pytest.mark.asyncio
+async def test_get_data_version(dispatcher, mock_plugin):
+    dispatcher.initialize([mock_plugin])
+    await dispatcher.get_data_version('container', 'file')
+    mock_plugin.get_data_version.assert_called_with(data_container='container', data_file='file')
+
+@pytest.mark.asyncio
+async def test_read_data_buffer(dispatcher, mock_plugin):
+    dispatcher.initialize([mock_plugin])
+    await dispatcher.read_data_buffer('container', 'file')
+    mock_plugin.read_data_buffer.assert_called_with(data_container='container', data_file='file')
+
+@pytest.mark.asyncio
+async def test_append_session_messages(dispatcher, mock_plugin):
+    dispatcher.initialize([mock_plugin])
+    await dispatcher.append_session_messages('container', 'file', [{"role": "user", "content": "hi"}])
+    mock_plugin.append_session_messages.assert_called_with(data_container='container', data_file='file', messages=[{"role": "user", "content": "hi"}])
+
+@pytest.mark.asyncio
+async def test_append_session_messages_stores_images_once(dispatcher, mock_plugin):
+    mock_plugin.images = 'images'
+    dispatcher.initialize([mock_plugin])
+    image = {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,aGVsbG8=", "detail": "high"}}
+    await dispatcher.append_session_messages('container', 'file', [{"role": "user", "content": [image]}])
+
+    stored = mock_plugin.append_session_messages.call_args.kwargs['messages']
+    reference = stored[0]["content"][0]["image_url"]["url"]
+    assert reference.startswith("image-ref:sha256:")
+    mock_plugin.write_data_content.assert_called_once_with('images', reference.split(":")[-1], "data:image/jpeg;base64,aGVsbG8=")
+
+@pytest.mark.asyncio
+async def test_rehydrate_session_images(dispatcher, mock_plugin):
+    mock_plugin.images = 'images'
+    mock_plugin.read_data_content = AsyncMock(return_value="data:image/jpeg;base64,aGVsbG8=")
+    dispatcher.initialize([mock_plugin])
+    image = {"type": "image_url", "image_url": {"url": "image-ref:sha256:abc"}}
+    messages = await dispatcher.rehydrate_session_images([{"role": "user", "content": [image]}])
+    assert messages[0]["content"][0]["image_url"]["url"] == "data:image/jpeg;base64,aGVsbG8="
+    mock_plugin.read_data_content.assert_called_once_with('images', 'abc')
+
+@pytest.mark.asyncio
+async def test_read_session_messages(dispatcher, mock_plugin):
+    dispatcher.initialize([mock_plugin])
+    await dispatcher.read_session_messages('container', 'file')
+    mock_plugin.read_session_messages.assert_called_with(data_container='container', data_file='file')
+
+@pytest.fixture
+def cached_plugin(mock_global_manager):
+    mock_global_manager.bot_config.INTERNAL_DATA_PROCESSING_CACHE = {"PROMPTS": {"TTL": 300}, "FEEDBACKS": {"TTL": 300}}
+    plugin = MagicMock(spec=InternalDataProcessingBase)
+    plugin.plugin_name = 'mock_plugin'
+    plugin.prompts = 'prompts'
+    plugin.feedbacks = 'feedbacks'
+    plugin.abort = 'abort'
+    plugin.read_data_content = AsyncMock(return_value='prompt')
+    return plugin
+
+@pytest.mark.asyncio
+async def test_read_data_content_is_cached_until_written(dispatcher, cached_plugin):
+    dispatcher.initialize([cached_plugin])
+    assert await dispatcher.read_data_content('prompts', 'core_prompt.txt') == 'prompt'
+    assert await dispatcher.read_data_content('prompts', 'core_prompt.txt') == 'prompt'
+    cached_plugin.read_data_content.assert_called_once()
+
+    await dispatcher.write_data_content('prompts', 'core_prompt.txt', 'new prompt')
+    cached_plugin.read_data_content.return_value = 'new prompt'
+    assert await dispatcher.read_data_content('prompts', 'core_prompt.txt') == 'new prompt'
+    assert cached_plugin.read_data_content.call_count == 2
+
+@pytest.mark.asyncio
+async def test_read_data_content_caches_missing_files_until_removed(dispatcher, cached_plugin):
+    cached_plugin.read_data_content.return_value = None
+    dispatcher.initialize([cached_plugin])
+    assert await dispatcher.read_data_content('feedbacks', 'general.txt') is None
+    assert await dispatcher.read_data_content('feedbacks', 'general.txt') is None
+    cached_plugin.read_data_content.assert_called_once()
+
+    await dispatcher.remove_data_content('feedbacks', 'general.txt')
+    await dispatcher.read_data_content('feedbacks', 'general.txt')
+    assert cached_plugin.read_data_content.call_count == 2
+
+@pytest.mark.asyncio
+async def test_read_data_content_uncached_container(dispatcher, cached_plugin):
+    dispatcher.initialize([cached_plugin])
+    await dispatcher.read_data_content('sessions', 'thread.txt')
+    await dispatcher.read_data_content('sessions', 'thread.txt')
+    assert cached_plugin.read_data_content.call_count == 2
+
+@pytest.mark.asyncio
+async def test_read_data_content_is_not_cached_by_default(dispatcher, cached_plugin, mock_global_manager):
+    mock_global_manager.bot_config.INTERNAL_DATA_PROCESSING_CACHE = None
+    dispatcher.initialize([cached_plugin])
+    await dispatcher.read_data_content('prompts', 'core_prompt.txt')
+    await dispatcher.read_data_content('prompts', 'core_prompt.txt')
+    await dispatcher.read_data_content('abort', 'session.txt')
+    await dispatcher.read_data_content('abort', 'session.txt')
+    assert cached_plugin.read_data_content.call_count == 4
+
+def test_cache_policies_from_configuration(dispatcher, cached_plugin, mock_global_manager):
+    mock_global_manager.bot_config.INTERNAL_DATA_PROCESSING_CACHE = {"PROMPTS": {"TTL": 10}, "UNKNOWN": {"TTL": 10}}
+    cached_plugin.unknown = None
+    dispatcher.initialize([cached_plugin])
+    assert dispatcher.read_cache.is_cached('prompts')
+    assert not dispatcher.read_cache.is_cached('abort')
+    dispatcher.logger.error.assert_called_with("BackendInternalDataProcessingDispatcher: Unknown container 'UNKNOWN' in cache configuration")
+
+@pytest.mark.asyncio
+async def test_flags_use_in_memory_store_by_default(dispatcher, cached_plugin, mock_global_manager):
+    mock_global_manager.bot_config.FLAG_STORE = "memory"
+    mock_global_manager.bot_config.PROCESSING_FLAG_TTL = 3600
+    dispatcher.initialize([cached_plugin])
+    assert isinstance(dispatcher.flag_store, InMemoryFlagStore)
+
+    await dispatcher.set_flag(PROCESSING_FLAGS, 'C1-1.txt', 'processing')
+    assert await dispatcher.get_flag(PROCESSING_FLAGS, 'C1-1.txt') == 'processing'
+    await dispatcher.clear_flag(PROCESSING_FLAGS, 'C1-1.txt')
+    assert await dispatcher.get_flag(PROCESSING_FLAGS, 'C1-1.txt') is None
+    cached_plugin.write_data_content.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_abort_flags_stay_in_the_backend_by_default(dispatcher, cached_plugin, mock_global_manager):
+    mock_global_manager.bot_config.FLAG_STORE = "memory"
+    mock_global_manager.bot_config.ABORT_FLAG_STORE = "backend"
+    mock_global_manager.bot_config.ABORT_FLAG_TTL = None
+    dispatcher.initialize([cached_plugin])
+    assert isinstance(dispatcher.flag_store, InMemoryFlagStore)
+    assert isinstance(dispatcher.abort_flag_store, BackendFlagStore)
+
+    await dispatcher.set_flag(ABORT_FLAGS, 'C1-1.txt', 'abort')
+    cached_plugin.write_data_content.assert_awaited_once()
+    assert json.loads(cached_plugin.write_data_content.call_args.kwargs['data'])['expires_at'] is None
+
+    # Abort files written before flags had an expiry are still honoured
+    cached_plugin.read_data_content.return_value = 'abort'
+    assert await dispatcher.get_flag(ABORT_FLAGS, 'C1-2.txt') == 'abort'
+
+@pytest.mark.asyncio
+async def test_claim_flag_sets_a_flag_once(dispatcher, cached_plugin, mock_global_manager):
+    mock_global_manager.bot_config.FLAG_STORE = "memory"
+    dispatcher.initialize([cached_plugin])
+    assert await dispatcher.claim_flag(PROCESSING_FLAGS, 'C1-1.txt', 'processing') is True
+    assert await dispatcher.claim_flag(PROCESSING_FLAGS, 'C1-1.txt', 'processing') is False
+
+@pytest.mark.asyncio
+async def test_flags_use_sqlite_shared_state_when_configured(dispatcher, cached_plugin, mock_global_manager, tmp_path):
+    mock_global_manager.bot_config.FLAG_STORE = "sqlite"
+    mock_global_manager.bot_config.SHARED_STATE_PATH = str(tmp_path / "shared_state.db")
+    dispatcher.initialize([cached_plugin])
+    assert isinstance(dispatcher.flag_store, SqliteSharedState)
+    assert dispatcher.shared_state is dispatcher.flag_store
+
+    assert await dispatcher.claim_flag(PROCESSING_FLAGS, 'C1-1.txt', 'processing') is True
+    assert await dispatcher.get_flag(PROCESSING_FLAGS, 'C1-1.txt') == 'processing'
+    await dispatcher.close()
+    assert dispatcher.flag_store.executor is None
+
+@pytest.mark.asyncio
+async def test_unmentioned_messages_are_locked(dispatcher, mock_plugin):
+    dispatcher.initialize([mock_plugin])
+    holders = []
+
+    async def store_unmentioned_messages(channel_id, thread_id, message):
+        holders.append(await dispatcher.shared_state.get_flag("locks", f"mock_plugin/unmentioned_messages_{channel_id}_{thread_id}"))
+
+    mock_plugin.store_unmentioned_messages.side_effect = store_unmentioned_messages
+    await dispatcher.store_unmentioned_messages('C1', 'T1', {'role': 'user'})
+    assert holders[0] is not None
+    assert await dispatcher.shared_state.get_flag("locks", "mock_plugin/unmentioned_messages_C1_T1") is None
+
+@pytest.mark.asyncio
+async def test_unmentioned_messages_are_buffered_in_sqlite_shared_state(dispatcher, mock_plugin, mock_global_manager, tmp_path):
+    mock_global_manager.bot_config.FLAG_STORE = "sqlite"
+    mock_global_manager.bot_config.SHARED_STATE_PATH = str(tmp_path / "shared_state.db")
+    dispatcher.initialize([mock_plugin])
+
+    await dispatcher.store_unmentioned_messages('C1', 'T1', {'role': 'user', 'content': 'first'})
+    await dispatcher.store_unmentioned_messages('C1', 'T1', {'role': 'user', 'content': 'second'})
+
+    assert await dispatcher.retrieve_unmentioned_messages('C1', 'T1') == [
+        {'role': 'user', 'content': 'first'},
+        {'role': 'user', 'content': 'second'},
+    ]
+    assert await dispatcher.retrieve_unmentioned_messages('C1', 'T1') == []
+    mock_plugin.store_unmentioned_messages.assert_not_called()
+    await dispatcher.close()
+
+@pytest.mark.asyncio
+async def test_flags_use_backend_store_when_configured(dispatcher, cached_plugin, mock_global_manager):
+    mock_global_manager.bot_config.FLAG_STORE = "backend"
+    dispatcher.initialize([cached_plugin])
+    assert isinstance(dispatcher.flag_store, BackendFlagStore)
+    # Locks stay in the process
+    assert isinstance(dispatcher.shared_state, InMemorySharedState)
+
+    await dispatcher.set_flag(ABORT_FLAGS, 'C1-1.txt', 'abort')
+    cached_plugin.write_data_content.assert_awaited_once()
+    assert cached_plugin.write_data_content.call_args.kwargs['data_container'] == 'abort'
+
+@pytest.mark.asyncio
+async def test_increment_pricing_is_written_behind(dispatcher, mock_plugin, mock_global_manager):
+    mock_global_manager.bot_config.COST_FLUSH_INTERVAL = 60
+    mock_plugin.update_pricing = AsyncMock(return_value=PricingData(total_tokens=5))
+    dispatcher.initialize([mock_plugin])
+
+    total = await dispatcher.increment_pricing('costs', 'C1-T1.txt', PricingData(total_tokens=10))
+
+    assert total.total_tokens == 15
+    assert mock_plugin.update_pricing.await_count == 1
+    assert dispatcher.get_costs_by_channel()['C1'].total_tokens == 10
+    await dispatcher.close()
+    assert mock_plugin.update_pricing.call_args.kwargs['pricing_data'].total_tokens == 10
+
+@pytest.mark.asyncio
+async def test_increment_pricing_writes_through_without_flush_interval(dispatcher, mock_plugin, mock_global_manager):
+    mock_global_manager.bot_config.COST_FLUSH_INTERVAL = 0
+    mock_plugin.update_pricing = AsyncMock(return_value=PricingData(total_tokens=10))
+    dispatcher.initialize([mock_plugin])
+    pricing_data = PricingData(total_tokens=10)
+
+    assert (await dispatcher.increment_pricing('costs', 'C1-T1.txt', pricing_data)).total_tokens == 10
+    mock_plugin.update_pricing.assert_awaited_once_with(container_name='costs', datafile_name='C1-T1.txt', pricing_data=pricing_data)
+
+@pytest.mark.asyncio
+async def test_start_starts_plugins(dispatcher, mock_plugin):
+    startable_plugin = MagicMock(spec=InternalDataProcessingBase)
+    startable_plugin.plugin_name = 'startable_plugin'
+    startable_plugin.start = AsyncMock()
+    dispatcher.initialize([mock_plugin, startable_plugin])
+    await dispatcher.start()
+    startable_plugin.start.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_close_closes_plugins(dispatcher, mock_plugin):
+    closable_plugin = MagicMock(spec=InternalDataProcessingBase)
+    closable_plugin.plugin_name = 'closable_plugin'
+    closable_plugin.close = AsyncMock(side_effect=Exception("already closed"))
+    dispatcher.initialize([mock_plugin, closable_plugin])
+    await dispatcher.close()
+    closable_plugin.close.assert_awaited_once()
+    dispatcher.logger.error.assert_called_once()
@@ -0,0 +1,72 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.backend import compression
+from core.backend.compression import (
+    GzipCodec,
+    MissingCodecPackageError,
+    ZstdCodec,
+    container_codecs,
+    create_codec,
+    decode_content,
+    decode_segments,
+    detect_codec,
+    encode_content,
+)
+
+
+def test_encode_content_without_codec_keeps_text():
+    assert encode_content("text", None) == "text"
+
+def test_gzip_round_trip_detected_by_header():
+    data = encode_content("feedback " * 100, GzipCodec())
+    assert isinstance(detect_codec(data), GzipCodec)
+    assert len(data) < len("feedback " * 100)
+    assert decode_content(data) == "feedback " * 100
+
+def test_decode_content_plain_text():
+    assert detect_codec(b'{"key": "value"}') is None
+    assert decode_content('{"key": "é"}'.encode('utf-8')) == '{"key": "é"}'
+
+def test_decode_segments_mixes_plain_and_compressed_appends():
+    codec = GzipCodec()
+    data = b'{"a": 1}\n' + codec.compress(b'{"b": 2}\n') + codec.compress(b'{"c": 3}\n') + b'{"d": 4}\n'
+    assert decode_segments(data) == '{"a": 1}\n{"b": 2}\n{"c": 3}\n{"d": 4}\n'
+
+def test_decode_segments_corrupted_member():
+    with pytest.raises(ValueError):
+        decode_segments(GzipCodec.magic + b"\x08\x00" + b"\x00" * 6 + b"\xff\xff\xff")
+
+def test_decode_segments_torn_member_keeps_complete_records():
+    data = GzipCodec().compress(b'{"a": 1}\n' + b'{"b": "' + b"x" * 100 + b'"}\n')
+    assert decode_segments(data[:-10]).startswith('{"a": 1}\n')
+
+def test_create_codec():
+    assert create_codec(None) is None
+    assert create_codec("none") is None
+    assert isinstance(create_codec("GZIP"), GzipCodec)
+    with pytest.raises(ValueError):
+        create_codec("lzma")
+
+def test_zstd_requires_zstandard(monkeypatch):
+    monkeypatch.setattr(compression, "zstandard", None)
+    with pytest.raises(MissingCodecPackageError, match="zstandard"):
+        create_codec("zstd")
+    # Reading a zstd blob without the package names it too
+    with pytest.raises(MissingCodecPackageError, match="zstandard"):
+        decode_content(ZstdCodec.magic + b"\x00" * 8)
+
+def test_zstd_round_trip_detected_by_header():
+    pytest.importorskip("zstandard")
+    data = encode_content("feedback " * 100, ZstdCodec())
+    assert isinstance(detect_codec(data), ZstdCodec)
+    assert decode_content(data) == "feedback " * 100
+    assert decode_segments(b'{"a": 1}\n' + ZstdCodec().compress(b'{"b": 2}\n')) == '{"a": 1}\n{"b": 2}\n'
+
+def test_container_codecs():
+    plugin = MagicMock(sessions="sessions", feedbacks="feedbacks")
+    logger = MagicMock()
+    codecs = container_codecs(plugin, {"SESSIONS": "gzip", "FEEDBACKS": "brotli", "COSTS": "gzip"}, logger)
+    assert list(codecs) == ["sessions"]
+    assert logger.error.call_count == 2
@@ -0,0 +1,107 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from core.backend.cost_ledger import CostLedger
+from core.backend.pricing_data import PricingData
+
+
+class FakeCostPlugin:
+    plugin_name = "fake"
+
+    def __init__(self):
+        self.stored = {}
+        self.update_pricing = AsyncMock(side_effect=self._update_pricing)
+
+    async def _update_pricing(self, container_name, datafile_name, pricing_data):
+        data = self.stored.setdefault(datafile_name, PricingData())
+        data.total_tokens += pricing_data.total_tokens
+        data.total_cost += pricing_data.total_cost
+        return PricingData(total_tokens=data.total_tokens, total_cost=data.total_cost)
+
+@pytest.fixture
+def plugin():
+    return FakeCostPlugin()
+
+@pytest.fixture
+def ledger(plugin):
+    dispatcher = MagicMock()
+    dispatcher.get_plugin.return_value = plugin
+    # 2026-10-17 12:00 UTC
+    return CostLedger(dispatcher, flush_interval=60, clock=lambda: 1792238400)
+
+def cost(tokens):
+    return PricingData(total_tokens=tokens, total_cost=tokens / 100)
+
+@pytest.mark.asyncio
+async def test_increments_are_accumulated_and_flushed_once_per_thread(ledger, plugin):
+    plugin.stored["C1-T1.txt"] = PricingData(total_tokens=100, total_cost=1)
+
+    await ledger.increment(plugin, "costs", "C1-T1.txt", cost(10))
+    total = await ledger.increment(plugin, "costs", "C1-T1.txt", cost(20))
+    await ledger.increment(plugin, "costs", "C1-T2.txt", cost(5))
+
+    assert total.total_tokens == 130
+    # One zero increment per thread to load its stored total
+    assert plugin.update_pricing.await_count == 2
+    assert plugin.stored["C1-T1.txt"].total_tokens == 100
+
+    await ledger.close()
+    assert plugin.update_pricing.await_count == 4
+    assert plugin.stored["C1-T1.txt"].total_tokens == 130
+    assert plugin.stored["C1-T2.txt"].total_tokens == 5
+    assert not ledger.has_pending()
+    ledger.dispatcher.invalidate_cache.assert_called_with(plugin, "costs", "C1-T2.txt")
+
+@pytest.mark.asyncio
+async def test_concurrent_increments_are_not_lost(ledger, plugin):
+    await asyncio.gather(*(ledger.increment(plugin, "costs", "C1-T1.txt", cost(1)) for _ in range(50)))
+    await ledger.flush()
+    assert plugin.stored["C1-T1.txt"].total_tokens == 50
+    assert plugin.update_pricing.await_count == 2
+    await ledger.close()
+
+@pytest.mark.asyncio
+async def test_totals_by_channel_and_day(ledger, plugin):
+    await ledger.increment(plugin, "costs", "C1-T1.txt", cost(10))
+    await ledger.increment(plugin, "costs", "C1-T2.txt", cost(20))
+    await ledger.increment(plugin, "costs", "C2-T1.txt", cost(5))
+    assert ledger.channel_totals["C1"].total_tokens == 30
+    assert ledger.channel_totals["C2"].total_tokens == 5
+    assert ledger.daily_totals["2026-10-17"].total_cost == pytest.approx(0.35)
+    await ledger.close()
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried(ledger, plugin):
+    await ledger.increment(plugin, "costs", "C1-T1.txt", cost(10))
+    plugin.update_pricing.side_effect = Exception("storage unavailable")
+    await ledger.flush()
+    assert ledger.has_pending()
+    ledger.logger.error.assert_called_once()
+
+    plugin.update_pricing.side_effect = plugin._update_pricing
+    await ledger.close()
+    assert plugin.stored["C1-T1.txt"].total_tokens == 10
+
+@pytest.mark.asyncio
+async def test_periodic_flush(plugin):
+    dispatcher = MagicMock()
+    dispatcher.get_plugin.return_value = plugin
+    ledger = CostLedger(dispatcher, flush_interval=0.01)
+    await ledger.increment(plugin, "costs", "C1-T1.txt", cost(10))
+    await asyncio.wait_for(ledger.flush_task, timeout=1)
+    assert plugin.stored["C1-T1.txt"].total_tokens == 10
+
+@pytest.mark.asyncio
+async def test_flushed_entries_are_evicted(plugin):
+    dispatcher = MagicMock()
+    dispatcher.get_plugin.return_value = plugin
+    ledger = CostLedger(dispatcher, flush_interval=60, max_entries=2)
+    for index in range(3):
+        await ledger.increment(plugin, "costs", f"C1-T{index}.txt", cost(1))
+    assert len(ledger.entries) == 3
+    await ledger.close()
+    assert len(ledger.entries) < 3
+    assert (await ledger.increment(plugin, "costs", "C1-T0.txt", cost(1))).total_tokens == 2
+    await ledger.close()
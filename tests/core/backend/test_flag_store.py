@@ -0,0 +1,94 @@
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from core.backend.flag_store import (
+    ABORT_FLAGS,
+    PROCESSING_FLAGS,
+    BackendFlagStore,
+    InMemoryFlagStore,
+)
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.mark.asyncio
+async def test_in_memory_flags_expire():
+    clock = FakeClock()
+    store = InMemoryFlagStore(clock=clock)
+    await store.set_flag(PROCESSING_FLAGS, "C1-1.txt", "processing", ttl=10)
+    await store.set_flag(ABORT_FLAGS, "C1-1.txt", "abort")
+    assert await store.get_flag(PROCESSING_FLAGS, "C1-1.txt") == "processing"
+
+    clock.now = 11
+    assert await store.get_flag(PROCESSING_FLAGS, "C1-1.txt") is None
+    # Flags without a ttl are kept until cleared
+    assert await store.get_flag(ABORT_FLAGS, "C1-1.txt") == "abort"
+    await store.clear_flag(ABORT_FLAGS, "C1-1.txt")
+    assert await store.get_flag(ABORT_FLAGS, "C1-1.txt") is None
+    assert len(store) == 0
+
+@pytest.mark.asyncio
+async def test_in_memory_sweep_drops_flags_never_read_again():
+    clock = FakeClock()
+    store = InMemoryFlagStore(sweep_interval=60, clock=clock)
+    for i in range(100):
+        await store.set_flag(PROCESSING_FLAGS, f"C1-{i}.txt", ttl=30)
+    assert len(store) == 100
+
+    clock.now = 61
+    await store.set_flag(PROCESSING_FLAGS, "C1-new.txt", ttl=30)
+    assert len(store) == 1
+
+@pytest.mark.asyncio
+async def test_add_flag_sets_only_missing_flags():
+    clock = FakeClock()
+    store = InMemoryFlagStore(clock=clock)
+    assert await store.add_flag(PROCESSING_FLAGS, "C1-1.txt", "first", ttl=10) is True
+    assert await store.add_flag(PROCESSING_FLAGS, "C1-1.txt", "second", ttl=10) is False
+    assert await store.get_flag(PROCESSING_FLAGS, "C1-1.txt") == "first"
+
+    clock.now = 11
+    assert await store.add_flag(PROCESSING_FLAGS, "C1-1.txt", "third") is True
+
+@pytest.fixture
+def backend():
+    backend = MagicMock()
+    backend.processing = "processing_container"
+    backend.abort = "abort_container"
+    backend.write_data_content = AsyncMock()
+    backend.read_data_content = AsyncMock(return_value=None)
+    backend.remove_data_content = AsyncMock()
+    return backend
+
+@pytest.mark.asyncio
+async def test_backend_flag_store_writes_expiry(backend):
+    store = BackendFlagStore(backend, clock=FakeClock(1000))
+    await store.set_flag(PROCESSING_FLAGS, "C1-1.txt", "processing", ttl=60)
+    container, key, content = backend.write_data_content.call_args[0]
+    assert (container, key) == ("processing_container", "C1-1.txt")
+    assert json.loads(content) == {"value": "processing", "expires_at": 1060}
+
+@pytest.mark.asyncio
+async def test_backend_flag_store_expired_flag_is_removed(backend):
+    store = BackendFlagStore(backend, clock=FakeClock(2000))
+    backend.read_data_content.return_value = json.dumps({"value": "abort", "expires_at": 1500})
+    assert await store.get_flag(ABORT_FLAGS, "C1-1.txt") is None
+    backend.remove_data_content.assert_awaited_once_with("abort_container", "C1-1.txt")
+
+    backend.read_data_content.return_value = json.dumps({"value": "abort", "expires_at": None})
+    assert await store.get_flag(ABORT_FLAGS, "C1-1.txt") == "abort"
+
+@pytest.mark.asyncio
+async def test_backend_flag_store_reads_legacy_flags(backend):
+    store = BackendFlagStore(backend)
+    backend.read_data_content.return_value = "processing"
+    assert await store.get_flag(PROCESSING_FLAGS, "C1-1.txt") == "processing"
+    backend.read_data_content.return_value = None
+    assert await store.get_flag(PROCESSING_FLAGS, "C1-2.txt") is None
@@ -0,0 +1,85 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from core.backend.image_store import IMAGE_REF_PREFIX, MISSING_IMAGE_TEXT, ImageStore
+
+DATA_URL = "data:image/jpeg;base64,aGVsbG8="
+
+
+class FakeImagesPlugin:
+    def __init__(self):
+        self.plugin_name = "mock_plugin"
+        self.images = "images"
+        self.files = {}
+        self.write_data_content = AsyncMock(side_effect=self.write)
+        self.read_data_content = AsyncMock(side_effect=self.read)
+
+    async def write(self, data_container, data_file, data):
+        self.files[(data_container, data_file)] = data
+
+    async def read(self, data_container, data_file):
+        return self.files.get((data_container, data_file))
+
+def vision_message(url):
+    return {"role": "user", "content": [
+        {"type": "text", "text": "look"},
+        {"type": "image_url", "image_url": {"url": url, "detail": "high"}},
+    ]}
+
+@pytest.mark.asyncio
+async def test_externalize_replaces_images_with_references():
+    plugin = FakeImagesPlugin()
+    store = ImageStore()
+    messages = [{"role": "system", "content": "prompt"}, vision_message(DATA_URL)]
+
+    stored = await store.externalize(plugin, messages)
+
+    reference = stored[1]["content"][1]["image_url"]["url"]
+    assert reference == f"{IMAGE_REF_PREFIX}{ImageStore.digest(DATA_URL)}"
+    assert stored[1]["content"][1]["image_url"]["detail"] == "high"
+    assert stored[0] is messages[0]
+    # The messages given are left untouched
+    assert messages[1]["content"][1]["image_url"]["url"] == DATA_URL
+    plugin.write_data_content.assert_awaited_once_with("images", ImageStore.digest(DATA_URL), DATA_URL)
+
+@pytest.mark.asyncio
+async def test_externalize_stores_each_image_once():
+    plugin = FakeImagesPlugin()
+    store = ImageStore()
+    await store.externalize(plugin, [vision_message(DATA_URL), vision_message(DATA_URL)])
+    await store.externalize(plugin, [vision_message(DATA_URL)])
+    plugin.write_data_content.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_externalize_leaves_text_messages_alone():
+    plugin = MagicMock()
+    store = ImageStore()
+    messages = [{"role": "user", "content": "hi"}, {"role": "user", "content": [{"type": "text", "text": "file"}]}]
+    assert await store.externalize(plugin, messages) == messages
+
+@pytest.mark.asyncio
+async def test_rehydrate_restores_data_urls():
+    plugin = FakeImagesPlugin()
+    store = ImageStore()
+    stored = await store.externalize(plugin, [vision_message(DATA_URL), vision_message(DATA_URL)])
+
+    rehydrated = await store.rehydrate(plugin, stored)
+
+    assert rehydrated == [vision_message(DATA_URL), vision_message(DATA_URL)]
+    plugin.read_data_content.assert_awaited_once_with("images", ImageStore.digest(DATA_URL))
+
+@pytest.mark.asyncio
+async def test_rehydrate_replaces_missing_images_with_text():
+    plugin = FakeImagesPlugin()
+    store = ImageStore()
+    rehydrated = await store.rehydrate(plugin, [vision_message(f"{IMAGE_REF_PREFIX}unknown")])
+    assert rehydrated[0]["content"][1] == {"type": "text", "text": MISSING_IMAGE_TEXT}
+
+@pytest.mark.asyncio
+async def test_rehydrate_without_references_reads_nothing():
+    plugin = FakeImagesPlugin()
+    store = ImageStore()
+    messages = [vision_message(DATA_URL)]
+    assert await store.rehydrate(plugin, messages) is messages
+    plugin.read_data_content.assert_not_awaited()
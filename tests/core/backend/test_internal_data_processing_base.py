@@ -18,7 +18,8 @@ class MockInternalDataProcessing(InternalDataProcessingBase):
             "costs": [],
             "abort": False,
             "processing": [],
-            "vectors": []
+            "vectors": [],
+            "images": []
         }
         self._plugin_name = "MockInternalDataProcessor"
 
@@ -59,6 +60,10 @@ class MockInternalDataProcessing(InternalDataProcessingBase):
     def vectors(self):
         return self._data["vectors"]
 
+    @property
+    def images(self):
+        return self._data["images"]
+
     # Méthodes abstraites avec implémentations simples ou retours de mock
     def append_data(self, data_identifier, data):
         self._data[data_identifier].append(data)
@@ -66,6 +71,9 @@ class MockInternalDataProcessing(InternalDataProcessingBase):
     async def read_data_content(self, data_container, data_file):
         return "data"
 
+    async def read_data_buffer(self, data_container, data_file):
+        return b"data"
+
     async def write_data_content(self, data_container, data_file, data):
         pass
 
@@ -87,9 +95,24 @@ class MockInternalDataProcessing(InternalDataProcessingBase):
     async def remove_data_content(self, data_container, data_file):
         pass
 
+    async def get_data_version(self, data_container, data_file):
+        return "version"
+
+    async def append_session_messages(self, data_container, data_file, messages):
+        pass
+
+    async def read_session_messages(self, data_container, data_file):
+        return []
+
     async def list_container_files(self, container_name):
         return ["file1", "file2"]
 
+    async def list_stale_files(self, data_container, older_than):
+        return [("file1.txt", 10)]
+
+    async def remove_many(self, data_container, data_files):
+        return len(data_files)
+
     @property
     def plugin_name(self):
         return self._plugin_name
@@ -108,7 +131,7 @@ def mock_processor():
     return MockInternalDataProcessing()
 
 # Test for properties
-@pytest.mark.parametrize("prop", ["sessions", "messages", "feedbacks", "concatenate", "prompts", "costs", "abort", "processing", "vectors"])
+@pytest.mark.parametrize("prop", ["sessions", "messages", "feedbacks", "concatenate", "prompts", "costs", "abort", "processing", "vectors", "images"])
 def test_properties(mock_processor, prop):
     assert hasattr(mock_processor, prop), f"Property {prop} is missing"
 
@@ -121,6 +144,20 @@ async def test_read_data_content(mock_processor):
     result = await mock_processor.read_data_content("dummy_container", "dummy_file")
     assert result == "data", "Should return 'data'"
 
+@pytest.mark.asyncio
+async def test_read_many_reads_files_concurrently(mock_processor):
+    mock_processor.read_data_content = AsyncMock(side_effect=["first", Exception("unavailable")])
+    result = await mock_processor.read_many([("container", "first"), ("container", "second")], return_exceptions=True)
+    assert result[0] == "first"
+    assert isinstance(result[1], Exception)
+
+@pytest.mark.asyncio
+async def test_write_many_writes_every_file(mock_processor):
+    mock_processor.write_data_content = AsyncMock(return_value=None)
+    await mock_processor.write_many([("container", "first", "1"), ("other", "second", "2")])
+    mock_processor.write_data_content.assert_any_await("container", "first", "1")
+    mock_processor.write_data_content.assert_any_await("other", "second", "2")
+
 @pytest.mark.asyncio
 async def test_write_data_content(mock_processor):
     mock_write = AsyncMock(return_value=None)
@@ -0,0 +1,56 @@
+from core.backend.read_cache import CachePolicy, ReadCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_uncached_container_is_never_stored():
+    cache = ReadCache({"prompts": CachePolicy()})
+    cache.put("sessions", "file", "data")
+    assert cache.get("sessions", "file") == (False, None)
+    assert not cache.is_cached("sessions")
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ReadCache({"abort": CachePolicy(TTL=2)}, clock=clock)
+    cache.put("abort", "flag", None)
+    assert cache.get("abort", "flag") == (True, None)
+    clock.now = 2.5
+    assert cache.get("abort", "flag") == (False, None)
+
+def test_zero_ttl_disables_container():
+    cache = ReadCache({"prompts": CachePolicy(TTL=0)})
+    assert not cache.is_cached("prompts")
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ReadCache({"prompts": CachePolicy(MAX_ENTRIES=2, MAX_BYTES=10)})
+    cache.put("prompts", "a", "1234")
+    cache.put("prompts", "b", "1234")
+    cache.get("prompts", "a")
+    cache.put("prompts", "c", "12")
+    # b was the least recently used entry
+    assert cache.get("prompts", "b") == (False, None)
+    assert cache.get("prompts", "a") == (True, "1234")
+
+    cache.put("prompts", "d", "123456")
+    assert cache.stats()["bytes"] <= 10
+    assert cache.get("prompts", "d") == (True, "123456")
+
+    cache.put("prompts", "huge", "x" * 11)
+    assert cache.get("prompts", "huge") == (False, None)
+
+def test_invalidate_discards_reads_started_before_the_write():
+    cache = ReadCache({"prompts": CachePolicy()})
+    generation = cache.generation("prompts")
+    cache.invalidate("prompts", "core_prompt.txt")
+    cache.put("prompts", "core_prompt.txt", "stale", generation)
+    assert cache.get("prompts", "core_prompt.txt") == (False, None)
+
+    cache.put("prompts", "core_prompt.txt", "fresh", cache.generation("prompts"))
+    assert cache.get("prompts", "core_prompt.txt") == (True, "fresh")
+    cache.invalidate("prompts")
+    assert cache.get("prompts", "core_prompt.txt") == (False, None)
@@ -0,0 +1,93 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from core.backend.retention_service import RetentionService
+
+
+class FakeRetentionPlugin:
+    plugin_name = "fake"
+    processing = "processing"
+    sessions = "sessions"
+
+    def __init__(self):
+        self.files = {
+            "processing": {f"C1-T{index}.txt": (1000 + index, 10) for index in range(5)},
+            "sessions": {"C1-T1.txt": (5000, 100)},
+        }
+
+@pytest.fixture
+def plugin():
+    return FakeRetentionPlugin()
+
+@pytest.fixture
+def dispatcher(plugin):
+    dispatcher = MagicMock()
+    dispatcher.plugins = [plugin]
+
+    async def list_stale_files(data_container, older_than, plugin_name=None):
+        return [(name, size) for name, (modified, size) in plugin.files[data_container].items() if modified < older_than]
+
+    async def remove_many(data_container, data_files, plugin_name=None):
+        return sum(plugin.files[data_container].pop(name, None) is not None for name in data_files)
+
+    dispatcher.list_stale_files = AsyncMock(side_effect=list_stale_files)
+    dispatcher.remove_many = AsyncMock(side_effect=remove_many)
+    return dispatcher
+
+def service(dispatcher, retention, **kwargs):
+    return RetentionService(dispatcher, retention, batch_size=2, batch_pause=0, clock=lambda: 10000, **kwargs)
+
+@pytest.mark.asyncio
+async def test_stale_files_are_removed_in_batches(dispatcher, plugin):
+    retention = service(dispatcher, {"PROCESSING": 8000, "SESSIONS": 8000})
+    reports = await retention.run_once()
+
+    # Processing files older than 2000 are removed two at a time, the session is recent
+    assert plugin.files["processing"] == {}
+    assert dispatcher.remove_many.await_count == 3
+    assert dispatcher.remove_many.await_args_list[0].args == ("processing", ["C1-T0.txt", "C1-T1.txt"])
+    assert [(report.container, report.removed_files, report.reclaimed_bytes) for report in reports] == [
+        ("processing", 5, 50),
+        ("sessions", 0, 0),
+    ]
+    assert retention.last_report == reports
+
+@pytest.mark.asyncio
+async def test_partial_batches_are_prorated(dispatcher):
+    dispatcher.remove_many = AsyncMock(return_value=1)
+    reports = await service(dispatcher, {"PROCESSING": 8000}).run_once()
+    assert reports[0].stale_files == 5
+    assert reports[0].removed_files == 3
+    assert reports[0].reclaimed_bytes == 10 + 10 + 10
+
+@pytest.mark.asyncio
+async def test_unknown_containers_and_disabled_retentions_are_skipped(dispatcher):
+    reports = await service(dispatcher, {"UNKNOWN": 10, "SESSIONS": 0}).run_once()
+    assert reports == []
+    dispatcher.list_stale_files.assert_not_awaited()
+    dispatcher.logger.error.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_failed_batches_do_not_stop_the_run(dispatcher, plugin):
+    dispatcher.remove_many = AsyncMock(side_effect=[Exception("unavailable"), 2, 1])
+    reports = await service(dispatcher, {"PROCESSING": 8000}).run_once()
+    assert reports[0].removed_files == 3
+    dispatcher.logger.error.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_start_runs_periodically_until_closed(dispatcher, plugin):
+    retention = service(dispatcher, {"PROCESSING": 8000}, interval=0.01)
+    retention.start()
+    await asyncio.sleep(0.05)
+    await retention.close()
+    assert dispatcher.list_stale_files.await_count >= 2
+    assert retention.task is None
+
+@pytest.mark.asyncio
+async def test_disabled_service_does_not_start(dispatcher):
+    retention = RetentionService(dispatcher)
+    assert not retention.enabled
+    retention.start()
+    assert retention.task is None
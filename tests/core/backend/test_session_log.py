@@ -0,0 +1,27 @@
+import json
+
+from core.backend.session_log import (
+    is_legacy_session,
+    parse_session_messages,
+    serialize_session_messages,
+)
+
+
+def test_round_trip():
+    messages = [{"role": "system", "content": "line\nbreak"}, {"role": "user", "content": [{"type": "text", "text": "hi"}]}]
+    content = serialize_session_messages(messages)
+    assert content.count("\n") == 2
+    assert parse_session_messages(content) == messages
+
+def test_parse_legacy_session():
+    messages = [{"role": "user", "content": "hi"}]
+    assert is_legacy_session(" " + json.dumps(messages))
+    assert parse_session_messages(json.dumps(messages)) == messages
+
+def test_parse_skips_torn_record():
+    content = '{"role": "user", "content": "hi"}\n{"role": "assis'
+    assert parse_session_messages(content) == [{"role": "user", "content": "hi"}]
+
+def test_parse_empty_session():
+    assert parse_session_messages(None) == []
+    assert parse_session_messages("  \n") == []
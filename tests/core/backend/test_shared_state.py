@@ -0,0 +1,114 @@
+import asyncio
+import multiprocessing
+
+import pytest
+import pytest_asyncio
+
+from core.backend.shared_state import LOCKS, InMemorySharedState, SqliteSharedState
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest_asyncio.fixture(params=["memory", "sqlite"])
+async def store(request, tmp_path, clock):
+    if request.param == "memory":
+        store = InMemorySharedState(clock=clock)
+    else:
+        store = SqliteSharedState(str(tmp_path / "state" / "shared_state.db"), clock=clock)
+    yield store
+    await store.close()
+
+@pytest.mark.asyncio
+async def test_flags(store, clock):
+    assert await store.add_flag("processing", "C1-1.txt", "first", ttl=10) is True
+    assert await store.add_flag("processing", "C1-1.txt", "second", ttl=10) is False
+    assert await store.get_flag("processing", "C1-1.txt") == "first"
+
+    assert await store.release_flag("processing", "C1-1.txt", "second") is False
+    assert await store.release_flag("processing", "C1-1.txt", "first") is True
+    assert await store.get_flag("processing", "C1-1.txt") is None
+
+    await store.set_flag("abort", "C1-1.txt", "abort", ttl=10)
+    clock.now += 11
+    assert await store.get_flag("abort", "C1-1.txt") is None
+    assert await store.add_flag("abort", "C1-1.txt", "abort") is True
+    await store.clear_flag("abort", "C1-1.txt")
+    assert await store.get_flag("abort", "C1-1.txt") is None
+
+@pytest.mark.asyncio
+async def test_buffers(store, clock):
+    await store.append_buffer("unmentioned", "C1-T1", {"role": "user", "content": "first"})
+    await store.append_buffer("unmentioned", "C1-T1", {"role": "user", "content": "second"}, ttl=10)
+    await store.append_buffer("unmentioned", "C1-T2", "other")
+    assert await store.drain_buffer("unmentioned", "C1-T1") == [
+        {"role": "user", "content": "first"},
+        {"role": "user", "content": "second"},
+    ]
+    assert await store.drain_buffer("unmentioned", "C1-T1") == []
+
+    await store.append_buffer("unmentioned", "C1-T2", "expired", ttl=10)
+    clock.now += 11
+    assert await store.drain_buffer("unmentioned", "C1-T2") == ["other"]
+
+@pytest.mark.asyncio
+async def test_lock_serializes_holders(store):
+    events = []
+
+    async def hold(name):
+        async with store.lock("thread", poll_interval=0.001):
+            events.append(f"{name} in")
+            await asyncio.sleep(0.01)
+            events.append(f"{name} out")
+
+    await asyncio.gather(hold("a"), hold("b"))
+    assert events in (["a in", "a out", "b in", "b out"], ["b in", "b out", "a in", "a out"])
+    assert await store.get_flag(LOCKS, "thread") is None
+
+@pytest.mark.asyncio
+async def test_expired_lock_is_taken_over(store, clock):
+    assert await store.add_flag(LOCKS, "thread", "dead worker", ttl=30)
+    clock.now += 31
+    async with store.lock("thread"):
+        assert await store.get_flag(LOCKS, "thread") not in (None, "dead worker")
+
+def claim_flags(database_path, worker, results):
+    async def claim():
+        store = SqliteSharedState(database_path)
+        claimed = [key for key in range(50) if await store.add_flag("processing", str(key), str(worker))]
+        await store.close()
+        return claimed
+    results.put(asyncio.run(claim()))
+
+def test_flags_are_claimed_once_across_processes(tmp_path):
+    database_path = str(tmp_path / "shared_state.db")
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [context.Process(target=claim_flags, args=(database_path, worker, results)) for worker in range(3)]
+    for worker in workers:
+        worker.start()
+    claimed = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=60)
+    assert sorted(key for keys in claimed for key in keys) == list(range(50))
+
+@pytest.mark.asyncio
+async def test_sqlite_sweep_removes_expired_rows(tmp_path, clock):
+    store = SqliteSharedState(str(tmp_path / "shared_state.db"), sweep_interval=60, clock=clock)
+    await store.set_flag("processing", "old", ttl=10)
+    await store.append_buffer("unmentioned", "C1-T1", "old", ttl=10)
+    clock.now += 61
+    await store.set_flag("processing", "new", ttl=10)
+    counts = await store.run(lambda connection, now: [connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("flags", "buffers")])
+    assert counts == [1, 0]
+    await store.close()
+    with pytest.raises(RuntimeError):
+        await store.get_flag("processing", "new")
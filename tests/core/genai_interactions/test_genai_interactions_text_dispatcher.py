@@ -64,10 +64,23 @@ async def test_trigger_genai(dispatcher, mock_global_manager, mock_plugin):
     event.thread_id = "mock_thread_id"  # Ajoutez cet attribut
     event.channel_id = "mock_channel_id"  # Ajoutez cet attribut
     mock_global_manager.backend_internal_data_processing_dispatcher = MagicMock()
-    mock_global_manager.backend_internal_data_processing_dispatcher.read_data_content = AsyncMock(return_value=False)
+    mock_global_manager.backend_internal_data_processing_dispatcher.get_flag = AsyncMock(return_value=None)
     await dispatcher.trigger_genai(event)
+    mock_global_manager.backend_internal_data_processing_dispatcher.get_flag.assert_awaited_once_with("abort", "mock_channel_id-mock_thread_id.txt")
     mock_plugin.trigger_genai.assert_awaited_once_with(event=event)
 
+@pytest.mark.asyncio
+async def test_trigger_genai_aborted(dispatcher, mock_global_manager, mock_plugin):
+    event = MagicMock(spec=IncomingNotificationDataBase)
+    event.thread_id = "mock_thread_id"
+    event.channel_id = "mock_channel_id"
+    event.text = "trigger"
+    mock_global_manager.backend_internal_data_processing_dispatcher = MagicMock()
+    mock_global_manager.backend_internal_data_processing_dispatcher.get_flag = AsyncMock(return_value="abort")
+    mock_global_manager.user_interactions_dispatcher.send_message = AsyncMock()
+    await dispatcher.trigger_genai(event)
+    mock_plugin.trigger_genai.assert_not_awaited()
+
 @pytest.mark.asyncio
 async def test_handle_action(dispatcher, mock_plugin):
     action_input = MagicMock(spec=ActionInput)
@@ -92,3 +92,15 @@ async def test_handle_action(genai_vectorsearch, mock_plugin):
     genai_vectorsearch.default_plugin_name = "test_plugin"
     await genai_vectorsearch.handle_action(mock_action_input)
     mock_plugin.handle_action.assert_called_once_with(mock_action_input)
+
+@pytest.mark.asyncio
+async def test_close_closes_plugins(genai_vectorsearch, mock_plugin):
+    closing_plugin = MagicMock(plugin_name="closing_plugin")
+    closing_plugin.close = mock.AsyncMock(side_effect=RuntimeError("unavailable"))
+    other_plugin = MagicMock(plugin_name="other_plugin")
+    other_plugin.close = mock.AsyncMock()
+    genai_vectorsearch.plugins = [mock_plugin, closing_plugin, other_plugin]
+    await genai_vectorsearch.close()
+    # A plugin failing to close does not keep the others from closing
+    other_plugin.close.assert_awaited_once()
+    genai_vectorsearch.logger.error.assert_called_once()
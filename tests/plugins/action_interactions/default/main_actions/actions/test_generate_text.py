@@ -45,7 +45,7 @@ async def test_generate_text_execute(mock_global_manager):
     )
 
     # Mock necessary methods and attributes
-    mock_global_manager.backend_internal_data_processing_dispatcher.read_data_content = AsyncMock(return_value='[{"role": "user", "content": "Hello"}]')
+    mock_global_manager.backend_internal_data_processing_dispatcher.read_session_messages = AsyncMock(return_value=[{"role": "system", "content": "prompt"}, {"role": "user", "content": "Hello"}])
     mock_global_manager.genai_interactions_text_dispatcher.plugins = [MagicMock(plugin_name='TestModel')]
     mock_global_manager.genai_interactions_text_dispatcher.handle_action = AsyncMock(return_value='Generated response')
     mock_global_manager.user_interactions_dispatcher.send_message = AsyncMock()
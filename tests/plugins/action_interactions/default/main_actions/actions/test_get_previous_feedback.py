@@ -1,3 +1,4 @@
+import asyncio
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
@@ -17,6 +18,14 @@ def mock_backend_internal_data_processing_dispatcher():
     mock_dispatcher = MagicMock()
     mock_dispatcher.read_data_content = AsyncMock()
     mock_dispatcher.feedbacks = MagicMock()
+
+    async def read_many(data_files, return_exceptions=False):
+        return list(await asyncio.gather(
+            *(mock_dispatcher.read_data_content(data_container=data_container, data_file=data_file) for data_container, data_file in data_files),
+            return_exceptions=return_exceptions,
+        ))
+
+    mock_dispatcher.read_many = AsyncMock(side_effect=read_many)
     return mock_dispatcher
 
 def create_mock_incoming_notification():
@@ -50,6 +59,18 @@ async def test_get_previous_feedback_no_general_feedback(get_previous_feedback_a
 
     assert result == "Don't create another feedback from this as this is an automated message containing our insights from past interactions in the context of test_category test_sub_category :[Specific feedback content]. Based on these informations follow next step of your current workflow."
 
+@pytest.mark.asyncio
+async def test_get_previous_feedback_reads_feedbacks_in_one_round(get_previous_feedback_action, mock_backend_internal_data_processing_dispatcher):
+    mock_backend_internal_data_processing_dispatcher.read_data_content.side_effect = ["General feedback content", "Specific feedback content"]
+
+    await get_previous_feedback_action.get_previous_feedback("test_category", "test_sub_category")
+
+    feedbacks = mock_backend_internal_data_processing_dispatcher.feedbacks
+    mock_backend_internal_data_processing_dispatcher.read_many.assert_awaited_once_with(
+        [(feedbacks, "test_category_Global.txt"), (feedbacks, "test_category_test_sub_category.txt")],
+        return_exceptions=True,
+    )
+
 @pytest.mark.asyncio
 async def test_get_previous_feedback_no_specific_feedback(get_previous_feedback_action, mock_backend_internal_data_processing_dispatcher):
     category = "test_category"
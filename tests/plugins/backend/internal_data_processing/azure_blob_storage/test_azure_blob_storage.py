@@ -1,18 +1,32 @@
+import asyncio
 import json
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
-from azure.core.exceptions import AzureError
-from azure.identity import DefaultAzureCredential
-from azure.storage.blob import BlobServiceClient
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    AzureError,
+    HttpResponseError,
+    ResourceExistsError,
+    ResourceNotFoundError,
+    ResourceNotModifiedError,
+)
+from azure.identity.aio import DefaultAzureCredential
+from azure.storage.blob.aio import BlobServiceClient
 
+from core.backend.compression import GzipCodec
 from core.backend.pricing_data import PricingData
+from core.backend.session_log import parse_session_messages
 from plugins.backend.internal_data_processing.azure_blob_storage.azure_blob_storage import (
     AZURE_BLOB_STORAGE,
     AzureBlobStoragePlugin,
 )
 
 
+async def async_iter(items):
+    for item in items:
+        yield item
+
 @pytest.fixture
 def mock_config():
     return {
@@ -53,26 +67,119 @@ def test_initialize(azure_blob_storage_plugin):
             assert azure_blob_storage_plugin.sessions_container == azure_blob_storage_plugin.azure_blob_storage_config.SESSIONS_CONTAINER
             assert azure_blob_storage_plugin.messages_container == azure_blob_storage_plugin.azure_blob_storage_config.MESSAGES_CONTAINER
 
-def test_initialize_blob_service_client_error(mock_config, extended_mock_global_manager):
+@pytest.mark.asyncio
+async def test_initialize_blob_service_client_error(mock_config, extended_mock_global_manager):
     with patch.object(BlobServiceClient, '__init__', side_effect=AzureError("Azure error")):
         plugin = AzureBlobStoragePlugin(global_manager=extended_mock_global_manager)
         plugin.initialize()
+        with pytest.raises(AzureError):
+            plugin.blob_service_client
         assert plugin.initialization_failed is True  # Check if initialization failed
 
 @pytest.mark.asyncio
 async def test_update_session(azure_blob_storage_plugin):
-    with patch.object(azure_blob_storage_plugin, 'read_data_content', new_callable=AsyncMock) as mock_read, \
-         patch.object(azure_blob_storage_plugin, 'write_data_content', new_callable=AsyncMock) as mock_write:
-        mock_read.return_value = '[]'
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
         await azure_blob_storage_plugin.update_session('container', 'file', 'role', 'content')
-        mock_read.assert_called_once_with('container', 'file')
-        mock_write.assert_called_once()
-        updated_content = mock_write.call_args[0][2]
-        assert '{"role": "role", "content": "content"}' in updated_content
+        mock_blob_client = mock_get_blob_client.return_value
+        mock_blob_client.append_block.assert_called_once_with(b'{"role": "role", "content": "content"}\n')
+        mock_blob_client.upload_blob.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_append_session_messages_creates_append_blob(azure_blob_storage_plugin):
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
+        mock_blob_client = mock_get_blob_client.return_value
+        mock_blob_client.append_block.side_effect = [ResourceNotFoundError("missing"), None]
+        await azure_blob_storage_plugin.append_session_messages('Container', 'File.txt', [{"role": "user", "content": "hi"}])
+        mock_get_blob_client.assert_called_once_with(container='Container', blob='file.txt')
+        mock_blob_client.create_append_blob.assert_called_once_with(match_condition=MatchConditions.IfMissing)
+        assert mock_blob_client.append_block.call_count == 2
+
+@pytest.mark.asyncio
+async def test_concurrent_first_appends_do_not_truncate(azure_blob_storage_plugin):
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
+        mock_blob_client = mock_get_blob_client.return_value
+        mock_blob_client.append_block.side_effect = [ResourceNotFoundError("missing"), None]
+        # Another append created the blob first
+        mock_blob_client.create_append_blob.side_effect = ResourceExistsError("exists")
+        await azure_blob_storage_plugin._append_session_messages('container', 'file', [{"role": "user", "content": "hi"}])
+        assert mock_blob_client.append_block.call_count == 2
+
+@pytest.mark.asyncio
+async def test_write_session_blob_stages_the_content(azure_blob_storage_plugin):
+    session_client = MagicMock(blob_name="c1-t1.txt", start_copy_from_url=AsyncMock(return_value={'copy_status': 'pending'}))
+    session_client.get_blob_properties = AsyncMock(return_value=MagicMock(copy=MagicMock(status='success')))
+    staging_client = AsyncMock(url="https://account/sessions/staging")
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=staging_client) as mock_get_blob_client, \
+         patch('plugins.backend.internal_data_processing.azure_blob_storage.azure_blob_storage.COPY_POLL_INTERVAL', 0):
+        await azure_blob_storage_plugin.write_session_blob(session_client, 'sessions', [{"role": "user", "content": "hi"}])
+
+    assert mock_get_blob_client.call_args.kwargs['blob'].startswith("c1-t1.txt.")
+    staging_client.append_block.assert_awaited_once_with(b'{"role": "user", "content": "hi"}\n')
+    # The session blob itself is only replaced by the copy
+    session_client.start_copy_from_url.assert_awaited_once_with("https://account/sessions/staging")
+    session_client.get_blob_properties.assert_awaited_once()
+    staging_client.delete_blob.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_append_session_messages_converts_legacy_session(azure_blob_storage_plugin):
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
+        mock_blob_client = mock_get_blob_client.return_value
+        legacy_error = HttpResponseError("legacy")
+        legacy_error.error_code = "InvalidBlobType"
+        mock_blob_client.append_block.side_effect = [legacy_error, None]
+        mock_blob_client.download_blob.return_value.readall.return_value = json.dumps([{"role": "system", "content": "prompt"}]).encode('utf-8')
+
+        await azure_blob_storage_plugin.append_session_messages('container', 'file', [{"role": "user", "content": "hi"}])
+
+        mock_blob_client.create_append_blob.assert_called_once()
+        converted = parse_session_messages(mock_blob_client.append_block.call_args[0][0].decode('utf-8'))
+        assert converted == [{"role": "system", "content": "prompt"}, {"role": "user", "content": "hi"}]
+
+@pytest.mark.asyncio
+async def test_read_session_messages(azure_blob_storage_plugin):
+    with patch.object(azure_blob_storage_plugin, 'read_data_buffer', new_callable=AsyncMock) as mock_read:
+        mock_read.return_value = b'{"role": "user", "content": "a"}\n{"role": "assistant", "content": "b"}\n'
+        assert await azure_blob_storage_plugin.read_session_messages('container', 'file') == [
+            {"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}
+        ]
+        mock_read.return_value = None
+        assert await azure_blob_storage_plugin.read_session_messages('container', 'file') == []
+
+@pytest.mark.asyncio
+async def test_compressed_sessions_append_members(azure_blob_storage_plugin):
+    azure_blob_storage_plugin.codecs = {'sessions': GzipCodec()}
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
+        await azure_blob_storage_plugin.append_session_messages('sessions', 'file', [{"role": "user", "content": "a"}])
+        await azure_blob_storage_plugin.append_session_messages('other', 'file', [{"role": "assistant", "content": "b"}])
+        blocks = [call.args[0] for call in mock_get_blob_client.return_value.append_block.call_args_list]
+
+    assert blocks[0].startswith(GzipCodec.magic)
+    assert not blocks[1].startswith(GzipCodec.magic)
+    # A session compressed after plain appends is read back as a whole
+    with patch.object(azure_blob_storage_plugin, 'read_data_buffer', new_callable=AsyncMock, return_value=blocks[1] + blocks[0]):
+        assert await azure_blob_storage_plugin.read_session_messages('sessions', 'file') == [
+            {"role": "assistant", "content": "b"}, {"role": "user", "content": "a"}
+        ]
+
+@pytest.mark.asyncio
+async def test_compressed_data_content_round_trip(azure_blob_storage_plugin):
+    azure_blob_storage_plugin.codecs = {'feedbacks': GzipCodec()}
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
+        mock_blob_client = mock_get_blob_client.return_value
+        await azure_blob_storage_plugin.write_data_content('feedbacks', 'file', 'feedback ' * 100)
+        uploaded = mock_blob_client.upload_blob.call_args.args[0]
+        assert uploaded.startswith(GzipCodec.magic)
+        assert len(uploaded) < len('feedback ' * 100)
+
+        mock_blob_client.exists = AsyncMock(return_value=True)
+        mock_blob_client.download_blob.return_value.readall = AsyncMock(return_value=uploaded)
+        # Compressed blobs are read whatever the configuration
+        azure_blob_storage_plugin.codecs = {}
+        assert await azure_blob_storage_plugin.read_data_content('feedbacks', 'file') == 'feedback ' * 100
 
 @pytest.mark.asyncio
 async def test_read_data_content(azure_blob_storage_plugin):
-    with patch.object(BlobServiceClient, 'get_blob_client') as mock_get_blob_client:
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
         mock_blob_client = mock_get_blob_client.return_value
         mock_blob_client.exists = AsyncMock(return_value=True)
         mock_blob_client.download_blob = AsyncMock()
@@ -81,19 +188,20 @@ async def test_read_data_content(azure_blob_storage_plugin):
 
 @pytest.mark.asyncio
 async def test_read_data_content_blob_not_exists(azure_blob_storage_plugin):
-    with patch.object(BlobServiceClient, 'get_blob_client') as mock_get_blob_client:
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
         mock_blob_client = mock_get_blob_client.return_value
-        mock_blob_client.exists = MagicMock(return_value=False)
-        mock_blob_client.download_blob = AsyncMock()  # Mock download_blob to ensure it's not called
+        mock_blob_client.download_blob = AsyncMock(side_effect=ResourceNotFoundError("not found"))
 
         content = await azure_blob_storage_plugin.read_data_content('container', 'file')
 
         assert content is None
-        mock_blob_client.download_blob.assert_not_called()
+        # A missing blob costs a single request
+        mock_blob_client.download_blob.assert_awaited_once_with()
+        mock_blob_client.exists.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_remove_data_content(azure_blob_storage_plugin):
-    with patch.object(BlobServiceClient, 'get_blob_client') as mock_get_blob_client:
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
         mock_blob_client = mock_get_blob_client.return_value
         mock_blob_client.exists = AsyncMock(return_value=True)
         mock_blob_client.delete_blob = AsyncMock()
@@ -102,7 +210,7 @@ async def test_remove_data_content(azure_blob_storage_plugin):
 
 @pytest.mark.asyncio
 async def test_write_data_content(azure_blob_storage_plugin):
-    with patch.object(BlobServiceClient, 'get_blob_client') as mock_get_blob_client:
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
         mock_blob_client = mock_get_blob_client.return_value
         mock_blob_client.upload_blob = AsyncMock()
         await azure_blob_storage_plugin.write_data_content('container', 'file', 'data')
@@ -110,9 +218,9 @@ async def test_write_data_content(azure_blob_storage_plugin):
 
 @pytest.mark.asyncio
 async def test_store_unmentioned_messages_new_blob(azure_blob_storage_plugin):
-    with patch.object(BlobServiceClient, 'get_blob_client') as mock_get_blob_client:
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
         mock_blob_client = mock_get_blob_client.return_value
-        mock_blob_client.exists.return_value = False
+        mock_blob_client.download_blob = AsyncMock(side_effect=ResourceNotFoundError("not found"))
         mock_blob_client.upload_blob = AsyncMock()
 
         message = {"content": "test message"}
@@ -124,16 +232,16 @@ async def test_store_unmentioned_messages_new_blob(azure_blob_storage_plugin):
 
 @pytest.mark.asyncio
 async def test_retrieve_unmentioned_messages(azure_blob_storage_plugin):
-    with patch.object(BlobServiceClient, 'get_blob_client') as mock_get_blob_client:
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
         mock_blob_client = mock_get_blob_client.return_value
-        mock_blob_client.exists = MagicMock(return_value=True)
+        mock_blob_client.exists = AsyncMock(return_value=True)
 
-        mock_download_blob = MagicMock()
+        mock_download_blob = AsyncMock()
         mock_content = json.dumps([{"content": "test message"}]).encode()
         mock_download_blob.readall.return_value = mock_content
         mock_blob_client.download_blob.return_value = mock_download_blob
 
-        mock_blob_client.delete_blob = MagicMock()
+        mock_blob_client.delete_blob = AsyncMock()
 
         messages = await azure_blob_storage_plugin.retrieve_unmentioned_messages("channel1", "thread1")
 
@@ -169,7 +277,7 @@ async def test_list_container_files(azure_blob_storage_plugin):
         mock_blob1.name = "path/to/file1.txt"
         mock_blob2 = MagicMock()
         mock_blob2.name = "another/path/file2.json"
-        mock_container_client.list_blobs = MagicMock(return_value=[mock_blob1, mock_blob2])
+        mock_container_client.list_blobs = MagicMock(return_value=MagicMock(__aiter__=lambda _: async_iter([mock_blob1, mock_blob2])))
 
         files = await azure_blob_storage_plugin.list_container_files("test_container")
         print(f"Returned files: {files}")
@@ -177,42 +285,35 @@ async def test_list_container_files(azure_blob_storage_plugin):
 
 @pytest.mark.asyncio
 async def test_update_prompt_system_message(azure_blob_storage_plugin):
-    with patch.object(azure_blob_storage_plugin, 'read_data_content', new_callable=AsyncMock) as mock_read, \
-         patch.object(azure_blob_storage_plugin, 'write_data_content', new_callable=AsyncMock) as mock_write:
+    with patch.object(azure_blob_storage_plugin, 'read_data_buffer', new_callable=AsyncMock) as mock_read, \
+         patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
 
         mock_read.return_value = json.dumps([
             {"role": "system", "content": "old message"},
             {"role": "user", "content": "user message"}
-        ])
+        ]).encode('utf-8')
 
         await azure_blob_storage_plugin.update_prompt_system_message("channel1", "thread1", "new system message")
 
-        mock_write.assert_called_once()
-        updated_content = json.loads(mock_write.call_args[0][2])
+        mock_blob_client = mock_get_blob_client.return_value
+        mock_blob_client.create_append_blob.assert_called_once()
+        updated_content = parse_session_messages(mock_blob_client.append_block.call_args[0][0].decode('utf-8'))
         assert updated_content[0]["role"] == "system"
         assert updated_content[0]["content"] == "new system message"
 
-@pytest.mark.asyncio
-async def test_update_session_invalid_json(azure_blob_storage_plugin):
-    with patch.object(azure_blob_storage_plugin, 'read_data_content', new_callable=AsyncMock) as mock_read, \
-         patch.object(azure_blob_storage_plugin, 'write_data_content', new_callable=AsyncMock) as mock_write:
-        mock_read.return_value = 'invalid json'
-        await azure_blob_storage_plugin.update_session('container', 'file', 'role', 'content')
-        mock_write.assert_not_called()
-
 @pytest.mark.asyncio
 async def test_store_unmentioned_messages_existing_blob(azure_blob_storage_plugin):
-    with patch.object(BlobServiceClient, 'get_blob_client') as mock_get_blob_client:
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
         mock_blob_client = mock_get_blob_client.return_value
-        mock_blob_client.exists = MagicMock(return_value=True)
+        mock_blob_client.exists = AsyncMock(return_value=True)
 
         # Simuler le contenu existant du blob
         existing_content = json.dumps([{"content": "existing message"}]).encode('utf-8')
-        mock_download_blob = MagicMock()
-        mock_download_blob.readall = MagicMock(return_value=existing_content)
-        mock_blob_client.download_blob = MagicMock(return_value=mock_download_blob)
+        mock_download_blob = AsyncMock()
+        mock_download_blob.readall = AsyncMock(return_value=existing_content)
+        mock_blob_client.download_blob = AsyncMock(return_value=mock_download_blob)
 
-        mock_blob_client.upload_blob = MagicMock()
+        mock_blob_client.upload_blob = AsyncMock()
 
         message = {"content": "new message"}
         await azure_blob_storage_plugin.store_unmentioned_messages("channel1", "thread1", message)
@@ -224,10 +325,10 @@ async def test_store_unmentioned_messages_existing_blob(azure_blob_storage_plugi
         uploaded_content = mock_blob_client.upload_blob.call_args[0][0]
         assert json.loads(uploaded_content) == [{"content": "existing message"}, {"content": "new message"}]
 
-    # Vérifier que write_data_content n'a pas été appelé
-    with patch.object(azure_blob_storage_plugin, 'write_data_content', new_callable=AsyncMock) as mock_write:
-        await azure_blob_storage_plugin.store_unmentioned_messages("channel1", "thread1", message)
-        mock_write.assert_not_called()
+        # Vérifier que write_data_content n'a pas été appelé
+        with patch.object(azure_blob_storage_plugin, 'write_data_content', new_callable=AsyncMock) as mock_write:
+            await azure_blob_storage_plugin.store_unmentioned_messages("channel1", "thread1", message)
+            mock_write.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_update_pricing_empty_initial_data(azure_blob_storage_plugin):
@@ -270,3 +371,148 @@ def test_properties(azure_blob_storage_plugin):
     assert azure_blob_storage_plugin.processing == azure_blob_storage_plugin.processing_container
     assert azure_blob_storage_plugin.abort == azure_blob_storage_plugin.abort_container
     assert azure_blob_storage_plugin.vectors == azure_blob_storage_plugin.vectors_container
+
+@pytest.mark.asyncio
+async def test_get_data_version(azure_blob_storage_plugin):
+    mock_blob_client = AsyncMock()
+    mock_blob_client.get_blob_properties.return_value.etag = '"0x8D"'
+    azure_blob_storage_plugin.blob_service_client = MagicMock()
+    azure_blob_storage_plugin.blob_service_client.get_blob_client.return_value = mock_blob_client
+    version = await azure_blob_storage_plugin.get_data_version('container', 'File')
+    assert version == '"0x8D"'
+    azure_blob_storage_plugin.blob_service_client.get_blob_client.assert_called_once_with('container', 'file')
+
+@pytest.mark.asyncio
+async def test_get_data_version_blob_not_found(azure_blob_storage_plugin):
+    mock_blob_client = AsyncMock()
+    mock_blob_client.get_blob_properties.side_effect = ResourceNotFoundError("not found")
+    azure_blob_storage_plugin.blob_service_client = MagicMock()
+    azure_blob_storage_plugin.blob_service_client.get_blob_client.return_value = mock_blob_client
+    assert await azure_blob_storage_plugin.get_data_version('container', 'file') is None
+
+@pytest.mark.asyncio
+async def test_read_data_buffer(azure_blob_storage_plugin):
+    mock_blob_client = AsyncMock()
+    mock_blob_client.exists.return_value = True
+    mock_blob_client.download_blob.return_value.readall.return_value = b'\x00\x01'
+    azure_blob_storage_plugin.blob_service_client = MagicMock()
+    azure_blob_storage_plugin.blob_service_client.get_blob_client.return_value = mock_blob_client
+    assert await azure_blob_storage_plugin.read_data_buffer('container', 'file') == b'\x00\x01'
+
+@pytest.mark.asyncio
+async def test_blob_service_client_uses_pooled_transport(extended_mock_global_manager, mock_config):
+    mock_config["CONNECTION_POOL_SIZE"] = 16
+    plugin = AzureBlobStoragePlugin(global_manager=extended_mock_global_manager)
+    plugin.initialize()
+    # The session is only created inside the running loop, on first use
+    assert plugin.transport is None
+
+    blob_client = plugin.blob_service_client.get_blob_client('container', 'file')
+    assert blob_client._pipeline._transport._transport is plugin.transport
+    session = plugin.transport.session
+    assert session.connector.limit == 16
+
+    await plugin.close()
+    assert session.closed
+    assert plugin.transport is None
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_do_not_block_each_other(azure_blob_storage_plugin):
+    in_flight = 0
+    max_in_flight = 0
+
+    async def slow_download():
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        raise ResourceNotFoundError("not found")
+
+    with patch.object(BlobServiceClient, 'get_blob_client', return_value=AsyncMock()) as mock_get_blob_client:
+        mock_get_blob_client.return_value.download_blob = slow_download
+        await asyncio.gather(*(azure_blob_storage_plugin.read_data_content('container', f'file{i}') for i in range(5)))
+    assert max_in_flight == 5
+
+@pytest.mark.asyncio
+async def test_close(azure_blob_storage_plugin):
+    blob_service_client = azure_blob_storage_plugin.blob_service_client = AsyncMock()
+    azure_blob_storage_plugin.credential = AsyncMock()
+    await azure_blob_storage_plugin.close()
+    blob_service_client.close.assert_awaited_once()
+    azure_blob_storage_plugin.credential.close.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_repeated_reads_are_conditional(azure_blob_storage_plugin):
+    mock_blob_client = AsyncMock()
+    mock_blob_client.download_blob.return_value.readall.return_value = b'prompt'
+    mock_blob_client.download_blob.return_value.properties.etag = '"0x1"'
+    azure_blob_storage_plugin.blob_service_client = MagicMock()
+    azure_blob_storage_plugin.blob_service_client.get_blob_client.return_value = mock_blob_client
+
+    assert await azure_blob_storage_plugin.read_data_content('prompts', 'prompt.txt') == 'prompt'
+    mock_blob_client.download_blob.side_effect = ResourceNotModifiedError("not modified")
+    assert await azure_blob_storage_plugin.read_data_content('prompts', 'prompt.txt') == 'prompt'
+    assert await azure_blob_storage_plugin.read_data_buffer('prompts', 'prompt.txt') == b'prompt'
+
+    assert mock_blob_client.download_blob.await_args_list[0].kwargs == {}
+    assert mock_blob_client.download_blob.await_args.kwargs == {'etag': '"0x1"', 'match_condition': MatchConditions.IfModified}
+    mock_blob_client.exists.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_blob_cache_follows_writes_and_removals(azure_blob_storage_plugin):
+    mock_blob_client = AsyncMock()
+    mock_blob_client.upload_blob.return_value = {'etag': '"0x2"'}
+    mock_blob_client.download_blob.side_effect = ResourceNotModifiedError("not modified")
+    azure_blob_storage_plugin.blob_service_client = MagicMock()
+    azure_blob_storage_plugin.blob_service_client.get_blob_client.return_value = mock_blob_client
+
+    await azure_blob_storage_plugin.write_data_content('feedbacks', 'file', 'feedback')
+    assert await azure_blob_storage_plugin.read_data_content('feedbacks', 'file') == 'feedback'
+    assert mock_blob_client.download_blob.await_args.kwargs['etag'] == '"0x2"'
+
+    await azure_blob_storage_plugin.remove_data_content('feedbacks', 'file')
+    mock_blob_client.download_blob.side_effect = ResourceNotFoundError("not found")
+    assert await azure_blob_storage_plugin.read_data_content('feedbacks', 'file') is None
+    assert mock_blob_client.download_blob.await_args.kwargs == {}
+
+@pytest.mark.asyncio
+async def test_remove_missing_blob_is_a_single_request(azure_blob_storage_plugin):
+    mock_blob_client = AsyncMock()
+    mock_blob_client.delete_blob.side_effect = ResourceNotFoundError("not found")
+    azure_blob_storage_plugin.blob_service_client = MagicMock()
+    azure_blob_storage_plugin.blob_service_client.get_blob_client.return_value = mock_blob_client
+    assert await azure_blob_storage_plugin.remove_data_content('container', 'file') is None
+    mock_blob_client.exists.assert_not_called()
+    azure_blob_storage_plugin.logger.error.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_list_stale_files(azure_blob_storage_plugin):
+    old_blob = MagicMock(size=10)
+    old_blob.name = "old.txt"
+    old_blob.last_modified.timestamp.return_value = 1000
+    new_blob = MagicMock(size=20)
+    new_blob.name = "new.txt"
+    new_blob.last_modified.timestamp.return_value = 3000
+    azure_blob_storage_plugin.blob_service_client = MagicMock()
+    azure_blob_storage_plugin.blob_service_client.get_container_client.return_value.list_blobs = MagicMock(
+        return_value=async_iter([old_blob, new_blob])
+    )
+    assert await azure_blob_storage_plugin.list_stale_files('processing', 2000) == [("old.txt", 10)]
+
+@pytest.mark.asyncio
+async def test_remove_many_deletes_in_batches(azure_blob_storage_plugin):
+    mock_container_client = MagicMock()
+    mock_container_client.delete_blobs = AsyncMock(
+        side_effect=lambda *blobs, **kwargs: async_iter([MagicMock(status_code=202 if blob != "gone.txt" else 404) for blob in blobs])
+    )
+    azure_blob_storage_plugin.blob_service_client = MagicMock()
+    azure_blob_storage_plugin.blob_service_client.get_container_client.return_value = mock_container_client
+    azure_blob_storage_plugin.blob_cache.put('processing', 'file0.txt', '"0x1"', b"data")
+
+    files = [f"File{index}.txt" for index in range(300)] + ["gone.txt"]
+    assert await azure_blob_storage_plugin.remove_many('processing', files) == 300
+    assert mock_container_client.delete_blobs.await_count == 2
+    assert len(mock_container_client.delete_blobs.await_args_list[0].args) == 256
+    assert mock_container_client.delete_blobs.await_args.kwargs == {'raise_on_any_failure': False}
+    assert azure_blob_storage_plugin.blob_cache.get('processing', 'file0.txt') is None
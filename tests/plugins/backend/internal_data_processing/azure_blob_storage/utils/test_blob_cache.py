@@ -0,0 +1,45 @@
+from plugins.backend.internal_data_processing.azure_blob_storage.utils.blob_cache import (
+    BlobCache,
+)
+
+
+def test_put_and_get():
+    cache = BlobCache()
+    assert cache.get("prompts", "prompt.txt") is None
+    cache.put("prompts", "prompt.txt", '"0x1"', b"prompt")
+    assert cache.get("prompts", "prompt.txt") == ('"0x1"', b"prompt")
+    cache.invalidate("prompts", "prompt.txt")
+    assert cache.get("prompts", "prompt.txt") is None
+
+def test_least_recently_used_blobs_are_dropped():
+    cache = BlobCache(max_entries=2)
+    cache.put("c", "a", "1", b"a")
+    cache.put("c", "b", "1", b"b")
+    cache.get("c", "a")
+    cache.put("c", "c", "1", b"c")
+    assert cache.get("c", "b") is None
+    assert len(cache) == 2
+
+def test_blobs_without_etag_or_too_large_are_not_kept():
+    cache = BlobCache(max_blob_size=4)
+    cache.put("c", "a", '"0x1"', b"small")
+    cache.put("c", "b", None, b"b")
+    assert len(cache) == 0
+
+def test_replacing_with_an_uncacheable_blob_drops_the_old_one():
+    cache = BlobCache(max_blob_size=4)
+    cache.put("c", "a", '"0x1"', b"a")
+    cache.put("c", "a", '"0x2"', b"too large")
+    assert cache.get("c", "a") is None
+
+def test_least_recently_used_blobs_are_dropped_beyond_max_bytes():
+    cache = BlobCache(max_bytes=10)
+    cache.put("c", "a", "1", b"aaaa")
+    cache.put("c", "b", "1", b"bbbb")
+    cache.get("c", "a")
+    cache.put("c", "c", "1", b"cccc")
+    assert cache.get("c", "b") is None
+    assert cache.size == 8
+    cache.put("c", "a", "2", b"a")
+    cache.invalidate("c", "c")
+    assert cache.size == 1
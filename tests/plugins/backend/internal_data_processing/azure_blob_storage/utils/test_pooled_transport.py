@@ -0,0 +1,24 @@
+import pytest
+
+from plugins.backend.internal_data_processing.azure_blob_storage.utils.pooled_transport import (
+    create_pooled_transport,
+)
+
+
+@pytest.mark.asyncio
+async def test_transport_uses_pooled_session():
+    transport = create_pooled_transport(pool_size=8)
+    session = transport.session
+    assert session.connector.limit == 8
+    assert session.connector.limit_per_host == 8
+
+    # Requests reuse the same session and its connection pool
+    await transport.open()
+    await transport.open()
+    assert transport.session is session
+
+    # Closing the transport, as clients do, leaves the session to its owner
+    await transport.close()
+    assert not session.closed
+    await session.close()
+    assert session.closed
@@ -1,13 +1,21 @@
+import asyncio
+import json
+import mmap
 import os
+import threading
 from unittest.mock import AsyncMock, mock_open, patch
 
 import pytest
 
+from core.backend.compression import GzipCodec
 from core.backend.pricing_data import PricingData
+from core.backend.session_log import parse_session_messages
 from plugins.backend.internal_data_processing.file_system.file_system import (
     FileSystemPlugin,
 )
 
+FILE_SYSTEM_MODULE = "plugins.backend.internal_data_processing.file_system.file_system"
+
 @pytest.fixture
 def mock_config():
     return {
@@ -40,11 +48,11 @@ def file_system_plugin(extended_mock_global_manager):
 
 @pytest.mark.asyncio
 async def test_read_data_content(file_system_plugin):
-    m = mock_open(read_data='{"key": "value"}')
+    m = mock_open(read_data=b'{"key": "value"}')
     with patch("builtins.open", m), patch("os.path.exists", return_value=True):
         content = await file_system_plugin.read_data_content('container', 'file')
         assert content == '{"key": "value"}'
-        m.assert_called_once_with(os.path.join(file_system_plugin.root_directory, 'container', 'file'), 'r')
+        m.assert_called_once_with(os.path.join(file_system_plugin.root_directory, 'container', 'file'), 'rb')
 
 @pytest.mark.asyncio
 async def test_read_data_content_file_not_exists(file_system_plugin):
@@ -54,11 +62,18 @@ async def test_read_data_content_file_not_exists(file_system_plugin):
 
 @pytest.mark.asyncio
 async def test_write_data_content(file_system_plugin):
-    m = mock_open()
-    with patch("builtins.open", m):
+    with patch(f"{FILE_SYSTEM_MODULE}.atomic_write") as mock_atomic_write:
         await file_system_plugin.write_data_content('container', 'file', '{"key": "value"}')
-        m.assert_called_once_with(os.path.join(file_system_plugin.root_directory, 'container', 'file'), 'w')
-        m().write.assert_called_once_with('{"key": "value"}')
+        mock_atomic_write.assert_called_once_with(os.path.join(file_system_plugin.root_directory, 'container', 'file'), '{"key": "value"}')
+
+@pytest.mark.asyncio
+async def test_write_data_content_replaces_file_atomically(file_system_plugin, tmp_path):
+    file_system_plugin.root_directory = str(tmp_path)
+    os.makedirs(tmp_path / 'container')
+    (tmp_path / 'container' / 'file').write_text('old')
+    await file_system_plugin.write_data_content('container', 'file', 'new')
+    assert (tmp_path / 'container' / 'file').read_text() == 'new'
+    assert os.listdir(tmp_path / 'container') == ['file']
 
 @pytest.mark.asyncio
 async def test_remove_data_content(file_system_plugin):
@@ -75,7 +90,7 @@ async def test_remove_data_content_file_not_exists(file_system_plugin):
 @patch('os.makedirs')
 def test_init_shares(mock_makedirs, file_system_plugin):
     file_system_plugin.init_shares()
-    assert mock_makedirs.call_count == 6
+    assert mock_makedirs.call_count == 7
 
 @pytest.mark.asyncio
 async def test_append_data(file_system_plugin):
@@ -88,10 +103,10 @@ async def test_append_data(file_system_plugin):
 @pytest.mark.asyncio
 async def test_store_unmentioned_messages(file_system_plugin):
     m = mock_open(read_data='[]')
-    with patch("builtins.open", m), patch("os.path.exists", return_value=True), patch("json.dump") as mock_dump:
+    with patch("builtins.open", m), patch("os.path.exists", return_value=True), patch(f"{FILE_SYSTEM_MODULE}.atomic_write") as mock_atomic_write:
         message = {"content": "test"}
         await file_system_plugin.store_unmentioned_messages("channel", "thread", message)
-        mock_dump.assert_called_once_with([message], m())
+        assert json.loads(mock_atomic_write.call_args[0][1]) == [message]
 
 @pytest.mark.asyncio
 async def test_retrieve_unmentioned_messages(file_system_plugin):
@@ -104,20 +119,19 @@ async def test_retrieve_unmentioned_messages(file_system_plugin):
 @pytest.mark.asyncio
 async def test_update_pricing(file_system_plugin):
     m = mock_open(read_data='{"total_tokens": 100, "prompt_tokens": 50, "completion_tokens": 50, "total_cost": 1.0, "input_cost": 0.5, "output_cost": 0.5}')
-    with patch("builtins.open", m), patch("os.path.exists", return_value=True), patch("json.dump") as mock_dump:
+    with patch("builtins.open", m), patch("os.path.exists", return_value=True), patch(f"{FILE_SYSTEM_MODULE}.atomic_write") as mock_atomic_write:
         new_pricing = PricingData(total_tokens=50, prompt_tokens=25, completion_tokens=25, total_cost=0.5, input_cost=0.25, output_cost=0.25)
         updated_data = await file_system_plugin.update_pricing("container", "file", new_pricing)
         assert updated_data.total_tokens == 150
         assert updated_data.total_cost == 1.5
-        mock_dump.assert_called_once()
+        mock_atomic_write.assert_called_once()
 
 @pytest.mark.asyncio
 async def test_update_prompt_system_message(file_system_plugin):
-    m = mock_open(read_data='[{"role": "system", "content": "old"}, {"role": "user", "content": "hello"}]')
-    with patch("builtins.open", m), patch("os.path.exists", return_value=True), patch("json.dump") as mock_dump:
+    m = mock_open(read_data=b'[{"role": "system", "content": "old"}, {"role": "user", "content": "hello"}]')
+    with patch("builtins.open", m), patch("os.path.exists", return_value=True), patch(f"{FILE_SYSTEM_MODULE}.atomic_write") as mock_atomic_write:
         await file_system_plugin.update_prompt_system_message("channel", "thread", "new")
-        mock_dump.assert_called_once()
-        updated_content = mock_dump.call_args[0][0]
+        updated_content = parse_session_messages(mock_atomic_write.call_args[0][1])
         assert updated_content[0]["content"] == "new"
 
 @pytest.mark.asyncio
@@ -125,3 +139,133 @@ async def test_list_container_files(file_system_plugin):
     with patch("os.listdir", return_value=["file1.txt", "file2.json"]), patch("os.path.isfile", return_value=True):
         files = await file_system_plugin.list_container_files("container")
         assert files == ["file1", "file2"]
+
+@pytest.mark.asyncio
+async def test_get_data_version(file_system_plugin):
+    stat_result = os.stat_result((0, 0, 0, 0, 0, 0, 42, 0, 0, 0))
+    with patch("os.stat", return_value=stat_result) as mock_stat:
+        version = await file_system_plugin.get_data_version('container', 'file')
+        assert version == f"{stat_result.st_mtime_ns}-42"
+        mock_stat.assert_called_once_with(os.path.join(file_system_plugin.root_directory, 'container', 'file'))
+
+@pytest.mark.asyncio
+async def test_get_data_version_file_not_exists(file_system_plugin):
+    with patch("os.stat", side_effect=FileNotFoundError):
+        version = await file_system_plugin.get_data_version('container', 'file')
+        assert version is None
+
+@pytest.mark.asyncio
+async def test_read_data_buffer_is_memory_mapped(file_system_plugin, tmp_path):
+    file_system_plugin.root_directory = str(tmp_path)
+    os.makedirs(tmp_path / 'vectors')
+    (tmp_path / 'vectors' / 'index.npy').write_bytes(b'binary data')
+    buffer = await file_system_plugin.read_data_buffer('vectors', 'index.npy')
+    assert isinstance(buffer, mmap.mmap)
+    assert buffer[:] == b'binary data'
+
+@pytest.mark.asyncio
+async def test_read_data_buffer_file_not_exists(file_system_plugin):
+    with patch("os.path.exists", return_value=False):
+        assert await file_system_plugin.read_data_buffer('container', 'file') is None
+
+@pytest.mark.asyncio
+async def test_append_session_messages_only_appends(file_system_plugin, tmp_path):
+    file_system_plugin.root_directory = str(tmp_path)
+    os.makedirs(tmp_path / 'sessions')
+    await file_system_plugin.append_session_messages('sessions', 'thread.txt', [{"role": "system", "content": "prompt"}])
+    await file_system_plugin.update_session('sessions', 'thread.txt', 'assistant', 'answer')
+
+    content = (tmp_path / 'sessions' / 'thread.txt').read_text()
+    assert content == '{"role": "system", "content": "prompt"}\n{"role": "assistant", "content": "answer"}\n'
+    assert await file_system_plugin.read_session_messages('sessions', 'thread.txt') == [
+        {"role": "system", "content": "prompt"}, {"role": "assistant", "content": "answer"}
+    ]
+
+@pytest.mark.asyncio
+async def test_append_session_messages_converts_legacy_session(file_system_plugin, tmp_path):
+    file_system_plugin.root_directory = str(tmp_path)
+    os.makedirs(tmp_path / 'sessions')
+    (tmp_path / 'sessions' / 'thread.txt').write_text('[{"role": "system", "content": "prompt"}]')
+
+    assert await file_system_plugin.read_session_messages('sessions', 'thread.txt') == [{"role": "system", "content": "prompt"}]
+    await file_system_plugin.append_session_messages('sessions', 'thread.txt', [{"role": "user", "content": "hi"}])
+
+    assert (tmp_path / 'sessions' / 'thread.txt').read_text().splitlines() == ['{"role": "system", "content": "prompt"}', '{"role": "user", "content": "hi"}']
+
+@pytest.mark.asyncio
+async def test_compressed_session_keeps_plain_appends(file_system_plugin, tmp_path):
+    file_system_plugin.root_directory = str(tmp_path)
+    os.makedirs(tmp_path / 'sessions')
+    session_file = tmp_path / 'sessions' / 'channel-thread.txt'
+    await file_system_plugin.append_session_messages('sessions', 'channel-thread.txt', [{"role": "system", "content": "prompt"}])
+    file_system_plugin.codecs = {'sessions': GzipCodec()}
+    await file_system_plugin.append_session_messages('sessions', 'channel-thread.txt', [{"role": "user", "content": "hi " * 100}])
+    await file_system_plugin.update_session('sessions', 'channel-thread.txt', 'assistant', 'answer')
+
+    assert session_file.read_bytes().startswith(b'{"role": "system"')
+    assert await file_system_plugin.read_session_messages('sessions', 'channel-thread.txt') == [
+        {"role": "system", "content": "prompt"}, {"role": "user", "content": "hi " * 100}, {"role": "assistant", "content": "answer"}
+    ]
+
+    # Rewriting the session compresses it as a whole
+    await file_system_plugin.update_prompt_system_message('channel', 'thread', 'new prompt')
+    assert session_file.read_bytes().startswith(GzipCodec.magic)
+    messages = await file_system_plugin.read_session_messages('sessions', 'channel-thread.txt')
+    assert [message["content"] for message in messages] == ["new prompt", "hi " * 100, "answer"]
+
+@pytest.mark.asyncio
+async def test_compressed_data_content_round_trip(file_system_plugin, tmp_path):
+    file_system_plugin.root_directory = str(tmp_path)
+    os.makedirs(tmp_path / 'feedbacks')
+    file_system_plugin.codecs = {'feedbacks': GzipCodec()}
+    await file_system_plugin.write_data_content('feedbacks', 'general.txt', 'feedback ' * 100)
+
+    assert (tmp_path / 'feedbacks' / 'general.txt').read_bytes().startswith(GzipCodec.magic)
+    # Compressed files are read whatever the configuration
+    file_system_plugin.codecs = {}
+    assert await file_system_plugin.read_data_content('feedbacks', 'general.txt') == 'feedback ' * 100
+
+def test_compression_configuration(extended_mock_global_manager, mock_config):
+    mock_config["COMPRESSION"] = {"SESSIONS": "gzip", "FEEDBACKS": "none", "COSTS": "gzip"}
+    plugin = FileSystemPlugin(global_manager=extended_mock_global_manager)
+    with patch("os.makedirs"):
+        plugin.initialize()
+    assert list(plugin.codecs) == ['sessions']
+    assert isinstance(plugin.codecs['sessions'], GzipCodec)
+    extended_mock_global_manager.logger.error.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_read_session_messages_missing_session(file_system_plugin, tmp_path):
+    file_system_plugin.root_directory = str(tmp_path)
+    assert await file_system_plugin.read_session_messages('sessions', 'missing.txt') == []
+
+@pytest.mark.asyncio
+async def test_io_runs_off_the_event_loop(file_system_plugin):
+    calls = []
+    with patch("os.path.exists", side_effect=lambda path: calls.append(threading.current_thread().name) or False):
+        await file_system_plugin.read_data_content('container', 'file')
+    assert calls and calls[0].startswith("file_system_io")
+    assert file_system_plugin.io_executor.stats()["completed"] == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_updates_to_the_same_file_are_serialized(file_system_plugin, tmp_path):
+    file_system_plugin.root_directory = str(tmp_path)
+    os.makedirs(tmp_path / 'messages')
+    await asyncio.gather(*(file_system_plugin.store_unmentioned_messages("channel", "thread", {"content": i}) for i in range(10)))
+    messages = await file_system_plugin.retrieve_unmentioned_messages("channel", "thread")
+    assert sorted(message["content"] for message in messages) == list(range(10))
+
+@pytest.mark.asyncio
+async def test_list_stale_files_and_remove_many(file_system_plugin, tmp_path):
+    file_system_plugin.root_directory = str(tmp_path)
+    (tmp_path / "processing").mkdir()
+    (tmp_path / "processing" / "old.txt").write_bytes(b"12345")
+    (tmp_path / "processing" / "new.txt").write_bytes(b"1")
+    os.utime(tmp_path / "processing" / "old.txt", (1000, 1000))
+
+    stale_files = await file_system_plugin.list_stale_files("processing", 2000)
+    assert stale_files == [("old.txt", 5)]
+    assert await file_system_plugin.list_stale_files("missing", 2000) == []
+
+    assert await file_system_plugin.remove_many("processing", ["old.txt", "gone.txt"]) == 1
+    assert sorted(os.listdir(tmp_path / "processing")) == ["new.txt"]
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import stat
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from plugins.backend.internal_data_processing.file_system.utils.io_executor import (
+    IoExecutor,
+    atomic_write,
+)
+
+
+@pytest.mark.asyncio
+async def test_run_returns_result_from_pool_thread():
+    executor = IoExecutor(pool_size=2)
+    name = await executor.run(lambda: threading.current_thread().name)
+    assert name.startswith("file_system_io")
+    assert executor.stats()["completed"] == 1
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_queue_depth_is_bounded_by_pool_size():
+    executor = IoExecutor(pool_size=2)
+    release = threading.Event()
+    tasks = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(5)]
+    while executor.stats()["active"] < 2:
+        await asyncio.sleep(0.001)
+
+    stats = executor.stats()
+    assert stats["active"] == 2
+    assert stats["queue_depth"] == 3
+    assert [observation.value for observation in executor.observe_queue_depth()] == [3]
+
+    release.set()
+    await asyncio.gather(*tasks)
+    stats = executor.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["max_pending"] == 5
+    assert stats["completed"] == 5
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_run_propagates_exceptions():
+    executor = IoExecutor(pool_size=1)
+
+    def fail():
+        raise OSError("disk gone")
+
+    with pytest.raises(OSError):
+        await executor.run(fail)
+    assert executor.stats()["queue_depth"] == 0
+    executor.shutdown()
+
+def test_atomic_write_replaces_content_and_keeps_mode(tmp_path):
+    file_path = tmp_path / "data.json"
+    file_path.write_text("old")
+    os.chmod(file_path, 0o640)
+    atomic_write(str(file_path), "new")
+    assert file_path.read_text() == "new"
+    assert stat.S_IMODE(os.stat(file_path).st_mode) == 0o640
+    assert os.listdir(tmp_path) == ["data.json"]
+
+def test_atomic_write_leaves_target_untouched_on_failure(tmp_path):
+    file_path = tmp_path / "data.json"
+    file_path.write_text("old")
+    with patch("os.replace", side_effect=OSError("rename failed")):
+        with pytest.raises(OSError):
+            atomic_write(str(file_path), "new")
+    assert file_path.read_text() == "old"
+    assert os.listdir(tmp_path) == ["data.json"]
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+import pytest
+import pytest_asyncio
+
+from core.backend.pricing_data import PricingData
+from plugins.backend.internal_data_processing.sqlite.sqlite import SqlitePlugin
+
+
+@pytest.fixture
+def mock_config(tmp_path):
+    return {
+        "PLUGIN_NAME": "sqlite",
+        "DATABASE_PATH": str(tmp_path / "data" / "internal.db"),
+        "SESSIONS_CONTAINER": "sessions",
+        "MESSAGES_CONTAINER": "messages",
+        "FEEDBACKS_CONTAINER": "feedbacks",
+        "CONCATENATE_CONTAINER": "concatenate",
+        "PROMPTS_CONTAINER": "prompts",
+        "COSTS_CONTAINER": "costs",
+        "PROCESSING_CONTAINER": "processing",
+        "ABORT_CONTAINER": "abort",
+        "VECTORS_CONTAINER": "vectors",
+    }
+
+@pytest.fixture
+def extended_mock_global_manager(mock_global_manager, mock_config):
+    mock_global_manager.config_manager.config_model.PLUGINS.BACKEND.INTERNAL_DATA_PROCESSING = {
+        "SQLITE": mock_config
+    }
+    return mock_global_manager
+
+@pytest_asyncio.fixture
+async def sqlite_plugin(extended_mock_global_manager):
+    plugin = SqlitePlugin(global_manager=extended_mock_global_manager)
+    plugin.initialize()
+    yield plugin
+    await plugin.close()
+
+@pytest.mark.asyncio
+async def test_initialize_enables_wal(sqlite_plugin, mock_config):
+    assert sqlite_plugin.images == "images"
+    connection = sqlite3.connect(mock_config["DATABASE_PATH"])
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"costs_by_channel", "flags_by_expiry", "unmentioned_messages_by_thread"} <= indexes
+    connection.close()
+
+@pytest.mark.asyncio
+async def test_write_read_remove_data_content(sqlite_plugin):
+    assert await sqlite_plugin.read_data_content("prompts", "prompt.txt") is None
+    await sqlite_plugin.write_data_content("prompts", "prompt.txt", "first")
+    first_version = await sqlite_plugin.get_data_version("prompts", "prompt.txt")
+    await sqlite_plugin.write_data_content("prompts", "prompt.txt", "second")
+    assert await sqlite_plugin.read_data_content("prompts", "prompt.txt") == "second"
+    assert await sqlite_plugin.read_data_buffer("prompts", "prompt.txt") == b"second"
+    assert await sqlite_plugin.get_data_version("prompts", "prompt.txt") != first_version
+    assert await sqlite_plugin.list_container_files("prompts") == ["prompt"]
+
+    await sqlite_plugin.remove_data_content("prompts", "prompt.txt")
+    assert await sqlite_plugin.read_data_content("prompts", "prompt.txt") is None
+    assert await sqlite_plugin.get_data_version("prompts", "prompt.txt") is None
+
+@pytest.mark.asyncio
+async def test_binary_data_content(sqlite_plugin):
+    await sqlite_plugin.write_data_content("images", "abc", b"\x89PNG")
+    assert await sqlite_plugin.read_data_buffer("images", "abc") == b"\x89PNG"
+
+@pytest.mark.asyncio
+async def test_append_data(sqlite_plugin):
+    sqlite_plugin.append_data("concatenate", "file.txt", "a")
+    sqlite_plugin.append_data("concatenate", "file.txt", "b")
+    assert await sqlite_plugin.read_data_content("concatenate", "file.txt") == "ab"
+
+@pytest.mark.asyncio
+async def test_session_messages(sqlite_plugin):
+    await sqlite_plugin.append_session_messages("sessions", "C1-T1.txt", [
+        {"role": "system", "content": "prompt"},
+        {"role": "user", "content": "question"},
+    ])
+    await sqlite_plugin.update_session("sessions", "C1-T1.txt", "assistant", "answer")
+    version = await sqlite_plugin.get_data_version("sessions", "C1-T1.txt")
+
+    await sqlite_plugin.update_prompt_system_message("C1", "T1", "new prompt")
+
+    messages = await sqlite_plugin.read_session_messages("sessions", "C1-T1.txt")
+    assert [message["content"] for message in messages] == ["new prompt", "question", "answer"]
+    assert json.loads((await sqlite_plugin.read_data_content("sessions", "C1-T1.txt")).splitlines()[2]) == messages[2]
+    assert await sqlite_plugin.get_data_version("sessions", "C1-T1.txt") != version
+    assert await sqlite_plugin.list_container_files("sessions") == ["C1-T1"]
+
+    await sqlite_plugin.remove_data_content("sessions", "C1-T1.txt")
+    assert await sqlite_plugin.read_session_messages("sessions", "C1-T1.txt") == []
+
+@pytest.mark.asyncio
+async def test_update_prompt_system_message_without_system_role(sqlite_plugin):
+    await sqlite_plugin.update_session("sessions", "C1-T1.txt", "user", "question")
+    await sqlite_plugin.update_prompt_system_message("C1", "T1", "new prompt")
+    sqlite_plugin.logger.warning.assert_called_with("System role not found in session")
+
+@pytest.mark.asyncio
+async def test_unmentioned_messages_are_consumed(sqlite_plugin):
+    await sqlite_plugin.store_unmentioned_messages("C1", "T1", {"text": "first"})
+    await sqlite_plugin.store_unmentioned_messages("C1", "T1", {"text": "second"})
+    await sqlite_plugin.store_unmentioned_messages("C1", "T2", {"text": "other"})
+    assert await sqlite_plugin.retrieve_unmentioned_messages("C1", "T1") == [{"text": "first"}, {"text": "second"}]
+    assert await sqlite_plugin.retrieve_unmentioned_messages("C1", "T1") == []
+    assert await sqlite_plugin.retrieve_unmentioned_messages("C1", "T2") == [{"text": "other"}]
+
+@pytest.mark.asyncio
+async def test_update_pricing_and_costs_by_channel(sqlite_plugin):
+    pricing = PricingData(total_tokens=10, prompt_tokens=6, completion_tokens=4, total_cost=0.5, input_cost=0.3, output_cost=0.2)
+    await sqlite_plugin.update_pricing("costs", "C1-T1.txt", pricing)
+    await sqlite_plugin.update_pricing("costs", "C1-T2.txt", pricing)
+    result = await sqlite_plugin.update_pricing("costs", "C1-T1.txt", pricing)
+    await sqlite_plugin.update_pricing("costs", "C2-T1.txt", pricing)
+
+    assert result.total_tokens == 20
+    assert result.total_cost == pytest.approx(1.0)
+    assert json.loads(await sqlite_plugin.read_data_content("costs", "C1-T1.txt"))["prompt_tokens"] == 12
+    costs = await sqlite_plugin.get_costs_by_channel()
+    assert list(costs) == ["C1", "C2"]
+    assert costs["C1"].total_tokens == 30
+    assert costs["C2"].output_cost == pytest.approx(0.2)
+
+@pytest.mark.asyncio
+async def test_flags(sqlite_plugin):
+    await sqlite_plugin.write_data_content("processing", "C1-T1", json.dumps({"value": True, "expires_at": 123.0}))
+    assert json.loads(await sqlite_plugin.read_data_content("processing", "C1-T1"))["value"] is True
+    assert await sqlite_plugin.list_container_files("processing") == ["C1-T1"]
+    await sqlite_plugin.remove_data_content("processing", "C1-T1")
+    assert await sqlite_plugin.read_data_content("processing", "C1-T1") is None
+
+@pytest.mark.asyncio
+async def test_errors_are_logged(sqlite_plugin):
+    await sqlite_plugin.close()
+    assert await sqlite_plugin.read_data_content("prompts", "prompt.txt") is None
+    assert await sqlite_plugin.list_container_files("prompts") == []
+    sqlite_plugin.logger.error.assert_called()
+
+@pytest.mark.asyncio
+async def test_list_stale_files_and_remove_many(sqlite_plugin):
+    await sqlite_plugin.write_data_content("processing", "C1-T1.txt", "1")
+    await sqlite_plugin.append_session_messages("sessions", "C1-T1.txt", [{"role": "user", "content": "hi"}])
+    await sqlite_plugin.store_unmentioned_messages("C1", "T1", {"text": "hello"})
+    future = time.time() + 60
+
+    assert await sqlite_plugin.list_stale_files("processing", 0) == []
+    assert await sqlite_plugin.list_stale_files("processing", future) == [("C1-T1.txt", 1)]
+    assert [name for name, _ in await sqlite_plugin.list_stale_files("sessions", future)] == ["C1-T1.txt"]
+    assert await sqlite_plugin.list_stale_files("messages", future) == [("unmentioned_messages_C1_T1.json", len(json.dumps({"text": "hello"})))]
+
+    assert await sqlite_plugin.remove_many("processing", ["C1-T1.txt", "missing.txt"]) == 1
+    assert await sqlite_plugin.remove_many("sessions", ["C1-T1.txt"]) == 1
+    assert await sqlite_plugin.remove_many("messages", ["unmentioned_messages_C1_T1.json"]) == 1
+    assert await sqlite_plugin.read_data_content("processing", "C1-T1.txt") is None
+    assert await sqlite_plugin.read_session_messages("sessions", "C1-T1.txt") == []
+    assert await sqlite_plugin.retrieve_unmentioned_messages("C1", "T1") == []
+
+@pytest.mark.asyncio
+async def test_read_many_and_write_many(sqlite_plugin):
+    await sqlite_plugin.write_many([("prompts", "core.txt", "core"), ("feedbacks", "general.txt", "general"), ("abort", "C1-T1", "1")])
+    await sqlite_plugin.append_session_messages("sessions", "C1-T1.txt", [{"role": "user", "content": "hi"}])
+
+    contents = await sqlite_plugin.read_many([("prompts", "core.txt"), ("feedbacks", "general.txt"), ("abort", "C1-T1"), ("prompts", "missing.txt"), ("sessions", "C1-T1.txt")])
+    assert contents[:4] == ["core", "general", "1", None]
+    assert json.loads(contents[4].splitlines()[0]) == {"role": "user", "content": "hi"}
+
+@pytest.mark.asyncio
+async def test_transactions_hold_the_write_lock_from_their_first_read(sqlite_plugin, mock_config):
+    other_worker = sqlite3.connect(mock_config["DATABASE_PATH"], timeout=0, check_same_thread=False)
+
+    def read_then_write(connection):
+        connection.execute("SELECT COUNT(*) FROM unmentioned_messages").fetchone()
+        # Another process cannot insert between the read and the write
+        with pytest.raises(sqlite3.OperationalError):
+            other_worker.execute("INSERT INTO unmentioned_messages (channel_id, thread_id, message, created_at) VALUES ('C1', 'T1', '{}', 0)")
+        return connection.in_transaction
+
+    assert await sqlite_plugin.run(read_then_write) is True
+    other_worker.close()
+
+@pytest.mark.asyncio
+async def test_concurrent_session_appends_get_distinct_sequence_numbers(sqlite_plugin):
+    await asyncio.gather(*(
+        sqlite_plugin.append_session_messages("sessions", "C1-T1.txt", [{"role": "user", "content": str(index)}, {"role": "assistant", "content": str(index)}])
+        for index in range(10)
+    ))
+    messages = await sqlite_plugin.read_session_messages("sessions", "C1-T1.txt")
+    assert len(messages) == 20
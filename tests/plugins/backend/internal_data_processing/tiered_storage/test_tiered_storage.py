@@ -0,0 +1,319 @@
+import asyncio
+import json
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+import pytest_asyncio
+
+from core.backend.compression import GzipCodec
+from core.backend.session_log import parse_session_messages, serialize_session_messages
+from plugins.backend.internal_data_processing.tiered_storage.tiered_storage import (
+    PendingUpload,
+    TieredStoragePlugin,
+)
+
+CONTAINERS = {
+    "SESSIONS_CONTAINER": "sessions",
+    "MESSAGES_CONTAINER": "messages",
+    "FEEDBACKS_CONTAINER": "feedbacks",
+    "CONCATENATE_CONTAINER": "concatenate",
+    "PROMPTS_CONTAINER": "prompts",
+    "COSTS_CONTAINER": "costs",
+    "PROCESSING_CONTAINER": "processing",
+    "ABORT_CONTAINER": "abort",
+    "VECTORS_CONTAINER": "vectors",
+}
+
+async def async_iter(items):
+    for item in items:
+        yield item
+
+def blob_item(name):
+    blob = MagicMock()
+    blob.name = name
+    return blob
+
+async def slow_upload(*args):
+    await asyncio.sleep(0.01)
+
+class FakeRemote:
+    """
+    Blob storage kept in a dictionary, with the methods used by the tiered plugin.
+    """
+
+    def __init__(self):
+        self.blobs = {}
+        self.initialization_failed = False
+        for setting, container in CONTAINERS.items():
+            setattr(self, setting.split("_")[0].lower(), container)
+        self.images = "images"
+        self.read_data_buffer = AsyncMock(side_effect=self._read_data_buffer)
+        # The raising variants are used by the uploads, the public methods by the uncached containers
+        self._write_data_content = AsyncMock(side_effect=self.store)
+        self._remove_data_content = AsyncMock(side_effect=self.drop)
+        self._append_session_messages = AsyncMock(side_effect=self.append)
+        self.write_data_content = AsyncMock(side_effect=self.store)
+        self.remove_data_content = AsyncMock(side_effect=self.drop)
+        self.append_session_messages = AsyncMock(side_effect=self.append)
+        self.update_prompt_system_message = AsyncMock()
+        self.get_data_version = AsyncMock(return_value='"0x1"')
+        self.list_container_files = AsyncMock(return_value=[])
+        self.list_stale_files = AsyncMock(side_effect=lambda data_container, older_than: [
+            (name, len(data)) for (blob_container, name), data in self.blobs.items() if blob_container == data_container
+        ])
+        self.remove_many = AsyncMock(side_effect=self._remove_many)
+        self.read_data_content = AsyncMock(return_value="remote")
+        self.close = AsyncMock()
+        self.blob_service_client = MagicMock()
+        self.blob_service_client.get_container_client.side_effect = lambda container: MagicMock(
+            list_blobs=lambda: async_iter([blob_item(name) for (blob_container, name) in self.blobs if blob_container == container])
+        )
+
+    async def _read_data_buffer(self, data_container, data_file):
+        return self.blobs.get((data_container, data_file))
+
+    async def store(self, data_container, data_file, data):
+        self.blobs[(data_container, data_file)] = data.encode('utf-8')
+
+    async def drop(self, data_container, data_file):
+        self.blobs.pop((data_container, data_file), None)
+
+    async def _remove_many(self, data_container, data_files):
+        return sum(self.blobs.pop((data_container, data_file), None) is not None for data_file in data_files)
+
+    async def append(self, data_container, data_file, messages):
+        previous = self.blobs.get((data_container, data_file), b"")
+        self.blobs[(data_container, data_file)] = previous + serialize_session_messages(messages).encode('utf-8')
+
+@pytest.fixture
+def mock_config(tmp_path):
+    return {
+        "PLUGIN_NAME": "tiered_storage",
+        **CONTAINERS,
+        "LOCAL_DIRECTORY": str(tmp_path / "local"),
+        "LOCAL_MAX_SIZE": 1000,
+        "WARM_UP_CONTAINERS": [],
+        "REMOTE": {"CONNECTION_STRING": "https://account.blob.core.windows.net"},
+    }
+
+@pytest.fixture
+def extended_mock_global_manager(mock_global_manager, mock_config):
+    mock_global_manager.config_manager.config_model.PLUGINS.BACKEND.INTERNAL_DATA_PROCESSING = {
+        "TIERED_STORAGE": mock_config
+    }
+    return mock_global_manager
+
+@pytest_asyncio.fixture
+async def tiered_plugin(extended_mock_global_manager):
+    plugin = TieredStoragePlugin(global_manager=extended_mock_global_manager)
+    plugin.initialize()
+    plugin.remote = FakeRemote()
+    yield plugin
+    await plugin.flush()
+
+def test_initialize(tiered_plugin, tmp_path):
+    assert tiered_plugin.plugin_name == "tiered_storage"
+    assert tiered_plugin.local.root_directory == str(tmp_path / "local")
+    assert tiered_plugin.cached_containers == {"sessions", "prompts", "feedbacks", "images"}
+    assert (tmp_path / "local" / "images").is_dir()
+
+@pytest.mark.asyncio
+async def test_reads_are_copied_to_the_local_tier(tiered_plugin, tmp_path):
+    tiered_plugin.remote.blobs[("prompts", "prompt.txt")] = b"prompt"
+
+    assert await tiered_plugin.read_data_content("prompts", "prompt.txt") == "prompt"
+    assert await tiered_plugin.read_data_content("prompts", "prompt.txt") == "prompt"
+    assert bytes(await tiered_plugin.read_data_buffer("prompts", "prompt.txt")) == b"prompt"
+
+    tiered_plugin.remote.read_data_buffer.assert_awaited_once()
+    assert (tmp_path / "local" / "prompts" / "prompt.txt").read_bytes() == b"prompt"
+
+@pytest.mark.asyncio
+async def test_missing_blob(tiered_plugin):
+    assert await tiered_plugin.read_data_content("prompts", "missing.txt") is None
+    assert tiered_plugin.local_files == {}
+
+@pytest.mark.asyncio
+async def test_compressed_blobs_are_copied_as_stored(tiered_plugin):
+    tiered_plugin.remote.blobs[("feedbacks", "feedback.txt")] = GzipCodec().compress(b"feedback")
+    assert await tiered_plugin.read_data_content("feedbacks", "feedback.txt") == "feedback"
+
+@pytest.mark.asyncio
+async def test_uncached_containers_go_to_blob_storage(tiered_plugin, tmp_path):
+    assert await tiered_plugin.read_data_content("processing", "flag") == "remote"
+    await tiered_plugin.write_data_content("processing", "flag", "1")
+    tiered_plugin.remote.write_data_content.assert_awaited_once_with("processing", "flag", "1")
+    assert not (tmp_path / "local" / "processing").exists()
+
+@pytest.mark.asyncio
+async def test_writes_are_local_then_uploaded(tiered_plugin):
+    await tiered_plugin.write_data_content("feedbacks", "feedback.txt", "first")
+    assert await tiered_plugin.read_data_content("feedbacks", "feedback.txt") == "first"
+    tiered_plugin.remote.read_data_buffer.assert_not_called()
+
+    await tiered_plugin.flush()
+    assert tiered_plugin.remote.blobs[("feedbacks", "feedback.txt")] == b"first"
+
+@pytest.mark.asyncio
+async def test_writes_during_an_upload_are_uploaded_once(tiered_plugin):
+    await tiered_plugin.write_data_content("feedbacks", "feedback.txt", "first")
+    tiered_plugin.remote._write_data_content.side_effect = slow_upload
+    await asyncio.sleep(0)
+    for content in ("second", "third"):
+        await tiered_plugin.write_data_content("feedbacks", "feedback.txt", content)
+    await tiered_plugin.flush()
+    assert tiered_plugin.remote._write_data_content.await_count == 2
+    assert tiered_plugin.remote._write_data_content.await_args.args[2] == "third"
+
+@pytest.mark.asyncio
+async def test_session_appends(tiered_plugin):
+    first = [{"role": "system", "content": "prompt"}]
+    tiered_plugin.remote.blobs[("sessions", "C1-T1.txt")] = serialize_session_messages(first).encode('utf-8')
+
+    assert await tiered_plugin.read_session_messages("sessions", "C1-T1.txt") == first
+    await tiered_plugin.update_session("sessions", "C1-T1.txt", "user", "question")
+    await tiered_plugin.append_session_messages("sessions", "C1-T1.txt", [{"role": "assistant", "content": "answer"}])
+
+    messages = await tiered_plugin.read_session_messages("sessions", "C1-T1.txt")
+    assert [message["content"] for message in messages] == ["prompt", "question", "answer"]
+    tiered_plugin.remote.read_data_buffer.assert_awaited_once()
+
+    await tiered_plugin.flush()
+    assert parse_session_messages(tiered_plugin.remote.blobs[("sessions", "C1-T1.txt")].decode('utf-8')) == messages
+
+@pytest.mark.asyncio
+async def test_session_not_local_is_read_after_its_upload(tiered_plugin):
+    await tiered_plugin.update_session("sessions", "C1-T1.txt", "user", "question")
+    assert tiered_plugin.local_files == {}
+    messages = await tiered_plugin.read_session_messages("sessions", "C1-T1.txt")
+    assert messages == [{"role": "user", "content": "question"}]
+
+@pytest.mark.asyncio
+async def test_remove(tiered_plugin, tmp_path):
+    await tiered_plugin.write_data_content("prompts", "prompt.txt", "prompt")
+    await tiered_plugin.remove_data_content("prompts", "prompt.txt")
+    assert not (tmp_path / "local" / "prompts" / "prompt.txt").exists()
+    assert await tiered_plugin.read_data_content("prompts", "prompt.txt") is None
+    tiered_plugin.remote._remove_data_content.assert_awaited_once_with("prompts", "prompt.txt")
+    assert ("prompts", "prompt.txt") not in tiered_plugin.remote.blobs
+
+@pytest.mark.asyncio
+async def test_remove_many_drops_local_copies(tiered_plugin, tmp_path):
+    await tiered_plugin.write_data_content("prompts", "old.txt", "old")
+    await tiered_plugin.write_data_content("prompts", "new.txt", "new")
+
+    stale_files = await tiered_plugin.list_stale_files("prompts", 0)
+    # Pending uploads are written before blob storage is listed
+    assert sorted(stale_files) == [("new.txt", 3), ("old.txt", 3)]
+
+    assert await tiered_plugin.remove_many("prompts", ["old.txt"]) == 1
+    assert not (tmp_path / "local" / "prompts" / "old.txt").exists()
+    assert ("prompts", "old.txt") not in tiered_plugin.local_files
+    assert ("prompts", "old.txt") not in tiered_plugin.remote.blobs
+    assert await tiered_plugin.read_data_content("prompts", "new.txt") == "new"
+
+@pytest.mark.asyncio
+async def test_least_recently_used_files_are_evicted(tiered_plugin, tmp_path):
+    for index in range(3):
+        tiered_plugin.remote.blobs[("prompts", f"{index}.txt")] = b"x" * 400
+    for index in range(3):
+        await tiered_plugin.read_data_content("prompts", f"{index}.txt")
+
+    assert list(tiered_plugin.local_files) == [("prompts", "1.txt"), ("prompts", "2.txt")]
+    assert tiered_plugin.local_size == 800
+    assert not (tmp_path / "local" / "prompts" / "0.txt").exists()
+
+@pytest.mark.asyncio
+async def test_files_waiting_for_upload_are_not_evicted(tiered_plugin):
+    tiered_plugin.remote._write_data_content.side_effect = slow_upload
+    for index in range(3):
+        await tiered_plugin.write_data_content("prompts", f"{index}.txt", "x" * 400)
+    assert len(tiered_plugin.local_files) == 3
+    await tiered_plugin.flush()
+
+@pytest.mark.asyncio
+async def test_failed_upload_is_retried(tiered_plugin):
+    tiered_plugin.tiered_storage_config.UPLOAD_RETRY_DELAY = 0
+    tiered_plugin.remote._write_data_content.side_effect = [Exception("unavailable"), None]
+    await tiered_plugin.write_data_content("prompts", "prompt.txt", "prompt")
+    await tiered_plugin.flush()
+    assert tiered_plugin.remote._write_data_content.await_count == 2
+    assert tiered_plugin.pending == {}
+
+@pytest.mark.asyncio
+async def test_failed_blob_upload_is_retried(extended_mock_global_manager):
+    plugin = TieredStoragePlugin(global_manager=extended_mock_global_manager)
+    plugin.initialize()
+    plugin.tiered_storage_config.UPLOAD_RETRY_DELAY = 0
+    blob_client = MagicMock()
+    blob_client.upload_blob = AsyncMock(side_effect=[Exception("unavailable"), {"etag": '"0x2"'}])
+    plugin.remote.blob_service_client = MagicMock(get_blob_client=MagicMock(return_value=blob_client))
+
+    await plugin.write_data_content("prompts", "prompt.txt", "prompt")
+    await plugin.flush()
+    assert blob_client.upload_blob.await_count == 2
+    assert blob_client.upload_blob.await_args.args[0] == b"prompt"
+    assert plugin.pending == {}
+
+@pytest.mark.asyncio
+async def test_update_prompt_system_message_drops_local_session(tiered_plugin):
+    await tiered_plugin.write_data_content("sessions", "C1-T1.txt", json.dumps({"role": "system", "content": "prompt"}) + "\n")
+    await tiered_plugin.update_prompt_system_message("C1", "T1", "new prompt")
+    assert ("sessions", "C1-T1.txt") not in tiered_plugin.local_files
+    tiered_plugin.remote._write_data_content.assert_awaited_once()
+    tiered_plugin.remote.update_prompt_system_message.assert_awaited_once_with("C1", "T1", "new prompt")
+
+@pytest.mark.asyncio
+async def test_warm_up(tiered_plugin):
+    tiered_plugin.tiered_storage_config.WARM_UP_CONTAINERS = ["PROMPTS", "COSTS"]
+    tiered_plugin.remote.blobs[("prompts", "prompt.txt")] = b"prompt"
+    await tiered_plugin.read_data_content("costs", "C1-T1.txt")
+    # Reads do not start the warm up, the startup hook does
+    assert tiered_plugin.warm_up_task is None
+    await tiered_plugin.start()
+    await tiered_plugin.warm_up_task
+    assert ("prompts", "prompt.txt") in tiered_plugin.local_files
+
+@pytest.mark.asyncio
+async def test_files_of_a_previous_run_are_bounded_and_copied_again(extended_mock_global_manager, tmp_path):
+    prompts = tmp_path / "local" / "prompts"
+    prompts.mkdir(parents=True)
+    for index in range(3):
+        (prompts / f"{index}.txt").write_bytes(b"x" * 400)
+        os.utime(prompts / f"{index}.txt", (1000 + index, 1000 + index))
+    (prompts / ".2.txt.abc.tmp").write_bytes(b"partial")
+
+    plugin = TieredStoragePlugin(global_manager=extended_mock_global_manager)
+    plugin.initialize()
+    plugin.remote = FakeRemote()
+    assert list(plugin.local_files) == [("prompts", "0.txt"), ("prompts", "1.txt"), ("prompts", "2.txt")]
+    assert plugin.local_size == 1200
+
+    await plugin.start()
+    await plugin.warm_up_task
+    # The least recently written file is evicted to honor LOCAL_MAX_SIZE
+    assert not (prompts / "0.txt").exists()
+    assert plugin.local_size == 800
+
+    # Blob storage may have changed while the bot was stopped
+    plugin.remote.blobs[("prompts", "1.txt")] = b"updated"
+    assert await plugin.read_data_content("prompts", "1.txt") == "updated"
+    assert (prompts / "1.txt").read_bytes() == b"updated"
+    await plugin.close()
+
+@pytest.mark.asyncio
+async def test_close_uploads_pending_changes(tiered_plugin):
+    await tiered_plugin.write_data_content("prompts", "prompt.txt", "prompt")
+    await tiered_plugin.close()
+    assert tiered_plugin.remote.blobs[("prompts", "prompt.txt")] == b"prompt"
+    tiered_plugin.remote.close.assert_awaited_once()
+
+def test_pending_upload_merge():
+    append = PendingUpload("append", messages=[1])
+    assert PendingUpload("write", data="a").merge(PendingUpload("write", data="b")).data == "b"
+    assert append.merge(PendingUpload("append", messages=[2])).messages == [1, 2]
+    merged = PendingUpload("remove").merge(append)
+    assert (merged.kind, merged.reset, merged.messages) == ("append", True, [1])
+    assert PendingUpload("write", data="a").merge(append).kind == "write"
+    assert append.merge(PendingUpload("remove")).kind == "remove"
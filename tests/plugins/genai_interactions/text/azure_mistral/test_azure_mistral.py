@@ -49,7 +49,7 @@ async def test_handle_action_with_empty_blob(azure_mistral_plugin):
 
         with patch.object(azure_mistral_plugin.backend_internal_data_processing_dispatcher, 'read_data_content', new_callable=AsyncMock) as mock_read_data_content, \
              patch.object(azure_mistral_plugin.input_handler, 'calculate_and_update_costs', new_callable=AsyncMock) as mock_calculate_and_update_costs, \
-             patch.object(azure_mistral_plugin.backend_internal_data_processing_dispatcher, 'write_data_content', new_callable=AsyncMock) as mock_write_data_content:
+             patch.object(azure_mistral_plugin.backend_internal_data_processing_dispatcher, 'append_session_messages', new_callable=AsyncMock) as mock_append_session_messages:
 
             # Simulate empty blob
             mock_read_data_content.return_value = ""
@@ -83,7 +83,7 @@ async def test_handle_action_with_empty_blob(azure_mistral_plugin):
                     {"role": "user", "content": "test input"}
                 ]
             )
-            mock_write_data_content.assert_called_once()
+            mock_append_session_messages.assert_called_once()
             mock_calculate_and_update_costs.assert_called_once()
 
 @pytest.mark.asyncio
@@ -92,7 +92,7 @@ async def test_handle_action_with_existing_blob(azure_mistral_plugin):
 
         with patch.object(azure_mistral_plugin.backend_internal_data_processing_dispatcher, 'read_data_content', new_callable=AsyncMock) as mock_read_data_content, \
              patch.object(azure_mistral_plugin.input_handler, 'calculate_and_update_costs', new_callable=AsyncMock) as mock_calculate_and_update_costs, \
-             patch.object(azure_mistral_plugin.backend_internal_data_processing_dispatcher, 'write_data_content', new_callable=AsyncMock) as mock_write_data_content:
+             patch.object(azure_mistral_plugin.backend_internal_data_processing_dispatcher, 'append_session_messages', new_callable=AsyncMock) as mock_append_session_messages:
 
             # Simulate existing blob content
             existing_messages = [{"role": "assistant", "content": "previous message"}]
@@ -127,15 +127,14 @@ async def test_handle_action_with_existing_blob(azure_mistral_plugin):
                     {"role": "user", "content": "test input"}
                 ]
             )
-            mock_write_data_content.assert_called_once()
+            mock_append_session_messages.assert_called_once()
             mock_calculate_and_update_costs.assert_called_once()
 
-            # Verify that the new message is appended to the existing ones
-            expected_messages = existing_messages + [{"role": "assistant", "content": "Generated response"}]
-            mock_write_data_content.assert_called_with(
+            # Verify that only the new message is appended to the session
+            mock_append_session_messages.assert_called_with(
                 azure_mistral_plugin.backend_internal_data_processing_dispatcher.sessions,
                 f"{event.channel_id}-{event.thread_id or event.timestamp}.txt",
-                json.dumps(expected_messages)
+                [{"role": "assistant", "content": "Generated response"}]
             )
 
 @pytest.mark.asyncio
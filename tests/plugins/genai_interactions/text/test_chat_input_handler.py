@@ -1,4 +1,3 @@
-import json
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -76,17 +75,17 @@ async def test_handle_message_event(chat_input_handler, incoming_notification):
 
 @pytest.mark.asyncio
 async def test_handle_thread_message_event(chat_input_handler, incoming_notification):
-    with patch.object(chat_input_handler.backend_internal_data_processing_dispatcher, 'read_data_content', new_callable=AsyncMock) as mock_read_data_content, \
+    with patch.object(chat_input_handler.backend_internal_data_processing_dispatcher, 'read_session_messages', new_callable=AsyncMock) as mock_read_session_messages, \
          patch.object(chat_input_handler.backend_internal_data_processing_dispatcher, 'store_unmentioned_messages', new_callable=AsyncMock) as mock_store_unmentioned_messages, \
          patch.object(chat_input_handler, 'generate_response', new_callable=AsyncMock) as mock_generate_response:
 
-        mock_read_data_content.return_value = json.dumps([{"role": "assistant", "content": "previous message"}])
+        mock_read_session_messages.return_value = [{"role": "assistant", "content": "previous message"}]
         mock_generate_response.return_value = "generated response"
         incoming_notification.is_mention = False
 
         result = await chat_input_handler.handle_thread_message_event(incoming_notification)
         assert result is None
-        mock_read_data_content.assert_called_once()
+        mock_read_session_messages.assert_called_once()
         mock_store_unmentioned_messages.assert_called_once()
 
 @pytest.mark.asyncio
@@ -198,7 +197,7 @@ async def test_call_completion(chat_input_handler, incoming_notification, mock_c
     # Mock necessary methods and attributes
     chat_input_handler.backend_internal_data_processing_dispatcher.costs = "costs_container"
     chat_input_handler.backend_internal_data_processing_dispatcher.sessions = "sessions_container"
-    chat_input_handler.backend_internal_data_processing_dispatcher.write_data_content = AsyncMock()
+    chat_input_handler.backend_internal_data_processing_dispatcher.append_session_messages = AsyncMock()
     chat_input_handler.user_interaction_dispatcher.upload_file = AsyncMock()
     chat_input_handler.conversion_format = "yaml"  # or "json" depending on your configuration
 
@@ -209,7 +208,8 @@ async def test_call_completion(chat_input_handler, incoming_notification, mock_c
         mock_calculate_costs.return_value = (1.0, 0.5, 0.5)
         mock_yaml_to_json.return_value = {"response": "json data"}
 
-        result = await chat_input_handler.call_completion("channel_id", "thread_id", [], incoming_notification)
+        messages = [{"role": "user", "content": "previous"}, {"role": "user", "content": "new"}]
+        result = await chat_input_handler.call_completion("channel_id", "thread_id", messages, incoming_notification, session_length=1)
 
         # Assertions
         assert result == {"response": "json data"}
@@ -217,9 +217,34 @@ async def test_call_completion(chat_input_handler, incoming_notification, mock_c
         mock_calculate_costs.assert_called_once()
         mock_adjust_yaml.assert_called_once_with("completion")
         mock_yaml_to_json.assert_called_once_with(event_data=incoming_notification, yaml_string="adjusted yaml")
-        chat_input_handler.backend_internal_data_processing_dispatcher.write_data_content.assert_called_once()
+        chat_input_handler.backend_internal_data_processing_dispatcher.append_session_messages.assert_called_once_with(
+            "sessions_container", "channel_id-thread_id.txt",
+            [{"role": "user", "content": "new"}, {"role": "assistant", "content": "completion"}]
+        )
         chat_input_handler.user_interaction_dispatcher.upload_file.assert_called_once()
 
+@pytest.mark.asyncio
+async def test_call_completion_rehydrates_images_for_vision_turns(chat_input_handler, incoming_notification, mock_chat_plugin):
+    chat_input_handler.chat_plugin = mock_chat_plugin
+    mock_chat_plugin.generate_completion.return_value = ("completion", MagicMock())
+    dispatcher = chat_input_handler.backend_internal_data_processing_dispatcher
+    dispatcher.append_session_messages = AsyncMock()
+    dispatcher.rehydrate_session_images = AsyncMock(return_value=["rehydrated"])
+    chat_input_handler.user_interaction_dispatcher.upload_file = AsyncMock()
+    chat_input_handler.conversion_format = "json"
+    messages = [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": "image-ref:sha256:abc"}}]}]
+
+    with patch.object(chat_input_handler, 'calculate_and_update_costs', new_callable=AsyncMock):
+        incoming_notification.images = []
+        await chat_input_handler.call_completion("channel_id", "thread_id", messages, incoming_notification)
+        dispatcher.rehydrate_session_images.assert_not_called()
+        assert mock_chat_plugin.generate_completion.call_args.args[0] is messages
+
+        incoming_notification.images = ["base64_image_data"]
+        await chat_input_handler.call_completion("channel_id", "thread_id", messages, incoming_notification)
+        dispatcher.rehydrate_session_images.assert_awaited_once_with(messages)
+        assert mock_chat_plugin.generate_completion.call_args.args[0] == ["rehydrated"]
+
 @pytest.mark.asyncio
 async def test_calculate_and_update_costs(chat_input_handler, incoming_notification):
     cost_params = MagicMock()
@@ -228,8 +253,8 @@ async def test_calculate_and_update_costs(chat_input_handler, incoming_notificat
     cost_params.completion_tk = 50
     cost_params.input_token_price = 0.01
     cost_params.output_token_price = 0.02
-    with patch.object(chat_input_handler.backend_internal_data_processing_dispatcher, 'update_pricing', new_callable=AsyncMock) as mock_update_pricing:
-        mock_update_pricing.return_value = MagicMock()
+    with patch.object(chat_input_handler.backend_internal_data_processing_dispatcher, 'increment_pricing', new_callable=AsyncMock) as mock_increment_pricing:
+        mock_increment_pricing.return_value = MagicMock()
         result = await chat_input_handler.calculate_and_update_costs(cost_params, "costs_container", "blob_name", incoming_notification)
         assert isinstance(result, tuple)
         assert len(result) == 3
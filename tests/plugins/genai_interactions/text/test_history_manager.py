@@ -0,0 +1,125 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from core.genai_interactions.genai_interactions_text_plugin_base import (
+    GenAIInteractionsTextPluginBase,
+)
+from core.user_interactions.incoming_notification_data_base import (
+    IncomingNotificationDataBase,
+)
+from plugins.genai_interactions.text.history_manager import (
+    IMAGE_TOKENS,
+    MESSAGE_OVERHEAD_TOKENS,
+    HistoryManager,
+    count_tokens,
+)
+
+
+@pytest.fixture
+def mock_chat_plugin():
+    plugin = MagicMock(spec=GenAIInteractionsTextPluginBase)
+    plugin.plugin_name = "azure_chatgpt"
+    cost = MagicMock(total_tk=30, prompt_tk=20, completion_tk=10, input_token_price=0.01, output_token_price=0.02)
+    plugin.generate_completion = AsyncMock(return_value=("summary of the thread", cost))
+    return plugin
+
+@pytest.fixture
+def history_manager(mock_global_manager, mock_chat_plugin):
+    mock_global_manager.bot_config.HISTORY_TOKEN_BUDGET = 200
+    mock_global_manager.bot_config.HISTORY_TOKEN_BUDGETS = None
+    mock_global_manager.bot_config.HISTORY_RECENT_MESSAGES = 2
+    dispatcher = mock_global_manager.backend_internal_data_processing_dispatcher
+    dispatcher.sessions = "sessions"
+    dispatcher.costs = "costs"
+    dispatcher.read_data_content = AsyncMock(return_value=None)
+    dispatcher.write_data_content = AsyncMock()
+    dispatcher.increment_pricing = AsyncMock()
+    return HistoryManager(mock_global_manager, mock_chat_plugin)
+
+@pytest.fixture
+def event_data():
+    return IncomingNotificationDataBase(
+        channel_id="C1", thread_id="T1", user_id="U1", text="text", timestamp="1", converted_timestamp="1",
+        event_label="thread_message", response_id="1", user_name="user", user_email="user@example.com",
+        is_mention=True, origin="origin", images=["base64_image_data"]
+    )
+
+def conversation(count, size=200):
+    # Each stored message is about 50 tokens
+    messages = [{"role": "system", "content": "prompt"}]
+    for index in range(count):
+        messages.append({"role": "user" if index % 2 == 0 else "assistant", "content": f"{index}:" + "x" * size})
+    return messages
+
+def test_count_tokens():
+    assert count_tokens({"role": "user", "content": "x" * 40}) == MESSAGE_OVERHEAD_TOKENS + 10
+    image = {"type": "image_url", "image_url": {"url": "image-ref:sha256:abc"}}
+    assert count_tokens({"role": "user", "content": [{"type": "text", "text": "x" * 8}, image]}) == MESSAGE_OVERHEAD_TOKENS + 2 + IMAGE_TOKENS
+
+def test_token_budget_per_model(history_manager, mock_global_manager):
+    assert history_manager.token_budget() == 200
+    mock_global_manager.bot_config.HISTORY_TOKEN_BUDGETS = {"azure_chatgpt": 1000}
+    assert history_manager.token_budget() == 1000
+
+@pytest.mark.asyncio
+async def test_fit_keeps_short_history(history_manager, event_data):
+    messages = conversation(2)
+    assert await history_manager.fit("C1-T1.txt", messages, 2, event_data) is messages
+    history_manager.backend_internal_data_processing_dispatcher.read_data_content.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_fit_trims_and_summarizes_in_background(history_manager, mock_chat_plugin, event_data):
+    messages = conversation(10)
+    new_message = {"role": "user", "content": "new question"}
+    messages.append(new_message)
+
+    fitted = await history_manager.fit("C1-T1.txt", messages, 11, event_data)
+
+    assert fitted[0] == messages[0]
+    assert fitted[-1] == new_message
+    assert sum(count_tokens(message) for message in fitted) <= 200
+    assert fitted[1:-1] == messages[-1 - (len(fitted) - 2):-1]
+
+    await asyncio.gather(*history_manager.summary_tasks.values())
+    summary_event = mock_chat_plugin.generate_completion.call_args.args[1]
+    assert summary_event.images == []
+    assert event_data.images == ["base64_image_data"]
+    dispatcher = history_manager.backend_internal_data_processing_dispatcher
+    data_file, content = dispatcher.write_data_content.call_args.args[1:]
+    assert data_file == "C1-T1.summary.json"
+    assert json.loads(content)["summary"] == "summary of the thread"
+    assert 1 < json.loads(content)["covered"] <= 9
+    dispatcher.increment_pricing.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_fit_uses_stored_summary(history_manager, mock_chat_plugin, event_data):
+    messages = conversation(10)
+    history_manager.backend_internal_data_processing_dispatcher.read_data_content.return_value = json.dumps({"covered": 9, "summary": "earlier talk"})
+
+    fitted = await history_manager.fit("C1-T1.txt", messages, 11, event_data)
+
+    assert fitted[0]["role"] == "system"
+    assert fitted[0]["content"].startswith("prompt")
+    assert "earlier talk" in fitted[0]["content"]
+    assert fitted[1:] == messages[9:]
+    # The recent window is already covered, no summary is generated
+    assert history_manager.summary_tasks == {}
+    mock_chat_plugin.generate_completion.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_fit_ignores_summary_of_another_session(history_manager, event_data):
+    messages = conversation(10)
+    history_manager.backend_internal_data_processing_dispatcher.read_data_content.return_value = json.dumps({"covered": 50, "summary": "other"})
+    fitted = await history_manager.fit("C1-T1.txt", messages, 11, event_data)
+    assert all("other" not in str(message["content"]) for message in fitted)
+    await asyncio.gather(*history_manager.summary_tasks.values())
+
+@pytest.mark.asyncio
+async def test_summary_failure_is_logged(history_manager, mock_chat_plugin, event_data):
+    mock_chat_plugin.generate_completion.side_effect = Exception("model unavailable")
+    await history_manager.summarize("C1-T1.txt", conversation(2), 3, None, event_data)
+    history_manager.logger.error.assert_called_once()
+    history_manager.backend_internal_data_processing_dispatcher.write_data_content.assert_not_called()
@@ -9,6 +9,12 @@ from core.user_interactions.incoming_notification_data_base import (
 from plugins.genai_interactions.vector_search.openai_file_search.openai_file_search import (
     OpenaiFileSearchPlugin,
 )
+from plugins.genai_interactions.vector_search.openai_file_search.utils.ivf_index import (
+    IvfIndex,
+)
+from plugins.genai_interactions.vector_search.openai_file_search.utils.vector_index import (
+    VectorIndex,
+)
 import numpy as np
 import pandas as pd
 
@@ -36,6 +42,8 @@ def openai_file_search_plugin(mock_global_manager):
 
     plugin = OpenaiFileSearchPlugin(global_manager=mock_global_manager)
     plugin.initialize()
+    # No binary index by default, indexes are read from their CSV file
+    plugin.backend_internal_data_processing_dispatcher.get_data_version = AsyncMock(return_value=None)
     return plugin
 
 def test_initialize(openai_file_search_plugin):
@@ -56,7 +64,46 @@ async def test_handle_action(openai_file_search_plugin):
         mock_call_search.return_value = "search result"
         result = await openai_file_search_plugin.handle_action(action_input, mock_event)
         assert result == "search result"
-        mock_call_search.assert_called_once_with(query="test query", index_name="test_index", result_count=openai_file_search_plugin.result_count)
+        mock_call_search.assert_called_once_with(query="test query", index_name="test_index", result_count=openai_file_search_plugin.result_count, search_mode="vector", prefilter=False)
+
+@pytest.mark.asyncio
+async def test_handle_action_search_mode_parameters(openai_file_search_plugin):
+    action_input = ActionInput(action_name="search", parameters={"query": "ERR-1234", "index_name": "test_index", "search_mode": "hybrid", "prefilter": "true"})
+    with patch.object(openai_file_search_plugin, 'call_search', new_callable=AsyncMock) as mock_call_search:
+        await openai_file_search_plugin.handle_action(action_input, MagicMock(spec=IncomingNotificationDataBase))
+        assert mock_call_search.call_args.kwargs['search_mode'] == "hybrid"
+        assert mock_call_search.call_args.kwargs['prefilter'] is True
+
+def test_parse_index_names():
+    assert OpenaiFileSearchPlugin.parse_index_names("docs") == ["docs"]
+    assert OpenaiFileSearchPlugin.parse_index_names("docs, faq,,docs") == ["docs", "faq"]
+    assert OpenaiFileSearchPlugin.parse_index_names(["docs", " faq "]) == ["docs", "faq"]
+    assert OpenaiFileSearchPlugin.parse_index_names("") == []
+
+@pytest.mark.asyncio
+async def test_handle_action_fans_out_over_indexes(openai_file_search_plugin):
+    action_input = ActionInput(action_name="search", parameters={"query": "test query", "index_name": ["docs", "faq", "broken"], "result_count": 3})
+    searches = {
+        "docs": [("d1", "p1", 0.9, "t", "title", "path"), ("d2", "p2", 0.5, "t", "title", "path")],
+        "faq": [("f1", "p1", 0.7, "t", "title", "path"), ("f2", "p2", 0.6, "t", "title", "path")],
+    }
+
+    async def call_search(query, index_name, **kwargs):
+        if index_name == "broken":
+            raise FileNotFoundError(index_name)
+        return searches[index_name]
+
+    with patch.object(openai_file_search_plugin, 'call_search', side_effect=call_search) as mock_call_search, \
+         patch.object(openai_file_search_plugin, 'get_embedding', new_callable=AsyncMock) as mock_get_embedding:
+        results = await openai_file_search_plugin.handle_action(action_input)
+
+    # Results are interleaved by rank, not by raw score, the indexes tie in index order
+    assert [result[0] for result in results] == ["d1", "f1", "d2"]
+    assert results[0][2] == pytest.approx(1 / 61)
+    assert mock_call_search.call_count == 3
+    mock_get_embedding.assert_awaited_once()
+    assert not hasattr(openai_file_search_plugin, 'index_name')
+    assert openai_file_search_plugin.result_count == 5
 
 @pytest.mark.asyncio
 async def test_call_search_with_results(openai_file_search_plugin):
@@ -64,7 +111,7 @@ async def test_call_search_with_results(openai_file_search_plugin):
     index_name = "test_index"
     expected_result = [("doc1", "passage_id", 1.0, "This is a passage", "title", "file_path")]
     with patch.object(openai_file_search_plugin.backend_internal_data_processing_dispatcher, 'read_data_content', new_callable=AsyncMock) as mock_read_data_content:
-        mock_read_data_content.return_value = "passage_index,text,embedding\n0,This is a passage,[0.1,0.2,0.3]"
+        mock_read_data_content.return_value = "passage_index,text,embedding\n0,This is a passage,\"[0.1,0.2,0.3]\""
         with patch.object(openai_file_search_plugin, 'search_reviews', new_callable=AsyncMock) as mock_search_reviews:
             mock_search_reviews.return_value = [("doc1", "passage_id", 1.0, "This is a passage", "title", "file_path")]
             result = await openai_file_search_plugin.call_search(query=query, index_name=index_name)
@@ -115,6 +162,244 @@ async def test_get_embedding(openai_file_search_plugin):
         assert result == [0.1, 0.2, 0.3]
         mock_create.assert_called_once_with(input=["test text"], model="test_model")
 
+@pytest.mark.asyncio
+async def test_load_index_is_cached_until_version_changes(openai_file_search_plugin):
+    dispatcher = openai_file_search_plugin.backend_internal_data_processing_dispatcher
+    dispatcher.get_data_version = AsyncMock(side_effect=lambda data_container, data_file: None if data_file.endswith((".npy", ".npz")) else version)
+    version = "v1"
+    dispatcher.read_data_content = AsyncMock(return_value="passage_index,text,embedding\n0,This is a passage,\"[0.1,0.2,0.3]\"")
+
+    first = await openai_file_search_plugin.load_index("test_index")
+    # Within the version TTL the backend is not asked again
+    assert await openai_file_search_plugin.load_index("test_index") is first
+    assert dispatcher.get_data_version.call_count == 3
+
+    openai_file_search_plugin.index_checked_until["test_index"] = 0
+    second = await openai_file_search_plugin.load_index("test_index")
+    assert first is second
+    assert dispatcher.get_data_version.call_count == 6
+    assert dispatcher.read_data_content.call_count == 1
+
+    version = "v2"
+    openai_file_search_plugin.index_checked_until["test_index"] = 0
+    third = await openai_file_search_plugin.load_index("test_index")
+    assert third is not first
+    assert third.version == "v2"
+    assert dispatcher.read_data_content.call_count == 2
+
+@pytest.mark.asyncio
+async def test_load_index_prefers_binary_format(openai_file_search_plugin):
+    df = pd.DataFrame({
+        'document_id': ['doc1'], 'passage_id': [0], 'passage_index': [0], 'text': ['passage'],
+        'title': ['title'], 'file_path': ['path'], 'embedding': ['[3.0, 4.0]'],
+    })
+    embeddings, _, metadata = VectorIndex.from_dataframe(df).to_binary()
+    dispatcher = openai_file_search_plugin.backend_internal_data_processing_dispatcher
+    dispatcher.get_data_version = AsyncMock(side_effect=lambda data_container, data_file: "etag" if data_file.endswith(".npy") else None)
+    dispatcher.read_data_buffer = AsyncMock(side_effect=lambda data_container, data_file: embeddings if data_file == "test_index.embeddings.npy" else None)
+    dispatcher.read_data_content = AsyncMock(return_value=metadata)
+
+    index = await openai_file_search_plugin.load_index("test_index.csv")
+    assert index.version == "binary:etag"
+    assert np.allclose(index.embeddings, [[0.6, 0.8]])
+    dispatcher.read_data_content.assert_called_once_with(data_container=dispatcher.vectors, data_file="test_index.metadata.csv")
+
+    # A binary index keeps its memory-mapped float32 matrix to re-rank quantized candidates
+    openai_file_search_plugin.embedding_precision = "int8"
+    openai_file_search_plugin.indexes.clear()
+    index = await openai_file_search_plugin.load_index("test_index.csv")
+    assert index.precision == "int8"
+    assert index.exact_embeddings is not None
+
+@pytest.mark.asyncio
+async def test_load_index_requires_binary_metadata(openai_file_search_plugin):
+    embeddings, _, _ = VectorIndex(np.eye(2, dtype=np.float32)).to_binary()
+    dispatcher = openai_file_search_plugin.backend_internal_data_processing_dispatcher
+    dispatcher.get_data_version = AsyncMock(side_effect=lambda data_container, data_file: "etag" if data_file.endswith(".npy") else None)
+    dispatcher.read_data_buffer = AsyncMock(side_effect=lambda data_container, data_file: embeddings if data_file == "test_index.embeddings.npy" else None)
+    dispatcher.read_data_content = AsyncMock(return_value=None)
+
+    with pytest.raises(FileNotFoundError, match="test_index.metadata.csv"):
+        await openai_file_search_plugin.load_index("test_index.csv")
+    assert "test_index.csv" not in openai_file_search_plugin.indexes
+
+@pytest.mark.asyncio
+async def test_load_index_quantizes_embeddings(openai_file_search_plugin):
+    openai_file_search_plugin.embedding_precision = "int8"
+    dispatcher = openai_file_search_plugin.backend_internal_data_processing_dispatcher
+    dispatcher.get_data_version = AsyncMock(side_effect=lambda data_container, data_file: "v1" if data_file.endswith(".csv") else None)
+    dispatcher.read_data_content = AsyncMock(return_value="passage_index,text,embedding\n0,This is a passage,\"[0.1,0.2,0.3]\"")
+
+    index = await openai_file_search_plugin.load_index("test_index.csv")
+    assert index.precision == "int8"
+    # A CSV index only keeps its float32 matrix in memory when re-ranking is enabled for it
+    assert index.exact_embeddings is None
+
+    openai_file_search_plugin.csv_rerank_candidates = 10
+    openai_file_search_plugin.indexes.clear()
+    openai_file_search_plugin.logger.warning.reset_mock()
+    index = await openai_file_search_plugin.load_index("test_index.csv")
+    assert index.exact_embeddings is not None
+    openai_file_search_plugin.logger.warning.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_load_index_attaches_ivf_index(openai_file_search_plugin):
+    embeddings = np.eye(4, dtype=np.float32)
+    ivf_index = IvfIndex.build(embeddings, n_lists=2)
+    dispatcher = openai_file_search_plugin.backend_internal_data_processing_dispatcher
+    dispatcher.get_data_version = AsyncMock(side_effect=lambda data_container, data_file: None if data_file.endswith(".npy") else "v1")
+    dispatcher.read_data_content = AsyncMock(return_value='passage_index,text,embedding\n' + '\n'.join(f'{i},text{i},"{row.tolist()}"' for i, row in enumerate(embeddings)))
+    dispatcher.read_data_buffer = AsyncMock(return_value=ivf_index.to_bytes())
+
+    index = await openai_file_search_plugin.load_index("test_index.csv")
+    assert index.version == "v1+ivf:v1"
+    assert index.ann_index.n_lists == 2
+    dispatcher.read_data_buffer.assert_called_once_with(data_container=dispatcher.vectors, data_file="test_index.ivf.npz")
+    assert index.search([0.0, 0.0, 1.0, 0.0], result_count=1, n_probe=2)[0][0] == 2
+
+@pytest.mark.asyncio
+async def test_load_index_ignores_ivf_index_of_other_embeddings(openai_file_search_plugin):
+    embeddings = np.eye(4, dtype=np.float32)
+    dispatcher = openai_file_search_plugin.backend_internal_data_processing_dispatcher
+    dispatcher.get_data_version = AsyncMock(side_effect=lambda data_container, data_file: None if data_file.endswith(".npy") else "v1")
+    dispatcher.read_data_content = AsyncMock(return_value='passage_index,text,embedding\n' + '\n'.join(f'{i},text{i},"{row.tolist()}"' for i, row in enumerate(embeddings[:3])))
+    dispatcher.read_data_buffer = AsyncMock(return_value=IvfIndex.build(embeddings, n_lists=2).to_bytes())
+
+    index = await openai_file_search_plugin.load_index("test_index.csv")
+    # The approximate index has a row the CSV does not, the search is exact
+    assert index.ann_index is None
+    openai_file_search_plugin.logger.warning.assert_called()
+    assert index.search([0.0, 0.0, 1.0, 0.0], result_count=1, n_probe=2)[0][0] == 2
+
+@pytest.mark.asyncio
+async def test_search_reviews(openai_file_search_plugin):
+    df = pd.DataFrame({
+        'document_id': ['doc1', 'doc2'],
+        'passage_id': ['p1', 'p2'],
+        'passage_index': [0, 5],
+        'text': ['first passage', 'second passage'],
+        'title': ['title1', 'title2'],
+        'file_path': ['path1', 'path2'],
+        'embedding': ['[1.0, 0.0]', '[0.0, 1.0]'],
+        'title_embedding': ['[1.0, 0.0]', '[0.0, 1.0]'],
+    })
+    index = VectorIndex.from_dataframe(df)
+    openai_file_search_plugin.context_extraction = False
+    with patch.object(openai_file_search_plugin, 'get_embedding', new_callable=AsyncMock) as mock_get_embedding:
+        mock_get_embedding.return_value = [0.0, 1.0]
+        results = await openai_file_search_plugin.search_reviews(index, "query", "test_index", 1)
+    assert len(results) == 1
+    document_id, passage_id, similarity, text, title, file_path = results[0]
+    assert (document_id, passage_id, text, title, file_path) == ('doc2', 'p2', 'second passage', 'title2', 'path2')
+    assert np.isclose(similarity, 1.0)
+
+@pytest.mark.asyncio
+async def test_search_reviews_extracts_context_once_per_document(openai_file_search_plugin):
+    df = pd.DataFrame({
+        'document_id': ['doc1', 'doc1', 'doc2'],
+        'passage_id': ['p1', 'p2', 'p3'],
+        'passage_index': [0, 10, 0],
+        'text': ['first', 'second', 'third'],
+        'title': ['t1', 't1', 't2'],
+        'file_path': ['path1', 'path1', 'path2'],
+        'embedding': ['[1.0, 0.0]', '[0.9, 0.1]', '[0.8, 0.2]'],
+        'title_embedding': ['[1.0, 0.0]', '[1.0, 0.0]', '[0.0, 1.0]'],
+    })
+    index = VectorIndex.from_dataframe(df)
+    openai_file_search_plugin.context_extraction = True
+    documents = {'doc1': "0123456789second passage", 'doc2': "third passage"}
+    dispatcher = openai_file_search_plugin.backend_internal_data_processing_dispatcher
+    dispatcher.read_data_content = AsyncMock(side_effect=lambda data_container, data_file: documents[data_file])
+    with patch.object(openai_file_search_plugin, 'get_embedding', new_callable=AsyncMock) as mock_get_embedding:
+        mock_get_embedding.return_value = [1.0, 0.0]
+        results = await openai_file_search_plugin.search_reviews(index, "query", "test_index", 3)
+        await openai_file_search_plugin.search_reviews(index, "query", "test_index", 3)
+
+    assert [result[1] for result in results] == ['p1', 'p2', 'p3']
+    assert results[1][3].startswith("second")
+    assert sorted(call.kwargs['data_file'] for call in dispatcher.read_data_content.call_args_list) == ['doc1', 'doc2']
+
+def make_identifier_index():
+    df = pd.DataFrame({
+        'document_id': ['doc1', 'doc2', 'doc3'],
+        'passage_id': ['p1', 'p2', 'p3'],
+        'passage_index': [0, 0, 0],
+        'text': ['login failures explained', 'error ERR-1234 when saving', 'saving documents'],
+        'title': ['auth', 'errors', 'docs'],
+        'file_path': ['path1', 'path2', 'path3'],
+        'embedding': ['[1.0, 0.0]', '[0.0, 1.0]', '[0.7, 0.7]'],
+        'title_embedding': ['[1.0, 0.0]', '[0.0, 1.0]', '[0.7, 0.7]'],
+    })
+    return VectorIndex.from_dataframe(df)
+
+@pytest.mark.asyncio
+async def test_search_reviews_lexical_mode_skips_embedding(openai_file_search_plugin):
+    openai_file_search_plugin.context_extraction = False
+    with patch.object(openai_file_search_plugin, 'get_embedding', new_callable=AsyncMock) as mock_get_embedding:
+        results = await openai_file_search_plugin.search_reviews(make_identifier_index(), "ERR-1234", "test_index", 2, search_mode="lexical")
+    mock_get_embedding.assert_not_called()
+    assert [result[0] for result in results] == ['doc2']
+
+@pytest.mark.asyncio
+async def test_search_reviews_hybrid_mode_fuses_rankings(openai_file_search_plugin):
+    openai_file_search_plugin.context_extraction = False
+    with patch.object(openai_file_search_plugin, 'get_embedding', new_callable=AsyncMock) as mock_get_embedding:
+        mock_get_embedding.return_value = [1.0, 0.0]
+        results = await openai_file_search_plugin.search_reviews(make_identifier_index(), "ERR-1234", "test_index", 2, search_mode="hybrid")
+    # doc2 is last by cosine similarity but the only lexical match
+    assert [result[0] for result in results] == ['doc2', 'doc1']
+
+@pytest.mark.asyncio
+async def test_search_reviews_lexical_prefilter(openai_file_search_plugin):
+    openai_file_search_plugin.context_extraction = False
+    with patch.object(openai_file_search_plugin, 'get_embedding', new_callable=AsyncMock) as mock_get_embedding:
+        mock_get_embedding.return_value = [1.0, 0.0]
+        results = await openai_file_search_plugin.search_reviews(make_identifier_index(), "saving", "test_index", 3, prefilter=True)
+    assert [result[0] for result in results] == ['doc3', 'doc2']
+
+@pytest.mark.asyncio
+async def test_get_embedding_uses_cache(openai_file_search_plugin):
+    with patch.object(openai_file_search_plugin.client.embeddings, 'create', new_callable=AsyncMock) as mock_create:
+        mock_create.return_value.data = [AsyncMock(embedding=[0.1, 0.2, 0.3])]
+        first = await openai_file_search_plugin.get_embedding("same question", "test_model")
+        second = await openai_file_search_plugin.get_embedding("same\nquestion", "test_model")
+        assert first == second == [0.1, 0.2, 0.3]
+        mock_create.assert_called_once()
+        assert openai_file_search_plugin.embedding_cache.hits == 1
+
+@pytest.mark.asyncio
+async def test_get_embedding_persists_cache(openai_file_search_plugin):
+    dispatcher = openai_file_search_plugin.backend_internal_data_processing_dispatcher
+    dispatcher.read_data_content = AsyncMock(return_value=None)
+    dispatcher.write_data_content = AsyncMock()
+    openai_file_search_plugin.embedding_cache_persist = True
+    with patch.object(openai_file_search_plugin.client.embeddings, 'create', new_callable=AsyncMock) as mock_create:
+        mock_create.return_value.data = [AsyncMock(embedding=[0.5, 0.25])]
+        await openai_file_search_plugin.get_embedding("question", "test_model")
+        await openai_file_search_plugin.get_embedding("other question", "test_model")
+    dispatcher.read_data_content.assert_called_once_with(data_container=dispatcher.vectors, data_file="embedding_cache.json")
+    # Misses only mark the cache dirty, it is saved by the periodic flush or on close
+    dispatcher.write_data_content.assert_not_called()
+    assert openai_file_search_plugin.embedding_cache_flush_task is not None
+
+    await openai_file_search_plugin.close()
+    dispatcher.write_data_content.assert_called_once()
+    assert '"other question"' in dispatcher.write_data_content.call_args.kwargs['data']
+    assert not openai_file_search_plugin.embedding_cache.dirty
+
+@pytest.mark.asyncio
+async def test_embedding_cache_is_flushed_periodically(openai_file_search_plugin):
+    dispatcher = openai_file_search_plugin.backend_internal_data_processing_dispatcher
+    dispatcher.read_data_content = AsyncMock(return_value=None)
+    dispatcher.write_data_content = AsyncMock()
+    openai_file_search_plugin.embedding_cache_persist = True
+    openai_file_search_plugin.embedding_cache_persist_interval = 0
+    with patch.object(openai_file_search_plugin.client.embeddings, 'create', new_callable=AsyncMock) as mock_create:
+        mock_create.return_value.data = [AsyncMock(embedding=[0.5, 0.25])]
+        await openai_file_search_plugin.get_embedding("question", "test_model")
+    await openai_file_search_plugin.embedding_cache_flush_task
+    dispatcher.write_data_content.assert_called_once()
+
 def test_cosine_similarity(openai_file_search_plugin):
     a = np.array([1, 0, 1])
     b = np.array([0, 1, 1])
@@ -152,4 +437,24 @@ def test_validate_request(openai_file_search_plugin):
         is_mention=True,
         origin="origin"
     )
-    assert openai_file_search_plugin.validate_request(event) == True
\ No newline at end of file
+    assert openai_file_search_plugin.validate_request(event) == True
+@pytest.mark.asyncio
+async def test_get_embeddings_keeps_input_order(openai_file_search_plugin):
+    response = MagicMock()
+    response.data = [MagicMock(index=1, embedding=[2.0]), MagicMock(index=0, embedding=[1.0])]
+    openai_file_search_plugin.client = MagicMock()
+    openai_file_search_plugin.client.embeddings.create = AsyncMock(return_value=response)
+
+    embeddings = await openai_file_search_plugin.get_embeddings(["first\nline", "second"])
+
+    assert embeddings == [[1.0], [2.0]]
+    assert openai_file_search_plugin.client.embeddings.create.call_args.kwargs['input'] == ["first line", "second"]
+
+@pytest.mark.asyncio
+async def test_index_documents_defaults_to_index_container(openai_file_search_plugin):
+    with patch('plugins.genai_interactions.vector_search.openai_file_search.openai_file_search.IndexBuilder') as builder_class:
+        builder_class.return_value.build = AsyncMock(return_value={"embedded": 1})
+        stats = await openai_file_search_plugin.index_documents("docs.csv")
+
+    assert stats == {"embedded": 1}
+    builder_class.return_value.build.assert_awaited_once_with("docs.csv", "docs.csv", document_extension=".txt")
@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+
+from plugins.genai_interactions.vector_search.openai_file_search.utils.convert_index import (
+    binary_index_files,
+    convert_csv_index,
+)
+from plugins.genai_interactions.vector_search.openai_file_search.utils.vector_index import (
+    VectorIndex,
+)
+
+
+def test_binary_index_files():
+    assert binary_index_files("docs.csv") == ["docs.embeddings.npy", "docs.title_embeddings.npy", "docs.metadata.csv"]
+
+def test_convert_csv_index(tmp_path):
+    csv_path = tmp_path / "docs.csv"
+    csv_path.write_text(
+        'document_id,passage_id,passage_index,text,title,file_path,embedding,title_embedding\n'
+        'doc1,0,0,"first, passage",t1,p1,"[1.0, 0.0]","[0.0, 1.0]"\n'
+        'doc2,1,12,second passage,t2,p2,"[0.0, 3.0]","[1.0, 0.0]"\n'
+    )
+    output_directory = tmp_path / "out"
+
+    written = convert_csv_index(str(csv_path), str(output_directory))
+    assert sorted(os.path.basename(path) for path in written) == sorted(binary_index_files("docs.csv"))
+
+    with open(output_directory / "docs.embeddings.npy", 'rb') as file:
+        embeddings = file.read()
+    with open(output_directory / "docs.title_embeddings.npy", 'rb') as file:
+        title_embeddings = file.read()
+    metadata = (output_directory / "docs.metadata.csv").read_text()
+
+    index = VectorIndex.from_binary(embeddings, metadata, title_embeddings)
+    assert np.allclose(index.embeddings, [[1.0, 0.0], [0.0, 1.0]])
+    assert index.get_passage(0)['text'] == "first, passage"
+    assert index.get_passage(1)['passage_index'] == 12
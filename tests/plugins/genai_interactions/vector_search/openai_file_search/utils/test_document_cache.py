@@ -0,0 +1,77 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from plugins.genai_interactions.vector_search.openai_file_search.utils.document_cache import (
+    DocumentCache,
+)
+
+
+@pytest.mark.asyncio
+async def test_fetch_caches_content():
+    cache = DocumentCache(max_size=2)
+    loader = AsyncMock(return_value="content")
+    assert await cache.fetch(("index", "doc"), loader) == "content"
+    assert await cache.fetch(("index", "doc"), loader) == "content"
+    loader.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_concurrent_fetches_share_one_read():
+    cache = DocumentCache()
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "content"
+
+    results = await asyncio.gather(*[cache.fetch(("index", "doc"), loader) for _ in range(5)])
+    assert results == ["content"] * 5
+    assert calls == 1
+
+@pytest.mark.asyncio
+async def test_fetch_evicts_least_recently_used():
+    cache = DocumentCache(max_size=2)
+    for name in ("a", "b"):
+        await cache.fetch(("index", name), AsyncMock(return_value=name))
+    await cache.fetch(("index", "a"), AsyncMock())
+    await cache.fetch(("index", "c"), AsyncMock(return_value="c"))
+    assert list(cache.entries) == [("index", "a"), ("index", "c")]
+
+@pytest.mark.asyncio
+async def test_missing_documents_and_errors_are_not_cached():
+    cache = DocumentCache()
+    assert await cache.fetch(("index", "doc"), AsyncMock(return_value=None)) is None
+    with pytest.raises(RuntimeError):
+        await cache.fetch(("index", "doc"), AsyncMock(side_effect=RuntimeError("boom")))
+    assert len(cache) == 0 and not cache.pending
+
+@pytest.mark.asyncio
+async def test_invalidate_index():
+    cache = DocumentCache()
+    await cache.fetch(("index1", "doc"), AsyncMock(return_value="one"))
+    await cache.fetch(("index2", "doc"), AsyncMock(return_value="two"))
+    cache.invalidate("index1")
+    assert list(cache.entries) == [("index2", "doc")]
+
+@pytest.mark.asyncio
+async def test_waiters_read_again_when_the_first_fetch_is_cancelled():
+    cache = DocumentCache()
+    started = asyncio.Event()
+
+    async def slow_loader():
+        started.set()
+        await asyncio.sleep(10)
+
+    first = asyncio.create_task(cache.fetch(("index", "doc"), slow_loader))
+    await started.wait()
+    second = asyncio.create_task(cache.fetch(("index", "doc"), AsyncMock(return_value="content")))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await asyncio.wait_for(second, timeout=1) == "content"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert not cache.pending
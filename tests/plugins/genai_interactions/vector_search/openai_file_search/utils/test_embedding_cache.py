@@ -0,0 +1,60 @@
+import pytest
+
+from plugins.genai_interactions.vector_search.openai_file_search.utils.embedding_cache import (
+    EmbeddingCache,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def test_get_and_put_counts_hits_and_misses(clock):
+    cache = EmbeddingCache(max_size=2, ttl=60, clock=clock)
+    assert cache.get("model", "query") is None
+    cache.put("model", "query", [0.1, 0.2])
+    assert cache.get("model", "  query ") == [0.1, 0.2]
+    assert cache.get("other_model", "query") is None
+    assert cache.stats == {"size": 1, "hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = EmbeddingCache(max_size=2, ttl=60, clock=clock)
+    cache.put("model", "a", [1.0])
+    cache.put("model", "b", [2.0])
+    cache.get("model", "a")
+    cache.put("model", "c", [3.0])
+    assert cache.get("model", "b") is None
+    assert cache.get("model", "a") == [1.0]
+    assert cache.get("model", "c") == [3.0]
+
+def test_entries_expire(clock):
+    cache = EmbeddingCache(max_size=2, ttl=60, clock=clock)
+    cache.put("model", "query", [1.0])
+    clock.now += 61
+    assert cache.get("model", "query") is None
+    assert len(cache) == 0
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = EmbeddingCache(max_size=0, ttl=60, clock=clock)
+    cache.put("model", "query", [1.0])
+    assert cache.get("model", "query") is None
+
+def test_json_round_trip_skips_expired_entries(clock):
+    cache = EmbeddingCache(max_size=10, ttl=60, clock=clock)
+    cache.put("model", "old", [1.0, 2.0])
+    clock.now += 30
+    cache.put("model", "new", [0.5, 0.25])
+    content = cache.to_json()
+
+    clock.now += 40
+    restored = EmbeddingCache(max_size=10, ttl=60, clock=clock)
+    restored.load_json(content)
+    assert len(restored) == 1
+    assert restored.get("model", "new") == [0.5, 0.25]
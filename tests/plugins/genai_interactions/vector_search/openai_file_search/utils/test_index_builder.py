@@ -0,0 +1,193 @@
+import json
+from io import StringIO
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from plugins.genai_interactions.vector_search.openai_file_search.utils.index_builder import (
+    IndexBuilder,
+    chunk_text,
+    manifest_file,
+)
+
+
+class InMemoryBackend:
+    vectors = "vectors"
+
+    def __init__(self, files):
+        self.files = files
+
+    async def read_data_content(self, data_container, data_file):
+        return self.files.get((data_container, data_file))
+
+    async def write_data_content(self, data_container, data_file, data):
+        self.files[(data_container, data_file)] = data
+
+    async def list_stale_files(self, data_container, older_than):
+        return [(name, len(data)) for (container, name), data in self.files.items() if container == data_container]
+
+    async def get_data_version(self, data_container, data_file):
+        content = self.files.get((data_container, data_file))
+        return None if content is None else str(hash(content))
+
+    async def remove_data_content(self, data_container, data_file):
+        self.files.pop((data_container, data_file), None)
+
+class FakeEmbedder:
+    def __init__(self, failures=0):
+        self.calls = []
+        self.failures = failures
+
+    async def __call__(self, texts):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("rate limited")
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+def make_builder(backend, embedder, **kwargs):
+    options = dict(chunk_size=20, chunk_overlap=5, batch_size=2, concurrency=2, retry_delay=0)
+    options.update(kwargs)
+    return IndexBuilder(backend, embedder, MagicMock(), **options)
+
+def read_index(backend, name="docs.csv"):
+    return pd.read_csv(StringIO(backend.files[("vectors", name)]))
+
+def test_manifest_file():
+    assert manifest_file("docs.csv") == "docs.manifest.json"
+
+def test_chunk_text_overlaps_and_covers_text():
+    text = "alpha beta gamma delta epsilon zeta eta theta iota kappa"
+    chunks = chunk_text(text, 20, 5)
+    assert all(len(passage) <= 20 for _, passage in chunks)
+    assert chunks[0][0] == 0
+    for offset, passage in chunks:
+        assert text[offset:offset + len(passage)] == passage
+    assert chunks[-1][0] + len(chunks[-1][1]) == len(text)
+
+def test_chunk_text_empty():
+    assert chunk_text("", 20, 5) == []
+
+@pytest.mark.asyncio
+async def test_build_creates_index_and_manifest():
+    backend = InMemoryBackend({
+        ("docs.csv", "a.txt"): "alpha beta gamma delta epsilon zeta",
+        ("docs.csv", "b.txt"): "short text",
+    })
+    embedder = FakeEmbedder()
+
+    stats = await make_builder(backend, embedder).build("docs.csv", "docs.csv")
+
+    df = read_index(backend)
+    assert stats["embedded"] == 2 and stats["passages"] == len(df)
+    assert set(df['document_id']) == {"a.txt", "b.txt"}
+    assert df[df['document_id'] == "b.txt"].iloc[0]['file_path'] == "docs.csv/b.txt"
+    assert json.loads(df.iloc[0]['embedding'])[1] == 1.0
+    assert all(len(batch) <= 2 for batch in embedder.calls)
+    manifest = json.loads(backend.files[("vectors", "docs.manifest.json")])
+    assert set(manifest["documents"]) == {"a.txt", "b.txt"} and manifest["parts"] == []
+
+@pytest.mark.asyncio
+async def test_rebuild_only_embeds_changed_documents():
+    backend = InMemoryBackend({
+        ("docs.csv", "a.txt"): "alpha beta",
+        ("docs.csv", "b.txt"): "gamma delta",
+        ("docs.csv", "c.txt"): "epsilon",
+    })
+    await make_builder(backend, FakeEmbedder()).build("docs.csv", "docs.csv")
+
+    backend.files[("docs.csv", "b.txt")] = "gamma delta changed"
+    del backend.files[("docs.csv", "c.txt")]
+    embedder = FakeEmbedder()
+    stats = await make_builder(backend, embedder).build("docs.csv", "docs.csv")
+
+    assert stats == {"documents": 2, "unchanged": 1, "embedded": 1, "removed": 1, "passages": 2}
+    embedded_texts = [text for batch in embedder.calls for text in batch]
+    assert "alpha beta" not in embedded_texts
+    df = read_index(backend)
+    assert set(df['document_id']) == {"a.txt", "b.txt"}
+    assert "gamma delta changed" in " ".join(df[df['document_id'] == "b.txt"]['text'])
+
+@pytest.mark.asyncio
+async def test_rebuild_removes_stale_binary_and_ivf_indexes():
+    backend = InMemoryBackend({("docs.csv", "a.txt"): "alpha beta"})
+    await make_builder(backend, FakeEmbedder()).build("docs.csv", "docs.csv")
+    derived_files = ["docs.embeddings.npy", "docs.title_embeddings.npy", "docs.metadata.csv", "docs.ivf.npz"]
+    for derived_file in derived_files:
+        backend.files[("vectors", derived_file)] = "previous version"
+
+    # An unchanged index keeps the files derived from it
+    await make_builder(backend, FakeEmbedder()).build("docs.csv", "docs.csv")
+    assert all(("vectors", derived_file) in backend.files for derived_file in derived_files)
+
+    backend.files[("docs.csv", "a.txt")] = "alpha beta changed"
+    await make_builder(backend, FakeEmbedder()).build("docs.csv", "docs.csv")
+
+    assert all(("vectors", derived_file) not in backend.files for derived_file in derived_files)
+    assert "alpha beta changed" in " ".join(read_index(backend)['text'])
+
+@pytest.mark.asyncio
+async def test_build_retries_failed_batches():
+    backend = InMemoryBackend({("docs.csv", "a.txt"): "alpha"})
+    embedder = FakeEmbedder(failures=2)
+
+    stats = await make_builder(backend, embedder, max_retries=3).build("docs.csv", "docs.csv")
+
+    assert stats["embedded"] == 1
+
+@pytest.mark.asyncio
+async def test_build_checkpoints_after_each_group():
+    backend = InMemoryBackend({("docs.csv", f"{name}.txt"): name for name in "abc"})
+    writes = []
+    write = backend.write_data_content
+
+    async def recording_write(data_container, data_file, data):
+        writes.append(data_file)
+        await write(data_container, data_file, data)
+    backend.write_data_content = recording_write
+
+    await make_builder(backend, FakeEmbedder(), checkpoint_every=1).build("docs.csv", "docs.csv")
+
+    # Each group only writes its own rows, the parts are compacted into the index at the end
+    assert writes == ["docs.part0.csv", "docs.manifest.json", "docs.part1.csv", "docs.manifest.json",
+                      "docs.part2.csv", "docs.manifest.json", "docs.csv", "docs.manifest.json"]
+    assert set(read_index(backend)['document_id']) == {"a.txt", "b.txt", "c.txt"}
+    assert not [name for container, name in backend.files if ".part" in name]
+
+@pytest.mark.asyncio
+async def test_build_resumes_from_parts_of_an_interrupted_run():
+    backend = InMemoryBackend({("docs.csv", f"{name}.txt"): name for name in "abc"})
+    embedder = FakeEmbedder()
+
+    async def interrupted_compaction(*args):
+        raise RuntimeError("interrupted")
+    builder = make_builder(backend, embedder, checkpoint_every=1)
+    builder.compact = interrupted_compaction
+    with pytest.raises(RuntimeError):
+        await builder.build("docs.csv", "docs.csv")
+
+    embedder.calls.clear()
+    stats = await make_builder(backend, embedder).build("docs.csv", "docs.csv")
+    assert stats["unchanged"] == 3 and embedder.calls == []
+    assert set(read_index(backend)['document_id']) == {"a.txt", "b.txt", "c.txt"}
+
+@pytest.mark.asyncio
+async def test_build_matches_document_file_names():
+    backend = InMemoryBackend({
+        ("docs.csv", "release.notes.txt"): "alpha beta",
+        ("docs.csv", "image.png"): "not a document",
+    })
+    stats = await make_builder(backend, FakeEmbedder()).build("docs.csv", "docs.csv")
+    assert stats["documents"] == 1
+    assert set(read_index(backend)['document_id']) == {"release.notes.txt"}
+
+@pytest.mark.asyncio
+async def test_documents_without_passages_are_not_embedded_again():
+    backend = InMemoryBackend({("docs.csv", "a.txt"): "alpha", ("docs.csv", "blank.txt"): "   "})
+    await make_builder(backend, FakeEmbedder()).build("docs.csv", "docs.csv")
+
+    embedder = FakeEmbedder()
+    stats = await make_builder(backend, embedder).build("docs.csv", "docs.csv")
+    assert stats["unchanged"] == 2 and stats["embedded"] == 0
+    assert embedder.calls == []
@@ -0,0 +1,66 @@
+import numpy as np
+
+from plugins.genai_interactions.vector_search.openai_file_search.utils.ivf_index import (
+    IvfIndex,
+    evaluate_recall,
+    ivf_index_file,
+    sample_queries,
+)
+from plugins.genai_interactions.vector_search.openai_file_search.utils.vector_index import (
+    VectorIndex,
+)
+
+
+def make_embeddings(row_count=2000, dimension=16, clusters=20, seed=1):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension))
+    rows = centers[rng.integers(clusters, size=row_count)] + rng.normal(scale=0.1, size=(row_count, dimension))
+    return IvfIndex.normalize(rows.astype(np.float32))
+
+def test_build_assigns_every_row_once():
+    embeddings = make_embeddings()
+    ivf_index = IvfIndex.build(embeddings, n_lists=32)
+    assert ivf_index.n_lists == 32
+    assert ivf_index.offsets[-1] == embeddings.shape[0]
+    assert sorted(ivf_index.order.tolist()) == list(range(embeddings.shape[0]))
+
+def test_probing_every_list_scans_everything():
+    embeddings = make_embeddings(row_count=300)
+    ivf_index = IvfIndex.build(embeddings, n_lists=8)
+    candidates = ivf_index.candidates(embeddings[0], n_probe=8)
+    assert sorted(candidates.tolist()) == list(range(300))
+
+def test_bytes_round_trip():
+    ivf_index = IvfIndex.build(make_embeddings(row_count=200), n_lists=4)
+    restored = IvfIndex.from_bytes(ivf_index.to_bytes())
+    assert np.array_equal(restored.centroids, ivf_index.centroids)
+    assert np.array_equal(restored.order, ivf_index.order)
+    assert np.array_equal(restored.offsets, ivf_index.offsets)
+
+def test_covers_checks_the_row_count():
+    ivf_index = IvfIndex.build(make_embeddings(row_count=200), n_lists=4)
+    assert ivf_index.covers(200)
+    assert not ivf_index.covers(150)
+    assert not ivf_index.covers(250)
+
+def test_recall_increases_with_probes():
+    embeddings = make_embeddings()
+    ivf_index = IvfIndex.build(embeddings, n_lists=32)
+    report = evaluate_recall(embeddings, ivf_index, sample_queries(embeddings, 50), result_count=5, probes=[1, 32])
+    assert report[0]["n_probe"] == 0
+    assert report[1]["recall"] <= report[2]["recall"]
+    assert report[2]["recall"] == 1.0
+    assert report[1]["scanned"] < 1.0
+
+def test_vector_index_search_uses_ann_index():
+    embeddings = make_embeddings(row_count=500)
+    index = VectorIndex(embeddings)
+    index.ann_index = IvfIndex.build(embeddings, n_lists=16)
+    exact = index.search(embeddings[10], result_count=3)
+    approximate = index.search(embeddings[10], result_count=3, n_probe=16)
+    assert [row for row, _ in approximate] == [row for row, _ in exact]
+    assert approximate[0][0] == 10
+
+def test_ivf_index_file():
+    assert ivf_index_file("docs.csv") == "docs.ivf.npz"
+    assert ivf_index_file("docs.embeddings.npy") == "docs.ivf.npz"
@@ -0,0 +1,43 @@
+import numpy as np
+
+from plugins.genai_interactions.vector_search.openai_file_search.utils.lexical_index import (
+    LexicalIndex,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+
+def test_tokenize_keeps_identifiers():
+    assert tokenize("Error ERR-1234 in v1.2.3, see ticket_42.") == ["error", "err-1234", "in", "v1.2.3", "see", "ticket_42"]
+    assert tokenize(None) == []
+
+def test_search_ranks_by_bm25():
+    index = LexicalIndex.build([
+        "the cat sat on the mat",
+        "error ERR-1234 raised by the cat service",
+        "dogs and cats",
+    ])
+    assert index.search("ERR-1234", 3) == [(1, index.search("ERR-1234", 1)[0][1])]
+    rows = [row for row, _ in index.search("cat", 3)]
+    assert rows == [0, 1]
+    assert index.search("unknown", 3) == []
+
+def test_rare_terms_score_higher():
+    index = LexicalIndex.build(["common rare", "common", "common"])
+    scores = index.scores("common rare")
+    assert scores[0] > scores[1] == scores[2] > 0
+
+def test_candidates_are_in_row_order():
+    index = LexicalIndex.build(["b a", "a", "c", "a a a"])
+    assert np.array_equal(index.candidates("a", 2), np.sort([row for row, _ in index.search("a", 2)]))
+    assert len(index.candidates("z", 2)) == 0
+
+def test_empty_index():
+    index = LexicalIndex.build([])
+    assert len(index) == 0
+    assert index.search("anything", 3) == []
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[(1, 0.9), (2, 0.8)], [(2, 7.0), (3, 1.0)]], result_count=2, k=60)
+    assert [row for row, _ in fused] == [2, 1]
+    assert np.isclose(fused[0][1], 1 / 62 + 1 / 61)
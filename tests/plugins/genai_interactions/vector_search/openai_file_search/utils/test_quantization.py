@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from plugins.genai_interactions.vector_search.openai_file_search.utils.ivf_index import (
+    sample_queries,
+)
+from plugins.genai_interactions.vector_search.openai_file_search.utils.quantization import (
+    QuantizedMatrix,
+    evaluate_precision,
+)
+
+
+def random_embeddings(rows=500, dimensions=32, seed=0):
+    matrix = np.random.default_rng(seed).normal(size=(rows, dimensions)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+@pytest.mark.parametrize("precision, itemsize", [("float16", 2), ("int8", 1)])
+def test_quantize_approximates_scores(precision, itemsize):
+    embeddings = random_embeddings()
+    matrix = QuantizedMatrix.quantize(embeddings, precision)
+    query = embeddings[0]
+
+    assert matrix.precision == precision
+    assert matrix.shape == embeddings.shape
+    assert matrix.data.itemsize == itemsize
+    assert np.allclose(matrix @ query, embeddings @ query, atol=0.02)
+    assert np.allclose(matrix[np.array([3, 1])], embeddings[[3, 1]], atol=0.01)
+
+def test_quantize_scans_in_chunks(monkeypatch):
+    monkeypatch.setattr("plugins.genai_interactions.vector_search.openai_file_search.utils.quantization.SCAN_CHUNK_SIZE", 7)
+    embeddings = random_embeddings(rows=50)
+    matrix = QuantizedMatrix.quantize(embeddings, "int8")
+    assert np.allclose(matrix @ embeddings[0], embeddings @ embeddings[0], atol=0.02)
+
+def test_quantize_zero_rows_and_empty_matrix():
+    matrix = QuantizedMatrix.quantize(np.zeros((2, 3), dtype=np.float32), "int8")
+    assert np.array_equal(matrix @ np.ones(3, dtype=np.float32), [0.0, 0.0])
+    assert QuantizedMatrix.quantize(np.empty((0, 0), dtype=np.float32), "int8").shape == (0, 0)
+
+def test_quantize_unknown_precision():
+    with pytest.raises(ValueError):
+        QuantizedMatrix.quantize(random_embeddings(), "int4")
+
+def test_evaluate_precision_reports_recall():
+    embeddings = random_embeddings(rows=2000)
+    queries = sample_queries(embeddings, 20)
+    report = evaluate_precision(embeddings, queries, result_count=5, precisions=["float16", "int8"], reranks=[0, 20])
+
+    assert [(row["precision"], row["rerank"]) for row in report] == [("float32", 0), ("float16", 0), ("float16", 20), ("int8", 0), ("int8", 20)]
+    assert report[1]["megabytes"] == report[0]["megabytes"] / 2
+    assert all(row["recall"] >= 0.9 for row in report)
+    assert report[4]["recall"] == 1.0
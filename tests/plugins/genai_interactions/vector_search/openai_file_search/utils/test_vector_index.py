@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from plugins.genai_interactions.vector_search.openai_file_search.utils.vector_index import (
+    VectorIndex,
+)
+
+
+def make_dataframe():
+    return pd.DataFrame({
+        'document_id': ['doc1', 'doc2', 'doc3'],
+        'passage_id': [0, 1, 2],
+        'passage_index': [0, 10, 20],
+        'text': ['first', 'second', 'third'],
+        'title': ['t1', 't2', 't3'],
+        'file_path': ['p1', 'p2', 'p3'],
+        'embedding': ['[1.0, 0.0]', '[0.0, 2.0]', '[1.0, 1.0]'],
+        'title_embedding': ['[0.0, 1.0]', '[1.0, 0.0]', '[1.0, 1.0]'],
+    })
+
+def test_from_dataframe_normalizes_embeddings():
+    index = VectorIndex.from_dataframe(make_dataframe(), version="v1")
+    assert len(index) == 3
+    assert index.version == "v1"
+    assert index.embeddings.dtype == np.float32
+    assert np.allclose(np.linalg.norm(index.embeddings, axis=1), 1.0)
+    assert index.get_passage(1) == {
+        'document_id': 'doc2', 'passage_id': 1, 'passage_index': 10,
+        'text': 'second', 'title': 't2', 'file_path': 'p2'
+    }
+
+def test_search_orders_by_similarity():
+    index = VectorIndex.from_dataframe(make_dataframe())
+    hits = index.search([0.0, 1.0], result_count=2)
+    assert [row for row, _ in hits] == [1, 2]
+    assert np.isclose(hits[0][1], 1.0)
+    assert np.isclose(hits[1][1], np.sqrt(0.5))
+
+def test_search_matches_cosine_similarity():
+    index = VectorIndex.from_dataframe(make_dataframe())
+    query = np.array([0.3, 0.7])
+    hits = dict(index.search(query, result_count=3))
+    for row, embedding in enumerate([[1.0, 0.0], [0.0, 2.0], [1.0, 1.0]]):
+        expected = np.dot(embedding, query) / (np.linalg.norm(embedding) * np.linalg.norm(query))
+        assert np.isclose(hits[row], expected, atol=1e-6)
+
+def test_search_with_title_weights():
+    index = VectorIndex.from_dataframe(make_dataframe())
+    hits = index.search([1.0, 0.0], result_count=1, text_weight=0.1, title_weight=0.9, use_title=True)
+    assert hits[0][0] == 1
+
+def test_search_result_count_larger_than_index():
+    index = VectorIndex.from_dataframe(make_dataframe())
+    assert len(index.search([1.0, 0.0], result_count=10)) == 3
+
+def test_empty_index():
+    df = pd.DataFrame({'passage_index': [], 'text': [], 'embedding': []})
+    index = VectorIndex.from_dataframe(df)
+    assert len(index) == 0
+    assert index.search([1.0, 0.0], result_count=3) == []
+
+def test_binary_round_trip_is_zero_copy():
+    index = VectorIndex.from_dataframe(make_dataframe())
+    embeddings, title_embeddings, metadata = index.to_binary()
+    buffer = bytearray(embeddings)
+    loaded = VectorIndex.from_binary(buffer, metadata, title_embeddings, version="v1")
+    assert len(loaded) == 3
+    assert loaded.version == "v1"
+    assert np.array_equal(loaded.embeddings, index.embeddings)
+    assert np.array_equal(loaded.title_embeddings, index.title_embeddings)
+    assert np.shares_memory(loaded.embeddings, np.frombuffer(buffer, dtype=np.uint8))
+    assert loaded.get_passage(2) == index.get_passage(2)
+    assert loaded.search([0.0, 1.0], result_count=2) == index.search([0.0, 1.0], result_count=2)
+
+def test_search_restricted_to_candidate_rows():
+    index = VectorIndex(np.array([[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]]))
+    hits = index.search([1.0, 0.0], result_count=2, rows=np.array([1, 2]))
+    assert [row for row, _ in hits] == [2, 1]
+
+def test_quantized_search_reranks_with_exact_embeddings():
+    embeddings = np.random.default_rng(0).normal(size=(200, 16)).astype(np.float32)
+    exact = VectorIndex(embeddings)
+    quantized = VectorIndex(embeddings)
+    quantized.quantize("int8", keep_exact=True)
+
+    assert quantized.precision == "int8"
+    query = embeddings[7] + 0.01
+    expected = exact.search(query, result_count=5)
+    hits = quantized.search(query, result_count=5, rerank=20)
+    assert [row for row, _ in hits] == [row for row, _ in expected]
+    assert np.allclose([score for _, score in hits], [score for _, score in expected])
+
+def test_quantized_search_without_exact_embeddings():
+    embeddings = np.eye(4, dtype=np.float32)
+    index = VectorIndex(embeddings)
+    index.quantize("float16")
+
+    assert index.exact_embeddings is None
+    assert index.search([0.0, 1.0, 0.0, 0.0], result_count=1, rerank=10)[0][0] == 1
+    embeddings_buffer, _, metadata = index.to_binary()
+    restored = VectorIndex.from_binary(embeddings_buffer, metadata)
+    assert np.allclose(restored.embeddings, embeddings)
+
+def test_from_binary_requires_metadata_for_every_row():
+    embeddings_buffer, _, metadata = VectorIndex(np.eye(3, dtype=np.float32)).to_binary()
+    with pytest.raises(ValueError):
+        VectorIndex.from_binary(embeddings_buffer, None)
+    with pytest.raises(ValueError):
+        VectorIndex.from_binary(embeddings_buffer, metadata.rsplit("\n", 2)[0] + "\n")
@@ -8,6 +8,7 @@ from fastapi import Request
 from pydantic import BaseModel
 from starlette.responses import Response
 
+from core.backend.flag_store import InMemoryFlagStore
 from core.user_interactions.incoming_notification_data_base import (
     IncomingNotificationDataBase,
 )
@@ -118,7 +119,7 @@ async def test_validate_request(slack_plugin):
 
     # Mock is_message_too_old pour retourner False
     slack_plugin.is_message_too_old = AsyncMock(return_value=False)
-    slack_plugin.backend_internal_data_processing_dispatcher.read_data_content = AsyncMock(return_value=None)
+    slack_plugin.backend_internal_data_processing_dispatcher.claim_flag = AsyncMock(return_value=True)
 
     is_valid = await slack_plugin.validate_request(event_data, headers, raw_body_str)
 
@@ -333,10 +334,41 @@ async def test_validate_event_data(slack_plugin):
     reaction_event = valid_event.copy()
     assert slack_plugin._validate_event_data("reaction_added", "1234567890.123456", "C12345678", "U123456", reaction_event) is False
 
+def signed_request(slack_plugin, event_data):
+    raw_body_str = json.dumps(event_data)
+    headers = {'X-Slack-Request-Timestamp': '1531420618'}
+    sig_basestring = f'v0:{headers["X-Slack-Request-Timestamp"]}:{raw_body_str}'
+    headers['X-Slack-Signature'] = 'v0=' + hmac.new(
+        slack_plugin.slack_signing_secret.encode(),
+        sig_basestring.encode(),
+        hashlib.sha256
+    ).hexdigest()
+    return headers, raw_body_str
+
+@pytest.mark.asyncio
+async def test_app_mention_does_not_claim_the_message(slack_plugin):
+    flag_store = InMemoryFlagStore()
+    slack_plugin.is_message_too_old = AsyncMock(return_value=False)
+
+    async def claim_flag(namespace, key, value="1"):
+        return await flag_store.add_flag(namespace, key, value)
+
+    slack_plugin.backend_internal_data_processing_dispatcher.claim_flag = AsyncMock(side_effect=claim_flag)
+    event = {"user": "U123456", "channel": "C12345678", "ts": "1234567890.123456", "text": "<@bot> hello"}
+
+    app_mention = {"event": {**event, "type": "app_mention"}}
+    assert await slack_plugin.validate_request(app_mention, *signed_request(slack_plugin, app_mention)) is False
+
+    # The message event of the same mention is the one processed
+    message = {"event": {**event, "type": "message"}}
+    assert await slack_plugin.validate_request(message, *signed_request(slack_plugin, message)) is True
+    # A retry of the message is discarded
+    assert await slack_plugin.validate_request(message, *signed_request(slack_plugin, message)) is False
+
 @pytest.mark.asyncio
 async def test_validate_processing_status(slack_plugin):
     slack_plugin.is_message_too_old = AsyncMock(return_value=False)
-    slack_plugin.backend_internal_data_processing_dispatcher.read_data_content = AsyncMock(return_value=None)
+    slack_plugin.backend_internal_data_processing_dispatcher.claim_flag = AsyncMock(return_value=True)
 
     assert await slack_plugin._validate_processing_status("C12345678", "1234567890.123456") is True
 
@@ -346,8 +378,9 @@ async def test_validate_processing_status(slack_plugin):
 
     # Test with already processing message
     slack_plugin.is_message_too_old = AsyncMock(return_value=False)
-    slack_plugin.backend_internal_data_processing_dispatcher.read_data_content = AsyncMock(return_value="Some content")
+    slack_plugin.backend_internal_data_processing_dispatcher.claim_flag = AsyncMock(return_value=False)
     assert await slack_plugin._validate_processing_status("C12345678", "1234567890.123456") is False
+    slack_plugin.backend_internal_data_processing_dispatcher.claim_flag.assert_awaited_with("processing", "C12345678-1234567890.123456.txt", "processing")
 
 @pytest.mark.asyncio
 async def test_process_event_data(slack_plugin):
@@ -179,11 +179,11 @@ async def test_is_duplicate_request(teams_plugin):
         'id': 'message_id'
     }
     
-    with patch.object(teams_plugin.backend_internal_data_processing_dispatcher, 'read_data_content', new_callable=AsyncMock) as mock_read_data:
-        mock_read_data.return_value = None
+    with patch.object(teams_plugin.backend_internal_data_processing_dispatcher, 'claim_flag', new_callable=AsyncMock) as mock_claim_flag:
+        mock_claim_flag.return_value = True
         assert await teams_plugin._is_duplicate_request(event_data, 'user_id', 'channel_id', 'channel') is False
 
-        mock_read_data.return_value = 'Some content'
+        mock_claim_flag.return_value = False
         assert await teams_plugin._is_duplicate_request(event_data, 'user_id', 'channel_id', 'channel') is True
 
 @pytest.mark.asyncio
@@ -169,7 +169,7 @@ async def test_process_interaction_break_keyword(ca_default_behavior_plugin, glo
 
     # Ajoutez vos assertions ici
     ca_default_behavior_plugin.user_interactions_dispatcher.send_message.assert_called()
-    ca_default_behavior_plugin.backend_internal_data_processing_dispatcher.write_data_content.assert_called()
+    ca_default_behavior_plugin.backend_internal_data_processing_dispatcher.set_flag.assert_called_with("abort", "C123-T456.txt", "abort")
 
 @pytest.mark.asyncio
 async def test_process_interaction_start_keyword(ca_default_behavior_plugin, global_manager):
@@ -197,7 +197,7 @@ async def test_process_interaction_start_keyword(ca_default_behavior_plugin, glo
     await ca_default_behavior_plugin.process_interaction(event)
 
     ca_default_behavior_plugin.user_interactions_dispatcher.send_message.assert_called()
-    ca_default_behavior_plugin.backend_internal_data_processing_dispatcher.remove_data_content.assert_called()
+    ca_default_behavior_plugin.backend_internal_data_processing_dispatcher.clear_flag.assert_called_with("abort", "C123-T456.txt")
 
 @pytest.mark.asyncio
 async def test_process_interaction_error(ca_default_behavior_plugin, global_manager):
@@ -259,7 +259,7 @@ async def test_process_interaction_thread_break_keyword(im_default_behavior_plug
     await im_default_behavior_plugin.process_interaction(event_data, event_origin="test_origin")
 
     plugin_mock.send_message.assert_awaited()
-    global_manager.backend_internal_data_processing_dispatcher.write_data_content.assert_awaited()
+    global_manager.backend_internal_data_processing_dispatcher.set_flag.assert_awaited_with("abort", "C123-thread_1.txt", "abort")
 
 @pytest.mark.asyncio
 async def test_process_interaction_break_keyword(im_default_behavior_plugin, global_manager):
@@ -290,12 +290,12 @@ async def test_process_interaction_break_keyword(im_default_behavior_plugin, glo
     im_default_behavior_plugin.user_interaction_dispatcher.get_plugin.return_value = plugin_mock
 
     im_default_behavior_plugin.backend_internal_data_processing_dispatcher = AsyncMock()
-    im_default_behavior_plugin.backend_internal_data_processing_dispatcher.write_data_content = AsyncMock()
+    im_default_behavior_plugin.backend_internal_data_processing_dispatcher.set_flag = AsyncMock()
 
     await im_default_behavior_plugin.process_interaction(event_data, event_origin="test_origin")
 
     plugin_mock.send_message.assert_awaited()
-    im_default_behavior_plugin.backend_internal_data_processing_dispatcher.write_data_content.assert_awaited()
+    im_default_behavior_plugin.backend_internal_data_processing_dispatcher.set_flag.assert_awaited_with("abort", "C123-thread_1.txt", "abort")
 
 @pytest.mark.asyncio
 async def test_begin_end_genai_completion(im_default_behavior_plugin):
@@ -8,24 +8,37 @@ from utils.prompt_manager.prompt_manager import PromptManager
 @pytest.fixture
 def mock_global_manager_with_dispatcher(mock_global_manager):
     mock_global_manager.backend_internal_data_processing_dispatcher = AsyncMock()
+    mock_global_manager.backend_internal_data_processing_dispatcher.read_many = AsyncMock(return_value=['core_prompt_content', 'main_prompt_content'])
     return mock_global_manager
 
 
 @pytest.mark.asyncio
 async def test_initialize(mock_global_manager_with_dispatcher):
+    mock_global_manager_with_dispatcher.config_manager.get_config = MagicMock(side_effect=lambda path: path[-1].lower())
     prompt_manager = PromptManager(mock_global_manager_with_dispatcher)
 
-    # Mock the methods that will be called during initialization
-    prompt_manager.get_core_prompt = AsyncMock(return_value='core_prompt_content')
-    prompt_manager.get_main_prompt = AsyncMock(return_value='main_prompt_content')
-
     # Call the initialize method
     await prompt_manager.initialize()
 
-    # Check if the prompts were set correctly
+    # Check if the prompts were read in one round and set correctly
     assert prompt_manager.core_prompt == 'core_prompt_content'
     assert prompt_manager.main_prompt == 'main_prompt_content'
     assert hasattr(prompt_manager, 'prompt_container')
+    mock_global_manager_with_dispatcher.backend_internal_data_processing_dispatcher.read_many.assert_awaited_once_with([
+        (prompt_manager.prompt_container, 'core_prompt.txt'),
+        (prompt_manager.prompt_container, 'main_prompt.txt'),
+    ])
+
+
+@pytest.mark.asyncio
+async def test_initialize_empty_prompts(mock_global_manager_with_dispatcher):
+    mock_global_manager_with_dispatcher.backend_internal_data_processing_dispatcher.read_many.return_value = [None, None]
+    prompt_manager = PromptManager(mock_global_manager_with_dispatcher)
+
+    await prompt_manager.initialize()
+
+    assert prompt_manager.core_prompt is None
+    assert prompt_manager.logger.error.call_count == 2
 
 
 @pytest.mark.asyncio
@@ -51,39 +64,41 @@ async def test_get_sub_prompt(mock_global_manager_with_dispatcher):
 async def test_get_core_prompt(mock_global_manager_with_dispatcher):
     # Mock the config manager to return a specific file name
     mock_global_manager_with_dispatcher.config_manager.get_config = MagicMock(return_value='core_prompt_file')
-    # Mock the backend dispatcher to return specific content
-    mock_global_manager_with_dispatcher.backend_internal_data_processing_dispatcher.read_data_content = AsyncMock(return_value='core_prompt_content')
 
     prompt_manager = PromptManager(mock_global_manager_with_dispatcher)
 
     # Call the initialize method to set prompt_container
     await prompt_manager.initialize()
 
+    # Mock the backend dispatcher to return specific content
+    mock_global_manager_with_dispatcher.backend_internal_data_processing_dispatcher.read_many.return_value = ['core_prompt_content']
+
     # Call the get_core_prompt method
     core_prompt = await prompt_manager.get_core_prompt()
 
     # Check if the core prompt was retrieved correctly
     assert core_prompt == 'core_prompt_content'
     mock_global_manager_with_dispatcher.config_manager.get_config.assert_called_with(['BOT_CONFIG', 'CORE_PROMPT'])
-    mock_global_manager_with_dispatcher.backend_internal_data_processing_dispatcher.read_data_content.assert_called_with(prompt_manager.prompt_container, 'core_prompt_file.txt')
+    mock_global_manager_with_dispatcher.backend_internal_data_processing_dispatcher.read_many.assert_awaited_with([(prompt_manager.prompt_container, 'core_prompt_file.txt')])
 
 
 @pytest.mark.asyncio
 async def test_get_main_prompt(mock_global_manager_with_dispatcher):
     # Mock the config manager to return a specific file name
     mock_global_manager_with_dispatcher.config_manager.get_config = MagicMock(return_value='main_prompt_file')
-    # Mock the backend dispatcher to return specific content
-    mock_global_manager_with_dispatcher.backend_internal_data_processing_dispatcher.read_data_content = AsyncMock(return_value='main_prompt_content')
 
     prompt_manager = PromptManager(mock_global_manager_with_dispatcher)
 
     # Call the initialize method to set prompt_container
     await prompt_manager.initialize()
 
+    # Mock the backend dispatcher to return specific content
+    mock_global_manager_with_dispatcher.backend_internal_data_processing_dispatcher.read_many.return_value = ['main_prompt_content']
+
     # Call the get_main_prompt method
     main_prompt = await prompt_manager.get_main_prompt()
 
     # Check if the main prompt was retrieved correctly
     assert main_prompt == 'main_prompt_content'
     mock_global_manager_with_dispatcher.config_manager.get_config.assert_called_with(['BOT_CONFIG', 'MAIN_PROMPT'])
-    mock_global_manager_with_dispatcher.backend_internal_data_processing_dispatcher.read_data_content.assert_called_with(prompt_manager.prompt_container, 'main_prompt_file.txt')
+    mock_global_manager_with_dispatcher.backend_internal_data_processing_dispatcher.read_many.assert_awaited_with([(prompt_manager.prompt_container, 'main_prompt_file.txt')])
@@ -24,6 +24,33 @@ class BotConfig(BaseModel):
     LLM_CONVERSION_FORMAT: str
     BREAK_KEYWORD: str
     START_KEYWORD: str
+    # Read cache policies of the backend dispatcher, keyed by container (PROMPTS, FEEDBACKS...), no caching by default
+    INTERNAL_DATA_PROCESSING_CACHE: Optional[Dict[str, Dict[str, Any]]] = None
+    # Processing flags, locks and buffers: "memory" for a single worker, "sqlite" to share them
+    # between the workers of a node, "backend" to share flags through the internal data processing backend
+    FLAG_STORE: str = "memory"
+    # Abort flags set by the break keyword, kept in the backend so that they survive restarts
+    ABORT_FLAG_STORE: str = "backend"
+    # SQLite database of the "sqlite" flag store, on local disk, in the temporary directory by default
+    SHARED_STATE_PATH: Optional[str] = None
+    PROCESSING_FLAG_TTL: Optional[float] = 3600
+    # Abort flags are kept until the start keyword clears them by default
+    ABORT_FLAG_TTL: Optional[float] = None
+    # Seconds the messages a bot was not mentioned in are kept when buffered in the "sqlite" shared state
+    UNMENTIONED_MESSAGES_TTL: Optional[float] = 604800
+    # Tokens of conversation history sent to the text models, 0 sends the whole session
+    HISTORY_TOKEN_BUDGET: int = 32000
+    # Budgets overriding HISTORY_TOKEN_BUDGET, keyed by text plugin name
+    HISTORY_TOKEN_BUDGETS: Optional[Dict[str, int]] = None
+    # Most recent stored messages kept verbatim, older ones are summarized
+    HISTORY_RECENT_MESSAGES: int = 10
+    # Seconds between writes of the accumulated costs to the backend, 0 writes every completion
+    COST_FLUSH_INTERVAL: float = 30
+    # Seconds after their last update before backend files are removed, keyed by container (SESSIONS, PROCESSING...)
+    RETENTION: Optional[Dict[str, float]] = None
+    RETENTION_INTERVAL: float = 3600
+    RETENTION_BATCH_SIZE: int = 256
+    RETENTION_BATCH_PAUSE: float = 1.0
 
 class File(BaseModel):
     PLUGIN_NAME: str
@@ -16,8 +16,21 @@ class PromptManager:
 
     async def initialize(self):
         self.prompt_container = self.backend_internal_data_processing_dispatcher.prompts
-        self.core_prompt = await self.get_core_prompt()
-        self.main_prompt = await self.get_main_prompt()
+        self.core_prompt, self.main_prompt = await self.read_prompts('CORE_PROMPT', 'MAIN_PROMPT')
+
+    async def read_prompts(self, *prompt_settings):
+        """
+        Read the prompts named by BOT_CONFIG settings, like CORE_PROMPT, in one round.
+        """
+        prompt_files = [self.config_manager.get_config(['BOT_CONFIG', setting]) for setting in prompt_settings]
+        prompts = await self.backend_internal_data_processing_dispatcher.read_many([
+            (self.prompt_container, f"{prompt_file}.txt") for prompt_file in prompt_files
+        ])
+        for setting, prompt in zip(prompt_settings, prompts):
+            if not prompt:
+                prompt_name = setting.lower().replace('_', ' ')
+                self.logger.error(f"Error while retrieving {prompt_name}: {prompt_name} is empty")
+        return prompts
 
     async def get_sub_prompt(self, message_type):
         # Get the sub_prompts folder name from the configuration
@@ -28,18 +41,9 @@ class PromptManager:
         return sub_prompt
 
     async def get_core_prompt(self):
-        core_prompt_file = self.config_manager.get_config(['BOT_CONFIG', 'CORE_PROMPT'])
-        core_prompt = []
-        core_prompt = await self.backend_internal_data_processing_dispatcher.read_data_content(self.prompt_container, f"{core_prompt_file}.txt")
-
-        if not core_prompt:
-            self.logger.error("Error while retrieving core prompt: core prompt is empty")
+        core_prompt, = await self.read_prompts('CORE_PROMPT')
         return core_prompt
 
     async def get_main_prompt(self):
-        main_prompt_file = self.config_manager.get_config(['BOT_CONFIG', 'MAIN_PROMPT'])
-        main_prompt = []
-        main_prompt = await self.backend_internal_data_processing_dispatcher.read_data_content(self.prompt_container, f"{main_prompt_file}.txt")
-        if not main_prompt:
-            self.logger.error("Error while retrieving main prompt: main prompt is empty")
+        main_prompt, = await self.read_prompts('MAIN_PROMPT')
         return main_prompt